@@ -6,57 +6,108 @@ Airリザーブ自動予約システム - メインエントリーポイント
     python main.py --mode monitor    # 監視モード
     python main.py --mode book       # 予約実行モード
     python main.py --mode schedule   # 定期実行モード
+    python main.py --mode schedule --once   # 次の監視期間のみ実行
+    python main.py --mode daemon     # 常駐モード（制御APIで状態確認・設定変更）
+    python main.py --mode validate   # 設定の検証のみ（ブラウザを読み込まない）
+    python main.py --mode report     # モードごとのモジュール読み込み時間の内訳
+    python main.py --mode bench      # 起動時間・予約公開・スキャン時間・HARの再生を計測し、予算・ベースラインを超えたら失敗
+    python main.py --mode monitor --profile sample,loop   # プロファイリングしながら監視（profiles/ にレポート）
 """
 
+import time
+
+# 起動時間の計測開始（モジュールの読み込みより前）
+STARTED_AT = time.perf_counter()
+
 import argparse
 import asyncio
 import logging
 import sys
-from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 
 # プロジェクトルートをパスに追加
 sys.path.append(str(Path(__file__).parent))
 
-from src.scraper import AirReserveScraper
-from src.booker import AirReserveBooker
-from src.notifier import NotificationManager
+# Playwrightを読み込むスクレイパー・ブッカーなどの重いモジュールは、必要なモードの実行直前に読み込む
+from src.profiles import FairSeatAllocator, load_profiles
+from src.ledger import open_ledger
+from src.targets import load_targets
 from src.config import validate_required_config, ConfigError
 
+# 起動時に読み込みを計測しないモード（起動時間の計測自体を行うモード）
+MEASUREMENT_MODES = ("report", "bench")
+# benchモードの計測項目（startup: 起動時間、release: 予約公開の再現、throughput: スキャン時間、replay: HARの再生）
+BENCH_SUITES = ("startup", "release", "throughput", "replay")
+# ブラウザで監視・予約するモード（メトリクスを公開する）
+BROWSER_MODES = ("monitor", "book", "schedule", "daemon")
+
 
 def setup_logging():
-    """ログ設定を初期化"""
-    import os
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+    """ログ設定を初期化（ファイル・標準出力への書き出しはバックグラウンドのスレッドで行う）"""
+    from src.config import get_debug, get_log_dir, get_log_format
+    from src.logging_setup import start_logging
     
     # DEBUG環境変数に応じてログレベルを設定
-    debug_mode = os.getenv("DEBUG", "false").lower() == "true"
-    log_level = logging.DEBUG if debug_mode else logging.INFO
+    log_level = logging.DEBUG if get_debug() else logging.INFO
+    start_logging(log_level, get_log_dir(), get_log_format())
+
+
+def log_startup_time(mode: str):
+    """起動からモードの実行開始（必要なモジュールの読み込み完了）までの時間を予算と比べてログに出力"""
+    from src.startup import check_startup_budget
     
-    # ロガーの設定
-    root_logger = logging.getLogger()
-    root_logger.setLevel(log_level)
+    check_startup_budget(mode, (time.perf_counter() - STARTED_AT) * 1000)
+
+
+async def book_existing_slots(scraper, bookers, available_slots, booked_profiles: Optional[set] = None) -> set:
+    """既存の枠を予約者プロファイルごとに1件ずつ予約する
     
-    # ハンドラーをクリア
-    root_logger.handlers.clear()
+    スコアの高い枠から順に、希望条件に合致するプロファイルへ残席数まで割り当てる
+    （監視モードと同じFairSeatAllocatorを使う）。割り当て先の予約が失敗した場合は控えのプロファイルに繰り上げる。
+    予約台帳で予約済み・試行済みの枠はスコアが0になるため対象外。
     
-    # フォーマッター
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    Args:
+        booked_profiles: 既に予約できたプロファイルIDの集合（予約に成功したプロファイルを追加する）
+    
+    Returns:
+        set: 予約に成功したプロファイルIDの集合
+    """
+    logger = logging.getLogger(__name__)
+    allocator = FairSeatAllocator()
+    if booked_profiles is None:
+        booked_profiles = set()
     
-    # ファイルハンドラー
-    file_handler = logging.FileHandler(log_dir / f"auto-booker-{datetime.now().strftime('%Y%m%d')}.log")
-    file_handler.setLevel(log_level)
-    file_handler.setFormatter(formatter)
-    root_logger.addHandler(file_handler)
+    def best_score(slot):
+        return max(booker.score_slot(slot) for booker in bookers)
     
-    # コンソールハンドラー
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(log_level)
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    for slot in sorted(available_slots, key=best_score, reverse=True):
+        candidates = [
+            (booker, booker.score_slot(slot)) for booker in bookers if booker.profile_id not in booked_profiles
+        ]
+        candidates = [(booker, score) for booker, score in candidates if score > 0]
+        if not candidates:
+            continue
+        logger.info(f"希望条件に合致する枠を発見: {slot['text']}")
+        
+        for booker in allocator.allocate(slot, candidates):
+            while booker is not None:
+                logger.info(f"予約を実行します (プロファイル: {booker.profile_id})...")
+                # 予約を実行（先読み済みのページがあればそれを使う）
+                if await scraper.book_slot(slot, booker=booker):
+                    logger.info(f"予約が成功しました (プロファイル: {booker.profile_id}): {slot['text']}")
+                    booked_profiles.add(booker.profile_id)
+                    allocator.record_success(booker.profile_id)
+                    break
+                logger.warning(f"予約が失敗しました (プロファイル: {booker.profile_id}): {slot['text']}")
+                booker = allocator.next_fallback(slot)
+        
+        # 全プロファイルが予約できたら終了
+        if len(booked_profiles) == len(bookers):
+            break
+    return booked_profiles
 
 
 async def main_async():
@@ -64,10 +115,36 @@ async def main_async():
     parser = argparse.ArgumentParser(description="Airリザーブ自動予約システム")
     parser.add_argument(
         "--mode", 
-        choices=["monitor", "book", "schedule"], 
+        choices=["monitor", "book", "schedule", "daemon", "validate", "report", "bench"], 
         default="schedule",
         help="実行モードを選択"
     )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="定期実行モードで、次の監視期間のみ実行して終了する"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="benchモードで、各項目を計測する回数"
+    )
+    parser.add_argument(
+        "--suite",
+        choices=["all"] + list(BENCH_SUITES),
+        default="all",
+        help="benchモードで計測する項目"
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="benchモードで、結果をベースラインとして保存する"
+    )
+    parser.add_argument(
+        "--profile",
+        help="プロファイリングの種類（cpu,sample,loop,memory をカンマ区切り、all ですべて、off で無効。デフォルト: PROFILE_MODES）"
+    )
     parser.add_argument(
         "--config", 
         default=".env",
@@ -93,68 +170,178 @@ async def main_async():
     
     logger.info(f"Airリザーブ自動予約システム開始 - モード: {args.mode}")
     
+    ledger = None
+    history = None
+    exporter = None
+    profiler = None
     try:
-        if args.mode == "monitor":
-            # 監視モード
-            booker = AirReserveBooker()
-            scraper = AirReserveScraper(booker=booker)  # bookerを設定
-            await scraper.start_monitoring()
+        if args.mode in BROWSER_MODES:
+            # メトリクスの公開（METRICS_PORT / METRICS_TEXTFILE が設定されている場合）
+            from src.metrics import MetricsExporter
+            exporter = MetricsExporter()
+            await exporter.start()
+            
+            # 予約枠の履歴（HISTORY_ENABLED=trueの場合、スキャンで見た枠の状態の変化を記録する）
+            from src.history import open_history
+            history = open_history()
+        
+        if args.mode in BROWSER_MODES + ("bench",):
+            # プロファイリング（PROFILE_MODES / --profile が設定されている場合）
+            from src.config import parse_profile_modes
+            from src.profiling import Profiler, set_profiler
+            profiler = Profiler.from_env(parse_profile_modes(args.profile) if args.profile is not None else None)
+            set_profiler(profiler)
+            await profiler.start()
+        
+        if args.mode == "validate":
+            # 設定の検証モード（監視対象・予約公開カレンダー・予約者プロファイルを読み込んで終了する）
+            from src.release_calendar import load_release_calendar
+            
+            targets = load_targets()
+            windows = load_release_calendar().upcoming_windows()
+            profiles = load_profiles()
+            logger.info(f"監視対象: {', '.join(target.target_id for target in targets)}")
+            logger.info(f"予約者プロファイル: {', '.join(profile.profile_id for profile in profiles)}")
+            logger.info(f"今後の監視期間: {len(windows)}件" + (f"（次回: {windows[0].start}）" if windows else ""))
+            log_startup_time(args.mode)
+            logger.info("設定は有効です")
+            
+        elif args.mode == "report":
+            # モジュール読み込み時間の内訳（新しいPythonプロセスで -X importtime を使って計測する）
+            from src.startup import MODE_MODULES, import_report
+            
+            for mode in MODE_MODULES:
+                if mode in MEASUREMENT_MODES:
+                    continue
+                report = import_report(mode)
+                logger.info(f"モード {mode}: {report['total_ms']:.0f}ms ({report['modules']}モジュール)")
+                for timing in report['top_level']:
+                    logger.info(f"  {timing['cumulative_ms']:8.1f}ms  {timing['module']}")
+            
+        elif args.mode == "bench":
+            # ベンチマーク（起動時間は新しいPythonプロセスで、予約公開・スキャン時間はローカルのシミュレーターで計測する）
+            from src.startup import MODE_MODULES, check_startup_budget, measure_cold_start
+            from src.bench import check_regressions, run_benchmarks, save_baseline, write_results
+            
+            suites = BENCH_SUITES if args.suite == "all" else (args.suite,)
+            within_budget = True
+            startup = []
+            if "startup" in suites:
+                for mode in MODE_MODULES:
+                    if mode in MEASUREMENT_MODES:
+                        continue
+                    result = measure_cold_start(mode, runs=args.runs)
+                    within_budget = check_startup_budget(mode, result['median_ms']) and within_budget
+                    startup.append(result)
+            
+            results = await run_benchmarks(runs=args.runs, suites=tuple(s for s in suites if s != "startup"))
+            if startup:
+                results['startup'] = startup
+                results['metrics'].update({f"startup.{r['mode']}.median_ms": r['median_ms'] for r in startup})
+            passed = check_regressions(results)
+            logger.info(f"ベンチマークの結果を保存しました: {write_results(results)}")
+            if args.update_baseline:
+                logger.info(f"ベースラインを保存しました: {save_baseline(results)}")
+                passed = True
+            if not within_budget or not passed:
+                sys.exit(1)
+            
+        elif args.mode == "monitor":
+            # 監視モード（予約者プロファイルごとにbookerを作成し、1つのスキャンを共有する）
+            from src.scraper import AirReserveScraper
+            from src.booker import AirReserveBooker
+            from src.multi_target import MultiTargetMonitor
+            log_startup_time(args.mode)
+            
+            ledger = open_ledger()
+            bookers = [AirReserveBooker(profile, ledger=ledger) for profile in load_profiles()]
+            targets = load_targets()
+            if len(targets) > 1:
+                # 複数の監視対象を1つのブラウザで監視する
+                await MultiTargetMonitor(targets, bookers=bookers).run()
+            else:
+                scraper = AirReserveScraper(bookers=bookers, target=targets[0])  # bookerを設定
+                await scraper.start_monitoring()
             
         elif args.mode == "book":
-            # 予約実行モード
+            # 予約実行モード（予約者プロファイルごとに、既存の枠を1件ずつ予約する）
             logger.info("予約実行モード: 既存の予約可能枠を検出して予約を実行します")
+            from src.scraper import AirReserveScraper
+            from src.booker import AirReserveBooker
+            log_startup_time(args.mode)
             
-            scraper = AirReserveScraper()
-            booker = AirReserveBooker()
-            scraper.booker = booker  # bookerを設定
+            ledger = open_ledger()
+            bookers = [AirReserveBooker(profile, ledger=ledger) for profile in load_profiles()]
+            booked_profiles = set()
             
-            async with scraper:
-                # カレンダーページを読み込み
-                if not await scraper.load_calendar_page():
-                    logger.error("カレンダーページの読み込みに失敗しました")
-                    return
-                
-                # 予約可能枠を取得
-                logger.info("予約可能枠を検索中...")
-                available_slots = await scraper.get_available_slots(max_weeks=7)
-                
-                if not available_slots:
-                    logger.warning("予約可能枠が見つかりませんでした")
-                    return
-                
-                logger.info(f"{len(available_slots)}件の予約可能枠を発見")
+            # 監視対象ごとに順に予約する（予約できたプロファイルは次の監視対象では予約しない）
+            for target in load_targets():
+                if len(booked_profiles) == len(bookers):
+                    break
+                scraper = AirReserveScraper(bookers=bookers, target=target)  # bookerを設定
                 
-                # 希望条件に合致する枠を探して予約を実行
-                booking_success = False
-                for slot in available_slots:
-                    if booker.is_preferred_slot(slot):
-                        logger.info(f"希望条件に合致する枠を発見: {slot['text']}")
-                        logger.info("予約を実行します...")
-                        
-                        # 予約を実行
-                        success = await booker.execute_booking(slot, scraper.page)
-                        
-                        if success:
-                            logger.info(f"予約が成功しました: {slot['text']}")
-                            booking_success = True
-                            break  # 最初の成功で終了
-                        else:
-                            logger.warning(f"予約が失敗しました: {slot['text']}")
-                
-                if not booking_success:
-                    logger.warning("希望条件に合致する枠の予約に失敗しました")
+                async with scraper:
+                    # カレンダーページを読み込み
+                    if not await scraper.load_calendar_page():
+                        logger.error(f"カレンダーページの読み込みに失敗しました (監視対象: {target.target_id})")
+                        continue
+                    
+                    # 予約可能枠を取得（プロファイリングではここからをバーストのフェーズとする）
+                    from src.profiling import get_profiler
+                    get_profiler().begin_window()
+                    logger.info(f"予約可能枠を検索中... (監視対象: {target.target_id})")
+                    available_slots = await scraper.get_available_slots(max_weeks=7)
+                    history.observe(target.target_id, available_slots)
+                    
+                    if not available_slots:
+                        logger.warning(f"予約可能枠が見つかりませんでした (監視対象: {target.target_id})")
+                        continue
+                    
+                    logger.info(f"{len(available_slots)}件の予約可能枠を発見")
+                    await book_existing_slots(scraper, bookers, available_slots, booked_profiles)
+            
+            for booker in bookers:
+                if booker.profile_id not in booked_profiles:
+                    logger.warning(f"希望条件に合致する枠の予約に失敗しました (プロファイル: {booker.profile_id})")
+            
+            # 遅延トレースの内訳を出力して書き出す（TRACE_ENABLEDの場合）
+            from src.tracing import get_tracer
+            get_tracer().finish_run()
             
         elif args.mode == "schedule":
             # 定期実行モード
             from src.scheduler import Scheduler
-            scheduler = Scheduler()
-            scheduler.start()
+            log_startup_time(args.mode)
+            scheduler = Scheduler(once=args.once)
+            await scheduler.start()
+            
+        elif args.mode == "daemon":
+            # 常駐モード（ブラウザを起動したまま監視期間を監視し続け、制御APIで状態確認・設定変更を受け付ける）
+            from src.daemon import MonitorDaemon
+            from src.control_api import ControlServer
+            from src.config import get_control_api_port, get_control_api_socket
+            log_startup_time(args.mode)
+            daemon = MonitorDaemon()
+            if get_control_api_socket() or get_control_api_port():
+                async with ControlServer(daemon):
+                    await daemon.start()
+            else:
+                await daemon.start()
             
     except KeyboardInterrupt:
         logger.info("プログラムが中断されました")
     except Exception as e:
         logger.error(f"エラーが発生しました: {e}")
         sys.exit(1)
+    finally:
+        if profiler:
+            await profiler.close()
+        if exporter:
+            await exporter.close()
+        if ledger:
+            ledger.close()
+        if history:
+            history.close()
 
 
 def main():
@@ -0,0 +1,432 @@
+"""
+ベンチマーク
+
+ローカルのシミュレーター（src/simulator.py）に対して実際のスクレイパー・ブッカー・パイプラインを動かし、次を計測する
+- release: 予約公開を再現し、公開から枠の検出まで・予約確定までの時間と、スキャンごとのCPU時間・RSS
+- throughput: 週数・1日あたりの枠数を増やしたときのスキャン時間
+- replay: 実サイトで記録したHAR（src/har.py）を再生し、固定した実サイトの挙動に対するスキャン時間と確認画面までの予約時間
+起動時間（src/startup.py）と合わせて結果をJSONで BENCH_RESULTS_DIR に書き出し、
+ベースライン（BENCH_BASELINE_FILE）より BENCH_REGRESSION_THRESHOLD_PERCENT を超えて遅くなった項目を退行とする
+
+CPU時間・RSSはこのPythonプロセスの値（ブラウザのプロセスは含まない）
+"""
+
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.config import (
+    ConfigError,
+    get_bench_baseline_file,
+    get_bench_latency_ms,
+    get_bench_regression_threshold_percent,
+    get_bench_results_dir,
+    get_har_dir,
+)
+from src.har import SESSION_FILE, summarize_har
+from src.pipeline import SlotPipeline
+from src.simulator import AirReserveSimulator, SimulatedSlot
+
+
+# スキャン時間を計測する（週数, 1日あたりの枠数）の組み合わせ
+THROUGHPUT_GRID = [(1, 2), (3, 2), (7, 2), (7, 6)]
+
+# シミュレーターの枠の開始時刻（公開する枠以外）
+SLOT_TIMES = ["08:00", "08:30", "11:00", "11:30", "14:00", "14:30", "16:00", "16:30"]
+
+
+class ReleaseScenario:
+    """1回の予約公開の再現"""
+
+    def __init__(
+        self,
+        weeks: int = 7,
+        slots_per_day: int = 2,
+        release_week: int = 1,
+        release_after: float = 3.0,
+        timeout: float = 60.0,
+        check_interval: float = 1.0,
+        latency_ms: float = 0.0,
+    ):
+        self.weeks = weeks
+        self.slots_per_day = slots_per_day
+        # 公開する枠の週（0始まり）
+        self.release_week = release_week
+        # 監視を始めてから公開するまでの秒数
+        self.release_after = release_after
+        # 公開から予約確定を待つ最大秒数
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.latency_ms = latency_ms
+
+
+def build_release_slots(
+    scenario: ReleaseScenario, start_date: date, release_at: datetime, preferred_time: str
+) -> Tuple[List[SimulatedSlot], str]:
+    """満員の枠で埋めたカレンダーに、release_at に公開する枠を1つ置く（公開する枠のIDも返す）
+
+    公開する枠は希望時間帯の開始時刻にするため、パイプラインの順位付けで予約の対象になる
+    """
+    week_start = start_date - timedelta(days=start_date.weekday())
+    slots = []
+    for offset in range(scenario.weeks * 7):
+        day = week_start + timedelta(days=offset)
+        for start in SLOT_TIMES[:scenario.slots_per_day]:
+            slots.append(SimulatedSlot(f"s{len(slots) + 1:04d}", day, start, remaining=0))
+    # 公開する週の水曜日
+    release_day = week_start + timedelta(weeks=scenario.release_week, days=2)
+    slots.append(SimulatedSlot("release", release_day, preferred_time, capacity=1, release_at=release_at))
+    return slots, "release"
+
+
+def current_rss_mb() -> float:
+    """このプロセスの現在のRSS（MB、/procがない場合は最大RSS）"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Linuxの ru_maxrss はKB単位
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PollProbe:
+    """スクレイパーのスキャンごとのCPU時間・RSS・所要時間を記録する"""
+
+    def __init__(self, scraper):
+        self.cpu_ms: List[float] = []
+        self.rss_mb: List[float] = []
+        self.scan_ms: List[float] = []
+        original = scraper.get_available_slots
+
+        async def probed(max_weeks: int = 7):
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            try:
+                return await original(max_weeks=max_weeks)
+            finally:
+                self.scan_ms.append((time.perf_counter() - started) * 1000)
+                self.cpu_ms.append((time.process_time() - cpu_started) * 1000)
+                self.rss_mb.append(current_rss_mb())
+
+        scraper.get_available_slots = probed
+
+
+class _RecordingNotifier:
+    """パイプラインの通知を記録し、公開した枠の予約が終わったら知らせる"""
+
+    def __init__(self, slot_id: str):
+        self.slot_id = slot_id
+        self.detected: Optional[datetime] = None
+        self.booked: Optional[bool] = None
+        self.finished = asyncio.Event()
+
+    def _is_target(self, slot: Dict) -> bool:
+        return (slot.get('href') or '').endswith(f"/reserve/{self.slot_id}")
+
+    def notify_new_slot_detected(self, slot: Dict):
+        if self._is_target(slot) and self.detected is None:
+            self.detected = slot.get('timestamp')
+
+    def notify_booking_success(self, slot: Dict):
+        if self._is_target(slot):
+            self.booked = True
+            self.finished.set()
+
+    def notify_booking_failure(self, slot: Dict, error: str):
+        if self._is_target(slot):
+            self.booked = False
+            self.finished.set()
+
+
+def create_bench_booker():
+    """シミュレーターに対して最後まで予約するブッカー（予約者情報は設定から読み込む）"""
+    from src.booker import AirReserveBooker
+
+    booker = AirReserveBooker()
+    booker.dry_run = False
+    booker.stop_before_submit = False
+    booker.require_manual_confirmation = False
+    return booker
+
+
+def create_browser_scraper(url: str, booker=None):
+    """シミュレーターを監視するスクレイパー（ブラウザを起動する）"""
+    from src.scraper import AirReserveScraper
+    from src.targets import MonitorTarget
+
+    target = MonitorTarget("bench", url, release_datetime=datetime.now())
+    return AirReserveScraper(booker=booker, target=target)
+
+
+def create_replay_booker():
+    """記録したHARに対して確認画面まで進むブッカー（記録時と同じ予約者プロファイルを使う）"""
+    booker = create_bench_booker()
+    booker.stop_before_submit = True
+    return booker
+
+
+def create_replay_scraper(url: str, booker=None, har_dir: Optional[str] = None):
+    """記録したHARを再生するスクレイパー（ネットワークに接続しない）"""
+    from src.har import HarSession
+    from src.scraper import AirReserveScraper
+    from src.targets import MonitorTarget
+
+    target = MonitorTarget("replay", url, release_datetime=datetime.now())
+    return AirReserveScraper(booker=booker, target=target, har=HarSession("replay", har_dir or get_har_dir(), "abort"))
+
+
+async def run_release_scenario(
+    scenario: ReleaseScenario,
+    scraper_factory: Callable = create_browser_scraper,
+    booker_factory: Callable = create_bench_booker,
+) -> Dict:
+    """予約公開を1回再現し、公開から検出・予約確定までの時間とスキャンごとの負荷を計測する"""
+    logger = logging.getLogger(__name__)
+    booker = booker_factory()
+    release_at = datetime.now() + timedelta(seconds=scenario.release_after)
+    slots, slot_id = build_release_slots(scenario, date.today(), release_at, booker.preferred_time_start)
+    notifier = _RecordingNotifier(slot_id)
+
+    async with AirReserveSimulator(slots, weeks=scenario.weeks, port=0, latency=scenario.latency_ms / 1000) as sim:
+        scraper = scraper_factory(sim.calendar_url, booker)
+        probe = PollProbe(scraper)
+        async with scraper:
+            await scraper.load_calendar_page()
+            pipeline = SlotPipeline(
+                scraper, booker=booker, notifier=notifier, max_weeks=scenario.weeks,
+                check_interval=scenario.check_interval, book_once=True,
+            )
+            run = asyncio.create_task(pipeline.run(until=release_at + timedelta(seconds=scenario.timeout)))
+            finished = asyncio.create_task(notifier.finished.wait())
+            await asyncio.wait({run, finished}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (run, finished):
+                task.cancel()
+            await asyncio.gather(run, finished, return_exceptions=True)
+        bookings = [booking for booking in sim.bookings if booking['slot_id'] == slot_id]
+
+    result = {
+        'detection_ms': (notifier.detected - release_at).total_seconds() * 1000 if notifier.detected else None,
+        'booking_ms': (bookings[0]['booked_at'] - release_at).total_seconds() * 1000 if bookings else None,
+        'booked': bool(bookings),
+        'polls': len(probe.scan_ms),
+        'scan_ms': statistics.median(probe.scan_ms) if probe.scan_ms else None,
+        'cpu_ms_per_poll': statistics.mean(probe.cpu_ms) if probe.cpu_ms else None,
+        'rss_mb': max(probe.rss_mb) if probe.rss_mb else None,
+    }
+    if not bookings:
+        logger.warning(f"公開した枠を予約できませんでした (検出: {result['detection_ms']}ms)")
+    return result
+
+
+async def run_throughput(
+    weeks: int,
+    slots_per_day: int,
+    scans: int = 5,
+    latency_ms: float = 0.0,
+    scraper_factory: Callable = create_browser_scraper,
+) -> Dict:
+    """すべての枠が公開済みのカレンダーを繰り返しスキャンし、スキャン時間を計測する"""
+    week_start = date.today() - timedelta(days=date.today().weekday())
+    slots = [
+        SimulatedSlot(f"s{i * slots_per_day + j + 1:04d}", week_start + timedelta(days=i), start)
+        for i in range(weeks * 7)
+        for j, start in enumerate(SLOT_TIMES[:slots_per_day])
+    ]
+    async with AirReserveSimulator(slots, weeks=weeks, port=0, latency=latency_ms / 1000) as sim:
+        scraper = scraper_factory(sim.calendar_url, None)
+        probe = PollProbe(scraper)
+        async with scraper:
+            await scraper.load_calendar_page()
+            found = 0
+            for _ in range(scans):
+                found = len(await scraper.get_available_slots(max_weeks=weeks))
+                # 次のスキャンのために最初の週に戻る
+                await scraper.page.goto(scraper.target_url, wait_until="networkidle", timeout=30000)
+    scan_ms = statistics.median(probe.scan_ms)
+    return {
+        'weeks': weeks,
+        'slots_per_day': slots_per_day,
+        'slots_found': found,
+        'scan_ms': scan_ms,
+        'week_ms': scan_ms / weeks,
+        'scans_per_second': 1000 / scan_ms if scan_ms else None,
+    }
+
+
+async def run_replay(
+    scans: int = 5,
+    har_dir: Optional[str] = None,
+    scraper_factory: Callable = create_replay_scraper,
+    booker_factory: Callable = create_replay_booker,
+) -> Dict:
+    """記録したHARを再生し、カレンダーのスキャン時間と、最初に見つかった枠の確認画面までの予約時間を計測する"""
+    har_path = Path(har_dir or get_har_dir()) / SESSION_FILE
+    summary = summarize_har(str(har_path))
+    url = summary['metadata'].get('target_url')
+    if not url:
+        raise ConfigError(f"HAR has no recorded target URL: {har_path}")
+
+    scraper = scraper_factory(url, None)
+    probe = PollProbe(scraper)
+    booking_ms = None
+    booked = False
+    async with scraper:
+        await scraper.load_calendar_page()
+        slots = []
+        for _ in range(scans):
+            slots = await scraper.get_available_slots()
+            await scraper.page.goto(scraper.target_url, wait_until="networkidle", timeout=30000)
+        if slots:
+            booker = booker_factory()
+            started = time.perf_counter()
+            booked = await booker.execute_booking({**slots[0], 'target_url': url}, scraper.page)
+            booking_ms = (time.perf_counter() - started) * 1000
+    return {
+        'har': str(har_path),
+        'entries': summary['entries'],
+        'slots_found': len(slots),
+        'scan_ms': statistics.median(probe.scan_ms),
+        'booking_ms': booking_ms,
+        'booked': booked,
+    }
+
+
+async def run_benchmarks(
+    runs: int = 5,
+    suites: Tuple[str, ...] = ("release", "throughput", "replay"),
+    scraper_factory: Callable = create_browser_scraper,
+    booker_factory: Callable = create_bench_booker,
+    latency_ms: Optional[float] = None,
+    har_dir: Optional[str] = None,
+) -> Dict:
+    """ベンチマークを実行し、結果と比較用の数値（metrics、すべて小さいほど良い）を返す"""
+    logger = logging.getLogger(__name__)
+    latency_ms = get_bench_latency_ms() if latency_ms is None else latency_ms
+    results: Dict = {'created_at': datetime.now().isoformat(timespec="seconds"), 'runs': runs, 'metrics': {}}
+    metrics = results['metrics']
+
+    if "release" in suites:
+        scenario = ReleaseScenario(latency_ms=latency_ms)
+        samples = []
+        for i in range(runs):
+            sample = await run_release_scenario(scenario, scraper_factory, booker_factory)
+            logger.info(
+                f"予約公開 {i + 1}/{runs}: 検出 {_format_ms(sample['detection_ms'])}, "
+                f"予約確定 {_format_ms(sample['booking_ms'])}, スキャン {sample['polls']}回"
+            )
+            samples.append(sample)
+        results['release'] = samples
+        for key in ('detection_ms', 'booking_ms', 'cpu_ms_per_poll', 'rss_mb'):
+            values = [sample[key] for sample in samples if sample[key] is not None]
+            if values:
+                metrics[f"release.{key}"] = statistics.median(values)
+        if any(not sample['booked'] for sample in samples):
+            # 予約できなかった回は計測値がないため、失敗として扱う
+            metrics['release.failed_runs'] = sum(1 for sample in samples if not sample['booked'])
+
+    if "throughput" in suites:
+        results['throughput'] = []
+        for weeks, slots_per_day in THROUGHPUT_GRID:
+            sample = await run_throughput(weeks, slots_per_day, scans=runs, latency_ms=latency_ms,
+                                          scraper_factory=scraper_factory)
+            logger.info(
+                f"スキャン時間 ({weeks}週, 1日{slots_per_day}枠): {sample['scan_ms']:.0f}ms "
+                f"(1週 {sample['week_ms']:.0f}ms, {sample['slots_found']}件)"
+            )
+            results['throughput'].append(sample)
+            metrics[f"throughput.w{weeks}_s{slots_per_day}.scan_ms"] = sample['scan_ms']
+
+    if "replay" in suites:
+        har_path = Path(har_dir or get_har_dir()) / SESSION_FILE
+        if not har_path.exists():
+            logger.info(f"HARが記録されていないため再生の計測を省略します: {har_path} (HAR_MODE=record で記録できます)")
+        else:
+            sample = await run_replay(scans=runs, har_dir=har_dir)
+            logger.info(
+                f"HARの再生: スキャン {sample['scan_ms']:.0f}ms ({sample['slots_found']}件), "
+                f"確認画面まで {_format_ms(sample['booking_ms'])}"
+            )
+            results['replay'] = sample
+            metrics['replay.scan_ms'] = sample['scan_ms']
+            if sample['booking_ms'] is not None:
+                metrics['replay.booking_ms'] = sample['booking_ms']
+            if not sample['booked']:
+                metrics['replay.failed_runs'] = 1
+    return results
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return f"{value:.0f}ms" if value is not None else "なし"
+
+
+def compare_to_baseline(metrics: Dict[str, float], baseline: Dict[str, float], threshold_percent: float) -> List[Dict]:
+    """ベースラインより threshold_percent を超えて大きくなった項目（退行）を返す"""
+    regressions = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if value is None or base is None:
+            continue
+        if base <= 0:
+            # 失敗回数などベースラインが0の項目は、増えたら退行とする
+            if value > base:
+                regressions.append({'metric': name, 'baseline': base, 'value': value, 'change_percent': None})
+            continue
+        change = (value - base) / base * 100
+        if change > threshold_percent:
+            regressions.append({'metric': name, 'baseline': base, 'value': value, 'change_percent': change})
+    return regressions
+
+
+def load_baseline(path: Optional[str] = None) -> Optional[Dict[str, float]]:
+    """ベースラインの数値を読み込む（ファイルがない場合はNone）"""
+    path = Path(path or get_bench_baseline_file())
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8")).get('metrics', {})
+
+
+def save_baseline(results: Dict, path: Optional[str] = None) -> Path:
+    path = Path(path or get_bench_baseline_file())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps({'created_at': results['created_at'], 'metrics': results['metrics']}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    return path
+
+
+def write_results(results: Dict, directory: Optional[str] = None) -> Path:
+    output_dir = Path(directory or get_bench_results_dir())
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def check_regressions(results: Dict, baseline_path: Optional[str] = None, threshold_percent: Optional[float] = None) -> bool:
+    """結果をベースラインと比べてログに出力し、退行がないかを返す（ベースラインがない場合は比較しない）"""
+    logger = logging.getLogger(__name__)
+    threshold_percent = threshold_percent if threshold_percent is not None else get_bench_regression_threshold_percent()
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        logger.info("ベースラインがないため比較しません（--update-baseline で保存できます）")
+        results['regressions'] = []
+        return True
+    regressions = compare_to_baseline(results['metrics'], baseline, threshold_percent)
+    results['regressions'] = regressions
+    for regression in regressions:
+        change = f"+{regression['change_percent']:.0f}%" if regression['change_percent'] is not None else "増加"
+        logger.warning(
+            f"退行: {regression['metric']} {regression['baseline']:.1f} → {regression['value']:.1f} ({change})"
+        )
+    if not regressions:
+        logger.info(f"ベースラインからの退行はありません（閾値 {threshold_percent:.0f}%）")
+    return not regressions
@@ -7,7 +7,6 @@ Airリザーブ予約フロー自動化機能
 import asyncio
 import logging
 from datetime import datetime
-from pathlib import Path
 from typing import Dict, Optional
 from playwright.async_api import Page
 
@@ -16,45 +15,62 @@ from src.config import (
     get_dry_run,
     get_stop_before_submit,
     get_require_manual_confirmation,
+    get_booking_max_resumes,
     get_debug,
-    get_booker_name,
-    get_booker_name_kana,
-    get_booker_name_kana_mei,
-    get_booker_email,
-    get_booker_phone,
-    get_child_name,
-    get_child_age,
-    get_preferred_days,
-    get_preferred_time_start,
-    get_preferred_time_end,
 )
+from src.booking_state import BookingState, NEXT_STATE, detect_booking_state
+from src.evidence import EvidenceCapture
+from src.flight_recorder import FlightRecorder
+from src.ledger import BookingLedger
+from src.metrics import BOOKING_ATTEMPTS, BOOKING_RESULTS, BOOKING_STEP_FAILURES, BOOKING_SUCCESS_SECONDS
+from src.profiles import BookerProfile
+from src.profiling import get_profiler
+from src.slots import parse_remaining_seats, parse_slot_minutes
+from src.tracing import get_tracer
 
 
 class AirReserveBooker:
     """Airリザーブ予約実行クラス"""
     
-    def __init__(self):
+    def __init__(self, profile: Optional[BookerProfile] = None, ledger: Optional[BookingLedger] = None):
         self.logger = logging.getLogger(__name__)
         self.dry_run = get_dry_run()
         self.stop_before_submit = get_stop_before_submit()
         self.require_manual_confirmation = get_require_manual_confirmation()
+        self.max_resumes = get_booking_max_resumes()
         self.debug = get_debug()
         
+        # 予約者プロファイル（未指定の場合は環境変数から作成）
+        profile = profile or BookerProfile.from_env()
+        self.profile_id = profile.profile_id
+        
         # 予約者情報
-        self.booker_name = get_booker_name()
-        self.booker_name_kana = get_booker_name_kana()  # フリガナ（セイ）
-        self.booker_name_kana_mei = get_booker_name_kana_mei()  # フリガナ（メイ）
-        self.booker_email = get_booker_email()
-        self.booker_phone = get_booker_phone()
-        self.child_name = get_child_name()
-        self.child_age = get_child_age()
+        self.booker_name = profile.booker_name
+        self.booker_name_kana = profile.booker_name_kana  # フリガナ（セイ）
+        self.booker_name_kana_mei = profile.booker_name_kana_mei  # フリガナ（メイ）
+        self.booker_email = profile.booker_email
+        self.booker_phone = profile.booker_phone
+        self.child_name = profile.child_name
+        self.child_age = profile.child_age
         
         # 希望条件
-        self.preferred_days = get_preferred_days()
-        self.preferred_time_start = get_preferred_time_start()
-        self.preferred_time_end = get_preferred_time_end()
+        self.preferred_days = profile.preferred_days
+        self.preferred_time_start = profile.preferred_time_start
+        self.preferred_time_end = profile.preferred_time_end
+        
+        # 予約台帳（予約済み・試行済みの枠を再び予約しない）
+        self.ledger = ledger
+        
+        # 証跡キャプチャ（書き込みはバックグラウンドで実行）
+        self.evidence = EvidenceCapture()
+        
+        # フライトレコーダー（失敗時のみ直近のイベントを書き出す）
+        self.recorder = FlightRecorder()
+        
+        # 直近の予約試行のチェックポイント（状態の履歴と再開回数）
+        self.last_checkpoint: Optional[Dict] = None
         
-        self.logger.info(f"予約実行クラス初期化完了 (DRY_RUN: {self.dry_run}, STOP_BEFORE_SUBMIT: {self.stop_before_submit})")
+        self.logger.info(f"予約実行クラス初期化完了 (プロファイル: {self.profile_id}, DRY_RUN: {self.dry_run}, STOP_BEFORE_SUBMIT: {self.stop_before_submit})")
     
     async def _retry_with_backoff(self, func, max_retries: int = 3, base_delay: float = 1.0, operation_name: str = "操作"):
         """指数バックオフによるリトライ機能
@@ -113,63 +129,171 @@ class AirReserveBooker:
         # すべてのリトライが失敗した場合（Falseが返された場合）
         return False
         
-    async def execute_booking(self, slot_info: Dict, page: Page) -> bool:
-        """予約を実行"""
+    async def execute_booking(self, slot_info: Dict, page: Page, resume: bool = False) -> bool:
+        """予約を実行（予約台帳がある場合は、試行前に確認し、試行と結果を記録する）
+        
+        DRY_RUN・STOP_BEFORE_SUBMITの場合は実際に予約しないため、台帳を参照・記録しない。
+        """
+        if not self._ledger_active():
+            return await self._traced_booking(slot_info, page, resume)
+        
+        reason = self.ledger.check(slot_info, self.profile_id)
+        if reason:
+            self.logger.info(f"予約台帳により予約をスキップします ({reason}): {slot_info.get('text', '')[:50]}")
+            return False
+        
+        attempt_id = self.ledger.record_attempt(slot_info, self.profile_id)
+        booked = False
+        try:
+            booked = await self._traced_booking(slot_info, page, resume)
+            return booked
+        finally:
+            self.ledger.record_outcome(attempt_id, slot_info, self.profile_id, booked)
+    
+    async def _traced_booking(self, slot_info: Dict, page: Page, resume: bool) -> bool:
+        """予約フローを実行し、枠の検出から予約完了までの時間をスパンに記録する"""
+        target = slot_info.get('target_url', '')
+        BOOKING_ATTEMPTS.inc(target=target, profile=self.profile_id)
+        with get_tracer().span("booking", profile_id=self.profile_id, slot=slot_info.get('text', '')[:50]) as span, \
+                get_profiler().booking():
+            detected_at = slot_info.get('timestamp')
+            if isinstance(detected_at, datetime):
+                # 枠の検出から予約開始までの待ち時間
+                span.set(since_detected_ms=(datetime.now() - detected_at).total_seconds() * 1000)
+            booked = await self._execute_booking(slot_info, page, resume)
+            span.set(booked=booked)
+            if booked and isinstance(detected_at, datetime):
+                elapsed = (datetime.now() - detected_at).total_seconds()
+                span.set(detected_to_booked_ms=elapsed * 1000)
+                if not self.dry_run:
+                    BOOKING_SUCCESS_SECONDS.observe(elapsed, target=target)
+            return booked
+    
+    def _ledger_active(self) -> bool:
+        """予約台帳を参照・記録するか（実際に予約する場合のみ）"""
+        return self.ledger is not None and not (self.dry_run or self.stop_before_submit)
+    
+    async def _execute_booking(self, slot_info: Dict, page: Page, resume: bool = False) -> bool:
+        """予約フローを実行
+        
+        予約フローを状態遷移（カレンダー → メニュー詳細 → 入力フォーム → 確認 → 完了）として実行する。
+        あるステップがリトライ後も失敗した場合は、ページの現在の状態をURLとDOMから判定し、
+        カレンダーからやり直さずにその状態から再開する（最大BOOKING_MAX_RESUMES回）。
+        
+        Args:
+            slot_info: 予約枠の情報
+            page: 予約に使うページ
+            resume: Trueの場合、ページがこの枠の予約フローの途中にあるものとして現在の状態から開始する
+        """
+        target = slot_info.get('target_url', '')
         try:
             self.logger.info(f"予約実行開始: {slot_info['text']}")
             
             if self.dry_run:
                 self.logger.info("DRY_RUNモード: 実際の予約は実行しません")
                 return True
-                
-            # 1. 予約リンクをクリック（リトライ付き）
-            async def click_link():
-                return await self._click_reservation_link(slot_info, page)
             
-            if not await self._retry_with_backoff(click_link, max_retries=3, operation_name="予約リンククリック"):
-                return False
+            # フライトレコーダーを開始（失敗時のみ書き出す）
+            await self.recorder.attach(page)
+            await self.recorder.begin(page)
+            
+            # 別の枠の予約途中のページを誤って再利用しないよう、通常はカレンダーから開始する
+            state = await detect_booking_state(page) if resume else BookingState.CALENDAR
+            if state == BookingState.UNKNOWN:
+                state = BookingState.CALENDAR
+            checkpoint = {'slot': slot_info.get('text', ''), 'state': state, 'history': [state], 'resumes': 0}
+            self.last_checkpoint = checkpoint
+            
+            while True:
+                if state == BookingState.DONE:
+                    self.logger.info("予約が正常に完了しました")
+                    BOOKING_RESULTS.inc(target=target, result="success")
+                    await self.recorder.end(page)
+                    return True
                 
-            # 2. メニュー選択（リトライ付き）
-            async def select_menu():
-                return await self._select_menu(page)
-            
-            if not await self._retry_with_backoff(select_menu, max_retries=2, operation_name="メニュー選択"):
-                return False
+                if state == BookingState.UNAVAILABLE:
+                    self.logger.warning("この予約枠は予約受付期間外です")
+                    BOOKING_RESULTS.inc(target=target, result="unavailable")
+                    return await self._record_failure(page, "unavailable")
                 
-            # 3. 日時選択（リトライ付き）
-            async def select_datetime():
-                return await self._select_datetime(page)
-            
-            if not await self._retry_with_backoff(select_datetime, max_retries=2, operation_name="日時選択"):
-                return False
+                step_name, operation_name, step, max_retries = self._get_booking_step(state, slot_info, page)
                 
-            # 4. メニュー詳細ページの送信（確認画面へ遷移、リトライ付き）
-            async def submit_form():
-                return await self._submit_menu_detail_form(page)
-            
-            if not await self._retry_with_backoff(submit_form, max_retries=3, operation_name="フォーム送信"):
-                return False
-            
-            # 5. 予約者情報入力（リトライ付き）
-            async def fill_form():
-                return await self._fill_booking_form(page)
-            
-            if not await self._retry_with_backoff(fill_form, max_retries=2, operation_name="フォーム入力"):
-                return False
-            
-            # 6. 確認・予約完了（リトライ付き）
-            async def confirm():
-                return await self._confirm_booking(page)
-            
-            if not await self._retry_with_backoff(confirm, max_retries=3, operation_name="予約確認"):
-                return False
+                failure_reason = "failed"
+                with get_tracer().span(f"booking.{step_name}", resumes=checkpoint['resumes']) as span:
+                    try:
+                        succeeded = await self._retry_with_backoff(step, max_retries=max_retries, operation_name=operation_name)
+                    except Exception as e:
+                        self.logger.error(f"{operation_name}でエラーが発生: {e}")
+                        succeeded = False
+                        failure_reason = type(e).__name__
+                    span.set(succeeded=succeeded)
                 
-            self.logger.info("予約が正常に完了しました")
-            return True
+                if succeeded:
+                    state = NEXT_STATE[state]
+                    checkpoint['state'] = state
+                    checkpoint['history'].append(state)
+                    continue
+                
+                BOOKING_STEP_FAILURES.inc(target=target, step=step_name, reason=failure_reason)
+                await self._record_failure(page, step_name)
+                await self.recorder.begin(page)
+                
+                # ページの実際の状態を判定し、その状態から再開する
+                if checkpoint['resumes'] >= self.max_resumes:
+                    self.logger.error(f"予約フローの再開回数が上限（{self.max_resumes}回）に達しました")
+                    BOOKING_RESULTS.inc(target=target, result="resume_limit")
+                    return False
+                checkpoint['resumes'] += 1
+                
+                detected = await detect_booking_state(page)
+                if detected == BookingState.UNKNOWN:
+                    detected = BookingState.CALENDAR
+                self.logger.info(f"予約フローを再開します: {state.value} → {detected.value} (再開 {checkpoint['resumes']}/{self.max_resumes})")
+                state = detected
+                checkpoint['state'] = state
+                checkpoint['history'].append(state)
             
         except Exception as e:
             self.logger.error(f"予約実行エラー: {e}")
-            return False
+            BOOKING_RESULTS.inc(target=target, result="exception")
+            return await self._record_failure(page, "exception")
+    
+    def _get_booking_step(self, state: BookingState, slot_info: Dict, page: Page):
+        """状態に対応するステップ（ステップ名, 操作名, 実行関数, 最大リトライ回数）を取得"""
+        if state == BookingState.CALENDAR:
+            # 1. 予約リンクをクリック
+            async def click_link():
+                return await self._click_reservation_link(slot_info, page)
+            return "click_link", "予約リンククリック", click_link, 3
+        
+        if state == BookingState.MENU_DETAIL:
+            # 2-4. メニュー選択・日時選択・メニュー詳細ページの送信
+            async def menu_detail():
+                if not await self._select_menu(page):
+                    return False
+                if not await self._select_datetime(page):
+                    return False
+                return await self._submit_menu_detail_form(page)
+            return "menu_detail", "メニュー詳細の送信", menu_detail, 3
+        
+        if state == BookingState.FORM:
+            # 5. 予約者情報入力
+            async def fill_form():
+                return await self._fill_booking_form(page)
+            return "fill_form", "フォーム入力", fill_form, 2
+        
+        # 6. 確認・予約完了
+        async def confirm():
+            return await self._confirm_booking(page)
+        return "confirm", "予約確認", confirm, 3
+    
+    async def _record_failure(self, page: Page, reason: str) -> bool:
+        """失敗時にフライトレコードを書き出す（常にFalseを返す）"""
+        try:
+            await self.recorder.dump(page, reason)
+        except Exception as e:
+            self.logger.error(f"フライトレコードの書き出しエラー: {e}")
+        return False
             
     async def _click_reservation_link(self, slot_info: Dict, page: Page) -> bool:
         """予約リンクをクリック"""
@@ -192,7 +316,7 @@ class AirReserveBooker:
                 # 週番号がある場合、その週まで移動する
                 if week_number:
                     self.logger.info(f"週{week_number}に移動します... (週開始日: {week_start_date})")
-                    target_url = get_target_url()
+                    target_url = slot_info.get('target_url') or get_target_url()
                     await page.goto(target_url, wait_until="networkidle", timeout=30000)
                     await asyncio.sleep(1)
                     
@@ -247,7 +371,7 @@ class AirReserveBooker:
                 # 通常のhrefの場合
                 # 相対URLの場合は絶対URLに変換
                 if href.startswith('/'):
-                    base_url = get_target_url()
+                    base_url = slot_info.get('target_url') or get_target_url()
                     href = base_url.rstrip('/') + href
                     
                 self.logger.info(f"予約ページに移動: {href}")
@@ -727,7 +851,7 @@ class AirReserveBooker:
                 self.logger.warning("一部の必須フィールドが入力されていません")
                 # スクリーンショットを保存してデバッグ用
                 screenshot_path = await self.take_screenshot(page, "form_input_partial")
-                self.logger.info(f"デバッグ用スクリーンショットを保存: {screenshot_path}")
+                self.logger.info(f"デバッグ用スクリーンショットを取得: {screenshot_path}")
             
             # 「確認へ進む」ボタンを押す（フォーム送信ではない、確認画面への遷移）
             self.logger.info("「確認へ進む」ボタンを探しています...")
@@ -773,7 +897,7 @@ class AirReserveBooker:
         except Exception as e:
             self.logger.error(f"フォーム入力エラー: {e}")
             screenshot_path = await self.take_screenshot(page, "form_input_error")
-            self.logger.info(f"エラー時のスクリーンショットを保存: {screenshot_path}")
+            self.logger.info(f"エラー時のスクリーンショットを取得: {screenshot_path}")
             return False
             
     async def _confirm_booking(self, page: Page) -> bool:
@@ -806,7 +930,7 @@ class AirReserveBooker:
             
             # スクリーンショットを保存（送信前）
             screenshot_path = await self.take_screenshot(page, "before_submit")
-            self.logger.info(f"送信前のスクリーンショットを保存: {screenshot_path}")
+            self.logger.info(f"送信前のスクリーンショットを取得: {screenshot_path}")
             
             # STOP_BEFORE_SUBMITチェック
             if self.stop_before_submit:
@@ -834,7 +958,7 @@ class AirReserveBooker:
             
             # スクリーンショットを保存（送信後）
             screenshot_path = await self.take_screenshot(page, "after_submit")
-            self.logger.info(f"送信後のスクリーンショットを保存: {screenshot_path}")
+            self.logger.info(f"送信後のスクリーンショットを取得: {screenshot_path}")
             
             # 成功メッセージの確認
             success_indicators = [
@@ -872,19 +996,20 @@ class AirReserveBooker:
             return False
     
     async def take_screenshot(self, page: Page, prefix: str = "booking") -> str:
-        """スクリーンショットを保存"""
+        """スクリーンショット（証跡）の取得を開始
+        
+        書き込み完了は待たずに保存予定のファイル名を返す。
+        形式はEVIDENCE_FORMATで切り替える（ビューポートJPEG、HTMLなど）
+        """
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"screenshots/{prefix}_{timestamp}.png"
-            
-            # スクリーンショットディレクトリを作成
-            Path(filename).parent.mkdir(parents=True, exist_ok=True)
-            
-            await page.screenshot(path=filename, full_page=True)
-            return filename
+            return await self.evidence.capture(page, prefix)
         except Exception as e:
             self.logger.error(f"スクリーンショット保存エラー: {e}")
             return ""
+    
+    async def close(self):
+        """書き込み待ちの証跡をすべて保存する（ブラウザを閉じる前に呼ぶ）"""
+        await self.evidence.close()
             
     def is_preferred_slot(self, slot_info: Dict) -> bool:
         """希望条件に合致する枠かどうかを判定"""
@@ -918,3 +1043,35 @@ class AirReserveBooker:
         except Exception as e:
             self.logger.error(f"希望条件判定エラー: {e}")
             return True  # エラーの場合は予約を試行
+    
+    def score_slot(self, slot_info: Dict) -> float:
+        """希望条件への合致度をスコア化（0は対象外、大きいほど優先）
+        
+        希望曜日・希望時間帯の両方に合致する枠を優先し、同点の場合は残席が多い枠、
+        近い週の枠を優先する。予約台帳で予約済み・試行済み・月の上限に達している枠は対象外とする
+        """
+        if not self.is_preferred_slot(slot_info):
+            return 0.0
+        if self._ledger_active() and self.ledger.check(slot_info, self.profile_id):
+            return 0.0
+        
+        text = slot_info.get('text', '')
+        score = 1.0
+        
+        if self.preferred_days and any(day in text for day in self.preferred_days):
+            score += 1.0
+        
+        minutes = parse_slot_minutes(text)
+        if minutes is not None:
+            start_hour, start_minute = self.preferred_time_start.split(':')
+            end_hour, end_minute = self.preferred_time_end.split(':')
+            if int(start_hour) * 60 + int(start_minute) <= minutes <= int(end_hour) * 60 + int(end_minute):
+                score += 1.0
+        
+        seats = parse_remaining_seats(text)
+        if seats:
+            score += min(seats, 10) / 100
+        
+        week_number = slot_info.get('week_number') or 0
+        score += max(0, 10 - week_number) / 1000
+        return score
@@ -0,0 +1,89 @@
+"""
+予約フローの状態判定
+
+予約フローを明示的な状態（カレンダー → メニュー詳細 → 入力フォーム → 確認 → 完了）として扱い、
+ページのURLとDOMから現在の状態を判定する
+リトライ時に、ページが実際にいる状態から予約フローを再開するために使う
+"""
+
+from enum import Enum
+from typing import Dict
+
+
+class BookingState(str, Enum):
+    """予約フローの状態"""
+
+    CALENDAR = "calendar"
+    MENU_DETAIL = "menu_detail"
+    FORM = "form"
+    CONFIRM = "confirm"
+    DONE = "done"
+    UNAVAILABLE = "unavailable"
+    UNKNOWN = "unknown"
+
+
+# 正常時の遷移順（各ステップ成功後の次の状態）
+NEXT_STATE = {
+    BookingState.CALENDAR: BookingState.MENU_DETAIL,
+    BookingState.MENU_DETAIL: BookingState.FORM,
+    BookingState.FORM: BookingState.CONFIRM,
+    BookingState.CONFIRM: BookingState.DONE,
+}
+
+# 予約完了ページを示すテキスト（確認画面のボタン文言と重ならないものに限定）
+DONE_INDICATORS = ['予約完了', '予約が完了', '予約を受け付けました', 'ご予約ありがとうございます']
+
+# 予約受付不可を示すテキスト
+UNAVAILABLE_INDICATORS = [
+    '予約受付期間外です',
+    '別の時間帯をお探しください',
+    '受付期間外',
+    '予約できません',
+    'このサービスはご利用いただけません',
+    'ご予約いただけません',
+]
+
+# 判定に必要な情報を1回の評価で取得するスクリプト
+DETECT_SCRIPT = '''() => ({
+    url: location.href,
+    hasCalendar: !!document.querySelector('.dataLinkBox.js-dataLinkBox, .ctlListItem.listNext'),
+    hasMenuDetail: !!document.querySelector('#menuDetailForm, #lessonEntryPaxCnt'),
+    hasVisitorForm: !!document.querySelector('input[name="lastNm"], input[name="mailAddress1"], input[name="tel1"]'),
+    text: document.body ? document.body.innerText.slice(0, 5000) : ''
+})'''
+
+
+def classify_booking_state(flags: Dict) -> BookingState:
+    """ページ情報から予約フローの状態を判定
+
+    Args:
+        flags: DETECT_SCRIPTの評価結果（url, hasCalendar, hasMenuDetail, hasVisitorForm, text）
+
+    Returns:
+        BookingState: 判定した状態
+    """
+    url = (flags.get('url') or '').lower()
+    text = flags.get('text') or ''
+
+    if any(indicator in text for indicator in DONE_INDICATORS):
+        return BookingState.DONE
+    if any(indicator in text for indicator in UNAVAILABLE_INDICATORS):
+        return BookingState.UNAVAILABLE
+    if flags.get('hasVisitorForm'):
+        return BookingState.FORM
+    if flags.get('hasMenuDetail'):
+        return BookingState.MENU_DETAIL
+    if 'confirm' in url:
+        return BookingState.CONFIRM
+    if flags.get('hasCalendar') or url.rstrip('/').endswith('/calendar'):
+        return BookingState.CALENDAR
+    return BookingState.UNKNOWN
+
+
+async def detect_booking_state(page) -> BookingState:
+    """ページの現在の状態を判定（判定できない場合はUNKNOWN）"""
+    try:
+        flags = await page.evaluate(DETECT_SCRIPT)
+    except Exception:
+        return BookingState.UNKNOWN
+    return classify_booking_state(flags)
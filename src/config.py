@@ -85,6 +85,28 @@ def get_int_env(key: str, default: int) -> int:
         raise ConfigError(f"{key} must be an integer, got: {value}")
 
 
+def get_float_env(key: str, default: float) -> float:
+    """浮動小数点数環境変数を取得
+    
+    Args:
+        key: 環境変数名
+        default: デフォルト値
+    
+    Returns:
+        float: 環境変数の値
+    
+    Raises:
+        ConfigError: 値が数値として解釈できない場合
+    """
+    value = os.getenv(key)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ConfigError(f"{key} must be a number, got: {value}")
+
+
 def get_str_env(key: str, default: str = "") -> str:
     """文字列環境変数を取得
     
@@ -137,6 +159,23 @@ def get_list_env(key: str, separator: str = ",", default: Optional[List[str]] =
     return [item.strip() for item in value.split(separator) if item.strip()]
 
 
+# ログ設定
+LOG_FORMATS = ("json", "text")
+
+
+def get_log_dir() -> str:
+    """ログファイルの出力先ディレクトリを取得"""
+    return get_str_env("LOG_DIR", "logs")
+
+
+def get_log_format() -> str:
+    """ログファイルの形式を取得（json: 1行1レコードのJSON、text: 従来のテキスト）"""
+    log_format = get_str_env("LOG_FORMAT", "json").lower()
+    if log_format not in LOG_FORMATS:
+        raise ConfigError(f"LOG_FORMAT must be one of {', '.join(LOG_FORMATS)}, got: {log_format}")
+    return log_format
+
+
 # スクレイパー設定
 def get_headless() -> bool:
     """ヘッドレスモードを取得"""
@@ -166,6 +205,48 @@ def get_monitor_duration_minutes() -> int:
     return duration
 
 
+def get_release_calendar_file() -> str:
+    """予約公開カレンダーファイル（JSON）のパスを取得（未設定の場合はNEXT_RELEASE_DATETIMEの1件のみ）"""
+    return get_str_env("RELEASE_CALENDAR_FILE")
+
+
+def get_release_calendar_horizon_days() -> int:
+    """予約公開カレンダーから何日先までの監視期間を計算するかを取得"""
+    days = get_int_env("RELEASE_CALENDAR_HORIZON_DAYS", 62)
+    if days < 1:
+        raise ConfigError("RELEASE_CALENDAR_HORIZON_DAYS must be at least 1")
+    return days
+
+
+def get_targets_file() -> str:
+    """監視対象ファイル（JSON）のパスを取得（未設定の場合はTARGET_URLなどの環境変数で1件を監視）"""
+    return get_str_env("TARGETS_FILE")
+
+
+def get_poll_budget_per_second() -> float:
+    """複数の監視対象で共有するポーリング予算（1秒あたりのスキャン回数）を取得"""
+    budget = get_float_env("POLL_BUDGET_PER_SECOND", 1.0)
+    if budget <= 0:
+        raise ConfigError("POLL_BUDGET_PER_SECOND must be greater than 0")
+    return budget
+
+
+def get_scheduler_prepare_seconds() -> float:
+    """定期実行モードで、監視開始の何秒前にブラウザを起動してカレンダーを読み込むかを取得"""
+    seconds = get_float_env("SCHEDULER_PREPARE_SECONDS", 60.0)
+    if seconds < 0:
+        raise ConfigError("SCHEDULER_PREPARE_SECONDS must be 0 or greater")
+    return seconds
+
+
+def get_scheduler_coarse_margin_seconds() -> float:
+    """監視開始時刻の何秒前から細かい待機に切り替えるかを取得"""
+    seconds = get_float_env("SCHEDULER_COARSE_MARGIN_SECONDS", 0.5)
+    if seconds < 0:
+        raise ConfigError("SCHEDULER_COARSE_MARGIN_SECONDS must be 0 or greater")
+    return seconds
+
+
 # ブッカー設定
 def get_dry_run() -> bool:
     """DRY_RUNモードを取得"""
@@ -182,6 +263,74 @@ def get_require_manual_confirmation() -> bool:
     return get_bool_env("REQUIRE_MANUAL_CONFIRMATION", False)
 
 
+def get_booking_max_resumes() -> int:
+    """予約フローを途中の状態から再開する最大回数を取得"""
+    resumes = get_int_env("BOOKING_MAX_RESUMES", 2)
+    if resumes < 0:
+        raise ConfigError("BOOKING_MAX_RESUMES must be 0 or greater")
+    return resumes
+
+
+def get_booking_pool_size() -> int:
+    """同時に実行できる予約の数（予約用ブラウザコンテキストの数）を取得"""
+    size = get_int_env("BOOKING_POOL_SIZE", 2)
+    if size < 1:
+        raise ConfigError("BOOKING_POOL_SIZE must be at least 1")
+    return size
+
+
+def get_pipeline_queue_size() -> int:
+    """パイプラインの各キューの最大長を取得"""
+    size = get_int_env("PIPELINE_QUEUE_SIZE", 16)
+    if size < 1:
+        raise ConfigError("PIPELINE_QUEUE_SIZE must be at least 1")
+    return size
+
+
+def get_pipeline_booking_workers() -> int:
+    """パイプラインの予約ワーカー数を取得（デフォルトはBOOKING_POOL_SIZE）"""
+    workers = get_int_env("PIPELINE_BOOKING_WORKERS", get_booking_pool_size())
+    if workers < 1:
+        raise ConfigError("PIPELINE_BOOKING_WORKERS must be at least 1")
+    return workers
+
+
+def get_speculative_prefetch() -> bool:
+    """最上位候補の予約ページを先読みするか"""
+    return get_bool_env("SPECULATIVE_PREFETCH", True)
+
+
+def get_ledger_enabled() -> bool:
+    """予約台帳（予約試行と結果の記録）を有効にするか"""
+    return get_bool_env("LEDGER_ENABLED", True)
+
+
+def get_ledger_path() -> str:
+    """予約台帳（SQLite）のパスを取得"""
+    return get_str_env("LEDGER_PATH", "data/booking_ledger.db")
+
+
+def get_max_attempts_per_slot() -> int:
+    """同じ枠・プロファイルで予約を試行する最大回数を取得"""
+    attempts = get_int_env("MAX_ATTEMPTS_PER_SLOT", 1)
+    if attempts < 1:
+        raise ConfigError("MAX_ATTEMPTS_PER_SLOT must be at least 1")
+    return attempts
+
+
+def get_max_bookings_per_month() -> int:
+    """プロファイルごとの1か月あたりの最大予約数を取得（0の場合は上限なし）"""
+    bookings = get_int_env("MAX_BOOKINGS_PER_MONTH", 0)
+    if bookings < 0:
+        raise ConfigError("MAX_BOOKINGS_PER_MONTH must be 0 or greater")
+    return bookings
+
+
+def get_profiles_file() -> str:
+    """予約者プロファイルファイル（JSON）のパスを取得（未設定の場合は環境変数の予約者情報を使う）"""
+    return get_str_env("PROFILES_FILE")
+
+
 def get_booker_name() -> str:
     """予約者氏名を取得"""
     return get_str_env("BOOKER_NAME")
@@ -232,6 +381,467 @@ def get_preferred_time_end() -> str:
     return get_str_env("PREFERRED_TIME_END", "17:00")
 
 
+# 証跡キャプチャ設定
+EVIDENCE_FORMATS = ("full", "viewport", "jpeg", "html")
+
+
+def get_evidence_format() -> str:
+    """証跡キャプチャの形式を取得
+    
+    - full: ページ全体のPNG（従来の動作、最も遅い）
+    - viewport: 表示領域のみのPNG
+    - jpeg: 表示領域のみのJPEG（EVIDENCE_JPEG_QUALITYで画質指定）
+    - html: HTMLスナップショット（画像エンコードなし）
+    """
+    evidence_format = get_str_env("EVIDENCE_FORMAT", "jpeg").lower()
+    if evidence_format not in EVIDENCE_FORMATS:
+        raise ConfigError(f"EVIDENCE_FORMAT must be one of {', '.join(EVIDENCE_FORMATS)}, got: {evidence_format}")
+    return evidence_format
+
+
+def get_evidence_jpeg_quality() -> int:
+    """JPEG形式の画質（1-100）を取得"""
+    quality = get_int_env("EVIDENCE_JPEG_QUALITY", 60)
+    if not 1 <= quality <= 100:
+        raise ConfigError("EVIDENCE_JPEG_QUALITY must be between 1 and 100")
+    return quality
+
+
+def get_evidence_dir() -> str:
+    """証跡の保存先ディレクトリを取得"""
+    return get_str_env("EVIDENCE_DIR", "screenshots")
+
+
+def get_evidence_queue_size() -> int:
+    """証跡書き込みキューの最大長を取得"""
+    size = get_int_env("EVIDENCE_QUEUE_SIZE", 32)
+    if size < 1:
+        raise ConfigError("EVIDENCE_QUEUE_SIZE must be at least 1")
+    return size
+
+
+# フライトレコーダー設定
+FLIGHT_RECORDER_MODES = ("off", "events", "trace")
+
+
+def get_flight_recorder_mode() -> str:
+    """フライトレコーダーのモードを取得
+    
+    - off: 記録しない
+    - events: 直近のDOM・ネットワークイベントをメモリに保持
+    - trace: eventsに加えてPlaywrightトレースを予約試行ごとに保持
+    """
+    mode = get_str_env("FLIGHT_RECORDER", "events").lower()
+    if mode not in FLIGHT_RECORDER_MODES:
+        raise ConfigError(f"FLIGHT_RECORDER must be one of {', '.join(FLIGHT_RECORDER_MODES)}, got: {mode}")
+    return mode
+
+
+def get_flight_recorder_window_seconds() -> float:
+    """フライトレコーダーが保持する時間幅（秒）を取得"""
+    window = get_float_env("FLIGHT_RECORDER_WINDOW_SECONDS", 30.0)
+    if window <= 0:
+        raise ConfigError("FLIGHT_RECORDER_WINDOW_SECONDS must be positive")
+    return window
+
+
+def get_flight_recorder_max_events() -> int:
+    """フライトレコーダーが保持する最大イベント数を取得"""
+    max_events = get_int_env("FLIGHT_RECORDER_MAX_EVENTS", 2000)
+    if max_events < 1:
+        raise ConfigError("FLIGHT_RECORDER_MAX_EVENTS must be at least 1")
+    return max_events
+
+
+def get_flight_recorder_dir() -> str:
+    """フライトレコーダーの出力先ディレクトリを取得"""
+    return get_str_env("FLIGHT_RECORDER_DIR", "flight_records")
+
+
+# 遅延トレース設定
+def get_trace_enabled() -> bool:
+    """スキャン・予約の各ステップの所要時間をスパンとして記録するか"""
+    return get_bool_env("TRACE_ENABLED", False)
+
+
+def get_trace_dir() -> str:
+    """遅延トレースの出力先ディレクトリを取得"""
+    return get_str_env("TRACE_DIR", "traces")
+
+
+def get_trace_max_spans() -> int:
+    """1回の実行で記録する最大スパン数を取得（超えた分は記録しない）"""
+    max_spans = get_int_env("TRACE_MAX_SPANS", 100000)
+    if max_spans < 1:
+        raise ConfigError("TRACE_MAX_SPANS must be at least 1")
+    return max_spans
+
+
+# プロファイリング設定
+PROFILE_MODES = ("cpu", "sample", "loop", "memory")
+
+
+def parse_profile_modes(value: str) -> List[str]:
+    """プロファイリングの種類（カンマ区切り、all ですべて、off・空で無効）を解析"""
+    modes = [mode.strip().lower() for mode in value.split(",") if mode.strip()]
+    if modes in ([], ["off"]):
+        return []
+    if modes == ["all"]:
+        return list(PROFILE_MODES)
+    invalid = [mode for mode in modes if mode not in PROFILE_MODES]
+    if invalid:
+        raise ConfigError(f"PROFILE_MODES must be a comma-separated list of {', '.join(PROFILE_MODES)} (or all/off), got: {', '.join(invalid)}")
+    return list(dict.fromkeys(modes))
+
+
+def get_profile_modes() -> List[str]:
+    """有効にするプロファイリングの種類を取得
+
+    - cpu: cProfileによる決定論的プロファイリング（フェーズごと）
+    - sample: イベントループのスレッドのスタックを定期的に採取する（実行中のタスク名つき）
+    - loop: イベントループの遅れ（スリープの超過時間）の採取
+    - memory: tracemallocのスナップショットを一定間隔で比較する
+    """
+    return parse_profile_modes(get_str_env("PROFILE_MODES", "off"))
+
+
+def get_profile_dir() -> str:
+    """プロファイリングのレポートの出力先ディレクトリを取得"""
+    return get_str_env("PROFILE_DIR", "profiles")
+
+
+def get_profile_sample_interval_ms() -> float:
+    """スタックを採取する間隔（ミリ秒）を取得"""
+    interval = get_float_env("PROFILE_SAMPLE_INTERVAL_MS", 5.0)
+    if interval <= 0:
+        raise ConfigError("PROFILE_SAMPLE_INTERVAL_MS must be greater than 0")
+    return interval
+
+
+def get_profile_loop_lag_interval_ms() -> float:
+    """イベントループの遅れを採取する間隔（ミリ秒）を取得"""
+    interval = get_float_env("PROFILE_LOOP_LAG_INTERVAL_MS", 50.0)
+    if interval <= 0:
+        raise ConfigError("PROFILE_LOOP_LAG_INTERVAL_MS must be greater than 0")
+    return interval
+
+
+def get_profile_memory_interval_seconds() -> float:
+    """tracemallocのスナップショットを取る間隔（秒）を取得（フェーズの切り替わりでも取る）"""
+    interval = get_float_env("PROFILE_MEMORY_INTERVAL_SECONDS", 60.0)
+    if interval <= 0:
+        raise ConfigError("PROFILE_MEMORY_INTERVAL_SECONDS must be greater than 0")
+    return interval
+
+
+def get_profile_burst_seconds() -> float:
+    """予約公開からバースト（集中監視）のフェーズとみなす秒数を取得"""
+    seconds = get_float_env("PROFILE_BURST_SECONDS", 30.0)
+    if seconds < 0:
+        raise ConfigError("PROFILE_BURST_SECONDS must be 0 or greater")
+    return seconds
+
+
+# 予約枠の履歴設定
+def get_history_enabled() -> bool:
+    """予約枠の履歴（スキャンで見た枠の状態の変化）を記録するか"""
+    return get_bool_env("HISTORY_ENABLED", True)
+
+
+def get_history_path() -> str:
+    """予約枠の履歴（SQLite）のパスを取得"""
+    return get_str_env("HISTORY_PATH", "data/slot_history.db")
+
+
+def get_history_flush_seconds() -> float:
+    """予約枠の履歴をまとめて書き込む間隔（秒）を取得"""
+    seconds = get_float_env("HISTORY_FLUSH_SECONDS", 5.0)
+    if seconds < 0:
+        raise ConfigError("HISTORY_FLUSH_SECONDS must be 0 or greater")
+    return seconds
+
+
+def get_history_batch_size() -> int:
+    """予約枠の履歴を書き込むまでにためる最大の行数を取得"""
+    size = get_int_env("HISTORY_BATCH_SIZE", 100)
+    if size < 1:
+        raise ConfigError("HISTORY_BATCH_SIZE must be at least 1")
+    return size
+
+
+# 予測ポーリング設定
+def get_prediction_enabled() -> bool:
+    """予約枠の履歴から予測した頻度で、ポーリング間隔と確認する週を決めるか"""
+    return get_bool_env("PREDICTION_ENABLED", False)
+
+
+def get_prediction_min_events() -> int:
+    """予測に使うのに必要な、履歴中の新しい枠・キャンセルの最小件数を取得（少ない場合は一定間隔で監視する）"""
+    events = get_int_env("PREDICTION_MIN_EVENTS", 20)
+    if events < 1:
+        raise ConfigError("PREDICTION_MIN_EVENTS must be at least 1")
+    return events
+
+
+def get_prediction_max_interval_seconds() -> float:
+    """枠が出ないと予測した時間帯のポーリング間隔（秒）を取得"""
+    seconds = get_float_env("PREDICTION_MAX_INTERVAL_SECONDS", 30.0)
+    if seconds <= 0:
+        raise ConfigError("PREDICTION_MAX_INTERVAL_SECONDS must be greater than 0")
+    return seconds
+
+
+def get_prediction_burst_seconds() -> float:
+    """監視の開始から、予測によらず最短の間隔ですべての週を確認する秒数を取得"""
+    seconds = get_float_env("PREDICTION_BURST_SECONDS", 300.0)
+    if seconds < 0:
+        raise ConfigError("PREDICTION_BURST_SECONDS must be 0 or greater")
+    return seconds
+
+
+def get_prediction_hot_week_share() -> float:
+    """毎回確認する週とみなす、新しい枠・キャンセルの割合の下限を取得"""
+    share = get_float_env("PREDICTION_HOT_WEEK_SHARE", 0.1)
+    if not 0 <= share <= 1:
+        raise ConfigError("PREDICTION_HOT_WEEK_SHARE must be between 0 and 1")
+    return share
+
+
+def get_prediction_full_scan_every() -> int:
+    """何回に1回すべての週を確認するかを取得"""
+    scans = get_int_env("PREDICTION_FULL_SCAN_EVERY", 10)
+    if scans < 1:
+        raise ConfigError("PREDICTION_FULL_SCAN_EVERY must be at least 1")
+    return scans
+
+
+# メトリクス設定
+def get_metrics_host() -> str:
+    """メトリクス（Prometheusのテキスト形式）の待ち受けアドレスを取得"""
+    return get_str_env("METRICS_HOST", "127.0.0.1")
+
+
+def get_metrics_port() -> int:
+    """メトリクスの待ち受けポートを取得（0の場合は公開しない）"""
+    port = get_int_env("METRICS_PORT", 0)
+    if not 0 <= port <= 65535:
+        raise ConfigError("METRICS_PORT must be between 0 and 65535")
+    return port
+
+
+def get_metrics_textfile() -> str:
+    """メトリクスを書き出すファイルのパスを取得（未設定の場合は書き出さない）"""
+    return get_str_env("METRICS_TEXTFILE")
+
+
+def get_metrics_textfile_interval_seconds() -> float:
+    """メトリクスをファイルに書き出す間隔（秒）を取得"""
+    seconds = get_float_env("METRICS_TEXTFILE_INTERVAL_SECONDS", 15.0)
+    if seconds <= 0:
+        raise ConfigError("METRICS_TEXTFILE_INTERVAL_SECONDS must be greater than 0")
+    return seconds
+
+
+# 起動時間設定
+def get_startup_budget_ms() -> float:
+    """起動からモードの実行開始（モジュールの読み込み完了）までの予算（ミリ秒）を取得"""
+    budget = get_float_env("STARTUP_BUDGET_MS", 1500.0)
+    if budget <= 0:
+        raise ConfigError("STARTUP_BUDGET_MS must be greater than 0")
+    return budget
+
+
+# ベンチマーク設定
+def get_bench_baseline_file() -> str:
+    """ベンチマークのベースライン（JSON）のパスを取得"""
+    return get_str_env("BENCH_BASELINE_FILE", "bench/baseline.json")
+
+
+def get_bench_results_dir() -> str:
+    """ベンチマークの結果の出力先ディレクトリを取得"""
+    return get_str_env("BENCH_RESULTS_DIR", "bench/results")
+
+
+def get_bench_regression_threshold_percent() -> float:
+    """ベースラインから何%遅くなったら退行とするかを取得"""
+    threshold = get_float_env("BENCH_REGRESSION_THRESHOLD_PERCENT", 20.0)
+    if threshold < 0:
+        raise ConfigError("BENCH_REGRESSION_THRESHOLD_PERCENT must be 0 or greater")
+    return threshold
+
+
+def get_bench_latency_ms() -> float:
+    """ベンチマークでシミュレーターの応答に加える遅延（ミリ秒）を取得"""
+    latency = get_float_env("BENCH_LATENCY_MS", 0.0)
+    if latency < 0:
+        raise ConfigError("BENCH_LATENCY_MS must be 0 or greater")
+    return latency
+
+
+# 予約競争シミュレーション設定
+def get_contention_trials() -> int:
+    """予約競争シミュレーションの試行回数を取得"""
+    trials = get_int_env("CONTENTION_TRIALS", 200)
+    if trials < 1:
+        raise ConfigError("CONTENTION_TRIALS must be 1 or greater")
+    return trials
+
+
+def get_contention_seats() -> int:
+    """予約競争シミュレーションで公開する席数を取得"""
+    seats = get_int_env("CONTENTION_SEATS", 1)
+    if seats < 1:
+        raise ConfigError("CONTENTION_SEATS must be 1 or greater")
+    return seats
+
+
+def get_contention_competitors() -> str:
+    """競合の人数と遅延の分布を取得（例: 10*lognormal:3000:0.6,3*uniform:800:1500）"""
+    return get_str_env("CONTENTION_COMPETITORS", "10*lognormal:3000:0.6")
+
+
+def get_contention_detection() -> str:
+    """公開から自分側が予約を始めるまでの遅れの分布を取得（スキャン間隔1秒なら uniform:0:1000）"""
+    return get_str_env("CONTENTION_DETECTION", "uniform:0:1000")
+
+
+# HAR記録・再生設定
+HAR_MODES = ("off", "record", "replay")
+HAR_NOT_FOUND_ACTIONS = ("abort", "fallback")
+
+
+def get_har_mode() -> str:
+    """HARの記録・再生モードを取得
+
+    - off: 記録・再生しない
+    - record: 実サイトとの通信をHARに記録する（STOP_BEFORE_SUBMITで確認画面まで）
+    - replay: 記録したHARをルートの横取りでブラウザに返す（ネットワークに接続しない）
+    """
+    mode = get_str_env("HAR_MODE", "off").lower()
+    if mode not in HAR_MODES:
+        raise ConfigError(f"HAR_MODE must be one of {', '.join(HAR_MODES)}, got: {mode}")
+    if mode == "record" and not get_stop_before_submit():
+        raise ConfigError("HAR_MODE=record requires STOP_BEFORE_SUBMIT=true (recording must not submit a booking)")
+    return mode
+
+
+def get_har_dir() -> str:
+    """HARの保存先ディレクトリを取得"""
+    return get_str_env("HAR_DIR", "har")
+
+
+def get_har_not_found() -> str:
+    """再生時にHARにないリクエストの扱いを取得（abort: 中断、fallback: ネットワークに接続）"""
+    action = get_str_env("HAR_NOT_FOUND", "abort").lower()
+    if action not in HAR_NOT_FOUND_ACTIONS:
+        raise ConfigError(f"HAR_NOT_FOUND must be one of {', '.join(HAR_NOT_FOUND_ACTIONS)}, got: {action}")
+    return action
+
+
+# 常駐モード設定
+def get_daemon_poll_interval_seconds() -> float:
+    """常駐モードのスキャン間隔（秒）を取得（実行中に制御APIで変更可能）"""
+    seconds = get_float_env("DAEMON_POLL_INTERVAL_SECONDS", 1.0)
+    if seconds < 0:
+        raise ConfigError("DAEMON_POLL_INTERVAL_SECONDS must be 0 or greater")
+    return seconds
+
+
+def get_control_api_host() -> str:
+    """制御APIの待ち受けアドレスを取得（外部に公開しないよう、デフォルトはループバックのみ）"""
+    return get_str_env("CONTROL_API_HOST", "127.0.0.1")
+
+
+def get_control_api_port() -> int:
+    """制御APIの待ち受けポートを取得（0の場合は制御APIを起動しない）"""
+    port = get_int_env("CONTROL_API_PORT", 8765)
+    if not 0 <= port <= 65535:
+        raise ConfigError("CONTROL_API_PORT must be between 0 and 65535")
+    return port
+
+
+def get_control_api_socket() -> str:
+    """制御APIのUnixソケットのパスを取得（設定した場合はTCPの代わりに使う）"""
+    return get_str_env("CONTROL_API_SOCKET")
+
+
+# 分散監視設定
+COORDINATION_BACKENDS = ("none", "sqlite", "file", "redis")
+DEFAULT_COORDINATION_URLS = {
+    "sqlite": "coordination.db",
+    "file": "coordination",
+    "redis": "redis://127.0.0.1:6379/0",
+}
+
+
+def get_coordination_backend() -> str:
+    """複数インスタンス間の調整に使うバックエンドを取得
+    
+    - none: 調整しない（1インスタンスで監視）
+    - sqlite: SQLiteファイル（同じマシン上のインスタンス間）
+    - file: ファイルロック付きのディレクトリ（同じマシン上のインスタンス間）
+    - redis: Redis互換サーバー（RESPプロトコル）
+    """
+    backend = get_str_env("COORDINATION_BACKEND", "none").lower()
+    if backend not in COORDINATION_BACKENDS:
+        raise ConfigError(f"COORDINATION_BACKEND must be one of {', '.join(COORDINATION_BACKENDS)}, got: {backend}")
+    return backend
+
+
+def get_coordination_url() -> str:
+    """調整バックエンドの接続先（SQLiteファイル・ディレクトリのパス、またはredis://のURL）を取得"""
+    return get_str_env("COORDINATION_URL", DEFAULT_COORDINATION_URLS.get(get_coordination_backend(), ""))
+
+
+def get_coordination_instance_id() -> str:
+    """インスタンスID（未設定の場合はホスト名とプロセスIDから作成）を取得"""
+    instance_id = get_str_env("COORDINATION_INSTANCE_ID")
+    if instance_id:
+        return instance_id
+    import socket
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def get_coordination_instance_count() -> int:
+    """監視を分担するインスタンス数を取得"""
+    count = get_int_env("COORDINATION_INSTANCE_COUNT", 1)
+    if count < 1:
+        raise ConfigError("COORDINATION_INSTANCE_COUNT must be at least 1")
+    return count
+
+
+def get_coordination_instance_index() -> int:
+    """このインスタンスの番号（0からCOORDINATION_INSTANCE_COUNT-1）を取得"""
+    index = get_int_env("COORDINATION_INSTANCE_INDEX", 0)
+    if not 0 <= index < get_coordination_instance_count():
+        raise ConfigError("COORDINATION_INSTANCE_INDEX must be between 0 and COORDINATION_INSTANCE_COUNT - 1")
+    return index
+
+
+def get_coordination_claim_ttl_seconds() -> float:
+    """予約試行の確保の有効期限（秒）を取得（期限切れの確保は他のインスタンスが引き継げる）"""
+    ttl = get_float_env("COORDINATION_CLAIM_TTL_SECONDS", 300.0)
+    if ttl <= 0:
+        raise ConfigError("COORDINATION_CLAIM_TTL_SECONDS must be positive")
+    return ttl
+
+
+def get_coordination_snapshot_ttl_seconds() -> float:
+    """共有したスキャン結果の有効期限（秒）を取得（更新が途絶えたインスタンスの担当は他が引き継ぐ）"""
+    ttl = get_float_env("COORDINATION_SNAPSHOT_TTL_SECONDS", 30.0)
+    if ttl <= 0:
+        raise ConfigError("COORDINATION_SNAPSHOT_TTL_SECONDS must be positive")
+    return ttl
+
+
+def get_coordination_poll_period_seconds() -> float:
+    """インスタンス間でスキャン開始をずらす周期（秒）を取得"""
+    period = get_float_env("COORDINATION_POLL_PERIOD_SECONDS", 2.0)
+    if period <= 0:
+        raise ConfigError("COORDINATION_POLL_PERIOD_SECONDS must be positive")
+    return period
+
+
 # 通知設定
 def get_notify_success() -> bool:
     """予約成功通知を有効にするか"""
@@ -243,12 +853,126 @@ def get_notify_failure() -> bool:
     return get_bool_env("NOTIFY_FAILURE", True)
 
 
+NOTIFY_SINK_TYPES = ("stdout", "file", "webhook", "smtp")
+
+
+def get_notify_sinks() -> List[str]:
+    """通知の送信先（stdout / file / webhook / smtp、カンマ区切り、未設定の場合はログ出力のみ）"""
+    sinks = [sink.lower() for sink in get_list_env("NOTIFY_SINKS")]
+    unknown = [sink for sink in sinks if sink not in NOTIFY_SINK_TYPES]
+    if unknown:
+        raise ConfigError(f"NOTIFY_SINKS must be one of {', '.join(NOTIFY_SINK_TYPES)}, got: {', '.join(unknown)}")
+    return sinks
+
+
+def get_notify_queue_size() -> int:
+    """送信待ちの通知の最大数を取得（超えた通知は破棄する）"""
+    size = get_int_env("NOTIFY_QUEUE_SIZE", 100)
+    if size < 1:
+        raise ConfigError("NOTIFY_QUEUE_SIZE must be at least 1")
+    return size
+
+
+def get_notify_timeout_seconds() -> float:
+    """送信先ごとの1回の送信のタイムアウト（秒）を取得"""
+    seconds = get_float_env("NOTIFY_TIMEOUT_SECONDS", 5.0)
+    if seconds <= 0:
+        raise ConfigError("NOTIFY_TIMEOUT_SECONDS must be greater than 0")
+    return seconds
+
+
+def get_notify_retries() -> int:
+    """送信に失敗した場合の再試行回数を取得"""
+    retries = get_int_env("NOTIFY_RETRIES", 2)
+    if retries < 0:
+        raise ConfigError("NOTIFY_RETRIES must be 0 or greater")
+    return retries
+
+
+def get_notify_coalesce_seconds() -> float:
+    """新規枠の検出通知を1通にまとめる時間（秒、0の場合はまとめない）"""
+    seconds = get_float_env("NOTIFY_COALESCE_SECONDS", 2.0)
+    if seconds < 0:
+        raise ConfigError("NOTIFY_COALESCE_SECONDS must be 0 or greater")
+    return seconds
+
+
+def get_notify_file_path() -> str:
+    """通知を書き出すファイル（JSON Lines）のパスを取得"""
+    return get_str_env("NOTIFY_FILE_PATH", "logs/notifications.jsonl")
+
+
+def get_notify_webhook_url() -> str:
+    """通知を送るWebhookのURLを取得（SlackのIncoming Webhookなど、{"text": ...} をPOSTする）"""
+    return get_str_env("NOTIFY_WEBHOOK_URL")
+
+
+def get_notify_smtp_host() -> str:
+    """通知メールを送るSMTPサーバーを取得"""
+    return get_str_env("NOTIFY_SMTP_HOST")
+
+
+def get_notify_smtp_port() -> int:
+    """SMTPサーバーのポートを取得"""
+    return get_int_env("NOTIFY_SMTP_PORT", 25)
+
+
+def get_notify_smtp_starttls() -> bool:
+    """SMTPでSTARTTLSを使うか"""
+    return get_bool_env("NOTIFY_SMTP_STARTTLS", False)
+
+
+def get_notify_smtp_username() -> str:
+    """SMTP認証のユーザー名を取得（未設定の場合は認証しない）"""
+    return get_str_env("NOTIFY_SMTP_USERNAME")
+
+
+def get_notify_smtp_password() -> str:
+    """SMTP認証のパスワードを取得"""
+    return get_str_env("NOTIFY_SMTP_PASSWORD")
+
+
+def get_notify_email_from() -> str:
+    """通知メールの送信元アドレスを取得"""
+    return get_str_env("NOTIFY_EMAIL_FROM")
+
+
+def get_notify_email_to() -> List[str]:
+    """通知メールの宛先（カンマ区切り）を取得"""
+    return get_list_env("NOTIFY_EMAIL_TO")
+
+
 def validate_required_config() -> None:
     """必須設定項目のバリデーション
     
     Raises:
         ConfigError: 必須項目が不足している場合
     """
+    # 監視対象ファイルを使う場合は、形式を検証する
+    if get_targets_file():
+        from src.targets import load_targets
+        
+        load_targets()
+    
+    # 予約公開カレンダーを使う場合は、形式を検証する
+    if get_release_calendar_file():
+        from src.release_calendar import load_release_calendar
+        
+        load_release_calendar()
+    
+    # プロファイルファイルを使う場合は、各プロファイルの予約者情報を検証する
+    if get_profiles_file():
+        from src.profiles import load_profiles
+        
+        problems = []
+        for profile in load_profiles():
+            missing = profile.missing_fields()
+            if missing:
+                problems.append(f"{profile.profile_id} ({', '.join(missing)})")
+        if problems:
+            raise ConfigError(f"Required profile fields are missing: {'; '.join(problems)}")
+        return
+    
     required_vars = [
         ("BOOKER_NAME", get_booker_name()),
         ("BOOKER_EMAIL", get_booker_email()),
@@ -0,0 +1,302 @@
+"""
+予約競争のシミュレーション
+
+実際の予約公開では、他の保護者や他のボットと同じ枠を取り合う
+ローカルのシミュレーター（src/simulator.py）で K 席の枠を公開し、遅延の分布を指定した合成の競合を同時に予約させながら、
+自分側は実際の予約フロー（AirReserveBooker.execute_booking）で予約して、これを何百回も繰り返す
+勝率（席を取れた割合）と、公開から席の確保までの時間のパーセンタイルを報告する
+
+遅延の分布の書式（ミリ秒）:
+    fixed:800               常に800ms
+    uniform:500:1500        500〜1500msの一様分布
+    normal:1200:300         平均1200ms・標準偏差300msの正規分布（0未満は0）
+    lognormal:2500:0.5      中央値2500ms・σ=0.5の対数正規分布
+
+競合の書式: "<人数>*<分布>" をカンマ区切りで並べる（例: "10*lognormal:3000:0.6,3*uniform:800:1500"）
+自分側の検出の遅れ（公開から予約を始めるまで）も分布で指定する（例: スキャン間隔1秒なら "uniform:0:1000"）
+
+使用方法:
+    python -m src.contention --trials 300 --seats 2 --competitors "10*lognormal:3000:0.6" --detection "uniform:0:1000"
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.config import (
+    ConfigError,
+    get_bench_latency_ms,
+    get_bench_results_dir,
+    get_contention_competitors,
+    get_contention_detection,
+    get_contention_seats,
+    get_contention_trials,
+)
+from src.simulator import AirReserveSimulator, SimulatedSlot
+
+
+# 競合の予約者名の接頭辞（シミュレーターの予約記録で自分と区別する）
+COMPETITOR_PREFIX = "competitor-"
+
+# 公開の何秒前に試行を準備するか
+RELEASE_LEAD_SECONDS = 0.2
+
+
+class LatencyDistribution:
+    """遅延（ミリ秒）の分布"""
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+
+    def __init__(self, kind: str, params: List[float]):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *values = spec.strip().split(":")
+        if kind not in cls.KINDS or len(values) != cls.KINDS[kind]:
+            raise ConfigError(f"Invalid latency distribution: {spec!r} (e.g. fixed:800, uniform:500:1500, lognormal:2500:0.5)")
+        try:
+            params = [float(value) for value in values]
+        except ValueError:
+            raise ConfigError(f"Invalid latency distribution: {spec!r}")
+        if any(value < 0 for value in params):
+            raise ConfigError(f"Latency distribution parameters must not be negative: {spec!r}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        """遅延（ミリ秒）を1つ取り出す"""
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(*self.params)
+        if self.kind == 'normal':
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __str__(self) -> str:
+        return ":".join([self.kind] + [f"{value:g}" for value in self.params])
+
+
+def parse_competitors(spec: str) -> List[LatencyDistribution]:
+    """競合の指定（"10*lognormal:3000:0.6,3*uniform:800:1500"）を1人ずつの分布にする"""
+    competitors = []
+    for group in filter(None, (part.strip() for part in spec.split(","))):
+        count, _, distribution = group.rpartition("*")
+        try:
+            count = int(count) if count else 1
+        except ValueError:
+            raise ConfigError(f"Invalid competitor group: {group!r} (e.g. 10*lognormal:3000:0.6)")
+        competitors.extend([LatencyDistribution.parse(distribution)] * count)
+    return competitors
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """パーセンタイル（最近傍法、値がない場合はNone）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+async def _sleep_until(at: datetime):
+    # イベントループの時計と壁時計のずれで早く起きることがあるため、時刻を過ぎるまで待つ
+    delay = (at - datetime.now()).total_seconds()
+    while delay > 0:
+        await asyncio.sleep(delay)
+        delay = (at - datetime.now()).total_seconds()
+
+
+class ContentionSimulation:
+    """予約競争の試行を繰り返す"""
+
+    def __init__(
+        self,
+        booker,
+        competitors: List[LatencyDistribution],
+        detection: LatencyDistribution,
+        seats: int = 1,
+        latency_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.booker = booker
+        self.competitors = competitors
+        self.detection = detection
+        self.seats = seats
+        self.latency_ms = latency_ms
+        self.rng = random.Random(seed)
+        self.trials: List[Dict] = []
+
+    async def run(self, trials: int, page_factory: Callable) -> Dict:
+        """試行を繰り返して結果をまとめる
+
+        Args:
+            trials: 試行回数
+            page_factory: 予約に使うページを返す非同期コンテキストマネージャー（ブラウザのページ）
+        """
+        async with AirReserveSimulator([], weeks=1, port=0, latency=self.latency_ms / 1000) as sim:
+            async with page_factory() as page:
+                for i in range(trials):
+                    trial = await self._run_trial(sim, page, i)
+                    self.trials.append(trial)
+                    if (i + 1) % 10 == 0 or i + 1 == trials:
+                        self.logger.info(f"試行 {i + 1}/{trials}: 勝率 {self._win_rate():.1%}")
+        return self.summary()
+
+    async def _run_trial(self, sim: AirReserveSimulator, page, index: int) -> Dict:
+        slot_id = f"t{index + 1:04d}"
+        release_at = datetime.now() + timedelta(seconds=RELEASE_LEAD_SECONDS)
+        sim.slots[slot_id] = SimulatedSlot(
+            slot_id, date.today(), self.booker.preferred_time_start, capacity=self.seats, release_at=release_at
+        )
+        competitor_delays = [distribution.sample(self.rng) for distribution in self.competitors]
+        detection_ms = self.detection.sample(self.rng)
+
+        async def competitor(number: int, delay_ms: float):
+            await _sleep_until(release_at + timedelta(milliseconds=delay_ms))
+            sim.book(slot_id, f"{COMPETITOR_PREFIX}{number}")
+
+        async def ours() -> bool:
+            detected_at = release_at + timedelta(milliseconds=detection_ms)
+            await _sleep_until(detected_at)
+            slot_info = {
+                'text': sim.slots[slot_id].label(datetime.now()),
+                'href': f"{sim.base_url}/{sim.shop}/reserve/{slot_id}",
+                'target_url': sim.calendar_url,
+                'timestamp': detected_at,
+            }
+            try:
+                return await self.booker.execute_booking(slot_info, page)
+            except Exception as e:
+                self.logger.error(f"予約フローでエラーが発生: {e}")
+                return False
+
+        tasks = [asyncio.create_task(competitor(i + 1, delay)) for i, delay in enumerate(competitor_delays)]
+        booked = await ours()
+        await asyncio.gather(*tasks)
+
+        ours_booking = next(
+            (b for b in sim.bookings if b['slot_id'] == slot_id and not b['customer'].startswith(COMPETITOR_PREFIX)),
+            None,
+        )
+        return {
+            'trial': index + 1,
+            'won': ours_booking is not None,
+            'booked': booked,
+            'detection_ms': detection_ms,
+            'claim_ms': (ours_booking['booked_at'] - release_at).total_seconds() * 1000 if ours_booking else None,
+            # 席がすべて埋まった時点（公開からのミリ秒、埋まらなかった場合はNone）
+            'sold_out_ms': self._sold_out_ms(sim, slot_id, release_at),
+        }
+
+    def _sold_out_ms(self, sim: AirReserveSimulator, slot_id: str, release_at: datetime) -> Optional[float]:
+        bookings = sorted(b['booked_at'] for b in sim.bookings if b['slot_id'] == slot_id)
+        if len(bookings) < self.seats:
+            return None
+        return (bookings[self.seats - 1] - release_at).total_seconds() * 1000
+
+    def _win_rate(self) -> float:
+        return sum(1 for trial in self.trials if trial['won']) / len(self.trials) if self.trials else 0.0
+
+    def summary(self) -> Dict:
+        claims = [trial['claim_ms'] for trial in self.trials if trial['claim_ms'] is not None]
+        sold_out = [trial['sold_out_ms'] for trial in self.trials if trial['sold_out_ms'] is not None]
+        return {
+            'created_at': datetime.now().isoformat(timespec="seconds"),
+            'trials': len(self.trials),
+            'seats': self.seats,
+            'competitors': [str(distribution) for distribution in self.competitors],
+            'detection': str(self.detection),
+            'latency_ms': self.latency_ms,
+            'wins': sum(1 for trial in self.trials if trial['won']),
+            'win_rate': self._win_rate(),
+            'claim_ms': {f"p{q}": percentile(claims, q) for q in (50, 90, 99)},
+            'sold_out_ms': {f"p{q}": percentile(sold_out, q) for q in (50, 90, 99)},
+            'trial_results': self.trials,
+        }
+
+
+@asynccontextmanager
+async def browser_page():
+    """予約に使うブラウザのページ（試行の間で使い回す）"""
+    from playwright.async_api import async_playwright
+    from src.config import get_headless
+    from src.scraper import USER_AGENT, launch_browser
+
+    async with async_playwright() as playwright:
+        browser = await launch_browser(playwright, get_headless())
+        try:
+            context = await browser.new_context(extra_http_headers={'User-Agent': USER_AGENT})
+            yield await context.new_page()
+        finally:
+            await browser.close()
+
+
+def create_contention_booker():
+    """シミュレーターに対して最後まで予約するブッカー（予約者情報は設定から読み込む）"""
+    from src.bench import create_bench_booker
+
+    return create_bench_booker()
+
+
+def write_summary(summary: Dict, directory: Optional[str] = None) -> Path:
+    output_dir = Path(directory or get_bench_results_dir())
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"contention-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps(summary, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    return path
+
+
+def log_summary(summary: Dict):
+    logger = logging.getLogger(__name__)
+    claim = summary['claim_ms']
+    sold_out = summary['sold_out_ms']
+    logger.info(
+        f"予約競争: {summary['trials']}回, {summary['seats']}席, 競合{len(summary['competitors'])}人, "
+        f"勝率 {summary['win_rate']:.1%} ({summary['wins']}勝)"
+    )
+    if claim['p50'] is not None:
+        logger.info(f"  席の確保まで: p50 {claim['p50']:.0f}ms, p90 {claim['p90']:.0f}ms, p99 {claim['p99']:.0f}ms")
+    if sold_out['p50'] is not None:
+        logger.info(f"  満席まで: p50 {sold_out['p50']:.0f}ms, p90 {sold_out['p90']:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="予約競争のシミュレーション")
+    parser.add_argument("--trials", type=int, help="試行回数（デフォルト: CONTENTION_TRIALS）")
+    parser.add_argument("--seats", type=int, help="公開する席数（デフォルト: CONTENTION_SEATS）")
+    parser.add_argument("--competitors", help="競合の人数と遅延の分布（デフォルト: CONTENTION_COMPETITORS）")
+    parser.add_argument("--detection", help="自分側の検出の遅れの分布（デフォルト: CONTENTION_DETECTION）")
+    parser.add_argument("--latency-ms", type=float, help="シミュレーターの応答の遅延（デフォルト: BENCH_LATENCY_MS）")
+    parser.add_argument("--seed", type=int, help="乱数の種（同じ条件で比べる場合に指定）")
+    parser.add_argument("--config", default=".env", help="設定ファイルのパス")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(args.config)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    simulation = ContentionSimulation(
+        create_contention_booker(),
+        parse_competitors(args.competitors or get_contention_competitors()),
+        LatencyDistribution.parse(args.detection or get_contention_detection()),
+        seats=args.seats or get_contention_seats(),
+        latency_ms=args.latency_ms if args.latency_ms is not None else get_bench_latency_ms(),
+        seed=args.seed,
+    )
+    summary = asyncio.run(simulation.run(args.trials or get_contention_trials(), browser_page))
+    log_summary(summary)
+    logging.getLogger(__name__).info(f"結果を保存しました: {write_summary(summary)}")
+
+
+if __name__ == "__main__":
+    main()
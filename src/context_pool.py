@@ -0,0 +1,104 @@
+"""
+予約用ブラウザコンテキストのプール
+
+監視用ページとは別に、予約専用のブラウザコンテキストを事前に作成しておく
+予約中も監視用ページはカレンダーに留まるため、監視を止めずに予約を並行実行できる
+空きがない場合、予約は空きが出るまでキューで待機する
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+
+class BookingContextPool:
+    """予約用ページのプール"""
+
+    def __init__(self, browser, size: int, extra_http_headers: Optional[Dict[str, str]] = None, har=None):
+        self.logger = logging.getLogger(__name__)
+        self.browser = browser
+        self.size = size
+        self.extra_http_headers = extra_http_headers or {}
+        # HARの記録・再生（src/har.py の HarSession）
+        self.har = har
+        self._created = 0
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._contexts: List = []
+        self.waiting = 0
+
+    async def start(self):
+        """予約用のコンテキストとページを事前に作成"""
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            page = await self._create_page()
+            self._idle.put_nowait(page)
+        self.logger.info(f"予約用コンテキストを{self.size}個作成しました")
+
+    async def _create_page(self):
+        """新しいコンテキストとページを作成"""
+        self._created += 1
+        if self.har:
+            context = await self.har.new_context(
+                self.browser, f"booking-{self._created}", extra_http_headers=self.extra_http_headers
+            )
+        else:
+            context = await self.browser.new_context(extra_http_headers=self.extra_http_headers)
+        self._contexts.append(context)
+        return await context.new_page()
+
+    @property
+    def idle_count(self) -> int:
+        """空いているページ数"""
+        return self._idle.qsize() if self._idle else 0
+
+    @property
+    def busy_count(self) -> int:
+        """使用中のページ数"""
+        return self.size - self.idle_count
+
+    async def checkout(self):
+        """空いているページを取得（空きがない場合は待機）"""
+        if self._idle.empty():
+            self.logger.info(f"予約用コンテキストに空きがないため待機します (待機中: {self.waiting + 1}件)")
+        self.waiting += 1
+        try:
+            return await self._idle.get()
+        finally:
+            self.waiting -= 1
+
+    async def checkin(self, page):
+        """ページを初期状態に戻してプールへ返却"""
+        try:
+            await page.goto("about:blank")
+            await page.context.clear_cookies()
+        except Exception as e:
+            # 壊れたページは作り直す
+            self.logger.warning(f"予約用ページの初期化に失敗したため作り直します: {e}")
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+            if page.context in self._contexts:
+                self._contexts.remove(page.context)
+            page = await self._create_page()
+        self._idle.put_nowait(page)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """ページを借りて、使用後に自動で返却する"""
+        page = await self.checkout()
+        try:
+            yield page
+        finally:
+            await self.checkin(page)
+
+    async def close(self):
+        """すべてのコンテキストを閉じる"""
+        for context in self._contexts:
+            try:
+                await context.close()
+            except Exception as e:
+                self.logger.debug(f"コンテキストのクローズに失敗: {e}")
+        self._contexts = []
@@ -0,0 +1,193 @@
+"""
+常駐モードの制御API
+
+ローカルのTCPポート（デフォルトは127.0.0.1のみ）またはUnixソケットで、JSONを返す小さなHTTPサーバーを提供する
+
+    GET  /status         現在の状態（フェーズ・スキャン頻度・直近のスキャン時間・監視期間・検出済みの枠・予約キュー）
+    GET  /slots          検出済みの枠
+    POST /pause          ポーリングを一時停止
+    POST /resume         ポーリングを再開
+    POST /poll-interval  スキャン間隔を変更 {"seconds": 0.5}
+    POST /windows        予約公開日時を追加 {"release_datetime": "2026-11-01 09:30:00"}
+
+認証はないため、外部から接続できるアドレスでは待ち受けないこと
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from src.config import (
+    ConfigError,
+    get_control_api_host,
+    get_control_api_port,
+    get_control_api_socket,
+)
+
+
+# リクエストボディの最大サイズ（バイト）
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ControlServer:
+    """常駐モードの制御APIサーバー"""
+
+    def __init__(
+        self,
+        daemon,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        socket_path: Optional[str] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.daemon = daemon
+        self.host = host if host is not None else get_control_api_host()
+        self.port = port if port is not None else get_control_api_port()
+        self.socket_path = socket_path if socket_path is not None else get_control_api_socket()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.routes = {
+            '/status': {'GET': self._status},
+            '/slots': {'GET': self._slots},
+            '/pause': {'POST': self._pause},
+            '/resume': {'POST': self._resume},
+            '/poll-interval': {'POST': self._poll_interval},
+            '/windows': {'POST': self._add_window},
+        }
+
+    async def start(self):
+        """待ち受けを開始（Unixソケットが指定されている場合はTCPの代わりに使う）"""
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+            # 同じユーザーのみ接続できるようにする
+            os.chmod(self.socket_path, 0o600)
+            self.logger.info(f"制御APIを開始しました: unix:{self.socket_path}")
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            # port=0の場合は割り当てられたポートを記録する
+            self.port = self._server.sockets[0].getsockname()[1]
+            self.logger.info(f"制御APIを開始しました: http://{self.host}:{self.port}")
+
+    async def close(self):
+        """待ち受けを終了"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """1つのリクエストを処理して接続を閉じる"""
+        try:
+            status, payload = await self._read_and_dispatch(reader)
+            body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_and_dispatch(self, reader: asyncio.StreamReader) -> Tuple[int, Dict]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            return 400, {'error': 'invalid request line'}
+        method, path = request_line[0].upper(), request_line[1].split("?", 1)[0]
+
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    return 400, {'error': 'invalid Content-Length'}
+        if content_length > MAX_BODY_BYTES:
+            return 400, {'error': 'request body too large'}
+        body = await reader.readexactly(content_length) if content_length else b""
+        return self.dispatch(method, path, body)
+
+    def dispatch(self, method: str, path: str, body: bytes = b"") -> Tuple[int, Dict]:
+        """リクエストを処理し、ステータスコードとJSONにする内容を返す"""
+        handlers = self.routes.get(path.rstrip("/") or "/")
+        if handlers is None:
+            return 404, {'error': f'not found: {path}'}
+        handler = handlers.get(method)
+        if handler is None:
+            return 405, {'error': f'method not allowed: {method}'}
+
+        try:
+            data = json.loads(body.decode("utf-8")) if body.strip() else {}
+        except (UnicodeDecodeError, ValueError):
+            return 400, {'error': 'request body must be JSON'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'request body must be a JSON object'}
+
+        try:
+            return 200, handler(data)
+        except ConfigError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            self.logger.error(f"制御APIエラー ({method} {path}): {e}")
+            return 500, {'error': str(e)}
+
+    def _status(self, data: Dict) -> Dict:
+        return self.daemon.status()
+
+    def _slots(self, data: Dict) -> Dict:
+        return {'slots': self.daemon.status()['slots']}
+
+    def _pause(self, data: Dict) -> Dict:
+        self.daemon.pause()
+        return {'paused': True}
+
+    def _resume(self, data: Dict) -> Dict:
+        self.daemon.resume()
+        return {'paused': False}
+
+    def _poll_interval(self, data: Dict) -> Dict:
+        try:
+            seconds = float(data['seconds'])
+        except (KeyError, TypeError, ValueError):
+            raise ConfigError('"seconds" must be a number')
+        self.daemon.set_poll_interval(seconds)
+        return {'poll_interval_seconds': seconds}
+
+    def _add_window(self, data: Dict) -> Dict:
+        try:
+            release = datetime.strptime(str(data['release_datetime']), "%Y-%m-%d %H:%M:%S")
+        except (KeyError, ValueError):
+            raise ConfigError('"release_datetime" must be in format YYYY-MM-DD HH:MM:SS')
+        window = self.daemon.add_window(release)
+        return {'window': {'start': window.start, 'end': window.end, 'releases': window.releases} if window else None}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
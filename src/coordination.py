@@ -0,0 +1,501 @@
+"""
+複数インスタンスの分散監視
+
+複数の main.py インスタンスで監視する週とスキャンの開始タイミング（位相）を分担し、
+調整バックエンドを通じてスキャン結果を共有し、予約試行を確保する
+同じ枠を同じプロファイルで予約するのは、確保に成功した1インスタンスだけになる
+
+バックエンド:
+    - sqlite: SQLiteファイル（WALモード、同じマシン上のインスタンス間）
+    - file: ファイルロック（fcntl.flock）付きのディレクトリ（同じマシン上のインスタンス間）
+    - redis: Redis互換サーバー（RESPプロトコル、src/resp_standin.py で代用可能）
+
+更新が途絶えたインスタンス（スキャン結果の有効期限切れ）の担当の週は、残りのインスタンスが引き継ぐ
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from src.config import (
+    ConfigError,
+    get_coordination_backend,
+    get_coordination_url,
+    get_coordination_instance_id,
+    get_coordination_instance_index,
+    get_coordination_instance_count,
+    get_coordination_claim_ttl_seconds,
+    get_coordination_snapshot_ttl_seconds,
+    get_coordination_poll_period_seconds,
+)
+from src.slots import get_slot_key
+
+
+class CoordinationBackend:
+    """調整バックエンドの共通インターフェース（同期API、Coordinatorがワーカースレッドで呼び出す）"""
+
+    def claim(self, key: str, owner: str, ttl_seconds: Optional[float]) -> bool:
+        """キーを確保（既に自分が確保している場合は有効期限を更新してTrue、ttl_secondsがNoneの場合は無期限）"""
+        raise NotImplementedError
+
+    def release(self, key: str, owner: str):
+        """自分が確保しているキーを解放"""
+        raise NotImplementedError
+
+    def put_snapshot(self, name: str, payload: str, ttl_seconds: float):
+        """スキャン結果を保存"""
+        raise NotImplementedError
+
+    def get_snapshots(self, prefix: str) -> List[str]:
+        """有効期限内のスキャン結果を取得"""
+        raise NotImplementedError
+
+    def close(self):
+        """接続を閉じる"""
+        pass
+
+
+class SQLiteCoordination(CoordinationBackend):
+    """SQLiteファイルを使う調整バックエンド"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (name TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def claim(self, key: str, owner: str, ttl_seconds: Optional[float]) -> bool:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM claims WHERE key = ? AND expires_at IS NOT NULL AND expires_at < ?", (key, now)
+            )
+            row = conn.execute("SELECT owner FROM claims WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO claims (key, owner, expires_at) VALUES (?, ?, ?)", (key, owner, expires_at))
+                return True
+            if row[0] != owner:
+                return False
+            conn.execute("UPDATE claims SET expires_at = ? WHERE key = ?", (expires_at, key))
+            return True
+
+    def release(self, key: str, owner: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM claims WHERE key = ? AND owner = ?", (key, owner))
+
+    def put_snapshot(self, name: str, payload: str, ttl_seconds: float):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (name, payload, expires_at) VALUES (?, ?, ?)",
+                (name, payload, time.time() + ttl_seconds),
+            )
+
+    def get_snapshots(self, prefix: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM snapshots WHERE substr(name, 1, ?) = ? AND expires_at >= ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FileCoordination(CoordinationBackend):
+    """ファイルロック付きのディレクトリを使う調整バックエンド"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.snapshot_dir = self.directory / "snapshots"
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.claims_file = self.directory / "claims.json"
+        self.lock_file = self.directory / "claims.lock"
+
+    @contextmanager
+    def _locked_claims(self):
+        """排他ロックを取得して確保一覧を読み込み、ブロックを抜けるときに書き戻す"""
+        import fcntl
+
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    claims = json.loads(self.claims_file.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    claims = {}
+                now = time.time()
+                claims = {
+                    key: value for key, value in claims.items()
+                    if value.get("expires_at") is None or value["expires_at"] >= now
+                }
+                yield claims
+                self._write_atomic(self.claims_file, json.dumps(claims, ensure_ascii=False))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_atomic(path: Path, text: str):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _safe_name(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+    def claim(self, key: str, owner: str, ttl_seconds: Optional[float]) -> bool:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        with self._locked_claims() as claims:
+            current = claims.get(key)
+            if current is not None and current["owner"] != owner:
+                return False
+            claims[key] = {"owner": owner, "expires_at": expires_at}
+            return True
+
+    def release(self, key: str, owner: str):
+        with self._locked_claims() as claims:
+            if claims.get(key, {}).get("owner") == owner:
+                del claims[key]
+
+    def put_snapshot(self, name: str, payload: str, ttl_seconds: float):
+        record = json.dumps({"expires_at": time.time() + ttl_seconds, "payload": payload}, ensure_ascii=False)
+        self._write_atomic(self.snapshot_dir / f"{self._safe_name(name)}.json", record)
+
+    def get_snapshots(self, prefix: str) -> List[str]:
+        now = time.time()
+        payloads = []
+        for path in self.snapshot_dir.glob(f"{self._safe_name(prefix)}*.json"):
+            try:
+                record = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if record.get("expires_at", 0) >= now:
+                payloads.append(record["payload"])
+        return payloads
+
+
+class RespClient:
+    """Redis互換サーバー用の最小限のRESPクライアント"""
+
+    def __init__(self, host: str, port: int, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+
+    def execute(self, *args):
+        """コマンドを送信して応答を返す（接続が切れていた場合は1回だけ再接続する）"""
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        request = b"".join(payload)
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(request)
+                    return self._read_reply()
+                except (OSError, ConnectionError):
+                    self._close_socket()
+                    if attempt:
+                        raise
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise RuntimeError(body.decode("utf-8"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            count = int(body)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"unexpected reply: {line!r}")
+
+    def _close_socket(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def close(self):
+        with self._lock:
+            self._close_socket()
+
+
+# 確保の解除: 自分の確保である場合のみ削除する（GETとDELの間に期限切れで他のインスタンスが確保した場合に消さない）
+RELEASE_CLAIM_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('DEL', KEYS[1]) "
+    "end "
+    "return 0"
+)
+
+# 確保の延長: 自分の確保である場合のみ有効期限を更新する（ARGV[2]が空の場合は期限なし）
+RENEW_CLAIM_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) ~= ARGV[1] then "
+    "return 0 "
+    "end "
+    "if ARGV[2] == '' then "
+    "redis.call('SET', KEYS[1], ARGV[1]) "
+    "else "
+    "redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2]) "
+    "end "
+    "return 1"
+)
+
+
+class RedisCoordination(CoordinationBackend):
+    """Redis互換サーバーを使う調整バックエンド（SET NX PX / GET / KEYS と、確保の解除・延長のEVALのみ使う）"""
+
+    def __init__(self, url: str, namespace: str = "childcare-auto-booker"):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ConfigError(f"COORDINATION_URL must start with redis:// for the redis backend, got: {url}")
+        self.client = RespClient(parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        self.namespace = namespace
+        database = parsed.path.lstrip("/")
+        if database and database != "0":
+            self.client.execute("SELECT", database)
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self.namespace}:{kind}:{name}"
+
+    def claim(self, key: str, owner: str, ttl_seconds: Optional[float]) -> bool:
+        redis_key = self._key("claim", key)
+        expiry = ["PX", int(ttl_seconds * 1000)] if ttl_seconds is not None else []
+        if self.client.execute("SET", redis_key, owner, "NX", *expiry) == "OK":
+            return True
+        # 既に自分が確保している場合は有効期限を更新する（比較と更新はサーバー側で不可分に行う）
+        ttl_ms = int(ttl_seconds * 1000) if ttl_seconds is not None else ""
+        return self.client.execute("EVAL", RENEW_CLAIM_SCRIPT, 1, redis_key, owner, ttl_ms) == 1
+
+    def release(self, key: str, owner: str):
+        self.client.execute("EVAL", RELEASE_CLAIM_SCRIPT, 1, self._key("claim", key), owner)
+
+    def put_snapshot(self, name: str, payload: str, ttl_seconds: float):
+        self.client.execute("SET", self._key("snapshot", name), payload, "PX", int(ttl_seconds * 1000))
+
+    def get_snapshots(self, prefix: str) -> List[str]:
+        keys = self.client.execute("KEYS", self._key("snapshot", prefix) + "*") or []
+        payloads = []
+        for key in keys:
+            payload = self.client.execute("GET", key)
+            if payload is not None:
+                payloads.append(payload)
+        return payloads
+
+    def close(self):
+        self.client.close()
+
+
+def create_backend(backend: str, url: str) -> CoordinationBackend:
+    """バックエンド名と接続先から調整バックエンドを作成"""
+    if backend == "sqlite":
+        return SQLiteCoordination(url)
+    if backend == "file":
+        return FileCoordination(url)
+    if backend == "redis":
+        return RedisCoordination(url)
+    raise ConfigError(f"Unknown coordination backend: {backend}")
+
+
+class Coordinator:
+    """インスタンス間で監視を分担し、予約試行を確保するクラス"""
+
+    def __init__(
+        self,
+        backend: CoordinationBackend,
+        instance_id: str,
+        instance_index: int = 0,
+        instance_count: int = 1,
+        claim_ttl: float = 300.0,
+        snapshot_ttl: float = 30.0,
+        poll_period: float = 2.0,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.instance_id = instance_id
+        self.instance_index = instance_index
+        self.instance_count = instance_count
+        self.claim_ttl = claim_ttl
+        self.snapshot_ttl = snapshot_ttl
+        self.poll_period = poll_period
+
+        # スキャン結果を共有しているインスタンスの番号（自分を含む）
+        self.live_indexes: Set[int] = set(range(instance_count))
+
+        # 統計
+        self.claims_won = 0
+        self.claims_lost = 0
+
+    @property
+    def rank(self) -> int:
+        """生存しているインスタンスの中での自分の順位"""
+        return sorted(self.live_indexes | {self.instance_index}).index(self.instance_index)
+
+    @property
+    def live_count(self) -> int:
+        return len(self.live_indexes | {self.instance_index})
+
+    def assigned_weeks(self, max_weeks: int) -> Set[int]:
+        """このインスタンスがスキャンする週（0始まり）"""
+        return {week for week in range(max_weeks) if week % self.live_count == self.rank}
+
+    async def wait_for_phase(self):
+        """自分の位相（周期内でのスキャン開始時刻）まで待機する"""
+        offset = self.poll_period * self.rank / self.live_count
+        now = time.time()
+        wait = (offset - now) % self.poll_period
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def share_slots(self, scope: str, slots: List[Dict]) -> List[Dict]:
+        """自分のスキャン結果を共有し、他のインスタンスの結果と合わせた枠一覧を返す
+
+        バックエンドに接続できない場合は自分の結果だけを返す。
+        """
+        payload = json.dumps(
+            {"instance_id": self.instance_id, "index": self.instance_index, "slots": slots},
+            ensure_ascii=False, default=str,
+        )
+        try:
+            await asyncio.to_thread(
+                self.backend.put_snapshot, f"{scope}:{self.instance_id}", payload, self.snapshot_ttl
+            )
+            snapshots = await asyncio.to_thread(self.backend.get_snapshots, f"{scope}:")
+        except Exception as e:
+            self.logger.warning(f"スキャン結果の共有に失敗しました: {e}")
+            return slots
+
+        merged = {get_slot_key(slot): slot for slot in slots}
+        live = {self.instance_index}
+        for raw in snapshots:
+            try:
+                snapshot = json.loads(raw)
+            except ValueError:
+                continue
+            if snapshot.get("instance_id") == self.instance_id:
+                continue
+            live.add(snapshot.get("index", -1))
+            for slot in snapshot.get("slots", []):
+                merged.setdefault(get_slot_key(slot), slot)
+
+        if live != self.live_indexes:
+            self.logger.info(f"監視を分担するインスタンス: {sorted(live)}")
+            self.live_indexes = live
+        return list(merged.values())
+
+    @staticmethod
+    def _claim_key(slot: Dict, profile_id: str) -> str:
+        return f"{profile_id}:{get_slot_key(slot)}"
+
+    async def claim(self, slot: Dict, profile_id: str) -> bool:
+        """予約試行を確保（他のインスタンスが確保済み、またはバックエンドに接続できない場合はFalse）"""
+        try:
+            won = await asyncio.to_thread(
+                self.backend.claim, self._claim_key(slot, profile_id), self.instance_id, self.claim_ttl
+            )
+        except Exception as e:
+            # 二重予約を避けるため、確保できない場合は予約しない
+            self.logger.error(f"予約試行の確保に失敗しました: {e}")
+            return False
+        if won:
+            self.claims_won += 1
+        else:
+            self.claims_lost += 1
+            self.logger.info(f"他のインスタンスが予約中のためスキップ (プロファイル: {profile_id}): {slot.get('text', '')[:50]}")
+        return won
+
+    async def confirm(self, slot: Dict, profile_id: str):
+        """予約成功後、確保を無期限にして他のインスタンスが予約しないようにする"""
+        try:
+            await asyncio.to_thread(self.backend.claim, self._claim_key(slot, profile_id), self.instance_id, None)
+        except Exception as e:
+            self.logger.error(f"予約済みの記録に失敗しました: {e}")
+
+    async def release(self, slot: Dict, profile_id: str):
+        """予約失敗後、他のインスタンスが予約できるよう確保を解放する"""
+        try:
+            await asyncio.to_thread(self.backend.release, self._claim_key(slot, profile_id), self.instance_id)
+        except Exception as e:
+            self.logger.warning(f"予約試行の解放に失敗しました: {e}")
+
+    async def close(self):
+        await asyncio.to_thread(self.backend.close)
+        self.logger.info(f"分散監視を終了しました (確保: {self.claims_won}件, 他インスタンス優先: {self.claims_lost}件)")
+
+
+def create_coordinator() -> Optional[Coordinator]:
+    """設定から分散監視の調整役を作成（COORDINATION_BACKEND=noneの場合はNone）"""
+    backend_name = get_coordination_backend()
+    if backend_name == "none":
+        return None
+    coordinator = Coordinator(
+        create_backend(backend_name, get_coordination_url()),
+        instance_id=get_coordination_instance_id(),
+        instance_index=get_coordination_instance_index(),
+        instance_count=get_coordination_instance_count(),
+        claim_ttl=get_coordination_claim_ttl_seconds(),
+        snapshot_ttl=get_coordination_snapshot_ttl_seconds(),
+        poll_period=get_coordination_poll_period_seconds(),
+    )
+    coordinator.logger.info(
+        f"分散監視を開始します (バックエンド: {backend_name}, インスタンス: {coordinator.instance_id}, "
+        f"番号: {coordinator.instance_index}/{coordinator.instance_count})"
+    )
+    return coordinator
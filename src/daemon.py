@@ -0,0 +1,241 @@
+"""
+常駐モード
+
+ブラウザを起動したまま予約公開カレンダーの監視期間を順に監視し続ける
+制御API（src/control_api.py）から、現在の状態（フェーズ・スキャン頻度・直近のスキャン時間・
+検出済みの枠・予約キュー）を確認でき、再起動せずに監視期間の追加・ポーリングの一時停止・
+スキャン間隔の変更ができる（ブラウザとカレンダーページの読み込み状態はそのまま保たれる）
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from src.scheduler import Scheduler
+from src.scraper import AirReserveScraper
+from src.booker import AirReserveBooker
+from src.ledger import open_ledger
+from src.pipeline import SlotPipeline
+from src.profiles import load_profiles
+from src.release_calendar import ReleaseCalendar, ReleaseWindow
+from src.config import ConfigError, get_daemon_poll_interval_seconds
+
+
+# 状態に含めるトリガー履歴の件数
+STATUS_TRIGGER_LOG_SIZE = 10
+
+
+class RuntimeControl:
+    """実行中に変更できる監視の設定（ポーリングの一時停止・スキャン間隔）"""
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self.paused = False
+        self._resumed: Optional[asyncio.Event] = None
+
+    def _event(self) -> asyncio.Event:
+        if self._resumed is None:
+            self._resumed = asyncio.Event()
+            if not self.paused:
+                self._resumed.set()
+        return self._resumed
+
+    def pause(self):
+        """ポーリングを一時停止（実行中のスキャン・予約は最後まで実行する）"""
+        self.paused = True
+        self._event().clear()
+
+    def resume(self):
+        """ポーリングを再開"""
+        self.paused = False
+        self._event().set()
+
+    async def gate(self):
+        """スキャン前に呼ばれ、一時停止中は再開されるまで待機する"""
+        await self._event().wait()
+
+
+class MonitorDaemon(Scheduler):
+    """常駐モード
+
+    Schedulerと同じく監視期間ごとに準備・監視を行うが、ブラウザは最初に1回だけ起動し、監視期間をまたいで使い回す。
+    今後の監視期間がない場合も終了せず、制御APIから監視期間が追加されるまで待機する。
+    """
+
+    def __init__(self, calendar: Optional[ReleaseCalendar] = None):
+        super().__init__(calendar)
+        self.control = RuntimeControl(get_daemon_poll_interval_seconds())
+        # starting → idle（監視期間なし）/ waiting（準備開始待ち）→ preparing → monitoring → ... → stopped
+        self.phase = "starting"
+        self.pipeline: Optional[SlotPipeline] = None
+        self.scraper: Optional[AirReserveScraper] = None
+        self.bookers: List = []
+        self._stopping = False
+        self._calendar_changed: Optional[asyncio.Event] = None
+
+    def _changed_event(self) -> asyncio.Event:
+        if self._calendar_changed is None:
+            self._calendar_changed = asyncio.Event()
+        return self._calendar_changed
+
+    async def start(self):
+        """常駐モードを開始（stopが呼ばれるまで戻らない）"""
+        self.logger.info("常駐モードを開始します")
+        try:
+            async with self._open_session() as (scraper, bookers):
+                self.scraper, self.bookers = scraper, bookers
+                after = datetime.now()
+                while not self._stopping:
+                    window = self.calendar.next_window(max(after, datetime.now()))
+                    if window is None:
+                        self.phase = "idle"
+                        self.logger.info("今後の予約公開日時はありません。監視期間が追加されるまで待機します")
+                        await self._wait_for_change()
+                        continue
+                    if await self._run_window(window):
+                        # 同じ監視期間を繰り返さないよう、終了時刻以降の監視期間を探す
+                        after = window.end
+        finally:
+            self.phase = "stopped"
+            await self.notifier.close()
+            self.logger.info("常駐モードを終了しました")
+
+    def stop(self):
+        """常駐モードを終了する（待機中はすぐに、監視中は監視期間の終了後に戻る）"""
+        self._stopping = True
+        self._changed_event().set()
+
+    @asynccontextmanager
+    async def _open_session(self):
+        """常駐中に使い回すブラウザと予約者プロファイルごとのブッカーを用意する"""
+        ledger = open_ledger()
+        try:
+            bookers = [AirReserveBooker(profile, ledger=ledger) for profile in load_profiles()]
+            scraper = AirReserveScraper(bookers=bookers, target=self.target)
+            async with scraper:
+                yield scraper, bookers
+        finally:
+            if ledger:
+                ledger.close()
+
+    async def _run_window(self, window: ReleaseWindow) -> bool:
+        """1つの監視期間の準備から監視終了までを実行（準備開始前にカレンダーが変わった場合はFalse）"""
+        self.window = window
+        self.release_datetime = window.release_datetime
+        self.booking_succeeded = False
+
+        prepare_at = window.start - timedelta(seconds=self.prepare_seconds)
+        self.logger.info(f"監視開始時刻をスケジュール: {window.start} (準備開始: {prepare_at})")
+
+        self.phase = "waiting"
+        if not await self._wait_for_prepare(prepare_at):
+            self.logger.info("予約公開カレンダーが変更されたため、次の監視期間を計算し直します")
+            return False
+
+        self.phase = "preparing"
+        try:
+            await self._start_monitoring_job()
+        finally:
+            self.pipeline = None
+        return True
+
+    async def _wait_for_prepare(self, prepare_at: datetime) -> bool:
+        """準備開始時刻まで待機（カレンダーの変更・終了でFalseを返す）"""
+        changed = self._changed_event()
+        changed.clear()
+        if self._stopping:
+            return False
+        trigger = asyncio.create_task(self._trigger("prepare", prepare_at))
+        interrupted = asyncio.create_task(changed.wait())
+        done, pending = await asyncio.wait({trigger, interrupted}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return trigger in done
+
+    async def _wait_for_change(self):
+        """カレンダーの変更・終了まで待機"""
+        changed = self._changed_event()
+        changed.clear()
+        if not self._stopping:
+            await changed.wait()
+
+    async def _monitor_and_book(self):
+        """起動済みのブラウザでカレンダーページを読み込み直し、監視と予約を実行"""
+        self.scraper.release_datetime = self.release_datetime
+        if not await self.scraper.load_calendar_page():
+            self.logger.error("カレンダーページの読み込みに失敗しました")
+            return
+        await self._monitor_window(self.scraper, self.bookers)
+
+    def _create_pipeline(self, scraper: AirReserveScraper, bookers, coordinator) -> SlotPipeline:
+        """一時停止とスキャン間隔の変更を反映するパイプラインを作成"""
+        self.phase = "monitoring"
+        self.pipeline = SlotPipeline(
+            scraper, bookers=bookers, notifier=self.notifier, poll_gate=self.control.gate,
+            check_interval=self.control.poll_interval, book_once=True,
+            coordinator=coordinator, target_id=scraper.target.target_id,
+        )
+        return self.pipeline
+
+    # 制御APIから呼ばれる操作
+
+    def add_window(self, release_datetime: datetime) -> Optional[ReleaseWindow]:
+        """予約公開日時を追加し、その監視期間を返す（既に終わった日時はConfigError）"""
+        duration = timedelta(minutes=self.calendar.monitor_duration_minutes)
+        if release_datetime + duration <= datetime.now():
+            raise ConfigError(f"Release datetime has already passed: {release_datetime}")
+        if release_datetime not in self.calendar.dates:
+            self.calendar.dates = sorted(self.calendar.dates + [release_datetime])
+            self.logger.info(f"予約公開日時を追加しました: {release_datetime}")
+            self._changed_event().set()
+        for window in self.calendar.upcoming_windows():
+            if release_datetime in window.releases:
+                return window
+        return None
+
+    def set_poll_interval(self, seconds: float):
+        """スキャン間隔を変更（監視中のパイプラインには次のスキャンから反映する）"""
+        if seconds < 0:
+            raise ConfigError("Poll interval must be 0 or greater")
+        self.control.poll_interval = seconds
+        if self.pipeline:
+            self.pipeline.check_interval = seconds
+        self.logger.info(f"スキャン間隔を変更しました: {seconds}秒")
+
+    def pause(self):
+        """ポーリングを一時停止"""
+        self.control.pause()
+        self.logger.info("ポーリングを一時停止しました")
+
+    def resume(self):
+        """ポーリングを再開"""
+        self.control.resume()
+        self.logger.info("ポーリングを再開しました")
+
+    def status(self) -> Dict:
+        """現在の状態"""
+        pipeline = self.pipeline
+        scanner = pipeline.metrics['scanner'] if pipeline else None
+        return {
+            'phase': self.phase,
+            'paused': self.control.paused,
+            'poll_interval_seconds': self.control.poll_interval,
+            'scans_per_second': pipeline.scans_per_second() if pipeline else None,
+            'last_scan_seconds': scanner.last_seconds if scanner and scanner.processed else None,
+            'window': _window_dict(self.window) if self.window else None,
+            'upcoming_windows': [_window_dict(window) for window in self.calendar.upcoming_windows()],
+            'booking_succeeded': self.booking_succeeded,
+            'slots': list(pipeline.last_slots) if pipeline else [],
+            'queued_bookings': list(pipeline.booking_jobs.values()) if pipeline else [],
+            'trigger_log': self.trigger_log[-STATUS_TRIGGER_LOG_SIZE:],
+        }
+
+
+def _window_dict(window: ReleaseWindow) -> Dict:
+    return {
+        'start': window.start,
+        'end': window.end,
+        'releases': list(window.releases),
+    }
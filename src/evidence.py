@@ -0,0 +1,145 @@
+"""
+証跡キャプチャ機能
+
+予約フローの証跡（スクリーンショット・HTMLスナップショット）を取得する
+ページからの取得だけをその場で開始し、ディスクへの書き込みは
+バックグラウンドタスクがキューから順に処理するため、予約の送信処理を待たせない
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+from src.config import (
+    get_evidence_format,
+    get_evidence_jpeg_quality,
+    get_evidence_dir,
+    get_evidence_queue_size,
+)
+
+
+# 形式ごとのファイル拡張子
+EVIDENCE_EXTENSIONS = {
+    "full": "png",
+    "viewport": "png",
+    "jpeg": "jpg",
+    "html": "html",
+}
+
+
+class EvidenceCapture:
+    """証跡キャプチャ管理クラス"""
+
+    def __init__(
+        self,
+        evidence_format: Optional[str] = None,
+        jpeg_quality: Optional[int] = None,
+        output_dir: Optional[str] = None,
+        queue_size: Optional[int] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.evidence_format = evidence_format or get_evidence_format()
+        self.jpeg_quality = jpeg_quality or get_evidence_jpeg_quality()
+        self.output_dir = output_dir or get_evidence_dir()
+        self.queue_size = queue_size or get_evidence_queue_size()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def build_filename(self, prefix: str) -> str:
+        """保存先ファイル名を生成"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        extension = EVIDENCE_EXTENSIONS[self.evidence_format]
+        return str(Path(self.output_dir) / f"{prefix}_{timestamp}.{extension}")
+
+    async def capture(self, page, prefix: str = "booking") -> str:
+        """証跡の取得を開始する
+
+        ページからの取得リクエストをブラウザへ送出した時点で戻る。
+        画像のエンコードやディスクへの書き込みの完了は待たない。
+
+        Args:
+            page: 対象のPlaywrightページ
+            prefix: ファイル名の接頭辞
+
+        Returns:
+            str: 保存予定のファイル名
+        """
+        self._ensure_writer()
+        filename = self.build_filename(prefix)
+
+        task = asyncio.create_task(self._grab_and_enqueue(page, filename))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+        # 取得タスクを一度だけ走らせ、現在のページ状態への取得リクエストを先に送出させる
+        await asyncio.sleep(0)
+        return filename
+
+    def _ensure_writer(self):
+        """書き込みタスクを起動（未起動の場合のみ）"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def _grab(self, page) -> bytes:
+        """ページから証跡データを取得"""
+        if self.evidence_format == "html":
+            content = await page.content()
+            return content.encode("utf-8")
+        if self.evidence_format == "jpeg":
+            return await page.screenshot(type="jpeg", quality=self.jpeg_quality)
+        if self.evidence_format == "viewport":
+            return await page.screenshot(type="png")
+        return await page.screenshot(type="png", full_page=True)
+
+    async def _grab_and_enqueue(self, page, filename: str):
+        """証跡データを取得して書き込みキューに積む"""
+        try:
+            data = await self._grab(page)
+        except Exception as e:
+            self.logger.error(f"証跡の取得エラー ({filename}): {e}")
+            return
+        await self._queue.put((filename, data))
+
+    async def _writer(self):
+        """キューに積まれた証跡をディスクへ書き込む"""
+        while True:
+            item: Tuple[str, bytes] = await self._queue.get()
+            filename, data = item
+            try:
+                await asyncio.to_thread(self._write_file, filename, data)
+                self.logger.info(f"証跡を保存: {filename}")
+            except Exception as e:
+                self.logger.error(f"証跡の保存エラー ({filename}): {e}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write_file(filename: str, data: bytes):
+        """ファイルへ書き込む（ワーカースレッドで実行）"""
+        path = Path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    async def flush(self):
+        """取得中・書き込み待ちの証跡がすべて保存されるまで待機"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """残りの証跡を保存して書き込みタスクを停止"""
+        await self.flush()
+        if self._writer_task and not self._writer_task.done():
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._writer_task = None
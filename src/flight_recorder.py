@@ -0,0 +1,204 @@
+"""
+フライトレコーダー
+
+予約フロー中のDOM・ネットワークイベントを直近N秒分だけメモリに保持し、
+予約ステップが失敗した場合にのみディスクへ書き出す
+正常終了時は何も書き出さないため、通常の実行ではほぼコストがかからない
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from src.config import (
+    get_flight_recorder_mode,
+    get_flight_recorder_window_seconds,
+    get_flight_recorder_max_events,
+    get_flight_recorder_dir,
+)
+
+
+class _ContextRecording:
+    """1つのブラウザコンテキストの記録（イベントのリングバッファとトレースの状態）"""
+
+    def __init__(self, max_events: int):
+        self.events: Deque[Dict] = deque(maxlen=max_events)
+        self.tracing = False
+        self.chunk_active = False
+
+
+class FlightRecorder:
+    """直近イベントのリングバッファを管理するクラス
+
+    予約用コンテキストプールでは1つのブッカーが複数のページで同時に予約・先読みするため、
+    イベントとトレースの状態はブラウザコンテキストごとに分けて保持する
+    （書き出すのは失敗したページのコンテキストの記録のみ）。
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        window_seconds: Optional[float] = None,
+        max_events: Optional[int] = None,
+        output_dir: Optional[str] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode or get_flight_recorder_mode()
+        self.window_seconds = window_seconds or get_flight_recorder_window_seconds()
+        self.max_events = max_events or get_flight_recorder_max_events()
+        self.output_dir = output_dir or get_flight_recorder_dir()
+
+        # コンテキストごとの記録（閉じられたコンテキストの記録は自動で破棄される）
+        self._recordings: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # コンテキストを持たないページ用の記録
+        self._default = _ContextRecording(self.max_events)
+        # リスナー登録済みのページ（作り直されたページをid()の再利用で登録済みと誤認しないよう弱参照で持つ）
+        self._attached_pages: "weakref.WeakSet" = weakref.WeakSet()
+
+    @property
+    def enabled(self) -> bool:
+        """記録が有効かどうか"""
+        return self.mode != "off"
+
+    @property
+    def events(self) -> Deque[Dict]:
+        """コンテキストを持たないページ用のイベント"""
+        return self._default.events
+
+    def _recording(self, context) -> _ContextRecording:
+        """コンテキストの記録を取得（なければ作成）"""
+        if context is None:
+            return self._default
+        recording = self._recordings.get(context)
+        if recording is None:
+            recording = _ContextRecording(self.max_events)
+            self._recordings[context] = recording
+        return recording
+
+    @staticmethod
+    def _context_of(page):
+        return getattr(page, "context", None)
+
+    def record(self, kind: str, context=None, **fields):
+        """イベントを記録（保持期間を過ぎた古いイベントは破棄）"""
+        events = self._recording(context).events
+        now = time.monotonic()
+        events.append({"t": now, "wall": time.time(), "kind": kind, **fields})
+        threshold = now - self.window_seconds
+        while events and events[0]["t"] < threshold:
+            events.popleft()
+
+    async def attach(self, page):
+        """ページにイベントリスナーを登録（同じページへの二重登録はしない）"""
+        if not self.enabled or page in self._attached_pages:
+            return
+        self._attached_pages.add(page)
+        context = self._context_of(page)
+        recording = self._recording(context)
+
+        def record(kind, **fields):
+            self.record(kind, context, **fields)
+
+        def on_navigated(frame):
+            if frame == page.main_frame:
+                record("navigated", url=frame.url)
+
+        page.on("framenavigated", on_navigated)
+        page.on("request", lambda request: record("request", method=request.method, url=request.url))
+        page.on("response", lambda response: record("response", status=response.status, url=response.url))
+        page.on("requestfailed", lambda request: record("requestfailed", url=request.url, failure=request.failure))
+        page.on("console", lambda message: record("console", type=message.type, text=message.text))
+        page.on("pageerror", lambda error: record("pageerror", error=str(error)))
+
+        if self.mode == "trace" and context is not None and not recording.tracing:
+            try:
+                await context.tracing.start(snapshots=True, screenshots=False)
+                recording.tracing = True
+                recording.chunk_active = True
+            except Exception as e:
+                self.logger.warning(f"トレースを開始できませんでした: {e}")
+
+    async def begin(self, page):
+        """予約試行の開始（トレースの新しいチャンクを開始）"""
+        recording = self._recording(self._context_of(page))
+        if self.mode != "trace" or not recording.tracing or recording.chunk_active:
+            return
+        try:
+            await page.context.tracing.start_chunk()
+            recording.chunk_active = True
+        except Exception as e:
+            self.logger.debug(f"トレースチャンクの開始に失敗: {e}")
+
+    async def end(self, page):
+        """予約試行の正常終了（このコンテキストの保持中のイベントとトレースチャンクを破棄）"""
+        recording = self._recording(self._context_of(page))
+        # プールで次の予約に使われたときに、この予約のイベントを書き出さないようにする
+        recording.events.clear()
+        if self.mode != "trace" or not recording.chunk_active:
+            return
+        try:
+            await page.context.tracing.stop_chunk()
+        except Exception as e:
+            self.logger.debug(f"トレースチャンクの破棄に失敗: {e}")
+        finally:
+            recording.chunk_active = False
+
+    async def dump(self, page, reason: str) -> Optional[str]:
+        """ページのコンテキストで保持中のイベント・DOM・トレースを書き出す
+
+        Args:
+            page: 対象のPlaywrightページ
+            reason: 失敗理由（ディレクトリ名に使用）
+
+        Returns:
+            Optional[str]: 出力先ディレクトリ（記録が無効な場合はNone）
+        """
+        if not self.enabled:
+            return None
+
+        recording = self._recording(self._context_of(page))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        record_dir = Path(self.output_dir) / f"{timestamp}_{reason}"
+        events = list(recording.events)
+        recording.events.clear()
+
+        html = None
+        try:
+            html = await page.content()
+        except Exception as e:
+            self.logger.debug(f"DOMの取得に失敗: {e}")
+
+        if self.mode == "trace" and recording.chunk_active:
+            try:
+                record_dir.mkdir(parents=True, exist_ok=True)
+                await page.context.tracing.stop_chunk(path=str(record_dir / "trace.zip"))
+            except Exception as e:
+                self.logger.warning(f"トレースの書き出しに失敗: {e}")
+            finally:
+                recording.chunk_active = False
+
+        try:
+            await asyncio.to_thread(self._write_record, record_dir, reason, page.url, events, html)
+            self.logger.info(f"フライトレコードを保存: {record_dir} ({len(events)}件のイベント)")
+            return str(record_dir)
+        except Exception as e:
+            self.logger.error(f"フライトレコードの保存エラー: {e}")
+            return None
+
+    @staticmethod
+    def _write_record(record_dir: Path, reason: str, url: str, events: List[Dict], html: Optional[str]):
+        """記録をファイルへ書き込む（ワーカースレッドで実行）"""
+        record_dir.mkdir(parents=True, exist_ok=True)
+        with open(record_dir / "events.jsonl", "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        meta = {"reason": reason, "url": url, "event_count": len(events), "saved_at": datetime.now().isoformat()}
+        (record_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        if html is not None:
+            (record_dir / "page.html").write_text(html, encoding="utf-8")
@@ -0,0 +1,143 @@
+"""
+HARの記録・再生
+
+実サイトのマークアップは予告なく変わり、手で作ったテスト用のページとはずれていくため、
+実サイトでの予約の流れ（STOP_BEFORE_SUBMITで確認画面まで）の通信をHARに記録し、
+再生時はPlaywrightのルートの横取り（route_from_har）で記録した応答をブラウザに返す
+ネットワークに接続せずに、固定した実サイトの挙動に対してスクレイパー・ブッカーを動かして計測できる
+
+記録はブラウザのコンテキストごとにファイルを分け（監視用・予約用）、終了時に1つのHAR（session.har）にまとめる
+再生時はすべてのコンテキストで session.har を使う
+
+HARには予約者情報（名前・メールアドレス・電話番号）の入力が含まれるため、リポジトリにコミットしないこと
+（POSTはリクエスト本文まで一致した記録を返すため、再生時は記録時と同じ予約者プロファイルを使う）
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from src.config import ConfigError, get_har_dir, get_har_mode, get_har_not_found
+
+
+# まとめたHARのファイル名
+SESSION_FILE = "session.har"
+
+
+def load_har(path: str) -> Dict:
+    """HARファイルを読み込む"""
+    try:
+        har = json.loads(Path(path).read_text(encoding="utf-8"))
+        har['log']['entries']
+        return har
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise ConfigError(f"Failed to load HAR {path}: {e}")
+
+
+def merge_har_files(paths: List[str], output: str, metadata: Optional[Dict] = None) -> Dict:
+    """複数のHARのエントリを開始時刻順に1つのHARにまとめる
+
+    metadata（記録した監視対象のURLなど）はHARの独自フィールド _airbooker に保存する
+    """
+    merged: Optional[Dict] = None
+    entries = []
+    for path in paths:
+        har = load_har(path)
+        if merged is None:
+            merged = {'log': {key: value for key, value in har['log'].items() if key not in ('entries', 'pages')}}
+            merged['log']['pages'] = []
+        merged['log']['pages'].extend(har['log'].get('pages', []))
+        entries.extend(har['log']['entries'])
+    if merged is None:
+        raise ConfigError("No HAR files to merge")
+    entries.sort(key=lambda entry: entry.get('startedDateTime', ''))
+    merged['log']['entries'] = entries
+    if metadata:
+        merged['log']['_airbooker'] = metadata
+
+    output_path = Path(output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(merged, ensure_ascii=False), encoding="utf-8")
+    tmp_path.replace(output_path)
+    return merged
+
+
+def summarize_har(path: str) -> Dict:
+    """HARの件数・ホスト・記録時の情報をまとめる"""
+    har = load_har(path)
+    entries = har['log']['entries']
+    hosts: Dict[str, int] = {}
+    for entry in entries:
+        host = urlsplit(entry.get('request', {}).get('url', '')).netloc
+        hosts[host] = hosts.get(host, 0) + 1
+    return {
+        'entries': len(entries),
+        'documents': sum(1 for entry in entries if 'text/html' in entry.get('response', {}).get('content', {}).get('mimeType', '')),
+        'hosts': hosts,
+        'metadata': har['log'].get('_airbooker', {}),
+    }
+
+
+class HarSession:
+    """ブラウザのコンテキストごとの記録・再生"""
+
+    def __init__(self, mode: str = "off", directory: str = "har", not_found: str = "abort"):
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode
+        self.directory = Path(directory)
+        self.not_found = not_found
+        # 記録中のHAR（コンテキスト名 → パス）
+        self.recordings: Dict[str, Path] = {}
+
+    @classmethod
+    def from_env(cls) -> "HarSession":
+        return cls(get_har_mode(), get_har_dir(), get_har_not_found())
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def session_path(self) -> Path:
+        return self.directory / SESSION_FILE
+
+    def _context_options(self, name: str) -> Dict:
+        """記録時にコンテキストの作成に加えるオプション"""
+        if self.mode != "record":
+            return {}
+        path = self.directory / "contexts" / f"{name}.har"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.recordings[name] = path
+        # 再生時にPOSTの本文や画像も返せるよう、すべての通信を本文ごと記録する
+        return {'record_har_path': str(path), 'record_har_content': "embed", 'record_har_mode': "full"}
+
+    async def new_context(self, browser, name: str, **options):
+        """記録・再生を設定したコンテキストを作成
+
+        Args:
+            browser: Playwrightのブラウザ
+            name: コンテキストの名前（記録するファイル名に使う）
+            options: browser.new_context に渡すオプション
+        """
+        context = await browser.new_context(**options, **self._context_options(name))
+        if self.mode == "replay":
+            if not self.session_path.exists():
+                await context.close()
+                raise ConfigError(f"HAR for replay not found: {self.session_path} (record it with HAR_MODE=record)")
+            await context.route_from_har(str(self.session_path), not_found=self.not_found)
+        return context
+
+    def finish(self, target_url: Optional[str] = None) -> Optional[Path]:
+        """記録したHARを session.har にまとめる（コンテキストを閉じた後に呼ぶ）"""
+        paths = [str(path) for path in self.recordings.values() if path.exists()]
+        if self.mode != "record" or not paths:
+            return None
+        metadata = {'target_url': target_url, 'recorded_at': datetime.now().isoformat(timespec="seconds")}
+        merged = merge_har_files(paths, str(self.session_path), metadata)
+        self.logger.info(f"HARを保存しました: {self.session_path} ({len(merged['log']['entries'])}件)")
+        self.recordings = {}
+        return self.session_path
@@ -0,0 +1,428 @@
+"""
+予約枠の履歴
+
+スキャンで見た予約枠の状態（残席数・表示の有無）を、変化したときだけSQLite（WALモード）へ追記する
+スキャンごとではなく変化ごとに1行のため、1秒間隔で監視しても行数は枠の数と変化の回数に比例する
+行はメモリにためて、HISTORY_FLUSH_SECONDS 秒ごと、または HISTORY_BATCH_SIZE 行たまったときにまとめて書き込む
+書き込みはバックグラウンドのスレッドで行い、スキャン結果の比較（observe）ではSQLiteに触れない
+
+状態:
+    available: 予約可能として表示されている（残席表示がない場合を含む）
+    full: 残0として表示されている
+    gone: カレンダーから消えた
+
+監視を開始して最初のスキャンで見えた枠は initial として記録する（実際に公開された時刻はそれより前）
+監視していた期間（最初と最後のスキャンの時刻）も監視対象ごとに1行記録し、枠が出る頻度の計算に使う
+
+使用方法:
+    python -m src.history --date 2026-11-05
+"""
+
+import argparse
+import logging
+import sqlite3
+import statistics
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from src.config import (
+    get_history_batch_size,
+    get_history_enabled,
+    get_history_flush_seconds,
+    get_history_path,
+)
+from src.slots import get_slot_date, get_slot_key, parse_remaining_seats, parse_slot_minutes
+
+
+STATUS_AVAILABLE = "available"
+STATUS_FULL = "full"
+STATUS_GONE = "gone"
+
+# (残席数, 状態, 日付, 時刻, テキスト)
+SlotState = Tuple[Optional[int], str, Optional[str], Optional[str], str]
+
+
+def slot_state(slot_info: Dict) -> SlotState:
+    """枠の状態を取得"""
+    text = slot_info.get('text', '')
+    seats = parse_remaining_seats(text)
+    slot_date = get_slot_date(slot_info)
+    minutes = parse_slot_minutes(text)
+    return (
+        seats,
+        STATUS_FULL if seats == 0 else STATUS_AVAILABLE,
+        slot_date.strftime('%Y-%m-%d') if slot_date else None,
+        f"{minutes // 60:02d}:{minutes % 60:02d}" if minutes is not None else None,
+        text,
+    )
+
+
+class SlotHistory:
+    """予約枠の履歴（追記のみ）"""
+
+    def __init__(self, path: Optional[str] = None, flush_seconds: float = 5.0, batch_size: int = 100):
+        self.logger = logging.getLogger(__name__)
+        # パスを指定しない場合は記録しない
+        self.path = path
+        self.enabled = path is not None
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+
+        # 監視対象ID → スロットキー → 前回のスキャンでの状態
+        self._state: Dict[str, Dict[str, SlotState]] = {}
+        self._pending: List[Tuple] = []
+        # 監視対象ID → [監視期間ID, 最初のスキャンの時刻, 最後のスキャンの時刻]
+        self._sessions: Dict[str, List[str]] = {}
+        # 終了した監視期間（次の書き込みで記録する）
+        self._finished: List[Tuple[str, str, str, str]] = []
+        self._sessions_changed = False
+        # ためた行・監視期間を入れ替えるためのロック（SQLiteへの書き込み中は保持しない）
+        self._buffer_lock = threading.Lock()
+        # SQLiteの接続を使うためのロック
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        if not self.enabled:
+            return
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS slot_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                target_id TEXT NOT NULL,
+                slot_key TEXT NOT NULL,
+                slot_date TEXT,
+                slot_time TEXT,
+                seats INTEGER,
+                status TEXT NOT NULL,
+                initial INTEGER NOT NULL,
+                observed_at TEXT NOT NULL,
+                text TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS slot_changes_date ON slot_changes (slot_date)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS slot_changes_slot ON slot_changes (target_id, slot_key)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scan_sessions (
+                session_id TEXT PRIMARY KEY,
+                target_id TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                ended_at TEXT NOT NULL
+            )
+            """
+        )
+        self._writer = threading.Thread(target=self._run_writer, name="slot-history-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> "SlotHistory":
+        """設定から作成（HISTORY_ENABLED=falseの場合は記録しない）"""
+        if not get_history_enabled():
+            return cls()
+        return cls(get_history_path(), flush_seconds=get_history_flush_seconds(), batch_size=get_history_batch_size())
+
+    def observe(self, target_id: str, slots: List[Dict], observed_at: Optional[datetime] = None) -> int:
+        """1回のスキャン結果を前回と比べ、変化した枠の行をためる（ためた行数を返す）
+
+        メモリ上の処理だけで、書き込みはバックグラウンドのスレッドが行う。
+        """
+        if not self.enabled:
+            return 0
+        observed = (observed_at or datetime.now()).isoformat(timespec="milliseconds")
+        previous = self._state.get(target_id)
+        initial = int(previous is None)
+        previous = previous or {}
+
+        current: Dict[str, SlotState] = {}
+        rows = []
+        for slot in slots:
+            key = get_slot_key(slot)
+            state = slot_state(slot)
+            current[key] = state
+            last = previous.get(key)
+            if last is None or last[:2] != state[:2]:
+                seats, status, slot_date, slot_time, text = state
+                rows.append((target_id, key, slot_date, slot_time, seats, status, initial, observed, text))
+        for key in previous.keys() - current.keys():
+            _, _, slot_date, slot_time, text = previous[key]
+            rows.append((target_id, key, slot_date, slot_time, None, STATUS_GONE, 0, observed, text))
+        self._state[target_id] = current
+
+        with self._buffer_lock:
+            session = self._sessions.setdefault(target_id, [uuid.uuid4().hex, observed, observed])
+            session[2] = observed
+            self._sessions_changed = True
+            self._pending.extend(rows)
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+        return len(rows)
+
+    def _run_writer(self):
+        """HISTORY_FLUSH_SECONDS 秒ごと、または行がたまって起こされたときに書き込む"""
+        while not self._stopping:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            if self._stopping:
+                break
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                # 書き込めなかった行は戻してあるため、次の書き込みで再試行する
+                self.logger.warning(f"予約枠の履歴を書き込めませんでした: {e}")
+
+    def flush(self):
+        """ためた行を1回のトランザクションで書き込む"""
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._buffer_lock:
+                if not (self._pending or self._sessions_changed or self._finished):
+                    return
+                rows, self._pending = self._pending, []
+                finished, self._finished = self._finished, []
+                sessions = finished + [
+                    (session_id, target_id, started, ended)
+                    for target_id, (session_id, started, ended) in self._sessions.items()
+                ]
+                self._sessions_changed = False
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO slot_changes (target_id, slot_key, slot_date, slot_time, seats, status, initial, "
+                    "observed_at, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_sessions (session_id, target_id, started_at, ended_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    sessions,
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                with self._buffer_lock:
+                    self._pending[:0] = rows
+                    self._finished[:0] = finished
+                    self._sessions_changed = True
+                raise
+        self.logger.debug("予約枠の履歴を書き込みました", extra={'rows': len(rows)})
+
+    def finish(self, target_id: str):
+        """監視期間の終了（次のスキャンからは新しい監視期間として記録する）"""
+        if not self.enabled:
+            return
+        with self._buffer_lock:
+            session = self._sessions.pop(target_id, None)
+            if session is not None:
+                self._finished.append((session[0], target_id, session[1], session[2]))
+            self._state.pop(target_id, None)
+        self._wake.set()
+
+    def changes(self, slot_date: Union[date, str, None] = None, target_id: Optional[str] = None) -> List[Dict]:
+        """記録した変化を古い順に取得"""
+        if self._conn is None:
+            return []
+        self.flush()
+        conditions, params = [], []
+        if slot_date is not None:
+            conditions.append("slot_date = ?")
+            params.append(str(slot_date))
+        if target_id is not None:
+            conditions.append("target_id = ?")
+            params.append(target_id)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT target_id, slot_key, slot_date, slot_time, seats, status, initial, observed_at, text "
+                f"FROM slot_changes{where} ORDER BY id",
+                params,
+            )
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        changes = []
+        for row in rows:
+            change = dict(zip(columns, row))
+            change['initial'] = bool(change['initial'])
+            change['observed_at'] = datetime.fromisoformat(change['observed_at'])
+            changes.append(change)
+        return changes
+
+    def sessions(self, target_id: Optional[str] = None) -> List[Tuple[datetime, datetime]]:
+        """監視していた期間（最初と最後のスキャンの時刻）を古い順に取得"""
+        if self._conn is None:
+            return []
+        self.flush()
+        where, params = (" WHERE target_id = ?", [target_id]) if target_id is not None else ("", [])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT started_at, ended_at FROM scan_sessions{where} ORDER BY started_at", params
+            ).fetchall()
+        return [(datetime.fromisoformat(started), datetime.fromisoformat(ended)) for started, ended in rows]
+
+    def lifecycles(self, slot_date: Union[date, str, None] = None, target_id: Optional[str] = None) -> List[Dict]:
+        """枠ごとに、表示された時刻・満席（または消えた）時刻・その後に再び予約可能になった時刻を取得
+
+        再び予約可能になった時刻（reopened）はキャンセルや手作業での追加による。
+        """
+        slots: Dict[Tuple[str, str], Dict] = {}
+        last_status: Dict[Tuple[str, str], str] = {}
+        for change in self.changes(slot_date, target_id):
+            key = (change['target_id'], change['slot_key'])
+            status = change['status']
+            slot = slots.get(key)
+            if slot is None:
+                if status != STATUS_AVAILABLE:
+                    continue
+                slots[key] = slot = {
+                    'target_id': change['target_id'],
+                    'slot_key': change['slot_key'],
+                    'slot_date': change['slot_date'],
+                    'slot_time': change['slot_time'],
+                    'text': change['text'],
+                    'appeared_at': change['observed_at'],
+                    'initial': change['initial'],
+                    'seats': change['seats'],
+                    'sold_out_at': None,
+                    'sell_out_seconds': None,
+                    'reopened': [],
+                }
+            elif status == STATUS_AVAILABLE:
+                if last_status[key] != STATUS_AVAILABLE:
+                    slot['reopened'].append(change['observed_at'])
+            elif last_status[key] == STATUS_AVAILABLE and slot['sold_out_at'] is None:
+                slot['sold_out_at'] = change['observed_at']
+                slot['sell_out_seconds'] = (change['observed_at'] - slot['appeared_at']).total_seconds()
+            last_status[key] = status
+        return sorted(slots.values(), key=lambda slot: slot['appeared_at'])
+
+    def date_report(self, slot_date: Union[date, str], target_id: Optional[str] = None) -> Dict:
+        """指定した日付の枠が、いつ表示され、どれだけの時間で満席になったか
+
+        監視開始時に既に表示されていた枠（initial）は、表示された時刻・満席までの時間の集計から除く。
+        """
+        lifecycles = self.lifecycles(slot_date, target_id)
+        observed = [slot for slot in lifecycles if not slot['initial']]
+        sell_out = [slot['sell_out_seconds'] for slot in observed if slot['sell_out_seconds'] is not None]
+        return {
+            'date': str(slot_date),
+            'slots': len(lifecycles),
+            'already_listed': len(lifecycles) - len(observed),
+            'first_appeared_at': observed[0]['appeared_at'] if observed else None,
+            'last_appeared_at': observed[-1]['appeared_at'] if observed else None,
+            'sold_out': sum(1 for slot in lifecycles if slot['sold_out_at'] is not None),
+            'sell_out_seconds': {
+                'median': statistics.median(sell_out) if sell_out else None,
+                'max': max(sell_out) if sell_out else None,
+            },
+            'reopened': sum(len(slot['reopened']) for slot in lifecycles),
+            'lifecycles': lifecycles,
+        }
+
+    def dates(self) -> List[Tuple[str, int]]:
+        """記録がある枠の日付と枠の数"""
+        if self._conn is None:
+            return []
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT slot_date, COUNT(DISTINCT target_id || '|' || slot_key) FROM slot_changes "
+                "WHERE slot_date IS NOT NULL GROUP BY slot_date ORDER BY slot_date"
+            ).fetchall()
+
+    def close(self):
+        """書き込みのスレッドを止め、ためた行を書き込んで閉じる"""
+        if self._conn is None:
+            return
+        if self._writer is not None:
+            self._stopping = True
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+
+_history: Optional[SlotHistory] = None
+
+
+def get_history() -> SlotHistory:
+    """プロセス全体で共有する予約枠の履歴（main.pyで開くまでは記録しない）"""
+    global _history
+    if _history is None:
+        _history = SlotHistory()
+    return _history
+
+
+def set_history(history: Optional[SlotHistory]):
+    """共有する予約枠の履歴を差し替える"""
+    global _history
+    _history = history
+
+
+def open_history() -> SlotHistory:
+    """設定から予約枠の履歴を開き、共有する履歴に設定する"""
+    history = SlotHistory.from_env()
+    set_history(history)
+    return history
+
+
+def log_report(report: Dict):
+    """日付ごとの集計をログに出力"""
+    logger = logging.getLogger(__name__)
+    logger.info(
+        f"{report['date']}: {report['slots']}枠（監視開始時に表示済み {report['already_listed']}枠）、"
+        f"満席 {report['sold_out']}枠、再び予約可能 {report['reopened']}回"
+    )
+    if report['first_appeared_at']:
+        logger.info(f"  表示: {report['first_appeared_at']} ～ {report['last_appeared_at']}")
+    sell_out = report['sell_out_seconds']
+    if sell_out['median'] is not None:
+        logger.info(f"  満席まで: 中央値 {sell_out['median']:.1f}秒、最大 {sell_out['max']:.1f}秒")
+    for slot in report['lifecycles']:
+        sold_out = f"{slot['sell_out_seconds']:.1f}秒で満席" if slot['sell_out_seconds'] is not None else "空きあり"
+        logger.info(
+            f"  {slot['slot_time'] or '--:--'} {slot['appeared_at']:%m/%d %H:%M:%S}"
+            f"{'（監視開始時）' if slot['initial'] else ''} {sold_out} ({slot['slot_key']})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="予約枠の履歴の集計")
+    parser.add_argument("--date", help="集計する枠の日付（YYYY-MM-DD、省略した場合は記録がある日付の一覧）")
+    parser.add_argument("--target", help="監視対象ID")
+    parser.add_argument("--path", help="履歴のパス（デフォルト: HISTORY_PATH）")
+    parser.add_argument("--config", default=".env", help="設定ファイルのパス")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(args.config)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    history = SlotHistory(args.path or get_history_path())
+    try:
+        if args.date:
+            log_report(history.date_report(args.date, args.target))
+        else:
+            for slot_date, count in history.dates():
+                logging.getLogger(__name__).info(f"{slot_date}: {count}枠")
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+予約台帳
+
+予約試行とその結果を枠（スロットキー）とプロファイルごとにSQLite（WALモード）へ記録する
+起動時に全件をメモリへ読み込み、予約前の確認は辞書の参照（O(1)）だけで行う
+プロセスの再起動や予約実行モードの再実行で、予約済み・試行済みの枠に時間を使わないようにする
+
+記録は予約試行の開始時（attempted）と終了時（booked / failed）に行う
+結果が記録されないまま終了した試行（attempted）は、予約できている可能性があるため試行済みとして扱う
+月ごとの予約数の上限には、予約成功に加えて結果が出ていない試行（並行して実行中の予約を含む）も数える
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.config import (
+    get_ledger_enabled,
+    get_ledger_path,
+    get_max_attempts_per_slot,
+    get_max_bookings_per_month,
+)
+from src.slots import get_slot_date, get_slot_key
+
+
+OUTCOME_ATTEMPTED = "attempted"
+OUTCOME_BOOKED = "booked"
+OUTCOME_FAILED = "failed"
+
+
+def get_slot_month(slot_info: Dict) -> str:
+    """枠の月（YYYY-MM）を取得
+
+    枠の日付から求める。日付が不明な場合は週の開始日、それもない場合は現在の月とする。
+    """
+    slot_date = get_slot_date(slot_info)
+    if slot_date:
+        return slot_date.strftime('%Y-%m')
+    week_start_date = slot_info.get('week_start_date')
+    if week_start_date:
+        return str(week_start_date)[:7]
+    return datetime.now().strftime('%Y-%m')
+
+
+class BookingLedger:
+    """予約台帳"""
+
+    def __init__(self, path: str, max_attempts_per_slot: int = 1, max_bookings_per_month: int = 0):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.max_attempts_per_slot = max_attempts_per_slot
+        # 0の場合は上限なし
+        self.max_bookings_per_month = max_bookings_per_month
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WALモードではNORMALでもコミット済みのデータは失われない（電源断時に直近のコミットが失われる可能性のみ）
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profile_id TEXT NOT NULL,
+                slot_key TEXT NOT NULL,
+                slot_text TEXT NOT NULL,
+                slot_month TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_profile_slot ON attempts (profile_id, slot_key)")
+
+        # (プロファイルID, スロットキー) → (試行回数, 最新の結果)
+        self._entries: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        # (プロファイルID, 月) → 予約成功数
+        self._monthly: Dict[Tuple[str, str], int] = defaultdict(int)
+        # (プロファイルID, 月) → 結果が出ていない試行の数（実行中、または結果を記録せずに終了したもの）
+        self._pending: Dict[Tuple[str, str], int] = defaultdict(int)
+        # 記録ID → (プロファイルID, 月)（実行中の試行の月の枠を結果の記録時に戻すため）
+        self._in_flight: Dict[int, Tuple[str, str]] = {}
+        self._load()
+
+    def _load(self):
+        """記録をメモリへ読み込む"""
+        rows = self._conn.execute(
+            "SELECT profile_id, slot_key, slot_month, outcome FROM attempts ORDER BY id"
+        ).fetchall()
+        for profile_id, slot_key, slot_month, outcome in rows:
+            attempts, _ = self._entries.get((profile_id, slot_key), (0, outcome))
+            self._entries[(profile_id, slot_key)] = (attempts + 1, outcome)
+            if outcome == OUTCOME_BOOKED:
+                self._monthly[(profile_id, slot_month)] += 1
+            elif outcome == OUTCOME_ATTEMPTED:
+                # 予約できている可能性があるため、月の予約数に数える
+                self._pending[(profile_id, slot_month)] += 1
+        self.logger.info(f"予約台帳を読み込みました: {self.path} ({len(rows)}件)")
+
+    def check(self, slot_info: Dict, profile_id: str) -> Optional[str]:
+        """予約を試行してよいか確認（試行しない場合はその理由、試行してよい場合はNone）"""
+        entry = self._entries.get((profile_id, get_slot_key(slot_info)))
+        if entry is not None:
+            attempts, outcome = entry
+            if outcome == OUTCOME_BOOKED:
+                return "予約済み"
+            if outcome == OUTCOME_ATTEMPTED:
+                return "結果不明の試行あり"
+            if attempts >= self.max_attempts_per_slot:
+                return f"試行済み（{attempts}回）"
+
+        if self.max_bookings_per_month:
+            month = get_slot_month(slot_info)
+            counted = self._monthly[(profile_id, month)] + self._pending[(profile_id, month)]
+            if counted >= self.max_bookings_per_month:
+                return f"{month}の予約数が上限（{self.max_bookings_per_month}件）に達しています"
+        return None
+
+    def record_attempt(self, slot_info: Dict, profile_id: str) -> int:
+        """予約試行の開始を記録（記録IDを返す）
+
+        結果が記録されるまで、この試行は月の予約数に数える（並行する試行が上限を超えないように）。
+        """
+        slot_key = get_slot_key(slot_info)
+        month = get_slot_month(slot_info)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO attempts (profile_id, slot_key, slot_text, slot_month, outcome, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (profile_id, slot_key, slot_info.get('text', ''), month,
+                 OUTCOME_ATTEMPTED, datetime.now().isoformat()),
+            )
+            attempts, _ = self._entries.get((profile_id, slot_key), (0, OUTCOME_ATTEMPTED))
+            self._entries[(profile_id, slot_key)] = (attempts + 1, OUTCOME_ATTEMPTED)
+            self._pending[(profile_id, month)] += 1
+            self._in_flight[cursor.lastrowid] = (profile_id, month)
+            return cursor.lastrowid
+
+    def record_outcome(self, attempt_id: int, slot_info: Dict, profile_id: str, booked: bool):
+        """予約試行の結果を記録"""
+        slot_key = get_slot_key(slot_info)
+        outcome = OUTCOME_BOOKED if booked else OUTCOME_FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE attempts SET outcome = ?, finished_at = ? WHERE id = ?",
+                (outcome, datetime.now().isoformat(), attempt_id),
+            )
+            attempts, _ = self._entries.get((profile_id, slot_key), (1, outcome))
+            self._entries[(profile_id, slot_key)] = (attempts, outcome)
+            month_key = self._in_flight.pop(attempt_id, None)
+            if month_key is not None:
+                self._pending[month_key] -= 1
+            else:
+                month_key = (profile_id, get_slot_month(slot_info))
+            if booked:
+                self._monthly[month_key] += 1
+
+    def booked_count(self, profile_id: str, month: str) -> int:
+        """プロファイルの月ごとの予約成功数を取得"""
+        return self._monthly[(profile_id, month)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_ledger() -> Optional[BookingLedger]:
+    """設定から予約台帳を開く（LEDGER_ENABLED=falseの場合はNone）"""
+    if not get_ledger_enabled():
+        return None
+    return BookingLedger(
+        get_ledger_path(),
+        max_attempts_per_slot=get_max_attempts_per_slot(),
+        max_bookings_per_month=get_max_bookings_per_month(),
+    )
@@ -0,0 +1,140 @@
+"""
+ログ出力
+
+ログのハンドラー（ファイル・標準出力）はバックグラウンドのスレッドで実行し、監視・予約の処理からは
+レコードをキューに積むだけにする（QueueHandler / QueueListener）
+メッセージは固定の文言にし、値は extra のフィールドとして渡す（ファイルにはJSON Linesで書き出す）
+時間のかかるデバッグ用の値は lazy で包み、そのレベルのログが有効な場合にだけ作る
+
+使用方法:
+    logger.info("週を確認中", extra={'week': week_num + 1, 'max_weeks': max_weeks})
+    logger.debug("発見した枠: %s", lazy(json.dumps, slots, default=str))
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# LogRecordの標準の属性（これ以外の属性を extra のフィールドとして扱う）
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class lazy:
+    """ログが出力される場合にだけ評価する値（ログの引数・extraのフィールドに使う）"""
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    """extra で渡されたフィールド"""
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコードを1行のJSONにする"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """従来の書式に、フィールドを key=value で付け加える"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """メッセージだけを確定してキューに積む（書式化・書き出しはリスナーのスレッドで行う）"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # 後で値が変わらないよう、引数を埋め込んだメッセージとlazyのフィールドはここで確定する
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in record_fields(record).items():
+            if isinstance(value, lazy):
+                setattr(record, key, str(value))
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def start_logging(level: int = logging.INFO, log_dir: str = "logs", file_format: str = "json") -> QueueListener:
+    """ルートロガーにキューのハンドラーを設定し、ファイル・標準出力への書き出しをバックグラウンドで開始する"""
+    global _listener
+    stop_logging()
+    directory = Path(log_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.FileHandler(directory / f"auto-booker-{datetime.now().strftime('%Y%m%d')}.log", encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter() if file_format == "json" else TextFormatter())
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.handlers.clear()
+    root_logger.addHandler(_DeferredQueueHandler(log_queue))
+    return _listener
+
+
+def stop_logging():
+    """キューに残っているログを書き出してリスナーを止める"""
+    global _listener
+    if _listener is None:
+        return
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            root_logger.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(stop_logging)
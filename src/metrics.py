@@ -0,0 +1,332 @@
+"""
+メトリクス
+
+監視中の数値（スキャン時間・スキャン頻度・検出した枠・予約試行・ステップごとの失敗・予約成功までの時間）を
+メトリクスレジストリに集計し、Prometheusのテキスト形式で公開する
+- METRICS_PORT: ローカルのポートで GET /metrics に応答する
+- METRICS_TEXTFILE: 一定間隔でファイルに書き出す（node_exporterのtextfileコレクター向け）
+ラベル target には監視対象のURLを付ける
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.config import (
+    get_metrics_host,
+    get_metrics_port,
+    get_metrics_textfile,
+    get_metrics_textfile_interval_seconds,
+)
+
+
+# 秒単位のヒストグラムのデフォルトのバケット
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        return lines + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """増加のみのカウンター"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """現在の値"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def get(self, **labels) -> Optional[float]:
+        return self.values.get(self._key(labels))
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """値の分布（バケットごとの累積件数・合計・件数）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとの（バケットごとの件数, 合計, 件数）
+        self.values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self.values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスの登録と、Prometheusのテキスト形式への変換"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(
+        self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式（値のないメトリクスは見出しのみ）"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# スキャン
+SCANS = REGISTRY.counter("airbooker_scans_total", "Completed calendar scans", ["target"])
+SCAN_ERRORS = REGISTRY.counter("airbooker_scan_errors_total", "Calendar scans that raised an error", ["target"])
+SCAN_SECONDS = REGISTRY.histogram("airbooker_scan_seconds", "Duration of a full calendar scan", ["target"])
+POLLS_PER_SECOND = REGISTRY.gauge("airbooker_polls_per_second", "Average scans per second in the current run", ["target"])
+WEEK_SCAN_SECONDS = REGISTRY.histogram(
+    "airbooker_week_scan_seconds", "Duration of scanning one week, including moving to the next week", ["target", "week"]
+)
+DOM_EXTRACTION_SECONDS = REGISTRY.histogram(
+    "airbooker_dom_extraction_seconds", "Duration of extracting slots from the DOM of one week", ["target"]
+)
+SLOTS_SEEN = REGISTRY.counter("airbooker_slots_seen_total", "Available slots seen across scans", ["target"])
+SLOTS_NEW = REGISTRY.counter("airbooker_slots_new_total", "Newly appeared available slots", ["target"])
+
+# 予約
+BOOKING_ATTEMPTS = REGISTRY.counter("airbooker_booking_attempts_total", "Booking attempts", ["target", "profile"])
+BOOKING_RESULTS = REGISTRY.counter(
+    "airbooker_booking_results_total", "Booking outcomes (success or the reason it stopped)", ["target", "result"]
+)
+BOOKING_STEP_FAILURES = REGISTRY.counter(
+    "airbooker_booking_step_failures_total", "Booking steps that failed after retries", ["target", "step", "reason"]
+)
+BOOKING_SUCCESS_SECONDS = REGISTRY.histogram(
+    "airbooker_booking_success_seconds", "Time from slot detection to a confirmed booking", ["target"],
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0),
+)
+
+
+class MetricsServer:
+    """GET /metrics にPrometheusのテキスト形式で応答するHTTPサーバー"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9464):
+        self.logger = logging.getLogger(__name__)
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """サーバーを起動（port=0の場合は空いているポートを使う）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"メトリクスを公開しました: http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip():
+                pass
+            if len(request_line) >= 2 and request_line[0] == "GET" and request_line[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class TextfileWriter:
+    """一定間隔でメトリクスをファイルに書き出す（書き込み途中のファイルを読まれないよう、一時ファイルから置き換える）"""
+
+    def __init__(self, path: str, interval: float = 15.0, registry: MetricsRegistry = REGISTRY):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = registry
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        self.logger.info(f"メトリクスを書き出します: {self.path} ({self.interval}秒ごと)")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # 最後の値を書き出す
+        self.write()
+
+    async def _run(self):
+        while True:
+            self.write()
+            await asyncio.sleep(self.interval)
+
+    def write(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.registry.render())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"メトリクスの書き出しに失敗しました: {e}")
+
+
+class MetricsExporter:
+    """設定に応じてメトリクスの公開（ポート・ファイル）を開始・終了する"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.server: Optional[MetricsServer] = None
+        self.writer: Optional[TextfileWriter] = None
+
+    async def start(self):
+        port = get_metrics_port()
+        if port:
+            self.server = MetricsServer(self.registry, get_metrics_host(), port)
+            await self.server.start()
+        textfile = get_metrics_textfile()
+        if textfile:
+            self.writer = TextfileWriter(textfile, get_metrics_textfile_interval_seconds(), self.registry)
+            await self.writer.start()
+
+    async def close(self):
+        if self.server:
+            await self.server.close()
+        if self.writer:
+            await self.writer.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
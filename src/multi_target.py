@@ -0,0 +1,166 @@
+"""
+複数施設の監視
+
+1つのブラウザで監視対象ごとにコンテキストを作成し、複数のカレンダーを同じプロセスで監視する
+各監視対象はそれぞれの予約公開日時に合わせて監視し、スキャンの回数は共有のポーリング予算
+（POLL_BUDGET_PER_SECOND）を監視中の対象に重み（weight）に応じて配分する
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from playwright.async_api import async_playwright
+
+from src.config import get_headless, get_poll_budget_per_second, get_scheduler_coarse_margin_seconds
+from src.coordination import create_coordinator
+from src.har import HarSession
+from src.pipeline import SlotPipeline
+from src.scraper import AirReserveScraper, launch_browser
+from src.targets import MonitorTarget
+from src.timing import sleep_until
+
+
+class PollBudget:
+    """複数の監視対象で共有するポーリング予算
+
+    全体のスキャン開始間隔を 1 / polls_per_second 秒以上に保つ。
+    待機中の対象のうち、重みあたりの取得回数が最も少ない対象に順番を渡す（ストライドスケジューリング）。
+    """
+
+    def __init__(self, polls_per_second: float):
+        self.interval = 1.0 / polls_per_second
+        self._next_at = 0.0
+        self._passes: Dict[str, float] = {}
+        self._waiting: Dict[str, float] = {}
+        self._changed: Optional[asyncio.Event] = None
+
+        # 対象ごとのスキャン許可回数
+        self.granted: Dict[str, int] = {}
+
+    async def acquire(self, target_id: str, weight: float = 1.0):
+        """スキャンの順番が来るまで待機"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+
+        # しばらく待機していなかった対象が順番を独占しないよう、待機中の対象に揃える
+        floor = min((self._passes[t] for t in self._waiting), default=None)
+        if floor is None:
+            floor = min(self._passes.values(), default=0.0)
+        self._passes[target_id] = max(self._passes.get(target_id, floor), floor)
+        self._waiting[target_id] = weight
+
+        try:
+            while True:
+                now = time.monotonic()
+                turn = min(self._waiting, key=lambda t: (self._passes[t], t))
+                if turn == target_id and now >= self._next_at:
+                    break
+                changed = self._changed
+                timeout = max(self._next_at - now, 0.0) if turn == target_id else None
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._passes[target_id] += 1.0 / weight
+            self._next_at = max(self._next_at, now) + self.interval
+            self.granted[target_id] = self.granted.get(target_id, 0) + 1
+        finally:
+            del self._waiting[target_id]
+            # 待機中の対象に順番の再計算を促す
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+
+class MultiTargetMonitor:
+    """複数の監視対象を1つのブラウザで監視するクラス"""
+
+    def __init__(
+        self,
+        targets: List[MonitorTarget],
+        bookers: Optional[List] = None,
+        notifier=None,
+        max_weeks: int = 7,
+        polls_per_second: Optional[float] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.targets = targets
+        self.bookers = bookers or []
+        self.notifier = notifier
+        self.max_weeks = max_weeks
+        self.budget = PollBudget(polls_per_second or get_poll_budget_per_second())
+
+        self.pipelines: Dict[str, SlotPipeline] = {}
+        self.coordinator = None
+
+    async def run(self):
+        """すべての監視対象の監視期間が終わるまで監視する"""
+        playwright = await async_playwright().start()
+        browser = await launch_browser(playwright, get_headless())
+        # すべての監視対象の通信を1つのHARにまとめる
+        har = HarSession.from_env()
+        scrapers = [
+            AirReserveScraper(bookers=self.bookers, target=target, browser=browser, har=har)
+            for target in self.targets
+        ]
+        self.logger.info(f"{len(scrapers)}件の監視対象を1つのブラウザで監視します")
+        self.coordinator = create_coordinator()
+
+        try:
+            await asyncio.gather(*(self._monitor_target(scraper) for scraper in scrapers))
+        finally:
+            for scraper in scrapers:
+                await scraper.close_browser()
+            # 書き込み待ちの証跡を保存してから閉じる
+            for booker in self.bookers:
+                await booker.close()
+            await browser.close()
+            await playwright.stop()
+            har.finish(self.targets[0].url)
+            if self.coordinator:
+                await self.coordinator.close()
+            for target_id, count in self.budget.granted.items():
+                self.logger.info(f"監視対象 {target_id}: スキャン {count}回")
+
+    async def _monitor_target(self, scraper: AirReserveScraper):
+        """1つの監視対象を予約公開日時に合わせて監視する"""
+        target = scraper.target
+        monitor_start = target.release_datetime - timedelta(seconds=3)
+        monitor_end = target.release_datetime + timedelta(minutes=target.monitor_duration_minutes)
+
+        if datetime.now() >= monitor_end:
+            self.logger.warning(f"監視対象 {target.target_id} の監視期間は終了しています: {monitor_end}")
+            return
+
+        try:
+            await scraper.start_browser()
+            if not await scraper.load_calendar_page():
+                self.logger.error(f"監視対象 {target.target_id} のカレンダーページの読み込みに失敗しました")
+                return
+
+            self.logger.info(f"監視対象 {target.target_id} の監視期間: {monitor_start} ～ {monitor_end}")
+            now = datetime.now()
+            if now < monitor_start:
+                wait_seconds = (monitor_start - now).total_seconds()
+                self.logger.info(f"監視対象 {target.target_id} の監視開始まで {wait_seconds:.1f} 秒待機します")
+                lateness = await sleep_until(monitor_start, coarse_margin=get_scheduler_coarse_margin_seconds())
+                self.logger.info(f"監視対象 {target.target_id} の監視を開始します (遅延 {lateness * 1000:.1f}ms)")
+
+            pipeline = SlotPipeline(
+                scraper,
+                bookers=self.bookers,
+                notifier=self.notifier,
+                max_weeks=self.max_weeks,
+                check_interval=0,
+                poll_gate=lambda: self.budget.acquire(target.target_id, target.weight),
+                coordinator=self.coordinator,
+                target_id=target.target_id,
+            )
+            self.pipelines[target.target_id] = pipeline
+            await pipeline.run(until=monitor_end)
+        except Exception as e:
+            # 1つの監視対象のエラーで他の監視対象を止めない
+            self.logger.error(f"監視対象 {target.target_id} の監視中にエラーが発生: {e}")
@@ -2,57 +2,413 @@
 通知機能
 
 予約成功・失敗の通知を管理する
+ログへの出力に加え、NOTIFY_SINKSで指定した送信先（標準出力・ファイル・Webhook・メール）に送る
+送信は上限付きのキューを介してバックグラウンドで行い、送信先ごとにタイムアウトと再試行を設定できる
+（遅い送信先があっても、枠の検出・予約は待たない）
+短時間に続く新規枠の検出通知は1通のまとめ（ダイジェスト）にする
 """
 
+import asyncio
+import json
 import logging
-from typing import Optional
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
 
-from src.config import get_notify_success, get_notify_failure
+from src.config import (
+    ConfigError,
+    get_notify_success,
+    get_notify_failure,
+    get_notify_sinks,
+    get_notify_queue_size,
+    get_notify_timeout_seconds,
+    get_notify_retries,
+    get_notify_coalesce_seconds,
+    get_notify_file_path,
+    get_notify_webhook_url,
+    get_notify_smtp_host,
+    get_notify_smtp_port,
+    get_notify_smtp_starttls,
+    get_notify_smtp_username,
+    get_notify_smtp_password,
+    get_notify_email_from,
+    get_notify_email_to,
+)
+
+
+# ダイジェストに枠名を列挙する最大件数
+DIGEST_MAX_ITEMS = 10
+
+# 再試行の待機時間（秒、再試行ごとに2倍にする）
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class Notification:
+    """1件の通知"""
+
+    def __init__(self, kind: str, message: str, fields: Optional[Dict] = None):
+        self.kind = kind
+        self.message = message
+        self.fields = fields or {}
+        self.created_at = datetime.now()
+
+    def as_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'message': self.message,
+            'created_at': self.created_at.isoformat(timespec="milliseconds"),
+            **self.fields,
+        }
+
+
+class NotificationSink:
+    """通知の送信先"""
+
+    name = "sink"
+
+    async def send(self, notification: Notification):
+        raise NotImplementedError
+
+
+class StdoutSink(NotificationSink):
+    """標準出力"""
+
+    name = "stdout"
+
+    async def send(self, notification: Notification):
+        print(notification.message, file=sys.stdout, flush=True)
+
+
+class FileSink(NotificationSink):
+    """ファイル（1行に1件のJSON）"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def send(self, notification: Notification):
+        await asyncio.to_thread(self._append, json.dumps(notification.as_dict(), ensure_ascii=False))
+
+    def _append(self, line: str):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class WebhookSink(NotificationSink):
+    """Webhook（{"text": ...} をJSONでPOSTする、SlackのIncoming Webhookと互換）"""
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def send(self, notification: Notification):
+        body = json.dumps({'text': notification.message, **notification.as_dict()}, ensure_ascii=False)
+        await asyncio.to_thread(self._post, body.encode("utf-8"))
+
+    def _post(self, body: bytes):
+        # 起動時間を短くするため、送信時に読み込む
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url, data=body, headers={'Content-Type': 'application/json'}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SmtpSink(NotificationSink):
+    """メール（SMTP）"""
+
+    name = "smtp"
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        recipients: List[str],
+        username: str = "",
+        password: str = "",
+        starttls: bool = False,
+        timeout: float = 5.0,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    async def send(self, notification: Notification):
+        await asyncio.to_thread(self._send, notification)
+
+    def _send(self, notification: Notification):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message["Subject"] = notification.message.splitlines()[0][:120]
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(notification.message)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+def create_notification_sinks() -> List[NotificationSink]:
+    """NOTIFY_SINKSの送信先を作成
+
+    Raises:
+        ConfigError: 送信先に必要な設定がない場合
+    """
+    timeout = get_notify_timeout_seconds()
+    sinks: List[NotificationSink] = []
+    for name in get_notify_sinks():
+        if name == "stdout":
+            sinks.append(StdoutSink())
+        elif name == "file":
+            sinks.append(FileSink(get_notify_file_path()))
+        elif name == "webhook":
+            url = get_notify_webhook_url()
+            if not url:
+                raise ConfigError("NOTIFY_WEBHOOK_URL is required when NOTIFY_SINKS includes webhook")
+            sinks.append(WebhookSink(url, timeout=timeout))
+        elif name == "smtp":
+            host, sender, recipients = get_notify_smtp_host(), get_notify_email_from(), get_notify_email_to()
+            if not (host and sender and recipients):
+                raise ConfigError(
+                    "NOTIFY_SMTP_HOST, NOTIFY_EMAIL_FROM and NOTIFY_EMAIL_TO are required when NOTIFY_SINKS includes smtp"
+                )
+            sinks.append(SmtpSink(
+                host, get_notify_smtp_port(), sender, recipients,
+                username=get_notify_smtp_username(), password=get_notify_smtp_password(),
+                starttls=get_notify_smtp_starttls(), timeout=timeout,
+            ))
+    return sinks
+
+
+class NotificationDispatcher:
+    """通知をバックグラウンドで送信先に送る
+
+    submitはキューに積むだけで待たない（キューが満杯の場合は破棄する）。
+    送信は最初のsubmitで起動するタスクが行い、送信先ごとにタイムアウトと再試行を適用する。
+    新規枠の検出通知は coalesce_seconds の間に届いたものを1通のダイジェストにまとめる
+    （途中で他の種類の通知が届いた場合は、まとめた分を先に送る）。
+    """
+
+    def __init__(
+        self,
+        sinks: List[NotificationSink],
+        queue_size: int = 100,
+        timeout: float = 5.0,
+        retries: int = 2,
+        coalesce_seconds: float = 2.0,
+        retry_backoff: float = RETRY_BACKOFF_SECONDS,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.sinks = sinks
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retries = retries
+        self.coalesce_seconds = coalesce_seconds
+        self.retry_backoff = retry_backoff
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # 送信先ごとの送信成功・失敗の件数と、キューが満杯で破棄した件数
+        self.sent: Dict[str, int] = {sink.name: 0 for sink in sinks}
+        self.failed: Dict[str, int] = {sink.name: 0 for sink in sinks}
+        self.dropped = 0
+
+    def submit(self, notification: Notification) -> bool:
+        """通知をキューに積む（待たない、積めなかった場合はFalse）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.logger.warning(f"イベントループの外からの通知は送信しません: {notification.message}")
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker = loop.create_task(self._run())
+        try:
+            self._queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.logger.warning(f"通知キューが満杯のため通知を破棄しました: {notification.message}")
+            return False
+        return True
+
+    async def close(self, timeout: Optional[float] = None):
+        """キューに残っている通知を送信してから終了（timeout秒を過ぎた場合は残りを破棄）"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"送信できなかった通知があります: {self._queue.qsize()}件")
+        finally:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._queue = None
+            self._worker = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            notification = await self._queue.get()
+            if notification.kind != "new_slot" or self.coalesce_seconds <= 0:
+                await self._deliver(notification)
+                self._queue.task_done()
+                continue
+
+            # 新規枠の検出通知をまとめる
+            batch = [notification]
+            following = None
+            deadline = loop.time() + self.coalesce_seconds
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item.kind == "new_slot":
+                    batch.append(item)
+                else:
+                    following = item
+                    break
+
+            await self._deliver(batch[0] if len(batch) == 1 else _digest(batch))
+            for _ in batch:
+                self._queue.task_done()
+            if following is not None:
+                await self._deliver(following)
+                self._queue.task_done()
+
+    async def _deliver(self, notification: Notification):
+        await asyncio.gather(*(self._send(sink, notification) for sink in self.sinks))
+
+    async def _send(self, sink: NotificationSink, notification: Notification):
+        """1つの送信先に送る（タイムアウト・失敗時は待機時間を倍にしながら再試行する）"""
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.wait_for(sink.send(notification), self.timeout)
+                self.sent[sink.name] += 1
+                return
+            except Exception as e:
+                reason = "タイムアウト" if isinstance(e, asyncio.TimeoutError) else str(e)
+                if attempt < self.retries:
+                    self.logger.debug(f"通知の送信に失敗しました ({sink.name}, 再試行 {attempt + 1}): {reason}")
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                else:
+                    self.failed[sink.name] += 1
+                    self.logger.warning(f"通知の送信に失敗しました ({sink.name}): {reason}")
+
+
+def _digest(batch: List[Notification]) -> Notification:
+    """新規枠の検出通知をまとめた1件の通知"""
+    texts = [notification.fields.get('slot', '') for notification in batch]
+    listed = ", ".join(texts[:DIGEST_MAX_ITEMS])
+    if len(texts) > DIGEST_MAX_ITEMS:
+        listed += f" 他{len(texts) - DIGEST_MAX_ITEMS}件"
+    return Notification(
+        "new_slot_digest",
+        f"🔍 新規予約枠を {len(batch)} 件検出: {listed}",
+        {'slots': texts, 'count': len(batch)},
+    )
+
+
+def create_notification_dispatcher() -> Optional[NotificationDispatcher]:
+    """NOTIFY_SINKSの送信先に送る通知ディスパッチャーを作成（送信先がない場合はNone）"""
+    sinks = create_notification_sinks()
+    if not sinks:
+        return None
+    return NotificationDispatcher(
+        sinks,
+        queue_size=get_notify_queue_size(),
+        timeout=get_notify_timeout_seconds(),
+        retries=get_notify_retries(),
+        coalesce_seconds=get_notify_coalesce_seconds(),
+    )
 
 
 class NotificationManager:
     """通知管理クラス"""
-    
-    def __init__(self):
+
+    def __init__(self, dispatcher: Optional[NotificationDispatcher] = None):
         self.logger = logging.getLogger(__name__)
         self.notify_success = get_notify_success()
         self.notify_failure = get_notify_failure()
-        
+        # 送信先への通知（未指定の場合はNOTIFY_SINKS、送信先がない場合はログ出力のみ）
+        self.dispatcher = dispatcher or create_notification_dispatcher()
+
     def notify_booking_success(self, slot_info: dict):
         """予約成功の通知"""
         if not self.notify_success:
             return
-            
-        message = f"✅ 予約成功: {slot_info.get('text', 'Unknown')}"
+
+        message = f"✅ 予約成功: {self._describe(slot_info)}"
         self.logger.info(message)
-        
-        # 将来的にメール通知やSlack通知を追加可能
-        # self._send_email(message)
-        # self._send_slack(message)
-        
+        self._dispatch("success", message, slot_info)
+
     def notify_booking_failure(self, slot_info: dict, error: str):
         """予約失敗の通知"""
         if not self.notify_failure:
             return
-            
-        message = f"❌ 予約失敗: {slot_info.get('text', 'Unknown')} - {error}"
+
+        message = f"❌ 予約失敗: {self._describe(slot_info)} - {error}"
         self.logger.error(message)
-        
-        # 将来的にメール通知やSlack通知を追加可能
-        # self._send_email(message)
-        # self._send_slack(message)
-        
+        self._dispatch("failure", message, slot_info, error=error)
+
+    def _describe(self, slot_info: dict) -> str:
+        """枠の表示名（複数プロファイルの場合はプロファイル名を付ける）"""
+        text = slot_info.get('text', 'Unknown')
+        if slot_info.get('profile_id'):
+            return f"{text} (プロファイル: {slot_info['profile_id']})"
+        return text
+
     def notify_new_slot_detected(self, slot_info: dict):
-        """新規枠検出の通知"""
+        """新規枠検出の通知（送信先へは短時間に続くものをまとめて送る）"""
         message = f"🔍 新規予約枠を検出: {slot_info.get('text', 'Unknown')}"
         self.logger.info(message)
-        
+        self._dispatch("new_slot", message, slot_info)
+
     def notify_monitoring_start(self, release_datetime: str):
         """監視開始の通知"""
         message = f"👀 予約枠監視を開始: {release_datetime}"
         self.logger.info(message)
-        
+        self._dispatch("monitoring_start", message, release_datetime=release_datetime)
+
     def notify_monitoring_end(self):
         """監視終了の通知"""
         message = "⏹️ 予約枠監視を終了"
         self.logger.info(message)
+        self._dispatch("monitoring_end", message)
+
+    def _dispatch(self, kind: str, message: str, slot_info: Optional[dict] = None, **fields):
+        """送信先への通知をキューに積む（待たない）"""
+        if not self.dispatcher:
+            return
+        if slot_info is not None:
+            fields['slot'] = slot_info.get('text', 'Unknown')
+            if slot_info.get('profile_id'):
+                fields['profile_id'] = slot_info['profile_id']
+        self.dispatcher.submit(Notification(kind, message, fields))
+
+    async def close(self, timeout: Optional[float] = 10.0):
+        """送信待ちの通知を送信してから終了"""
+        if self.dispatcher:
+            await self.dispatcher.close(timeout)
@@ -0,0 +1,184 @@
+"""
+通知の送信先の代用
+
+通知（NOTIFY_SINKS=webhook / smtp）を外部サービスなしで試すための、メモリ上の最小限のサーバー
+- WebhookStandIn: POSTされたJSONを記録するHTTPサーバー（応答の遅延・失敗を指定できる）
+- SmtpStandIn: 受け取ったメールを記録するSMTPサーバー（認証・STARTTLSには対応しない）
+
+使用方法:
+    python -m src.notify_standin --webhook-port 8080 --smtp-port 2525
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from email import message_from_bytes, policy
+from typing import Dict, List, Optional
+
+
+class WebhookStandIn:
+    """POSTされたJSONを記録するHTTPサーバー"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, delay: float = 0.0, fail_times: int = 0):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        # 応答までの遅延（秒）と、最初の何回を500で失敗させるか
+        self.delay = delay
+        self.fail_times = fail_times
+        self.requests = 0
+        self.received: List[Dict] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/webhook"
+
+    async def start(self):
+        """サーバーを起動（port=0の場合は空いているポートを使う）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Webhookサーバーを起動しました: {self.url}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readline()
+            content_length = 0
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    content_length = int(value.strip())
+            body = await reader.readexactly(content_length) if content_length else b""
+
+            self.requests += 1
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if self.requests <= self.fail_times:
+                status = "500 Internal Server Error"
+            else:
+                status = "200 OK"
+                self.received.append(json.loads(body.decode("utf-8")))
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok".encode("ascii"))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 遅延中にサーバーを閉じた場合
+            pass
+        finally:
+            writer.close()
+
+
+class SmtpStandIn:
+    """受け取ったメールを記録するSMTPサーバー"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 2525):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        self.received: List[Dict] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """サーバーを起動（port=0の場合は空いているポートを使う）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"SMTPサーバーを起動しました: {self.host}:{self.port}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        sender, recipients = None, []
+
+        async def reply(line: str):
+            writer.write((line + "\r\n").encode("ascii"))
+            await writer.drain()
+
+        try:
+            await reply("220 smtp-standin ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    await reply("250 smtp-standin")
+                elif verb == "MAIL":
+                    sender, recipients = command.split(":", 1)[1].strip().strip("<>"), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        data = await reader.readline()
+                        if data in (b".\r\n", b".\n", b""):
+                            break
+                        # 行頭のドットの透過処理を戻す
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    message = message_from_bytes(b"".join(lines), policy=policy.default)
+                    self.received.append({
+                        'from': sender,
+                        'to': recipients,
+                        'subject': str(message.get("Subject", "")),
+                        'message': message,
+                    })
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通知の送信先の代用（Webhook・SMTP）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--webhook-port", type=int, default=8080)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        webhook = WebhookStandIn(args.host, args.webhook_port)
+        smtp = SmtpStandIn(args.host, args.smtp_port)
+        await webhook.start()
+        await smtp.start()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await webhook.close()
+            await smtp.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+予約枠処理パイプライン
+
+検出・希望条件での順位付け・予約・通知を独立したステージに分け、
+有界キュー（asyncio.Queue）でつなぐ
+あるステージが遅くても他のステージは止まらず、キューが満杯になった場合は上流が待機する（背圧）
+
+    スキャナー → [差分キュー] → ランカー → [予約キュー] → 予約ワーカー ×N → [通知キュー] → 通知
+
+複数の予約者プロファイル（ブッカー）がある場合、ランカーは1回のスキャン結果を各プロファイルの
+希望条件に振り分け、残席数を超えないよう FairSeatAllocator で枠を割り当てる
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from src.config import (
+    get_pipeline_queue_size,
+    get_pipeline_booking_workers,
+)
+from src.history import get_history
+from src.metrics import POLLS_PER_SECOND, SCAN_ERRORS, SCANS, SLOTS_NEW, SLOTS_SEEN
+from src.prediction import PollPlanner
+from src.profiles import FairSeatAllocator
+from src.profiling import get_profiler
+from src.slots import get_slot_key
+from src.tracing import get_tracer
+
+
+class StageMetrics:
+    """ステージごとのメトリクス（処理件数・処理時間・入力キューの深さ）"""
+
+    def __init__(self, name: str, concurrency: int = 1):
+        self.name = name
+        self.concurrency = concurrency
+        self.processed = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        """1件の処理時間を記録"""
+        self.processed += 1
+        if error:
+            self.errors += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    def observe_queue(self, depth: int):
+        """入力キューの深さを記録"""
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def as_dict(self) -> Dict:
+        """辞書形式で取得"""
+        return {
+            'concurrency': self.concurrency,
+            'processed': self.processed,
+            'errors': self.errors,
+            'avg_seconds': self.total_seconds / self.processed if self.processed else 0.0,
+            'max_seconds': self.max_seconds,
+            'last_seconds': self.last_seconds,
+            'total_seconds': self.total_seconds,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+class SlotPipeline:
+    """予約枠の検出から通知までを行うパイプライン"""
+
+    def __init__(
+        self,
+        scraper,
+        booker=None,
+        notifier=None,
+        bookers: Optional[List] = None,
+        poll_gate: Optional[Callable[[], Awaitable]] = None,
+        coordinator=None,
+        target_id: str = "default",
+        max_weeks: int = 7,
+        check_interval: float = 1.0,
+        book_once: bool = False,
+        queue_size: Optional[int] = None,
+        booking_workers: Optional[int] = None,
+        planner: Optional[PollPlanner] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.scraper = scraper
+        # 予約者プロファイルごとのブッカー（bookerのみ指定した場合は1件）
+        self.bookers = list(bookers) if bookers else ([booker] if booker else [])
+        self.notifier = notifier
+        # スキャン前に待機するゲート（複数の監視対象でポーリング予算を共有する場合に使う）
+        self.poll_gate = poll_gate
+        # 分散監視の調整役（複数インスタンスで週とスキャンの位相を分担し、予約試行を確保する）
+        self.coordinator = coordinator
+        self.target_id = target_id
+        # メトリクスのラベル（監視対象のURL）
+        self.target_label = getattr(scraper, 'target_url', None) or target_id
+        self.max_weeks = max_weeks
+        self.check_interval = check_interval
+        # 予測ポーリング（PREDICTION_ENABLED、予約枠の履歴からポーリング間隔と確認する週を決める）
+        # check_intervalは予測した頻度が最も高い時間帯の間隔になる
+        self.planner = planner or PollPlanner.from_env(get_history(), target_id, max_weeks)
+        self.book_once = book_once
+        self.queue_size = queue_size or get_pipeline_queue_size()
+        self.booking_workers = booking_workers or get_pipeline_booking_workers()
+
+        self.diff_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.booking_queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        self.notify_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        self.metrics: Dict[str, StageMetrics] = {
+            'scanner': StageMetrics('scanner'),
+            'ranker': StageMetrics('ranker'),
+            'booking': StageMetrics('booking', self.booking_workers),
+            'notifier': StageMetrics('notifier'),
+        }
+
+        # 予約キューに入っている・予約中の枠（同じ枠を同じプロファイルで重複して予約しない）
+        self.inflight_keys: Set[str] = set()
+        # 予約キューに入っている・予約中の予約の内容（状態の確認用、キーはinflight_keysと同じ）
+        self.booking_jobs: Dict[str, Dict] = {}
+        self.allocator = FairSeatAllocator()
+        # 予約に成功したプロファイル（book_onceの場合はプロファイルごとに1件まで）
+        self.succeeded_profiles: Set[str] = set()
+        self.booking_succeeded = False
+        self.last_slots: List[Dict] = []
+        # カレンダーから消えた枠（予約キューに残っていても予約しない、再び表示されたら外す）
+        self.vanished_keys: Set[str] = set()
+        self._sequence = itertools.count()
+        self.started_at: Optional[float] = None
+
+    async def run(self, until: datetime):
+        """監視終了時刻までパイプラインを実行し、残りの予約・通知を処理してから終了"""
+        self.started_at = time.monotonic()
+        # プロファイリングのバーストのフェーズは監視の開始から数える
+        get_profiler().begin_window()
+        if self.planner:
+            self.planner.start()
+        workers = [asyncio.create_task(self._ranker())]
+        workers += [asyncio.create_task(self._booking_worker(i)) for i in range(self.booking_workers)]
+        workers.append(asyncio.create_task(self._notifier_sink()))
+
+        try:
+            await self._scanner(until)
+
+            # 上流から順にキューを空にする
+            await self.diff_queue.join()
+            await self.booking_queue.join()
+            await self.notify_queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.log_metrics()
+            if self.planner:
+                self.planner.log_report()
+            get_history().finish(self.target_id)
+            # 遅延トレースの内訳を出力して書き出す（TRACE_ENABLEDの場合）
+            get_tracer().finish_run()
+
+    async def _put(self, queue: asyncio.Queue, item, stage: str):
+        """キューに積み、次のステージの入力キューの深さを記録（満杯の場合は待機）"""
+        await queue.put(item)
+        self.metrics[stage].observe_queue(queue.qsize())
+
+    async def _scanner(self, until: datetime):
+        """スキャナー: 予約可能枠を取得し、前回との差分を差分キューへ送る"""
+        check_count = 0
+        while datetime.now() < until:
+            if self.poll_gate:
+                await self.poll_gate()
+            if self.coordinator:
+                self.scraper.scan_weeks = self.coordinator.assigned_weeks(self.max_weeks)
+                await self.coordinator.wait_for_phase()
+            if datetime.now() >= until:
+                break
+            check_count += 1
+            started = time.perf_counter()
+            error = False
+            skipped_weeks: Set[int] = set()
+            if self.planner:
+                # 予測した頻度が低い週は確認を省く（分散監視の場合は割り当てられた週の中から選ぶ）
+                assigned = self.scraper.scan_weeks if self.coordinator else None
+                planned = self.planner.plan_weeks(check_count, assigned)
+                all_weeks = set(range(self.max_weeks))
+                skipped_weeks = (all_weeks if assigned is None else assigned) - (all_weeks if planned is None else planned)
+                self.scraper.scan_weeks = planned
+            try:
+                self.logger.info("チェック", extra={'check': check_count})
+                current_slots = await self.scraper.get_available_slots(max_weeks=self.max_weeks)
+                if self.coordinator:
+                    # 他のインスタンスが担当する週の枠を合わせる
+                    current_slots = await self.coordinator.share_slots(self.target_id, current_slots)
+                if skipped_weeks:
+                    # 確認を省いた週の枠は前回の結果を引き継ぐ（消えた枠として扱わない）
+                    current_slots = current_slots + [
+                        slot for slot in self.last_slots if (slot.get('week_number') or 0) - 1 in skipped_weeks
+                    ]
+                # 枠の状態の変化を履歴に記録（HISTORY_ENABLED）
+                get_history().observe(self.target_id, current_slots)
+
+                last_keys = {get_slot_key(slot) for slot in self.last_slots}
+                current_keys = {get_slot_key(slot) for slot in current_slots}
+                new_slots = [slot for slot in current_slots if get_slot_key(slot) not in last_keys]
+                removed_keys = last_keys - current_keys
+                self.last_slots = current_slots
+                SLOTS_SEEN.inc(len(current_slots), target=self.target_label)
+                SLOTS_NEW.inc(len(new_slots), target=self.target_label)
+                if self.planner and check_count > 1:
+                    # 最初のスキャンの枠は監視開始時に表示されていたもののため、予測との比較に含めない
+                    self.planner.observe(new_slots)
+
+                if new_slots:
+                    self.logger.info("新規予約枠を発見", extra={'count': len(new_slots)})
+                    for slot in new_slots:
+                        self.logger.info("新規予約枠", extra={'text': slot['text'], 'href': slot['href']})
+                if new_slots or removed_keys:
+                    await self._put(self.diff_queue, {
+                        'new_slots': new_slots,
+                        'removed_keys': removed_keys,
+                        'scanned_at': datetime.now(),
+                    }, 'ranker')
+
+                # 最初の週に戻る
+                await self.scraper.page.goto(self.scraper.target_url, wait_until="networkidle", timeout=30000)
+            except Exception as e:
+                error = True
+                self.logger.error(f"監視中にエラーが発生: {e}")
+            finally:
+                self.metrics['scanner'].observe(time.perf_counter() - started, error)
+                (SCAN_ERRORS if error else SCANS).inc(target=self.target_label)
+                POLLS_PER_SECOND.set(self.scans_per_second() or 0.0, target=self.target_label)
+
+            await asyncio.sleep(self.planner.next_interval(self.check_interval) if self.planner else self.check_interval)
+
+        self.logger.info("監視期間が終了しました")
+
+    async def _ranker(self):
+        """ランカー: 新規枠を希望条件で順位付けし、プロファイルに割り当てて予約キューへ送る
+
+        消えた枠は記録し、予約キューに残っている予約と控えのプロファイルへの繰り上げを取りやめる。
+        """
+        while True:
+            event = await self.diff_queue.get()
+            started = time.perf_counter()
+            error = False
+            try:
+                new_slots = event['new_slots']
+                self._update_vanished(new_slots, event['removed_keys'])
+                if not new_slots:
+                    continue
+                if self.bookers:
+                    with get_tracer().span("rank", slots=len(new_slots)):
+                        ranked = self._rank(new_slots)
+                    for slot, candidates in ranked:
+                        if not candidates:
+                            self.logger.debug(f"希望条件に合致しないためスキップ: {slot['text']}")
+                            continue
+
+                        scores = {id(booker): score for booker, score in candidates}
+                        for booker in self.allocator.allocate(slot, candidates):
+                            self.logger.info(f"希望条件に合致する枠を発見 (プロファイル: {booker.profile_id}): {slot['text']}")
+                            job_key = self._job_key(slot, booker)
+                            self.inflight_keys.add(job_key)
+                            self.booking_jobs[job_key] = {
+                                'profile_id': booker.profile_id,
+                                'slot': slot.get('text', ''),
+                                'score': scores[id(booker)],
+                                'state': 'queued',
+                            }
+                            await self._put(
+                                self.booking_queue,
+                                (-scores[id(booker)], next(self._sequence), slot, booker),
+                                'booking',
+                            )
+                else:
+                    self.logger.debug("bookerが設定されていないため、予約を実行しません")
+
+                # 予約キューへ送ってから検出を通知する（通知で予約を待たせない）
+                await self._put(self.notify_queue, ('new_slots', new_slots, None), 'notifier')
+            except Exception as e:
+                error = True
+                self.logger.error(f"順位付け中にエラーが発生: {e}")
+            finally:
+                self.metrics['ranker'].observe(time.perf_counter() - started, error)
+                self.diff_queue.task_done()
+
+    def _rank(self, new_slots: List[Dict]) -> List[Tuple[Dict, List[Tuple[object, float]]]]:
+        """新規枠ごとに予約候補のプロファイルを求め、最高スコアの高い枠から順に並べる"""
+        ranked = []
+        for slot in new_slots:
+            candidates = []
+            for booker in self.bookers:
+                if self._profile_done(booker):
+                    continue
+                if self._job_key(slot, booker) in self.inflight_keys:
+                    self.logger.debug(f"同じ枠の予約が実行中のためスキップ: {slot['text']}")
+                    continue
+                score = booker.score_slot(slot)
+                if score > 0:
+                    candidates.append((booker, score))
+            best = max((score for _, score in candidates), default=0.0)
+            ranked.append((best, slot, candidates))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [(slot, candidates) for _, slot, candidates in ranked]
+
+    def _update_vanished(self, new_slots: List[Dict], removed_keys: Set[str]):
+        """消えた枠を記録し、再び表示された枠を外す"""
+        self.vanished_keys -= {get_slot_key(slot) for slot in new_slots}
+        for key in removed_keys:
+            self.vanished_keys.add(key)
+            self.allocator.fallbacks.pop(key, None)
+        if removed_keys:
+            self.logger.debug("枠がカレンダーから消えました", extra={'count': len(removed_keys)})
+
+    def _vanished(self, slot: Dict) -> bool:
+        """枠がカレンダーから消えたかどうか（満席になった、または受付が終わった）"""
+        return get_slot_key(slot) in self.vanished_keys
+
+    def _profile_done(self, booker) -> bool:
+        """book_onceの場合に、このプロファイルが予約済みかどうか"""
+        return self.book_once and booker.profile_id in self.succeeded_profiles
+
+    @staticmethod
+    def _job_key(slot: Dict, booker) -> str:
+        return f"{booker.profile_id}:{get_slot_key(slot)}"
+
+    async def _booking_worker(self, worker_id: int):
+        """予約ワーカー: 予約キューからスコアの高い順に枠を取り出して予約する
+
+        予約に失敗した場合は、同じ枠の控えのプロファイルに繰り上げて予約する。
+        """
+        while True:
+            _, _, slot, booker = await self.booking_queue.get()
+            started = time.perf_counter()
+            error = False
+            try:
+                while booker is not None:
+                    job_key = self._job_key(slot, booker)
+                    if self._vanished(slot):
+                        self.logger.info(f"枠がカレンダーから消えたため予約しません: {slot['text']}")
+                        # 再び表示された場合に予約できるよう、予約キューに入れたときの記録を外す
+                        self.inflight_keys.discard(job_key)
+                        self.booking_jobs.pop(job_key, None)
+                        break
+                    self.inflight_keys.add(job_key)
+                    self.booking_jobs[job_key] = {
+                        'profile_id': booker.profile_id,
+                        'slot': slot.get('text', ''),
+                        'state': 'booking',
+                    }
+                    try:
+                        if await self._book(worker_id, slot, booker):
+                            break
+                    finally:
+                        self.inflight_keys.discard(job_key)
+                        self.booking_jobs.pop(job_key, None)
+                    booker = self.allocator.next_fallback(slot)
+                    while booker is not None and self._profile_done(booker):
+                        booker = self.allocator.next_fallback(slot)
+                    if booker is not None:
+                        self.logger.info(f"控えのプロファイルに繰り上げて予約します (プロファイル: {booker.profile_id})")
+            except Exception as e:
+                error = True
+                self.logger.error(f"予約ワーカーでエラーが発生: {e}")
+            finally:
+                self.metrics['booking'].observe(time.perf_counter() - started, error)
+                self.booking_queue.task_done()
+
+    async def _book(self, worker_id: int, slot: Dict, booker) -> bool:
+        """1つのプロファイルで枠を予約し、結果を通知キューへ送る"""
+        if self._profile_done(booker):
+            return False
+        if self.coordinator and not await self.coordinator.claim(slot, booker.profile_id):
+            return False
+        self.logger.info(f"予約を実行します (ワーカー{worker_id}, プロファイル: {booker.profile_id}): {slot['text']}")
+        success = False
+        try:
+            success = await self.scraper.book_slot(
+                slot,
+                should_start=lambda: not self._profile_done(booker) and not self._vanished(slot),
+                booker=booker,
+            )
+        finally:
+            # 予約中に例外が発生した場合も確保を解除し、他のインスタンスが有効期限まで待たないようにする
+            if self.coordinator:
+                if success:
+                    await self.coordinator.confirm(slot, booker.profile_id)
+                else:
+                    await self.coordinator.release(slot, booker.profile_id)
+        result_slot = dict(slot, profile_id=booker.profile_id) if len(self.bookers) > 1 else slot
+        if success:
+            self.succeeded_profiles.add(booker.profile_id)
+            self.allocator.record_success(booker.profile_id)
+            self.booking_succeeded = True
+            self.logger.info(f"予約が成功しました (プロファイル: {booker.profile_id}): {slot['text']}")
+            await self._put(self.notify_queue, ('success', result_slot, None), 'notifier')
+            return True
+        if not self._profile_done(booker) and not self._vanished(slot):
+            self.logger.warning(f"予約が失敗しました (プロファイル: {booker.profile_id}): {slot['text']}")
+            await self._put(self.notify_queue, ('failure', result_slot, "予約実行に失敗"), 'notifier')
+        return False
+
+    async def _notifier_sink(self):
+        """通知: 検出・予約結果を通知する"""
+        while True:
+            kind, slot, error_message = await self.notify_queue.get()
+            started = time.perf_counter()
+            error = False
+            try:
+                if self.notifier:
+                    if kind == 'new_slots':
+                        # 送信先へは短時間に続く検出をまとめて送る
+                        for new_slot in slot:
+                            self.notifier.notify_new_slot_detected(new_slot)
+                    elif kind == 'success':
+                        self.notifier.notify_booking_success(slot)
+                    elif kind == 'failure':
+                        self.notifier.notify_booking_failure(slot, error_message)
+            except Exception as e:
+                error = True
+                self.logger.error(f"通知中にエラーが発生: {e}")
+            finally:
+                self.metrics['notifier'].observe(time.perf_counter() - started, error)
+                self.notify_queue.task_done()
+
+    def scans_per_second(self) -> Optional[float]:
+        """実行開始からの平均スキャン回数（1秒あたり、未実行の場合はNone）"""
+        if self.started_at is None:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return self.metrics['scanner'].processed / elapsed if elapsed > 0 else None
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """全ステージのメトリクスを取得"""
+        return {name: metrics.as_dict() for name, metrics in self.metrics.items()}
+
+    def log_metrics(self):
+        """ステージごとのメトリクスをログに出力"""
+        for name, values in self.get_metrics().items():
+            self.logger.info(
+                f"ステージ {name}: 処理 {values['processed']}件 (エラー {values['errors']}件), "
+                f"平均 {values['avg_seconds'] * 1000:.1f}ms, 最大 {values['max_seconds'] * 1000:.1f}ms, "
+                f"キュー最大深さ {values['max_queue_depth']}"
+            )
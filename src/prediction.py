@@ -0,0 +1,286 @@
+"""
+予測ポーリング
+
+予約枠の履歴（src/history.py）から、新しい枠・キャンセルが出る頻度を時刻・曜日・枠の日付までの週ごとに求め、
+監視中のポーリング間隔と確認する週を決める
+予約公開の直後は予測によらず最短の間隔ですべての週を確認し、その後の手作業での追加・キャンセルが出やすい
+時間帯は短く、出にくい時間帯は長い間隔で確認する
+監視の終了時に、予測した件数と実際に見つかった件数を時間帯・週ごとに出力する
+
+頻度のモデル:
+    頻度（件/時） = 全体の頻度 × 時刻の係数 × 曜日の係数
+    係数はその時刻・曜日に監視していた時間あたりの件数を全体の頻度と比べたもの（監視時間が短い場合は1に近づける）
+    週の割合は、枠の日付が表示中の週の何週目にあたるかの件数の割合
+
+使用方法:
+    python -m src.prediction
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.config import (
+    get_history_path,
+    get_prediction_burst_seconds,
+    get_prediction_enabled,
+    get_prediction_full_scan_every,
+    get_prediction_hot_week_share,
+    get_prediction_max_interval_seconds,
+    get_prediction_min_events,
+)
+
+
+# 監視時間が短い時刻・曜日の係数を全体の頻度に近づけるための、仮の監視時間（時間）
+SMOOTHING_HOURS = 1.0
+
+WEEKDAYS = "月火水木金土日"
+
+
+def week_index(slot_date: date, on: date) -> int:
+    """枠の日付が、その日に表示されるカレンダーの何週目（0始まり）にあたるか（カレンダーは今週の月曜日から始まる）"""
+    return (slot_date - (on - timedelta(days=on.weekday()))).days // 7
+
+
+class SlotPredictor:
+    """新しい枠・キャンセルが出る頻度の予測"""
+
+    def __init__(self, events: List[Tuple[datetime, Optional[date]]], sessions: List[Tuple[datetime, datetime]],
+                 max_weeks: int = 7):
+        self.events = len(events)
+        self.max_weeks = max_weeks
+
+        hour_events, hour_exposure = [0] * 24, [0.0] * 24
+        weekday_events, weekday_exposure = [0] * 7, [0.0] * 7
+        for started, ended in sessions:
+            # 時刻の区切りごとに監視時間を振り分ける
+            at = started
+            while at < ended:
+                until = min(ended, at.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+                hours = (until - at).total_seconds() / 3600
+                hour_exposure[at.hour] += hours
+                weekday_exposure[at.weekday()] += hours
+                at = until
+        week_counts = [0] * max_weeks
+        for observed_at, slot_date in events:
+            hour_events[observed_at.hour] += 1
+            weekday_events[observed_at.weekday()] += 1
+            if slot_date is not None and 0 <= week_index(slot_date, observed_at.date()) < max_weeks:
+                week_counts[week_index(slot_date, observed_at.date())] += 1
+
+        self.exposure_hours = sum(hour_exposure)
+        self.base_rate = self.events / self.exposure_hours if self.exposure_hours else 0.0
+        self.hour_factors = self._factors(hour_events, hour_exposure)
+        self.weekday_factors = self._factors(weekday_events, weekday_exposure)
+        dated = sum(week_counts)
+        self.week_shares = [(count + 1) / (dated + max_weeks) for count in week_counts]
+
+    def _factors(self, events: List[int], exposure: List[float]) -> List[float]:
+        if not self.base_rate:
+            return [1.0] * len(events)
+        return [
+            (count + SMOOTHING_HOURS * self.base_rate) / (hours + SMOOTHING_HOURS) / self.base_rate
+            for count, hours in zip(events, exposure)
+        ]
+
+    @classmethod
+    def from_history(cls, history, target_id: Optional[str] = None, max_weeks: int = 7) -> "SlotPredictor":
+        """予約枠の履歴から作成（監視開始時に既に表示されていた枠は、出た時刻が不明なため使わない）"""
+        events = []
+        for slot in history.lifecycles(target_id=target_id):
+            slot_date = date.fromisoformat(slot['slot_date']) if slot['slot_date'] else None
+            if not slot['initial']:
+                events.append((slot['appeared_at'], slot_date))
+            events.extend((reopened_at, slot_date) for reopened_at in slot['reopened'])
+        return cls(events, history.sessions(target_id), max_weeks)
+
+    def rate(self, at: datetime) -> float:
+        """予測した頻度（件/時）"""
+        return self.base_rate * self.hour_factors[at.hour] * self.weekday_factors[at.weekday()]
+
+    def peak_rate(self) -> float:
+        """最も頻度が高い時刻・曜日の頻度（件/時）"""
+        return self.base_rate * max(self.hour_factors) * max(self.weekday_factors)
+
+
+class PollPlanner:
+    """予測した頻度でポーリング間隔と確認する週を決め、予測した件数と実際の件数を記録する"""
+
+    def __init__(
+        self,
+        predictor: SlotPredictor,
+        max_interval: float = 30.0,
+        burst_seconds: float = 300.0,
+        hot_week_share: float = 0.1,
+        full_scan_every: int = 10,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.predictor = predictor
+        self.max_interval = max_interval
+        self.burst_seconds = burst_seconds
+        self.hot_week_share = hot_week_share
+        self.full_scan_every = full_scan_every
+        # 毎回確認する週（それ以外の週は full_scan_every 回に1回）
+        self.hot_weeks: Set[int] = {
+            week for week, share in enumerate(predictor.week_shares) if share >= hot_week_share
+        }
+
+        self.started_at: Optional[datetime] = None
+        self.polls = 0
+        self.partial_scans = 0
+        self.min_interval = 0.0
+        # 時間帯（YYYY-MM-DD HH:00）→ [予測した件数, 実際の件数]
+        self.hours: Dict[str, List[float]] = {}
+        self.week_actual = [0] * predictor.max_weeks
+
+    @classmethod
+    def from_env(cls, history, target_id: Optional[str] = None, max_weeks: int = 7) -> Optional["PollPlanner"]:
+        """設定から作成（PREDICTION_ENABLED=false、または履歴の件数が足りない場合はNone）"""
+        if not get_prediction_enabled():
+            return None
+        predictor = SlotPredictor.from_history(history, target_id, max_weeks)
+        if predictor.events < get_prediction_min_events():
+            logging.getLogger(__name__).info(
+                f"予約枠の履歴が少ないため、一定間隔で監視します ({predictor.events}件 / 必要 {get_prediction_min_events()}件)"
+            )
+            return None
+        return cls(
+            predictor,
+            max_interval=get_prediction_max_interval_seconds(),
+            burst_seconds=get_prediction_burst_seconds(),
+            hot_week_share=get_prediction_hot_week_share(),
+            full_scan_every=get_prediction_full_scan_every(),
+        )
+
+    def start(self, now: Optional[datetime] = None):
+        """監視の開始（ここから burst_seconds 秒は最短の間隔ですべての週を確認する）"""
+        self.started_at = now or datetime.now()
+
+    def in_burst(self, now: datetime) -> bool:
+        return self.started_at is None or (now - self.started_at).total_seconds() < self.burst_seconds
+
+    def _bucket(self, now: datetime) -> List[float]:
+        return self.hours.setdefault(now.strftime('%Y-%m-%d %H:00'), [0.0, 0])
+
+    def plan_weeks(self, scan_number: int, assigned: Optional[Set[int]] = None,
+                   now: Optional[datetime] = None) -> Optional[Set[int]]:
+        """今回確認する週（0始まり、Noneの場合はすべて）
+
+        assigned は分散監視で割り当てられた週（Noneの場合はすべて）。
+        予約公開の直後と full_scan_every 回に1回は、割り当てられた週をすべて確認する。
+        """
+        now = now or datetime.now()
+        if self.in_burst(now) or (scan_number - 1) % self.full_scan_every == 0:
+            return assigned
+        base = assigned if assigned is not None else set(range(self.predictor.max_weeks))
+        planned = base & self.hot_weeks
+        if not planned or planned == base:
+            return assigned
+        self.partial_scans += 1
+        return planned
+
+    def next_interval(self, min_interval: float, now: Optional[datetime] = None) -> float:
+        """次のスキャンまでの間隔（秒）を決め、その間に予測される件数を記録する"""
+        now = now or datetime.now()
+        self.polls += 1
+        self.min_interval = min_interval
+        rate = self.predictor.rate(now)
+        if self.in_burst(now):
+            interval = min_interval
+        else:
+            peak = self.predictor.peak_rate()
+            ratio = rate / peak if peak else 0.0
+            interval = max(min_interval, self.max_interval - (self.max_interval - min_interval) * ratio)
+        self._bucket(now)[0] += rate * interval / 3600
+        return interval
+
+    def observe(self, new_slots: List[Dict], now: Optional[datetime] = None):
+        """実際に見つかった新しい枠・キャンセルを記録（監視開始時に表示されていた枠は渡さない）"""
+        now = now or datetime.now()
+        self._bucket(now)[1] += len(new_slots)
+        for slot in new_slots:
+            week = (slot.get('week_number') or 0) - 1
+            if 0 <= week < len(self.week_actual):
+                self.week_actual[week] += 1
+
+    def report(self) -> Dict:
+        """予測した件数と実際の件数"""
+        elapsed = (datetime.now() - self.started_at).total_seconds() if self.started_at else 0.0
+        actual_total = sum(self.week_actual)
+        return {
+            'predicted': sum(predicted for predicted, _ in self.hours.values()),
+            'actual': sum(actual for _, actual in self.hours.values()),
+            'hours': [
+                {'hour': hour, 'predicted': predicted, 'actual': actual}
+                for hour, (predicted, actual) in sorted(self.hours.items())
+            ],
+            'weeks': [
+                {
+                    'week': week + 1,
+                    'predicted_share': share,
+                    'actual_share': self.week_actual[week] / actual_total if actual_total else None,
+                    'hot': week in self.hot_weeks,
+                }
+                for week, share in enumerate(self.predictor.week_shares)
+            ],
+            'polls': self.polls,
+            'partial_scans': self.partial_scans,
+            # 一定間隔（最短の間隔）で監視した場合のスキャン回数
+            'flat_polls': int(elapsed / self.min_interval) if self.min_interval else None,
+        }
+
+    def log_report(self):
+        """予測した件数と実際の件数をログに出力"""
+        report = self.report()
+        flat = f"（一定間隔の場合 {report['flat_polls']}回）" if report['flat_polls'] is not None else ""
+        self.logger.info(
+            f"予測ポーリング: 新しい枠・キャンセル 予測 {report['predicted']:.1f}件 / 実際 {report['actual']}件、"
+            f"スキャン {report['polls']}回{flat}、一部の週のみ {report['partial_scans']}回"
+        )
+        for hour in report['hours']:
+            self.logger.info(f"  {hour['hour']}: 予測 {hour['predicted']:.1f}件 / 実際 {hour['actual']}件")
+        for week in report['weeks']:
+            actual = f"{week['actual_share']:.0%}" if week['actual_share'] is not None else "-"
+            self.logger.info(
+                f"  {week['week']}週目: 予測 {week['predicted_share']:.0%} / 実際 {actual}"
+                f"{'（毎回確認）' if week['hot'] else ''}"
+            )
+
+
+def log_model(predictor: SlotPredictor):
+    """予測のモデルをログに出力"""
+    logger = logging.getLogger(__name__)
+    logger.info(
+        f"新しい枠・キャンセル {predictor.events}件 / 監視時間 {predictor.exposure_hours:.1f}時間"
+        f"（平均 {predictor.base_rate:.2f}件/時）"
+    )
+    for hour, factor in enumerate(predictor.hour_factors):
+        logger.info(f"  {hour:02d}時: {predictor.base_rate * factor:.2f}件/時")
+    for weekday, factor in enumerate(predictor.weekday_factors):
+        logger.info(f"  {WEEKDAYS[weekday]}曜: x{factor:.2f}")
+    for week, share in enumerate(predictor.week_shares):
+        logger.info(f"  {week + 1}週目: {share:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="予約枠の履歴から予測した、新しい枠・キャンセルが出る頻度")
+    parser.add_argument("--target", help="監視対象ID")
+    parser.add_argument("--path", help="履歴のパス（デフォルト: HISTORY_PATH）")
+    parser.add_argument("--config", default=".env", help="設定ファイルのパス")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(args.config)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from src.history import SlotHistory
+    history = SlotHistory(args.path or get_history_path())
+    try:
+        log_model(SlotPredictor.from_history(history, args.target))
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
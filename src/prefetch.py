@@ -0,0 +1,160 @@
+"""
+予約ページの投機的先読み
+
+スキャン中に最もスコアの高い新規枠が見つかった時点で、予約用コンテキストプールの待機ページで
+その枠の予約ページを開き、参加人数・予約者情報の入力を確認画面の手前まで済ませておく
+ブッカーは確定操作だけを行えばよく、ランキングが変わった場合や枠が消えた場合は先読みを破棄する
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+from src.booking_state import BookingState, detect_booking_state
+from src.slots import get_slot_key
+
+
+class SpeculativePrefetcher:
+    """最上位候補の予約ページを先読みするクラス"""
+
+    def __init__(self, pool, booker):
+        self.logger = logging.getLogger(__name__)
+        self.pool = pool
+        self.booker = booker
+
+        # 待機ページ（予約用コンテキストプールから借りる）
+        self.page = None
+
+        # 現在先読み中の枠
+        self.slot: Optional[Dict] = None
+        self.score = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        # 前回のスキャンまでに見つかっていた枠（新規枠の判定に使う）
+        self.known_keys: Set[str] = set()
+
+        # 統計
+        self.hits = 0
+        self.discards = 0
+
+    async def start(self):
+        """待機ページをプールから借りる"""
+        self.page = await self.pool.checkout()
+        self.logger.info("先読み用の待機ページを用意しました")
+
+    def consider(self, slots: Iterable[Dict]):
+        """スキャン途中の枠から先読み対象を選ぶ
+
+        前回のスキャンで見つかっていない枠のうち、最もスコアの高い枠を先読みする。
+        先読み中の枠よりスコアの高い枠が見つかった場合は、先読みを切り替える。
+        """
+        best = None
+        best_score = 0.0
+        for slot in slots:
+            if get_slot_key(slot) in self.known_keys:
+                continue
+            score = self.booker.score_slot(slot)
+            if score > best_score:
+                best, best_score = slot, score
+
+        if best is None:
+            return
+        if self.slot is not None:
+            if get_slot_key(self.slot) == get_slot_key(best) or best_score <= self.score:
+                return
+            self.logger.info(f"ランキングが変わったため先読みを切り替えます: {best['text'][:50]}")
+
+        self._speculate(best, best_score)
+
+    def reconcile(self, current_slots: Iterable[Dict]):
+        """スキャン完了時に呼び出し、消えた枠の先読みを破棄する"""
+        current_keys = {get_slot_key(slot) for slot in current_slots}
+        if self.slot is not None and get_slot_key(self.slot) not in current_keys:
+            self.logger.info(f"先読み中の枠が見つからなくなったため破棄します: {self.slot['text'][:50]}")
+            self.discard()
+        self.known_keys = current_keys
+
+    def _speculate(self, slot: Dict, score: float):
+        """先読みタスクを開始（実行中の先読みは取り消す）"""
+        previous = self._task
+        if previous and not previous.done():
+            previous.cancel()
+        if self.slot is not None:
+            self.discards += 1
+        self.slot = slot
+        self.score = score
+        self._task = asyncio.create_task(self._prefetch(slot, previous))
+
+    async def _prefetch(self, slot: Dict, previous: Optional[asyncio.Task]) -> bool:
+        """予約ページを開き、確認画面の手前まで入力を済ませる"""
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        if self.page is None:
+            self.page = await self.pool.checkout()
+        page = self.page
+
+        self.logger.info(f"予約ページを先読みします: {slot['text'][:50]}")
+        if not await self.booker._click_reservation_link(slot, page):
+            return False
+        if not await self.booker._select_menu(page):
+            return False
+        if not await self.booker._select_datetime(page):
+            return False
+        if not await self.booker._submit_menu_detail_form(page):
+            return False
+        if await detect_booking_state(page) == BookingState.FORM:
+            if not await self.booker._fill_booking_form(page):
+                return False
+
+        self.logger.info(f"先読みが完了しました（確定待ち）: {slot['text'][:50]}")
+        return True
+
+    async def claim(self, slot: Dict):
+        """先読み済みのページを取得（対象の枠でない場合はNone）
+
+        先読みが実行中の場合は完了を待つ（最初からやり直すより速いため）。
+        取得したページは予約完了後に release() で返却する。
+        """
+        if self.slot is None or get_slot_key(self.slot) != get_slot_key(slot):
+            return None
+
+        task = self._task
+        try:
+            ready = await task
+        except (asyncio.CancelledError, Exception) as e:
+            self.logger.warning(f"先読みが完了しませんでした: {e}")
+            ready = False
+
+        page = self.page
+        self.page = None
+        self.slot = None
+        self.score = 0.0
+        self._task = None
+
+        if ready:
+            self.hits += 1
+        self.logger.info(f"先読みページを予約に使用します (先読み完了: {ready})")
+        return page
+
+    async def release(self, page):
+        """予約に使ったページをプールへ返却"""
+        await self.pool.checkin(page)
+
+    def discard(self):
+        """先読みを破棄"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        if self.slot is not None:
+            self.discards += 1
+        self.slot = None
+        self.score = 0.0
+
+    async def close(self):
+        """先読みを破棄して待機ページをプールへ返却"""
+        self.discard()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.page is not None:
+            await self.pool.checkin(self.page)
+            self.page = None
+        self.logger.info(f"先読みを終了しました (使用: {self.hits}件, 破棄: {self.discards}件)")
@@ -0,0 +1,215 @@
+"""
+予約者プロファイル
+
+複数の家族（予約者情報と希望条件の組）を1つのスキャンで扱うためのプロファイル管理
+PROFILES_FILE（JSON）が指定されていない場合は、従来どおり環境変数から1件のプロファイルを作成する
+
+プロファイルファイルの形式:
+    [
+        {
+            "id": "yamada",
+            "booker_name": "山田太郎",
+            "booker_name_kana": "ヤマダ",
+            "booker_name_kana_mei": "タロウ",
+            "booker_email": "yamada@example.com",
+            "booker_phone": "090-1234-5678",
+            "child_name": "山田花子",
+            "child_age": "2",
+            "preferred_days": ["月", "水"],
+            "preferred_time_start": "09:00",
+            "preferred_time_end": "12:00"
+        }
+    ]
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    ConfigError,
+    get_profiles_file,
+    get_booker_name,
+    get_booker_name_kana,
+    get_booker_name_kana_mei,
+    get_booker_email,
+    get_booker_phone,
+    get_child_name,
+    get_child_age,
+    get_preferred_days,
+    get_preferred_time_start,
+    get_preferred_time_end,
+)
+from src.slots import get_slot_key, parse_remaining_seats
+
+
+# 必須項目（プロファイルのキー, 対応する環境変数名）
+REQUIRED_FIELDS = [
+    ("booker_name", "BOOKER_NAME"),
+    ("booker_email", "BOOKER_EMAIL"),
+    ("booker_phone", "BOOKER_PHONE"),
+    ("child_name", "CHILD_NAME"),
+    ("child_age", "CHILD_AGE"),
+]
+
+
+class BookerProfile:
+    """予約者プロファイル（予約者情報と希望条件）"""
+
+    def __init__(
+        self,
+        profile_id: str,
+        booker_name: str = "",
+        booker_name_kana: str = "",
+        booker_name_kana_mei: str = "",
+        booker_email: str = "",
+        booker_phone: str = "",
+        child_name: str = "",
+        child_age: str = "",
+        preferred_days: Optional[List[str]] = None,
+        preferred_time_start: str = "09:00",
+        preferred_time_end: str = "17:00",
+    ):
+        self.profile_id = profile_id
+        self.booker_name = booker_name
+        self.booker_name_kana = booker_name_kana
+        self.booker_name_kana_mei = booker_name_kana_mei
+        self.booker_email = booker_email
+        self.booker_phone = booker_phone
+        self.child_name = child_name
+        self.child_age = str(child_age)
+        self.preferred_days = preferred_days or []
+        self.preferred_time_start = preferred_time_start
+        self.preferred_time_end = preferred_time_end
+
+    @classmethod
+    def from_env(cls) -> "BookerProfile":
+        """環境変数からプロファイルを作成"""
+        return cls(
+            profile_id="default",
+            booker_name=get_booker_name(),
+            booker_name_kana=get_booker_name_kana(),
+            booker_name_kana_mei=get_booker_name_kana_mei(),
+            booker_email=get_booker_email(),
+            booker_phone=get_booker_phone(),
+            child_name=get_child_name(),
+            child_age=get_child_age(),
+            preferred_days=get_preferred_days(),
+            preferred_time_start=get_preferred_time_start(),
+            preferred_time_end=get_preferred_time_end(),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BookerProfile":
+        """辞書からプロファイルを作成（希望条件が未指定の場合は環境変数の値を使う）"""
+        if not data.get("id"):
+            raise ConfigError("Each profile in PROFILES_FILE must have an 'id'")
+        preferred_days = data.get("preferred_days", get_preferred_days())
+        if isinstance(preferred_days, str):
+            preferred_days = [day.strip() for day in preferred_days.split(",") if day.strip()]
+        return cls(
+            profile_id=str(data["id"]),
+            booker_name=data.get("booker_name", ""),
+            booker_name_kana=data.get("booker_name_kana", ""),
+            booker_name_kana_mei=data.get("booker_name_kana_mei", ""),
+            booker_email=data.get("booker_email", ""),
+            booker_phone=data.get("booker_phone", ""),
+            child_name=data.get("child_name", ""),
+            child_age=data.get("child_age", ""),
+            preferred_days=preferred_days,
+            preferred_time_start=data.get("preferred_time_start", get_preferred_time_start()),
+            preferred_time_end=data.get("preferred_time_end", get_preferred_time_end()),
+        )
+
+    def missing_fields(self) -> List[str]:
+        """未設定の必須項目名を取得"""
+        return [env_name for field, env_name in REQUIRED_FIELDS if not getattr(self, field)]
+
+
+def load_profiles(path: Optional[str] = None) -> List[BookerProfile]:
+    """プロファイルを読み込む
+
+    Args:
+        path: プロファイルファイルのパス（未指定の場合はPROFILES_FILE）
+
+    Returns:
+        List[BookerProfile]: プロファイルのリスト（ファイルがない場合は環境変数から1件）
+
+    Raises:
+        ConfigError: ファイルの形式が不正な場合
+    """
+    path = path or get_profiles_file()
+    if not path:
+        return [BookerProfile.from_env()]
+
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"PROFILES_FILE could not be loaded ({path}): {e}")
+
+    if not isinstance(data, list) or not data:
+        raise ConfigError("PROFILES_FILE must contain a non-empty JSON list of profiles")
+
+    profiles = [BookerProfile.from_dict(item) for item in data]
+    ids = [profile.profile_id for profile in profiles]
+    if len(ids) != len(set(ids)):
+        raise ConfigError("Profile ids in PROFILES_FILE must be unique")
+    return profiles
+
+
+class FairSeatAllocator:
+    """新規枠の残席をプロファイル間で公平に割り当てるクラス
+
+    残席数を超えてプロファイルを同じ枠に向かわせない（最後の1席を取り合わない）。
+    予約成功数の少ないプロファイルを優先し、同数の場合はスコア、さらに同点の場合は順番に回す。
+    割り当てられなかったプロファイルは控えとして保持し、割り当て先の予約が失敗した場合に繰り上げる。
+    """
+
+    def __init__(self):
+        self.booked_counts: Dict[str, int] = {}
+        self.fallbacks: Dict[str, List] = {}
+        self._turn = 0
+
+    def allocate(self, slot: Dict, candidates: List[Tuple[object, float]]) -> List:
+        """枠を割り当てるブッカーを決める
+
+        Args:
+            slot: 予約枠の情報
+            candidates: (ブッカー, スコア) のリスト（スコア0より大きいもの）
+
+        Returns:
+            List: 予約を行うブッカー（残席数まで）
+        """
+        if not candidates:
+            return []
+
+        count = len(candidates)
+        turn = self._turn
+        self._turn += 1
+        ordered = sorted(
+            enumerate(candidates),
+            key=lambda item: (
+                self.booked_counts.get(item[1][0].profile_id, 0),
+                -item[1][1],
+                (item[0] - turn) % count,
+            ),
+        )
+        bookers = [booker for _, (booker, _) in ordered]
+
+        # 残席表示がない場合は1席として扱う（取り合いを避ける）
+        seats = parse_remaining_seats(slot.get('text', ''))
+        seats = 1 if seats is None else max(seats, 1)
+
+        self.fallbacks[get_slot_key(slot)] = bookers[seats:]
+        return bookers[:seats]
+
+    def next_fallback(self, slot: Dict):
+        """割り当て先の予約が失敗した場合に、控えのブッカーを取得（いない場合はNone）"""
+        fallbacks = self.fallbacks.get(get_slot_key(slot))
+        if not fallbacks:
+            return None
+        return fallbacks.pop(0)
+
+    def record_success(self, profile_id: str):
+        """予約成功を記録"""
+        self.booked_counts[profile_id] = self.booked_counts.get(profile_id, 0) + 1
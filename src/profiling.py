@@ -0,0 +1,460 @@
+"""
+プロファイリング
+
+スキャンが遅いときに、時間がPlaywrightとの通信・Pythonでの解析・ログ出力のどこで使われているかを、外部のツールなしで調べる
+PROFILE_MODES（または --profile）で種類を選び、監視・予約・ベンチマークの実行中に記録する
+
+- cpu: cProfileによる決定論的プロファイリング（コルーチンは再開ごとに1回の呼び出しとして数える）
+- sample: イベントループのスレッドのスタックを別スレッドから一定間隔で採取し、実行中のタスク名をつけて集計する
+          スタックの末端で、待機（I/O待ち、Playwrightの応答待ちを含む）・playwright・logging・asyncio・python に分類する
+- loop: イベントループの遅れ（スリープの超過時間）を採取する
+- memory: tracemallocのスナップショットを一定間隔とフェーズの切り替わりで取り、増えた割り当て元を記録する
+
+記録はフェーズごとに分ける
+- warmup: 監視の開始まで（ブラウザの起動・ページの読み込み・監視期間の待機）
+- burst: 監視の開始から PROFILE_BURST_SECONDS 秒（予約公開直後の集中監視）
+- steady: それ以降の監視
+- booking: 予約の実行中（他のフェーズより優先）
+
+終了時に PROFILE_DIR/profile-<日時>-<実行ID>/ にレポート（report.json）と、
+フェーズごとの折りたたんだスタック（<フェーズ>.folded、flamegraph.pl などで描画できる）・cProfileの統計（<フェーズ>.pstats）を書き出す
+
+使用方法:
+    profiler = get_profiler()
+    await profiler.start()
+    ...
+    with get_profiler().booking():
+        await booker.execute_booking(...)
+    ...
+    await profiler.close()
+"""
+
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    get_profile_burst_seconds,
+    get_profile_dir,
+    get_profile_loop_lag_interval_ms,
+    get_profile_memory_interval_seconds,
+    get_profile_modes,
+    get_profile_sample_interval_ms,
+)
+
+
+PHASES = ("warmup", "burst", "steady", "booking")
+
+# 採取するスタックの最大の深さ
+MAX_STACK_DEPTH = 64
+# tracemallocで記録する割り当て元のフレーム数
+MEMORY_FRAMES = 10
+# レポートに載せる関数・割り当て元の数
+TOP_N = 20
+# イベントループの遅れをストールとみなす閾値（ミリ秒）
+STALL_MS = 100.0
+# loopを記録しない場合にフェーズの切り替わりを確認する間隔（秒）
+PHASE_CHECK_INTERVAL = 0.1
+
+# プロジェクトのルート（スタックのファイル名を短くする）
+_ROOT = str(Path(__file__).resolve().parent.parent) + "/"
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_ROOT):
+        return filename[len(_ROOT):]
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return Path(filename).name
+
+
+def classify_stack(stack: List[Tuple[str, str]]) -> str:
+    """スタック（末端から順の (ファイル名, 関数名)）を分類する"""
+    if not stack:
+        return "idle"
+    leaf_file = stack[0][0]
+    if leaf_file.endswith("selectors.py"):
+        # イベントループがI/Oを待っている（Playwrightの応答待ちを含む）
+        return "idle"
+    for filename, _ in stack:
+        if "/logging/" in filename:
+            return "logging"
+        if "/playwright/" in filename:
+            return "playwright"
+    if "/asyncio/" in leaf_file:
+        return "asyncio"
+    return "python"
+
+
+def _stats(values: List[float]) -> Dict:
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.mean(ordered),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p90_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'max_ms': ordered[-1],
+        'stalls': sum(1 for value in ordered if value >= STALL_MS),
+    }
+
+
+class _PhaseSamples:
+    """1つのフェーズで採取したスタック"""
+
+    def __init__(self):
+        self.total = 0
+        self.categories: Counter = Counter()
+        self.tasks: Counter = Counter()
+        # 末端の関数（自身の時間）と、スタックに含まれる関数（呼び出し先を含む時間）
+        self.self_counts: Counter = Counter()
+        self.inclusive_counts: Counter = Counter()
+        self.folded: Counter = Counter()
+
+    def add(self, task_name: Optional[str], stack: List[Tuple[str, str]]):
+        category = classify_stack(stack)
+        self.total += 1
+        self.categories[category] += 1
+        self.tasks[task_name or "-"] += 1
+        labels = [f"{name} ({_short_path(filename)})" for filename, name in stack]
+        if labels:
+            self.self_counts[labels[0]] += 1
+        for label in set(labels):
+            self.inclusive_counts[label] += 1
+        self.folded[";".join([f"task:{task_name or '-'}"] + labels[::-1])] += 1
+
+    def report(self) -> Dict:
+        total = self.total or 1
+        return {
+            'samples': self.total,
+            'categories': {name: count / total for name, count in self.categories.most_common()},
+            'tasks': dict(self.tasks.most_common(TOP_N)),
+            'top_self': [{'function': name, 'share': count / total} for name, count in self.self_counts.most_common(TOP_N)],
+            'top_inclusive': [
+                {'function': name, 'share': count / total} for name, count in self.inclusive_counts.most_common(TOP_N)
+            ],
+        }
+
+
+class Profiler:
+    """フェーズごとのプロファイリング"""
+
+    def __init__(
+        self,
+        modes: Optional[List[str]] = None,
+        directory: str = "profiles",
+        sample_interval_ms: float = 5.0,
+        lag_interval_ms: float = 50.0,
+        memory_interval: float = 60.0,
+        burst_seconds: float = 30.0,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.modes = list(modes or [])
+        self.directory = Path(directory)
+        self.sample_interval = sample_interval_ms / 1000
+        self.lag_interval = lag_interval_ms / 1000
+        self.memory_interval = memory_interval
+        self.burst_seconds = burst_seconds
+        self.run_id = uuid.uuid4().hex[:12]
+
+        self.running = False
+        self._window: Optional[datetime] = None
+        self._bookings = 0
+        self._phase = "warmup"
+        self._phase_started = 0.0
+        self.durations: Dict[str, float] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples: Dict[str, _PhaseSamples] = {}
+        self.lags: Dict[str, List[float]] = {}
+        self._cpu: Dict[str, object] = {}
+        self._memory_started = False
+        self._memory_snapshot = None
+        self._memory_taken = 0.0
+        self.memory_windows: List[Dict] = []
+
+    @classmethod
+    def from_env(cls, modes: Optional[List[str]] = None) -> "Profiler":
+        return cls(
+            get_profile_modes() if modes is None else modes,
+            get_profile_dir(),
+            get_profile_sample_interval_ms(),
+            get_profile_loop_lag_interval_ms(),
+            get_profile_memory_interval_seconds(),
+            get_profile_burst_seconds(),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.modes)
+
+    def current_phase(self) -> str:
+        if self._bookings:
+            return "booking"
+        if self._window is None or datetime.now() < self._window:
+            return "warmup"
+        if datetime.now() < self._window + timedelta(seconds=self.burst_seconds):
+            return "burst"
+        return "steady"
+
+    def begin_window(self, at: Optional[datetime] = None):
+        """監視の開始（バーストのフェーズの起点）を記録する"""
+        self._window = at or datetime.now()
+        self._check_phase()
+
+    @contextmanager
+    def booking(self):
+        """予約の実行中をbookingのフェーズとして記録する"""
+        self._bookings += 1
+        self._check_phase()
+        try:
+            yield
+        finally:
+            self._bookings -= 1
+            self._check_phase()
+
+    async def start(self):
+        """記録を開始（無効の場合は何もしない）"""
+        if not self.enabled or self.running:
+            return
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._phase = self.current_phase()
+        self._phase_started = time.perf_counter()
+        if "cpu" in self.modes:
+            self._enable_cpu(self._phase)
+        if "memory" in self.modes:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(MEMORY_FRAMES)
+                self._memory_started = True
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            self._memory_taken = time.perf_counter()
+        if "sample" in self.modes:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        self._watch_task = asyncio.create_task(self._watch())
+        self.logger.info(f"プロファイリングを開始しました ({', '.join(self.modes)}, 実行ID: {self.run_id})")
+
+    def _check_phase(self):
+        """フェーズの切り替わりを反映する（イベントループのスレッドから呼ぶ）"""
+        if not self.running:
+            return
+        phase = self.current_phase()
+        if phase == self._phase:
+            return
+        now = time.perf_counter()
+        self.durations[self._phase] = self.durations.get(self._phase, 0.0) + now - self._phase_started
+        if "cpu" in self.modes:
+            self._cpu[self._phase].disable()
+            self._enable_cpu(phase)
+        if "memory" in self.modes:
+            self._take_memory_window(self._phase)
+        self._phase = phase
+        # スナップショットにかかった時間は次のフェーズに含めない
+        self._phase_started = time.perf_counter()
+
+    def _enable_cpu(self, phase: str):
+        import cProfile
+        if phase not in self._cpu:
+            self._cpu[phase] = cProfile.Profile()
+        self._cpu[phase].enable()
+
+    async def _watch(self):
+        """イベントループの遅れの採取と、フェーズ・メモリの定期的な確認"""
+        interval = self.lag_interval if "loop" in self.modes else PHASE_CHECK_INTERVAL
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            if "loop" in self.modes:
+                lag_ms = max(0.0, (time.perf_counter() - started - interval) * 1000)
+                self.lags.setdefault(self._phase, []).append(lag_ms)
+            self._check_phase()
+            if "memory" in self.modes and time.perf_counter() - self._memory_taken >= self.memory_interval:
+                self._take_memory_window(self._phase)
+
+    def _sample_loop(self):
+        """イベントループのスレッドのスタックを採取する（別スレッドで実行）"""
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            task = current_tasks.get(self._loop)
+            task_name = task.get_name() if task is not None else None
+            self.samples.setdefault(self._phase, _PhaseSamples()).add(task_name, stack)
+
+    def _take_memory_window(self, phase: str):
+        """前回のスナップショットからの割り当ての増減を記録する"""
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        now = time.perf_counter()
+        current, peak = tracemalloc.get_traced_memory()
+        top = []
+        if self._memory_snapshot is not None:
+            for stat in snapshot.compare_to(self._memory_snapshot, "lineno")[:TOP_N]:
+                frame = stat.traceback[0]
+                top.append({
+                    'location': f"{_short_path(frame.filename)}:{frame.lineno}",
+                    'size_diff_kb': stat.size_diff / 1024,
+                    'count_diff': stat.count_diff,
+                })
+        self.memory_windows.append({
+            'phase': phase,
+            'seconds': now - self._memory_taken,
+            'current_mb': current / (1024 * 1024),
+            'peak_mb': peak / (1024 * 1024),
+            'top': top,
+        })
+        self._memory_snapshot = snapshot
+        self._memory_taken = now
+
+    def report(self) -> Dict:
+        """フェーズごとのレポート"""
+        phases = {}
+        for phase in PHASES:
+            entry: Dict = {}
+            if phase in self.durations:
+                entry['seconds'] = self.durations[phase]
+            if phase in self.samples:
+                entry['sample'] = self.samples[phase].report()
+            if phase in self.lags:
+                entry['loop_lag'] = _stats(self.lags[phase])
+            if phase in self._cpu:
+                entry['cpu'] = self._cpu_report(self._cpu[phase])
+            windows = [window for window in self.memory_windows if window['phase'] == phase]
+            if windows:
+                entry['memory'] = windows
+            if entry:
+                phases[phase] = entry
+        return {
+            'run_id': self.run_id,
+            'created_at': datetime.now().isoformat(timespec="seconds"),
+            'modes': self.modes,
+            'sample_interval_ms': self.sample_interval * 1000,
+            'loop_lag_interval_ms': self.lag_interval * 1000,
+            'phases': phases,
+        }
+
+    @staticmethod
+    def _cpu_report(profile) -> List[Dict]:
+        import pstats
+        stats = pstats.Stats(profile).stats
+        top = sorted(stats.items(), key=lambda item: -item[1][2])[:TOP_N]
+        return [
+            {
+                'function': f"{name} ({_short_path(filename)}:{line})",
+                'calls': calls,
+                'tottime_ms': tottime * 1000,
+                'cumtime_ms': cumtime * 1000,
+            }
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in top
+        ]
+
+    async def close(self) -> Optional[Path]:
+        """記録を終了してレポートを書き出し、出力先のディレクトリを返す（無効の場合はNone）"""
+        if not self.running:
+            return None
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+        self.durations[self._phase] = self.durations.get(self._phase, 0.0) + time.perf_counter() - self._phase_started
+        if "cpu" in self.modes:
+            self._cpu[self._phase].disable()
+        if "memory" in self.modes:
+            import tracemalloc
+            self._take_memory_window(self._phase)
+            if self._memory_started:
+                tracemalloc.stop()
+        self.running = False
+
+        report = self.report()
+        self.log_report(report)
+        try:
+            output_dir = self.export(report)
+            self.logger.info(f"プロファイリングのレポートを保存しました: {output_dir}")
+            return output_dir
+        except OSError as e:
+            self.logger.error(f"プロファイリングのレポートの保存に失敗しました: {e}")
+            return None
+
+    def export(self, report: Dict) -> Path:
+        output_dir = self.directory / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.run_id}"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / "report.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        for phase, samples in self.samples.items():
+            lines = [f"{stack} {count}" for stack, count in samples.folded.most_common()]
+            (output_dir / f"{phase}.folded").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        for phase, profile in self._cpu.items():
+            profile.dump_stats(str(output_dir / f"{phase}.pstats"))
+        return output_dir
+
+    def log_report(self, report: Dict):
+        """フェーズごとの要約をログに出力"""
+        for phase, entry in report['phases'].items():
+            self.logger.info(f"プロファイル [{phase}] {entry.get('seconds', 0):.1f}秒")
+            sample = entry.get('sample')
+            if sample and sample['samples']:
+                shares = ", ".join(f"{name} {share:.0%}" for name, share in sample['categories'].items())
+                self.logger.info(f"  スタック {sample['samples']}件: {shares}")
+                for item in sample['top_self'][:5]:
+                    self.logger.info(f"    {item['share']:5.1%}  {item['function']}")
+            lag = entry.get('loop_lag')
+            if lag and lag['count']:
+                self.logger.info(
+                    f"  イベントループの遅れ: p50 {lag['p50_ms']:.1f}ms, p99 {lag['p99_ms']:.1f}ms, "
+                    f"最大 {lag['max_ms']:.1f}ms, {STALL_MS:.0f}ms以上 {lag['stalls']}回"
+                )
+            for item in entry.get('cpu', [])[:5]:
+                self.logger.info(f"  cpu {item['tottime_ms']:8.1f}ms  {item['calls']:6d}回  {item['function']}")
+            for window in entry.get('memory', []):
+                growth = sum(item['size_diff_kb'] for item in window['top'])
+                self.logger.info(
+                    f"  メモリ {window['current_mb']:.1f}MB (ピーク {window['peak_mb']:.1f}MB, "
+                    f"上位の増加 {growth:+.0f}KB / {window['seconds']:.0f}秒)"
+                )
+
+
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Profiler:
+    """プロセス全体で共有するプロファイラー（PROFILE_MODESで有効化）"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler.from_env()
+    return _profiler
+
+
+def set_profiler(profiler: Optional[Profiler]):
+    """共有するプロファイラーを差し替える（Noneの場合は次回のget_profilerで設定から作り直す）"""
+    global _profiler
+    _profiler = profiler
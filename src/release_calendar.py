@@ -0,0 +1,236 @@
+"""
+予約公開カレンダー
+
+繰り返しの規則（毎月1日の9:30など）・単発の公開日時・休日などの例外から、
+今後の予約公開日時と監視期間（公開3秒前 ～ 公開後の監視時間）を事前に計算する
+監視期間が重なる公開日時は1つの監視期間にまとめる
+RELEASE_CALENDAR_FILE（JSON）が指定されていない場合は、従来どおりNEXT_RELEASE_DATETIMEの1件のみ
+
+カレンダーファイルの形式:
+    {
+        "rules": [
+            {"day": 1, "time": "09:30"},
+            {"day": 15, "time": "13:00", "months": [4, 10]}
+        ],
+        "dates": ["2025-12-20 10:00:00"],
+        "exceptions": [
+            "2026-01-01",
+            {"date": "2026-05-01", "move_to": "2026-05-07 09:30:00"}
+        ],
+        "monitor_duration_minutes": 10
+    }
+
+- rules: 毎月 day 日の time に公開（months を指定した場合はその月のみ、存在しない日の月は公開なし）
+- dates: 単発の公開日時
+- exceptions: その日の公開を取りやめる（move_to を指定した場合はその日時に振り替える）
+"""
+
+import json
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    ConfigError,
+    get_release_calendar_file,
+    get_release_calendar_horizon_days,
+    get_next_release_datetime,
+    get_monitor_duration_minutes,
+)
+
+
+# 予約公開日時の何秒前から監視を開始するか
+MONITOR_LEAD_SECONDS = 3
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ReleaseRule:
+    """毎月の予約公開の規則"""
+
+    def __init__(self, day: int, at: time, months: Optional[List[int]] = None):
+        self.day = day
+        self.at = at
+        self.months = set(months) if months else None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ReleaseRule":
+        try:
+            day = int(data["day"])
+            at = datetime.strptime(str(data.get("time", "09:30")), "%H:%M").time()
+            months = [int(month) for month in data.get("months", [])]
+        except (KeyError, TypeError, ValueError):
+            raise ConfigError(f"Invalid rule in RELEASE_CALENDAR_FILE: {data}")
+        if not 1 <= day <= 31:
+            raise ConfigError(f"Rule day must be between 1 and 31: {data}")
+        if any(not 1 <= month <= 12 for month in months):
+            raise ConfigError(f"Rule months must be between 1 and 12: {data}")
+        return cls(day, at, months)
+
+    def occurrences(self, start: datetime, end: datetime) -> List[datetime]:
+        """期間内（start以上end未満）の公開日時"""
+        result = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            if self.months is None or month in self.months:
+                try:
+                    release = datetime.combine(date(year, month, self.day), self.at)
+                except ValueError:
+                    # 31日がない月など
+                    release = None
+                if release is not None and start <= release < end:
+                    result.append(release)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return result
+
+
+class ReleaseWindow:
+    """監視期間（重なる公開日時をまとめたもの）"""
+
+    def __init__(self, start: datetime, end: datetime, releases: List[datetime]):
+        self.start = start
+        self.end = end
+        self.releases = releases
+
+    @property
+    def release_datetime(self) -> datetime:
+        """監視期間内の最初の予約公開日時"""
+        return self.releases[0]
+
+    def __repr__(self) -> str:
+        return f"ReleaseWindow({self.start} ～ {self.end}, releases={len(self.releases)})"
+
+
+class ReleaseCalendar:
+    """予約公開カレンダー"""
+
+    def __init__(
+        self,
+        rules: Optional[List[ReleaseRule]] = None,
+        dates: Optional[List[datetime]] = None,
+        exceptions: Optional[Dict[date, Optional[datetime]]] = None,
+        monitor_duration_minutes: int = 10,
+        horizon_days: int = 62,
+    ):
+        self.rules = rules or []
+        self.dates = sorted(dates or [])
+        # 取りやめる日 → 振替先の日時（振替なしはNone）
+        self.exceptions = exceptions or {}
+        self.monitor_duration_minutes = monitor_duration_minutes
+        self.horizon_days = horizon_days
+
+    @classmethod
+    def single(cls, release_datetime: datetime, monitor_duration_minutes: int = 10) -> "ReleaseCalendar":
+        """1件の予約公開日時だけのカレンダー"""
+        return cls(dates=[release_datetime], monitor_duration_minutes=monitor_duration_minutes)
+
+    @property
+    def recurring(self) -> bool:
+        """繰り返しの規則があるか（ない場合は単発の公開日時が終われば監視も終わる）"""
+        return bool(self.rules)
+
+    def releases_between(self, start: datetime, end: datetime) -> List[datetime]:
+        """期間内（start以上end未満）の予約公開日時（例外・振替を反映）"""
+        releases = set(release for release in self.dates if start <= release < end)
+        for rule in self.rules:
+            releases.update(rule.occurrences(start, end))
+
+        # 取りやめをすべて反映してから振替を加える（振替先が別の例外の日と重なっても消さない）
+        releases = set(release for release in releases if release.date() not in self.exceptions)
+        for move_to in self.exceptions.values():
+            if move_to is not None and start <= move_to < end:
+                releases.add(move_to)
+        return sorted(releases)
+
+    def upcoming_windows(self, now: Optional[datetime] = None) -> List[ReleaseWindow]:
+        """今後の監視期間（終了がnowより後のもの、horizon_days日先まで）"""
+        now = now or datetime.now()
+        duration = timedelta(minutes=self.monitor_duration_minutes)
+        lead = timedelta(seconds=MONITOR_LEAD_SECONDS)
+
+        # 監視中の監視期間にまとめられる公開日時をすべて含めるため、
+        # 監視期間がつながらなくなる（監視時間 + 3秒より離れる）まで遡って探す
+        begin = now - duration
+        while True:
+            earlier = self.releases_between(begin - duration - lead, begin)
+            if not earlier:
+                break
+            begin = earlier[0]
+        releases = self.releases_between(begin, now + timedelta(days=self.horizon_days))
+
+        windows: List[ReleaseWindow] = []
+        for release in releases:
+            start, end = release - lead, release + duration
+            if windows and start <= windows[-1].end:
+                # 重なる（または接する）監視期間はまとめる
+                windows[-1].end = max(windows[-1].end, end)
+                windows[-1].releases.append(release)
+            else:
+                windows.append(ReleaseWindow(start, end, [release]))
+        # まとめた後で、終わった監視期間を除く
+        return [window for window in windows if window.end > now]
+
+    def next_window(self, after: Optional[datetime] = None) -> Optional[ReleaseWindow]:
+        """次の監視期間（afterより後に終わる最初のもの、ない場合はNone）"""
+        windows = self.upcoming_windows(after)
+        return windows[0] if windows else None
+
+
+def _parse_datetime(value: str, field: str) -> datetime:
+    try:
+        return datetime.strptime(str(value), DATETIME_FORMAT)
+    except ValueError:
+        raise ConfigError(f"Invalid {field} in RELEASE_CALENDAR_FILE: {value} (expected YYYY-MM-DD HH:MM:SS)")
+
+
+def _parse_exception(item) -> Tuple[date, Optional[datetime]]:
+    if isinstance(item, dict):
+        day, move_to = item.get("date"), item.get("move_to")
+    else:
+        day, move_to = item, None
+    try:
+        day = datetime.strptime(str(day), "%Y-%m-%d").date()
+    except ValueError:
+        raise ConfigError(f"Invalid exception date in RELEASE_CALENDAR_FILE: {item} (expected YYYY-MM-DD)")
+    return day, _parse_datetime(move_to, "move_to") if move_to else None
+
+
+def load_release_calendar(path: Optional[str] = None) -> ReleaseCalendar:
+    """予約公開カレンダーを読み込む
+
+    Args:
+        path: カレンダーファイルのパス（未指定の場合はRELEASE_CALENDAR_FILE）
+
+    Returns:
+        ReleaseCalendar: カレンダー（ファイルがない場合はNEXT_RELEASE_DATETIMEの1件）
+
+    Raises:
+        ConfigError: ファイルの形式が不正な場合
+    """
+    path = path or get_release_calendar_file()
+    if not path:
+        return ReleaseCalendar.single(get_next_release_datetime(), get_monitor_duration_minutes())
+
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"RELEASE_CALENDAR_FILE could not be loaded ({path}): {e}")
+    if not isinstance(data, dict):
+        raise ConfigError("RELEASE_CALENDAR_FILE must contain a JSON object")
+
+    rules = [ReleaseRule.from_dict(item) for item in data.get("rules", [])]
+    dates = [_parse_datetime(item, "date") for item in data.get("dates", [])]
+    if not rules and not dates:
+        raise ConfigError("RELEASE_CALENDAR_FILE must contain at least one rule or date")
+
+    duration = int(data.get("monitor_duration_minutes", get_monitor_duration_minutes()))
+    if duration < 1:
+        raise ConfigError("monitor_duration_minutes in RELEASE_CALENDAR_FILE must be at least 1")
+
+    return ReleaseCalendar(
+        rules=rules,
+        dates=dates,
+        exceptions=dict(_parse_exception(item) for item in data.get("exceptions", [])),
+        monitor_duration_minutes=duration,
+        horizon_days=get_release_calendar_horizon_days(),
+    )
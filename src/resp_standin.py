@@ -0,0 +1,170 @@
+"""
+Redis互換サーバーの代用
+
+分散監視（COORDINATION_BACKEND=redis）をRedisなしで試すための、メモリ上の最小限のRESPサーバー
+RedisCoordinationが使うコマンド（PING, GET, SET [NX] [PX|EX], DEL, KEYS, SELECT）のみ対応する
+EVALはLuaを実行せず、RedisCoordinationが使う確保の解除・延長のスクリプトのみ同じ動作で処理する
+
+使用方法:
+    python -m src.resp_standin --port 6379
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.coordination import RELEASE_CLAIM_SCRIPT, RENEW_CLAIM_SCRIPT
+
+
+class RespStandIn:
+    """メモリ上のRESPサーバー"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """サーバーを起動（port=0の場合は空いているポートを使う）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"RESPサーバーを起動しました: {self.host}:{self.port}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # インラインコマンド（redis-cliやtelnetから）
+            return line.decode("utf-8").split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = await reader.readline()
+            length = int(header[1:-2])
+            data = await reader.readexactly(length + 2)
+            args.append(data[:-2].decode("utf-8"))
+        return args
+
+    def _execute(self, args: List[str]) -> bytes:
+        if not args:
+            return b"-ERR empty command\r\n"
+        command = args[0].upper()
+        if command == "PING":
+            return b"+PONG\r\n"
+        if command == "SELECT":
+            return b"+OK\r\n"
+        if command == "GET" and len(args) == 2:
+            return self._bulk(self._get(args[1]))
+        if command == "SET" and len(args) >= 3:
+            return self._set(args[1], args[2], [option.upper() for option in args[3:]], args[3:])
+        if command == "DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._get(key) is not None:
+                    del self._data[key]
+                    removed += 1
+            return b":%d\r\n" % removed
+        if command == "KEYS" and len(args) == 2:
+            keys = [key for key in list(self._data) if fnmatch.fnmatchcase(key, args[1]) and self._get(key) is not None]
+            return b"*%d\r\n" % len(keys) + b"".join(self._bulk(key) for key in keys)
+        if command == "EVAL" and len(args) >= 4:
+            return self._eval(args[1], args[3:3 + int(args[2])], args[3 + int(args[2]):])
+        return f"-ERR unknown command or wrong number of arguments '{args[0]}'\r\n".encode("utf-8")
+
+    def _eval(self, script: str, keys: List[str], argv: List[str]) -> bytes:
+        """確保の解除・延長のスクリプトのみ処理する（1つのコマンドとして実行されるため不可分）"""
+        if script == RELEASE_CLAIM_SCRIPT and len(keys) == 1 and len(argv) == 1:
+            if self._get(keys[0]) != argv[0]:
+                return b":0\r\n"
+            del self._data[keys[0]]
+            return b":1\r\n"
+        if script == RENEW_CLAIM_SCRIPT and len(keys) == 1 and len(argv) == 2:
+            if self._get(keys[0]) != argv[0]:
+                return b":0\r\n"
+            expires_at = time.monotonic() + float(argv[1]) / 1000 if argv[1] else None
+            self._data[keys[0]] = (argv[0], expires_at)
+            return b":1\r\n"
+        return b"-ERR only the claim release/renew scripts are supported\r\n"
+
+    def _set(self, key: str, value: str, options: List[str], raw: List[str]) -> bytes:
+        expires_at = None
+        nx = False
+        i = 0
+        while i < len(options):
+            if options[i] == "NX":
+                nx = True
+            elif options[i] in ("PX", "EX") and i + 1 < len(options):
+                amount = float(raw[i + 1])
+                expires_at = time.monotonic() + (amount / 1000 if options[i] == "PX" else amount)
+                i += 1
+            else:
+                return b"-ERR syntax error\r\n"
+            i += 1
+        if nx and self._get(key) is not None:
+            return b"$-1\r\n"
+        self._data[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    @staticmethod
+    def _bulk(value: Optional[str]) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        data = value.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis互換サーバーの代用（分散監視の動作確認用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(RespStandIn(args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,112 @@
 """
 スケジューラー
 
-予約公開日時に基づいて自動実行を管理する
+予約公開カレンダーの監視期間に基づいて自動実行を管理する
 """
 
-import asyncio
 import logging
-import schedule
-import time
 from datetime import datetime, timedelta
-from threading import Thread
+from typing import Dict, List, Optional
 
 from src.scraper import AirReserveScraper
 from src.booker import AirReserveBooker
 from src.notifier import NotificationManager
+from src.pipeline import SlotPipeline
+from src.coordination import create_coordinator
+from src.ledger import open_ledger
+from src.profiles import load_profiles
+from src.release_calendar import ReleaseCalendar, ReleaseWindow, load_release_calendar
+from src.targets import load_targets
+from src.timing import sleep_until
 from src.config import (
-    get_next_release_datetime,
-    get_monitor_duration_minutes,
+    ConfigError,
+    get_scheduler_prepare_seconds,
+    get_scheduler_coarse_margin_seconds,
 )
 
 
 class Scheduler:
-    """スケジューラークラス"""
+    """スケジューラークラス
     
-    def __init__(self):
+    予約公開カレンダーの監視期間ごとに、開始の直前まで非同期に待機し、メインのイベントループ上で監視を実行する。
+    監視開始の SCHEDULER_PREPARE_SECONDS 秒前にブラウザを起動してカレンダーを読み込み、
+    予約公開日時の3秒前に監視（スキャン）を開始する。各トリガーの遅延をログに出力する。
+    監視期間が終わると次の監視期間を計算し直すため、繰り返しの規則があれば再起動なしで毎回の公開を監視する。
+    """
+    
+    def __init__(self, calendar: Optional[ReleaseCalendar] = None, once: bool = False):
         self.logger = logging.getLogger(__name__)
         self.notifier = NotificationManager()
         
-        # 予約公開日時の設定
-        self.release_datetime = get_next_release_datetime()
+        # 予約公開カレンダー（未指定の場合はRELEASE_CALENDAR_FILE、またはNEXT_RELEASE_DATETIMEの1件）
+        self.calendar = calendar or load_release_calendar()
+        # 監視対象（予約公開日時はカレンダーに従うため、定期実行モードでは1件のみ）
+        targets = load_targets()
+        if len(targets) > 1:
+            raise ConfigError(
+                "Schedule mode monitors a single target; use --mode monitor for multiple targets in TARGETS_FILE"
+            )
+        self.target = targets[0]
+        # 次の監視期間のみ実行して終了するか
+        self.once = once
+        self.window: Optional[ReleaseWindow] = None
+        self.release_datetime: Optional[datetime] = None
+        self.prepare_seconds = get_scheduler_prepare_seconds()
+        self.coarse_margin = get_scheduler_coarse_margin_seconds()
         
         self.monitoring_active = False
+        self.booking_succeeded = False
         
-    def start(self):
-        """スケジューラーを開始"""
-        self.logger.info("スケジューラーを開始します")
-        
-        # 予約公開日時の3秒前から監視を開始するジョブをスケジュール
-        monitor_time = self.release_datetime - timedelta(seconds=3)
+        # トリガーごとの予定時刻と遅延
+        self.trigger_log: List[Dict] = []
         
-        # 毎日同じ時刻にチェック（実際の公開日時は月1回なので、その日のみ実行される）
-        schedule.every().day.at(monitor_time.strftime("%H:%M:%S")).do(self._start_monitoring_job)
+    async def start(self):
+        """スケジューラーを開始（今後の監視期間がなくなるまで戻らない）"""
+        self.logger.info("スケジューラーを開始します")
         
-        self.logger.info(f"監視開始時刻をスケジュール: {monitor_time}")
+        after = datetime.now()
+        try:
+            while True:
+                windows = self.calendar.upcoming_windows(after)
+                if not windows:
+                    self.logger.warning("今後の予約公開日時はありません")
+                    return
+                
+                self.logger.info("今後の監視期間:")
+                for window in windows:
+                    releases = ", ".join(release.strftime("%Y-%m-%d %H:%M") for release in window.releases)
+                    self.logger.info(f"  {window.start} ～ {window.end} (予約公開: {releases})")
+                
+                await self._run_window(windows[0])
+                if self.once:
+                    return
+                # 同じ監視期間を繰り返さないよう、終了時刻以降の監視期間を探す
+                after = max(datetime.now(), windows[0].end)
+        finally:
+            # 送信待ちの通知を送ってから終了する
+            await self.notifier.close()
+    
+    async def _run_window(self, window: ReleaseWindow):
+        """1つの監視期間の準備から監視終了までを実行"""
+        self.window = window
+        self.release_datetime = window.release_datetime
+        self.booking_succeeded = False
         
-        # スケジューラーループを開始
-        self._run_scheduler()
+        prepare_at = window.start - timedelta(seconds=self.prepare_seconds)
+        self.logger.info(f"監視開始時刻をスケジュール: {window.start} (準備開始: {prepare_at})")
         
-    def _run_scheduler(self):
-        """スケジューラーのメインループ"""
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(1)
-            except KeyboardInterrupt:
-                self.logger.info("スケジューラーが中断されました")
-                break
-            except Exception as e:
-                self.logger.error(f"スケジューラーエラー: {e}")
-                time.sleep(5)
+        await self._trigger("prepare", prepare_at)
+        await self._start_monitoring_job()
+            
+    async def _trigger(self, name: str, at: datetime) -> float:
+        """指定日時まで待機し、遅延を記録する（既に過ぎている場合はすぐに戻る）"""
+        lateness = await sleep_until(at, coarse_margin=self.coarse_margin)
+        self.trigger_log.append({'name': name, 'scheduled': at, 'lateness_seconds': lateness})
+        self.logger.info(f"トリガー {name}: 予定 {at.strftime('%H:%M:%S.%f')[:-3]}, 遅延 {lateness * 1000:.1f}ms")
+        return lateness
                 
-    def _start_monitoring_job(self):
-        """監視ジョブを開始"""
+    async def _start_monitoring_job(self):
+        """監視ジョブを実行"""
         if self.monitoring_active:
             self.logger.warning("既に監視が実行中です")
             return
@@ -69,23 +114,9 @@ class Scheduler:
         self.logger.info("監視ジョブを開始します")
         self.notifier.notify_monitoring_start(self.release_datetime.strftime("%Y-%m-%d %H:%M:%S"))
         
-        # 非同期タスクを別スレッドで実行
-        thread = Thread(target=self._run_monitoring_task)
-        thread.daemon = True
-        thread.start()
-        
-    def _run_monitoring_task(self):
-        """監視タスクを実行"""
         try:
             self.monitoring_active = True
-            
-            # 非同期イベントループを作成
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 監視を実行
-            loop.run_until_complete(self._monitor_and_book())
-            
+            await self._monitor_and_book()
         except Exception as e:
             self.logger.error(f"監視タスクエラー: {e}")
         finally:
@@ -94,72 +125,50 @@ class Scheduler:
             
     async def _monitor_and_book(self):
         """監視と予約を実行"""
-        scraper = AirReserveScraper()
-        booker = AirReserveBooker()
+        ledger = open_ledger()
+        bookers = [AirReserveBooker(profile, ledger=ledger) for profile in load_profiles()]
+        scraper = AirReserveScraper(bookers=bookers, target=self.target)
+        scraper.release_datetime = self.release_datetime
         
+        try:
+            await self._run_pipeline(scraper, bookers)
+        finally:
+            if ledger:
+                ledger.close()
+            
+    async def _run_pipeline(self, scraper: AirReserveScraper, bookers):
+        """ブラウザを起動し、監視期間中パイプラインを実行"""
         async with scraper:
             # カレンダーページを読み込み
             if not await scraper.load_calendar_page():
                 self.logger.error("カレンダーページの読み込みに失敗しました")
                 return
-                
-            # 監視期間の計算
-            monitor_start = self.release_datetime - timedelta(seconds=3)
-            monitor_end = self.release_datetime + timedelta(minutes=get_monitor_duration_minutes())
-            
-            self.logger.info(f"監視期間: {monitor_start} ～ {monitor_end}")
-            
-            # 現在時刻が監視開始時刻より前の場合は待機
-            now = datetime.now()
-            if now < monitor_start:
-                wait_seconds = (monitor_start - now).total_seconds()
-                self.logger.info(f"監視開始まで {wait_seconds:.1f} 秒待機します")
-                await asyncio.sleep(wait_seconds)
-                
-            # 監視ループ
-            last_slots = []
-            check_interval = 1  # 1秒間隔
-            booking_attempted = False
-            
-            while datetime.now() < monitor_end:
-                try:
-                    # 予約可能枠を取得
-                    current_slots = await scraper.get_available_slots()
-                    
-                    # 新規枠を検出
-                    new_slots = []
-                    for slot in current_slots:
-                        if slot not in last_slots:
-                            new_slots.append(slot)
-                            
-                    if new_slots:
-                        self.notifier.notify_new_slot_detected(new_slots[0])
-                        
-                        # 希望条件に合致する枠があれば予約を試行
-                        for slot in new_slots:
-                            if booker.is_preferred_slot(slot) and not booking_attempted:
-                                self.logger.info(f"希望条件に合致する枠を発見: {slot['text']}")
-                                
-                                # 予約を実行
-                                success = await booker.execute_booking(slot, scraper.page)
-                                
-                                if success:
-                                    self.notifier.notify_booking_success(slot)
-                                    booking_attempted = True
-                                    break
-                                else:
-                                    self.notifier.notify_booking_failure(slot, "予約実行に失敗")
-                                    
-                    last_slots = current_slots
-                    
-                    # 次のチェックまで待機
-                    await asyncio.sleep(check_interval)
-                    
-                except Exception as e:
-                    self.logger.error(f"監視中にエラーが発生: {e}")
-                    await asyncio.sleep(check_interval)
-                    
-            self.logger.info("監視期間が終了しました")
+            await self._monitor_window(scraper, bookers)
             
             # スクリーンショットを撮影
             await scraper.take_screenshot()
+    
+    async def _monitor_window(self, scraper: AirReserveScraper, bookers):
+        """カレンダーを読み込んだブラウザで、監視期間の開始から終了までパイプラインを実行"""
+        monitor_start, monitor_end = self.window.start, self.window.end
+        self.logger.info(f"監視期間: {monitor_start} ～ {monitor_end}")
+        
+        # 監視開始時刻まで高精度に待機（既に過ぎている場合はすぐに開始）
+        await self._trigger("monitor", monitor_start)
+            
+        # 監視ループ（検出・順位付け・予約・通知をパイプラインで並行実行、各プロファイルとも最初の予約成功後は新たに予約しない）
+        coordinator = create_coordinator()
+        try:
+            pipeline = self._create_pipeline(scraper, bookers, coordinator)
+            await pipeline.run(until=monitor_end)
+        finally:
+            if coordinator:
+                await coordinator.close()
+        self.booking_succeeded = pipeline.booking_succeeded
+    
+    def _create_pipeline(self, scraper: AirReserveScraper, bookers, coordinator) -> SlotPipeline:
+        """監視期間のパイプラインを作成"""
+        return SlotPipeline(
+            scraper, bookers=bookers, notifier=self.notifier, check_interval=1, book_once=True,
+            coordinator=coordinator, target_id=scraper.target.target_id,
+        )
@@ -5,43 +5,117 @@ Airリザーブ予約ページのスクレイピング機能
 """
 
 import asyncio
+import json
 import logging
 import re
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set
 from playwright.async_api import async_playwright, Browser, Page
 
 from src.config import (
-    get_target_url,
     get_headless,
     get_debug,
-    get_test_site_mode,
-    get_next_release_datetime,
-    get_monitor_duration_minutes,
+    get_speculative_prefetch,
+    get_booking_pool_size,
+    get_scheduler_coarse_margin_seconds,
 )
+from src.context_pool import BookingContextPool
+from src.coordination import create_coordinator
+from src.har import HarSession
+from src.logging_setup import lazy
+from src.metrics import DOM_EXTRACTION_SECONDS, SCAN_SECONDS, WEEK_SCAN_SECONDS
+from src.pipeline import SlotPipeline
+from src.prefetch import SpeculativePrefetcher
+from src.targets import MonitorTarget
+from src.timing import sleep_until
+from src.tracing import get_tracer
+
+
+# ブラウザのユーザーエージェント
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+# 枠の要素のタグ名と、枠の日付の手がかり（祖先要素のdata-date属性、表の列番号）を取得する
+SLOT_ELEMENT_INFO_SCRIPT = '''el => {
+    const info = {tagName: el.tagName, date: null, column: null};
+    for (let node = el; node && node.getAttribute; node = node.parentElement) {
+        const value = node.getAttribute('data-date');
+        if (value) {
+            info.date = value;
+            return info;
+        }
+    }
+    const cell = el.closest('td');
+    if (cell && cell.parentElement) {
+        info.column = cell.cellIndex - (cell.parentElement.cells.length - 7);
+    }
+    return info;
+}'''
+
+
+async def launch_browser(playwright, headless: bool) -> Browser:
+    """Chromiumを起動"""
+    # Ubuntu 24.04対応のChromium起動
+    return await playwright.chromium.launch(
+        headless=headless,
+        args=[
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-gpu',
+            '--disable-web-security',
+            '--disable-features=VizDisplayCompositor'
+        ]
+    )
 
 
 class AirReserveScraper:
     """Airリザーブ予約ページのスクレイピングクラス"""
     
-    def __init__(self, booker=None):
+    def __init__(
+        self,
+        booker=None,
+        bookers: Optional[List] = None,
+        target: Optional[MonitorTarget] = None,
+        browser: Optional[Browser] = None,
+        har: Optional[HarSession] = None,
+    ):
         self.logger = logging.getLogger(__name__)
-        self.target_url = get_target_url()
         self.headless = get_headless()
         self.debug = get_debug()
         
+        # 監視対象（未指定の場合は環境変数のTARGET_URLなど）
+        self.target = target or MonitorTarget.from_env()
+        self.target_url = self.target.url
+        
         # テストサイトモード（14日前の13時から受付開始）
-        self.test_site_mode = get_test_site_mode()
+        self.test_site_mode = self.target.test_site_mode
         
         # 予約公開日時の設定
-        self.release_datetime = get_next_release_datetime()
+        self.release_datetime = self.target.release_datetime
         
         # 監視時間（分）
-        self.monitor_duration = get_monitor_duration_minutes()
+        self.monitor_duration = self.target.monitor_duration_minutes
+        
+        # 共有ブラウザ（指定された場合はブラウザを起動せず、専用のコンテキストで監視する）
+        self.shared_browser = browser
+        self.context = None
+        
+        # HARの記録・再生（共有ブラウザの場合は、所有者が同じものを渡して記録をまとめる）
+        self.har = har or HarSession.from_env()
+        
+        # スキャンする週（0始まり、Noneの場合はすべて。分散監視で他のインスタンスと分担する場合・予測ポーリングで週を絞る場合に設定）
+        self.scan_weeks: Optional[Set[int]] = None
         
         # bookerへの参照（エラーチェック用）
-        self.booker = booker
+        # 複数の予約者プロファイルを扱う場合はbookersに全員分を渡す（先読みは先頭のプロファイルで行う）
+        self.bookers = list(bookers) if bookers else ([booker] if booker else [])
+        self.booker = booker or (self.bookers[0] if self.bookers else None)
+        
+        # 予約用コンテキストプールと先読み（ブラウザ起動時に作成）
+        self.pool: Optional[BookingContextPool] = None
+        self.prefetcher: Optional[SpeculativePrefetcher] = None
         
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
@@ -56,36 +130,59 @@ class AirReserveScraper:
         await self.close_browser()
         
     async def start_browser(self):
-        """ブラウザを起動"""
-        self.playwright = await async_playwright().start()
-        
-        # Ubuntu 24.04対応のChromium起動
-        self.browser = await self.playwright.chromium.launch(
-            headless=self.headless,
-            args=[
-                '--no-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-gpu',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
+        """ブラウザを起動（共有ブラウザがある場合は監視用のコンテキストを作成）"""
+        if self.shared_browser:
+            self.browser = self.shared_browser
+        else:
+            self.playwright = await async_playwright().start()
+            self.browser = await launch_browser(self.playwright, self.headless)
+        self.context = await self.har.new_context(
+            self.browser, f"monitor-{self.target.target_id}", extra_http_headers={'User-Agent': USER_AGENT}
         )
+        self.page = await self.context.new_page()
+        if self.har.enabled:
+            self.logger.info(f"HAR {self.har.mode}: {self.har.directory}")
         
-        self.page = await self.browser.new_page()
-        
-        # ユーザーエージェント設定
-        await self.page.set_extra_http_headers({
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        # 予約を行う場合は監視用ページとは別の予約用コンテキストを用意（DRY_RUNでは予約ページを開かない）
+        if self.booker and not self.booker.dry_run:
+            prefetch = get_speculative_prefetch()
+            # 先読みを行う場合は待機ページの分を1つ追加
+            pool_size = get_booking_pool_size() + (1 if prefetch else 0)
+            self.pool = BookingContextPool(self.browser, pool_size, {'User-Agent': USER_AGENT}, har=self.har)
+            await self.pool.start()
+            if prefetch:
+                self.prefetcher = SpeculativePrefetcher(self.pool, self.booker)
+                await self.prefetcher.start()
         
         self.logger.info("ブラウザを起動しました")
         
     async def close_browser(self):
         """ブラウザを終了"""
+        if self.prefetcher:
+            await self.prefetcher.close()
+            self.prefetcher = None
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+        if self.shared_browser:
+            # 共有ブラウザとbookerは所有者が閉じる
+            if self.context:
+                await self.context.close()
+                self.context = None
+            self.logger.info(f"監視用コンテキストを閉じました ({self.target.target_id})")
+            return
+        # 書き込み待ちの証跡を保存してから閉じる
+        for booker in self._all_bookers():
+            await booker.close()
+        # HARはコンテキストを閉じたときに書き出される
+        if self.context:
+            await self.context.close()
+            self.context = None
         if self.browser:
             await self.browser.close()
         if hasattr(self, 'playwright'):
             await self.playwright.stop()
+        self.har.finish(self.target_url)
         self.logger.info("ブラウザを終了しました")
         
     async def load_calendar_page(self) -> bool:
@@ -121,6 +218,15 @@ class AirReserveScraper:
         Args:
             max_weeks: 確認する最大週数（デフォルト: 7週 = 約1.5ヶ月）
         """
+        started = time.perf_counter()
+        with get_tracer().span("scan", target_id=self.target.target_id) as span:
+            slots = await self._scan_weeks(max_weeks)
+            span.set(slots=len(slots))
+        SCAN_SECONDS.observe(time.perf_counter() - started, target=self.target_url)
+        return slots
+    
+    async def _scan_weeks(self, max_weeks: int) -> List[Dict]:
+        """週ごとに予約可能枠を取得し、次週へ移動する"""
         try:
             if not self.page:
                 self.logger.error("ページが読み込まれていません")
@@ -128,25 +234,51 @@ class AirReserveScraper:
                 
             all_available_slots = []
             
+            # 分散監視で担当する週が決まっている場合は、最後の担当週まで確認する
+            if self.scan_weeks is not None:
+                max_weeks = min(max_weeks, max(self.scan_weeks, default=-1) + 1)
+            
             # 最初のページから開始
             for week_num in range(max_weeks):
-                self.logger.info(f"週 {week_num + 1}/{max_weeks} を確認中...")
-                
-                # 現在のページで予約可能枠を検索
-                slots = await self._get_slots_from_current_page(week_num=week_num)
+                week_started = time.perf_counter()
+                if self.scan_weeks is not None and week_num not in self.scan_weeks:
+                    slots = []
+                else:
+                    self.logger.info("週を確認中", extra={'week': week_num + 1, 'max_weeks': max_weeks})
+                    
+                    # 現在のページで予約可能枠を検索
+                    with get_tracer().span("extract_slots", week=week_num + 1) as span:
+                        slots = await self._get_slots_from_current_page(week_num=week_num)
+                        span.set(slots=len(slots))
+                    DOM_EXTRACTION_SECONDS.observe(time.perf_counter() - week_started, target=self.target_url)
+                # 複数の監視対象を扱う場合に、予約時の移動先と枠の識別に使う
+                for slot in slots:
+                    slot['target_id'] = self.target.target_id
+                    slot['target_url'] = self.target_url
                 all_available_slots.extend(slots)
                 
+                # 新規枠があれば、残りの週を確認している間に最上位候補を先読み
+                if self.prefetcher:
+                    self.prefetcher.consider(slots)
+                
                 # 次週へ移動（最後の週でない場合）
                 if week_num < max_weeks - 1:
-                    next_button = await self.page.query_selector('.ctlListItem.listNext')
-                    if next_button:
-                        await next_button.click()
-                        await asyncio.sleep(0.5)  # ページ遷移待機
-                    else:
+                    with get_tracer().span("navigate_week", week=week_num + 2):
+                        next_button = await self.page.query_selector('.ctlListItem.listNext')
+                        if next_button:
+                            await next_button.click()
+                            await asyncio.sleep(0.5)  # ページ遷移待機
+                    if not next_button:
                         self.logger.info("次週ボタンが見つかりません。確認を終了します")
                         break
+                WEEK_SCAN_SECONDS.observe(
+                    time.perf_counter() - week_started, target=self.target_url, week=str(week_num + 1)
+                )
             
-            self.logger.info(f"合計 {len(all_available_slots)} 件の予約可能枠を発見")
+            self.logger.info("予約可能枠の確認が完了", extra={'slots': len(all_available_slots)})
+            
+            if self.prefetcher:
+                self.prefetcher.reconcile(all_available_slots)
             return all_available_slots
             
         except Exception as e:
@@ -195,6 +327,24 @@ class AirReserveScraper:
             self.logger.error(f"週開始日の取得エラー: {e}")
             return None
     
+    def _get_slot_date(self, element_info: Dict, week_start_date: Optional[datetime]) -> Optional[datetime]:
+        """枠の日付を取得
+        
+        祖先要素のdata-date属性、または週表示の表の列（最後の7列が月〜日）から求める。
+        取得できない場合はNone（予約台帳は枠のテキスト中の日付、週の開始日の順に使う）。
+        """
+        if element_info.get('date'):
+            for date_format in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d'):
+                try:
+                    return datetime.strptime(element_info['date'], date_format)
+                except ValueError:
+                    continue
+            return None
+        column = element_info.get('column')
+        if week_start_date and column is not None and 0 <= column <= 6:
+            return week_start_date + timedelta(days=column)
+        return None
+    
     def _is_within_14_days(self, event_date: datetime) -> bool:
         """イベント日が14日以内かどうかを判定"""
         now = datetime.now()
@@ -208,12 +358,10 @@ class AirReserveScraper:
             week_num: 週番号（0から始まる、検出時点を記録するため）
         """
         try:
-            # テストサイトモードの場合、週の開始日を取得
-            week_start_date = None
-            if self.test_site_mode:
-                week_start_date = await self._get_week_start_date()
-                if week_start_date:
-                    self.logger.debug(f"週開始日: {week_start_date.strftime('%Y-%m-%d')}")
+            # 週の開始日を取得（枠の日付の計算と、テストサイトモードの14日前チェックに使う）
+            week_start_date = await self._get_week_start_date()
+            if week_start_date:
+                self.logger.debug("週開始日", extra={'week_start_date': week_start_date.date()})
             
             # Airリザーブのカレンダー構造に特化したセレクター
             # class="dataLinkBox js-dataLinkBox" が予約リンクを含む
@@ -223,7 +371,7 @@ class AirReserveScraper:
             elements = await self.page.query_selector_all(selector)
             
             if self.debug:
-                self.logger.debug(f"{selector} で {len(elements)} 個の要素を発見")
+                self.logger.debug("枠の要素を発見", extra={'selector': selector, 'elements': len(elements)})
                 # ページのHTML構造をログに出力（デバッグ用）
                 if len(elements) == 0:
                     # 代替セレクターを試行
@@ -239,14 +387,16 @@ class AirReserveScraper:
                     
                     # デバッグ用: テキスト内容をログに出力
                     if self.debug:
-                        self.logger.debug(f"要素 {idx+1} のテキスト: {text[:100]}")
+                        self.logger.debug("要素のテキスト", extra={'index': idx + 1, 'text': text[:100]})
                     
                     # リンク要素を探す（dataLinkBox内のa要素、またはdataLinkBox要素自体）
                     href = None
                     link_element = None
                     
                     # dataLinkBox要素自体がa要素の場合がある（テストサイト）
-                    tag_name = await element.evaluate('el => el.tagName')
+                    # タグ名と枠の日付の手がかりを1回の呼び出しで取得する
+                    element_info = await element.evaluate(SLOT_ELEMENT_INFO_SCRIPT)
+                    tag_name = element_info['tagName']
                     if tag_name == 'A':
                         link_element = element
                     
@@ -304,25 +454,26 @@ class AirReserveScraper:
                     
                     if not href:
                         if self.debug:
-                            self.logger.debug(f"要素 {idx+1}: hrefが見つかりませんでした（スキップ）")
+                            self.logger.debug("hrefが見つかりませんでした（スキップ）", extra={'index': idx + 1})
                         continue
                     
                     if self.debug:
-                        self.logger.debug(f"要素 {idx+1}: href={href}, class={class_name}")
+                        self.logger.debug("要素のリンク", extra={'index': idx + 1, 'href': href, 'class_name': class_name})
+                    
+                    # 枠の日付（予約台帳の月ごとの上限に使う、不明な場合はNone）
+                    slot_date = self._get_slot_date(element_info, week_start_date)
                     
                     # テストサイトモードの場合、14日前チェック
                     # ただし、フォーム入力テストのために残0枠も検出したい場合はスキップする
                     if self.test_site_mode and week_start_date:
-                        # イベントの曜日を推定（週の何日目か）
-                        # カレンダーは週表示で、各日に複数イベントがある
-                        # 簡易的に、週の開始日から6日以内と仮定
-                        event_date = week_start_date + timedelta(days=min(idx, 6))
+                        # 枠の日付が不明な場合は、簡易的に週の開始日から6日以内と仮定
+                        event_date = slot_date or week_start_date + timedelta(days=min(idx, 6))
                         
                         # 残0の場合はフォーム入力テストのために14日前チェックをスキップ
                         if '残0' in text.lower():
-                            self.logger.debug(f"残0枠のため14日前チェックをスキップ: {event_date.strftime('%Y-%m-%d')}")
+                            self.logger.debug("残0枠のため14日前チェックをスキップ", extra={'event_date': event_date})
                         elif not self._is_within_14_days(event_date):
-                            self.logger.debug(f"14日前より先のイベントをスキップ: {event_date.strftime('%Y-%m-%d')}")
+                            self.logger.debug("14日前より先のイベントをスキップ", extra={'event_date': event_date})
                             continue
                     
                     # 予約可能な要素かチェック
@@ -330,10 +481,12 @@ class AirReserveScraper:
                     if not href or href == '':
                         href = 'dataLinkBox:' + text.strip()
                     
-                    is_available = href.startswith('dataLinkBox:') or self._is_available_slot(text, href, class_name)
+                    # 判定は1回だけ行い、デバッグログでもその結果を使う
+                    pseudo_href = href.startswith('dataLinkBox:')
+                    is_available = pseudo_href or self._is_available_slot(text, href, class_name)
                     
                     if self.debug:
-                        self.logger.debug(f"要素 {idx+1}: is_available={is_available}, href starts with dataLinkBox: {href.startswith('dataLinkBox:') if href else False}, _is_available_slot: {self._is_available_slot(text, href, class_name) if href and not href.startswith('dataLinkBox:') else 'N/A'}")
+                        self.logger.debug("要素の判定", extra={'index': idx + 1, 'is_available': is_available, 'pseudo_href': pseudo_href})
                     
                     if is_available:
                         slot_info = {
@@ -344,10 +497,11 @@ class AirReserveScraper:
                             'timestamp': datetime.now(),
                             'week_url': self.page.url,  # 検出時点のページURLを保持
                             'week_number': week_num + 1,  # 検出時点の週番号（1から始まる）
-                            'week_start_date': week_start_date.strftime('%Y-%m-%d') if week_start_date else None  # 検出時点の週開始日
+                            'week_start_date': week_start_date.strftime('%Y-%m-%d') if week_start_date else None,  # 検出時点の週開始日
+                            'slot_date': slot_date.strftime('%Y-%m-%d') if slot_date else None,  # 枠の日付
                         }
                         if self.debug:
-                            self.logger.debug(f"予約枠を追加 (週{slot_info['week_number']}): {slot_info['text'][:50]}...")
+                            self.logger.debug("予約枠を追加", extra={'week': slot_info['week_number'], 'text': slot_info['text'][:50]})
                         available_slots.append(slot_info)
                         
                 except Exception as e:
@@ -355,8 +509,7 @@ class AirReserveScraper:
                     continue
             
             if self.debug and available_slots:
-                for slot in available_slots:
-                    self.logger.debug(f"発見した枠: {slot}")
+                self.logger.debug("発見した枠", extra={'slots': lazy(json.dumps, available_slots, ensure_ascii=False, default=str)})
                     
             return available_slots
             
@@ -435,74 +588,68 @@ class AirReserveScraper:
             if now < monitor_start:
                 wait_seconds = (monitor_start - now).total_seconds()
                 self.logger.info(f"監視開始まで {wait_seconds:.1f} 秒待機します")
-                await asyncio.sleep(wait_seconds)
+                lateness = await sleep_until(monitor_start, coarse_margin=get_scheduler_coarse_margin_seconds())
+                self.logger.info(f"監視を開始します (遅延 {lateness * 1000:.1f}ms)")
                 
-            # 監視ループ
-            last_slots = []
-            check_interval = 1  # 1秒間隔
-            check_count = 0
-            max_checks = int(self.monitor_duration * 60)  # 監視時間（分）を秒に変換
-            
-            while datetime.now() < monitor_end and check_count < max_checks:
-                try:
-                    check_count += 1
-                    self.logger.info(f"チェック {check_count}/{max_checks}")
-                    
-                    # 予約可能枠を取得（1.5ヶ月先まで、7週分）
-                    current_slots = await self.get_available_slots(max_weeks=7)
-                    
-                    # 新規枠を検出
-                    last_hrefs = {slot.get('href', '') for slot in last_slots}
-                    new_slots = []
-                    for slot in current_slots:
-                        href = slot.get('href', '')
-                        if href and href not in last_hrefs:
-                            new_slots.append(slot)
-                            
-                    if new_slots:
-                        self.logger.info(f"新規予約枠を {len(new_slots)} 件発見:")
-                        for slot in new_slots:
-                            self.logger.info(f"  - {slot['text']} ({slot['href']})")
-                        
-                        # bookerが設定されている場合、予約を試行
-                        if self.booker:
-                            for slot in new_slots:
-                                # 希望条件に合致する枠か確認
-                                if self.booker.is_preferred_slot(slot):
-                                    self.logger.info(f"希望条件に合致する枠を発見: {slot['text']}")
-                                    self.logger.info("予約を実行します...")
-                                    
-                                    # 予約を実行
-                                    success = await self.booker.execute_booking(slot, self.page)
-                                    
-                                    if success:
-                                        self.logger.info(f"予約が成功しました: {slot['text']}")
-                                        # 予約成功後は監視を終了（オプション）
-                                        # break  # 複数の枠を予約する場合はコメントアウト
-                                    else:
-                                        self.logger.warning(f"予約が失敗しました: {slot['text']}")
-                                else:
-                                    self.logger.debug(f"希望条件に合致しないためスキップ: {slot['text']}")
-                        else:
-                            self.logger.debug("bookerが設定されていないため、予約を実行しません")
-                            
-                    last_slots = current_slots
-                    
-                    # 最初のページに戻る
-                    await self.page.goto(self.target_url, wait_until="networkidle", timeout=30000)
-                    
-                    # 次のチェックまで待機
-                    await asyncio.sleep(check_interval)
-                    
-                except Exception as e:
-                    self.logger.error(f"監視中にエラーが発生: {e}")
-                    await asyncio.sleep(check_interval)
-                    
-            self.logger.info("監視期間が終了しました")
+            # 監視ループ（検出・順位付け・予約・通知をパイプラインで並行実行）
+            # 予約成功後も監視は継続する（複数の枠を予約する場合に対応）
+            # 予約数の上限は予約台帳（MAX_BOOKINGS_PER_MONTH）で、同じ枠の再試行は MAX_ATTEMPTS_PER_SLOT で制御する
+            # COORDINATION_BACKENDを設定した場合は、他のインスタンスと週・位相を分担する
+            coordinator = create_coordinator()
+            try:
+                pipeline = SlotPipeline(
+                    self, bookers=self._all_bookers(), max_weeks=7, check_interval=1,
+                    coordinator=coordinator, target_id=self.target.target_id,
+                )
+                await pipeline.run(until=monitor_end)
+            finally:
+                if coordinator:
+                    await coordinator.close()
             
         finally:
             await self.close_browser()
             
+    def _all_bookers(self) -> List:
+        """すべてのブッカーを取得（後から設定されたbookerも含む）"""
+        bookers = list(self.bookers)
+        if self.booker and self.booker not in bookers:
+            bookers.insert(0, self.booker)
+        return bookers
+
+    async def book_slot(self, slot: Dict, should_start: Optional[Callable[[], bool]] = None, booker=None) -> bool:
+        """枠の予約を実行
+        
+        先読み済みのページがあればそれを使い、なければ予約用コンテキストプールのページを使う
+        （空きがない場合は空くまで待機する）。監視用ページは予約に使わない。
+        
+        Args:
+            slot: 予約枠の情報
+            should_start: ページを確保した時点で呼び出し、Falseを返した場合は予約せずに終了する
+            booker: 予約を行うブッカー（未指定の場合はself.booker）
+        """
+        booker = booker or self.booker
+        
+        # 先読みページは先読みしたプロファイルの情報で入力済みのため、同じブッカーの場合のみ使う
+        if self.prefetcher and self.prefetcher.booker is booker:
+            page = await self.prefetcher.claim(slot)
+            if page:
+                try:
+                    if should_start and not should_start():
+                        return False
+                    return await booker.execute_booking(slot, page, resume=True)
+                finally:
+                    await self.prefetcher.release(page)
+        
+        if self.pool:
+            async with self.pool.acquire() as page:
+                if should_start and not should_start():
+                    return False
+                return await booker.execute_booking(slot, page)
+        
+        if should_start and not should_start():
+            return False
+        return await booker.execute_booking(slot, self.page)
+    
     async def take_screenshot(self, filename: str = None):
         """スクリーンショットを撮影"""
         if not self.page:
@@ -0,0 +1,471 @@
+"""
+Airリザーブのシミュレーター
+
+実サイトに接続せずに、スクレイパーとブッカーを端から端まで動かして計測するためのローカルのHTTPサーバー
+docs/airreserve-structure.md のカレンダーの構造と予約フローを再現する
+
+    GET  /<店舗>/calendar?week=N                        週表示のカレンダー（.ctlListItem.listDate / .listNext / .dataLinkBox.js-dataLinkBox）
+    GET  /<店舗>/reserve/<枠ID>                          メニュー詳細（#menuDetailForm, #lessonEntryPaxCnt）
+    POST /<店舗>/booking/lesson/visitor/regist/<枠ID>    予約者情報の入力フォーム（lastNm, mailAddress1, tel1 など）
+    POST /<店舗>/booking/lesson/visitor/confirm/<枠ID>   確認画面
+    POST /<店舗>/booking/lesson/visitor/complete/<受付ID> 予約の確定（残席がなければ満員）
+    GET  /_sim/state                                     枠・予約・リクエスト数（JSON）
+
+枠ごとに公開日時（release_at）を指定でき、公開前の枠は「残0」と表示し、予約ページは「予約受付期間外です」になる
+応答ごとに遅延（latency ± jitter 秒）を加えられる
+
+シナリオファイルの形式:
+    {
+        "shop": "simshop",
+        "start_date": "2026-11-02",
+        "latency_ms": 80,
+        "jitter_ms": 20,
+        "slots": [
+            {"date": "2026-11-04", "time": "09:30", "name": "一時預かり", "capacity": 5,
+             "remaining": 3, "release_at": "2026-10-20 13:00:00"}
+        ]
+    }
+
+使用方法:
+    python -m src.simulator --port 8000 --release-in 30 --latency-ms 80
+    TARGET_URL=http://127.0.0.1:8000/simshop/calendar python main.py --mode monitor
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import logging
+import random
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.config import ConfigError
+
+
+WEEKDAYS = "月火水木金土日"
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# リクエストボディの最大サイズ（バイト）
+MAX_BODY_BYTES = 64 * 1024
+
+# 予約者情報の入力フォームで必須の項目
+REQUIRED_VISITOR_FIELDS = ("lastNm", "mailAddress1", "tel1")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class SimulatedSlot:
+    """シミュレーターの予約枠"""
+
+    def __init__(
+        self,
+        slot_id: str,
+        day: date,
+        start: str,
+        name: str = "一時預かり",
+        capacity: int = 5,
+        remaining: Optional[int] = None,
+        release_at: Optional[datetime] = None,
+    ):
+        self.slot_id = slot_id
+        self.day = day
+        self.start = start
+        self.name = name
+        self.capacity = capacity
+        self.remaining = capacity if remaining is None else remaining
+        # 公開日時（Noneの場合は最初から公開）
+        self.release_at = release_at
+
+    @classmethod
+    def from_dict(cls, slot_id: str, data: Dict) -> "SimulatedSlot":
+        try:
+            day = datetime.strptime(str(data["date"]), "%Y-%m-%d").date()
+            start = datetime.strptime(str(data.get("time", "09:30")), "%H:%M").strftime("%H:%M")
+            release_at = data.get("release_at")
+            return cls(
+                slot_id,
+                day,
+                start,
+                name=str(data.get("name", "一時預かり")),
+                capacity=int(data.get("capacity", 5)),
+                remaining=int(data["remaining"]) if data.get("remaining") is not None else None,
+                release_at=datetime.strptime(release_at, DATETIME_FORMAT) if release_at else None,
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ConfigError(f"Invalid simulator slot {data!r}: {e}")
+
+    def is_released(self, now: datetime) -> bool:
+        return self.release_at is None or now >= self.release_at
+
+    def label(self, now: datetime) -> str:
+        """カレンダーに表示するテキスト（公開前は残0）"""
+        remaining = self.remaining if self.is_released(now) else 0
+        return f"{self.start}\n{self.name}\n残{remaining} /定員{self.capacity}"
+
+    def as_dict(self) -> Dict:
+        return {
+            'slot_id': self.slot_id,
+            'date': self.day.isoformat(),
+            'time': self.start,
+            'name': self.name,
+            'capacity': self.capacity,
+            'remaining': self.remaining,
+            'release_at': self.release_at.strftime(DATETIME_FORMAT) if self.release_at else None,
+        }
+
+
+class AirReserveSimulator:
+    """Airリザーブのカレンダーと予約フローを再現するHTTPサーバー"""
+
+    def __init__(
+        self,
+        slots: List[SimulatedSlot],
+        start_date: Optional[date] = None,
+        weeks: int = 7,
+        shop: str = "simshop",
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.slots: Dict[str, SimulatedSlot] = {slot.slot_id: slot for slot in slots}
+        today = start_date or date.today()
+        # 週表示は月曜日から始まる
+        self.start_date = today - timedelta(days=today.weekday())
+        self.weeks = weeks
+        self.shop = shop
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        # 確定した予約（枠ID・予約者・確定日時）
+        self.bookings: List[Dict] = []
+        # 確認画面まで進んだ予約（受付ID → 枠IDと入力内容）
+        self._drafts: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self._draft_sequence = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @classmethod
+    def from_scenario(cls, path: str, **kwargs) -> "AirReserveSimulator":
+        """シナリオファイル（JSON）から作成"""
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"Failed to load simulator scenario {path}: {e}")
+        slots = [SimulatedSlot.from_dict(f"s{i + 1:03d}", item) for i, item in enumerate(data.get("slots", []))]
+        start_date = data.get("start_date")
+        options = {
+            'start_date': datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None,
+            'weeks': int(data.get("weeks", 7)),
+            'shop': str(data.get("shop", "simshop")),
+            'latency': float(data.get("latency_ms", 0)) / 1000,
+            'jitter': float(data.get("jitter_ms", 0)) / 1000,
+        }
+        options.update(kwargs)
+        return cls(slots, **options)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def calendar_url(self) -> str:
+        """監視対象のURL（TARGET_URLに指定する）"""
+        return f"{self.base_url}/{self.shop}/calendar"
+
+    async def start(self):
+        """サーバーを起動（port=0の場合は空いているポートを使う）"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"シミュレーターを起動しました: {self.calendar_url}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def release(self, slot_ids: Optional[List[str]] = None, at: Optional[datetime] = None):
+        """枠の公開日時を設定（slot_ids省略時は公開前のすべての枠、at省略時は今すぐ公開）"""
+        at = at or datetime.now()
+        now = datetime.now()
+        for slot in self.slots.values():
+            if slot_ids is None and slot.is_released(now):
+                continue
+            if slot_ids is None or slot.slot_id in slot_ids:
+                slot.release_at = at
+
+    def book(self, slot_id: str, customer: str) -> bool:
+        """残席を1つ確保して予約を確定（公開前・満員の場合はFalse）"""
+        slot = self.slots.get(slot_id)
+        now = datetime.now()
+        if slot is None or not slot.is_released(now) or slot.remaining <= 0:
+            return False
+        slot.remaining -= 1
+        self.bookings.append({'slot_id': slot_id, 'customer': customer, 'booked_at': now})
+        return True
+
+    def state(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'slots': [slot.as_dict() for slot in self.slots.values()],
+            'bookings': [
+                {**booking, 'booked_at': booking['booked_at'].strftime("%Y-%m-%d %H:%M:%S.%f")}
+                for booking in self.bookings
+            ],
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """1つのリクエストを処理して接続を閉じる"""
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            content_length = 0
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    content_length = min(int(value.strip()), MAX_BODY_BYTES)
+            body = await reader.readexactly(content_length) if content_length else b""
+            if len(request_line) < 2:
+                status, content_type, payload = 400, "text/plain", "invalid request line"
+            else:
+                self.requests += 1
+                if self.latency or self.jitter:
+                    await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+                status, content_type, payload = self.dispatch(request_line[0].upper(), request_line[1], body)
+            data = payload.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Cache-Control: no-store\r\n"
+                "Connection: close\r\n\r\n".encode("ascii") + data
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 遅延中にサーバーを閉じた場合
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, method: str, target: str, body: bytes = b"") -> Tuple[int, str, str]:
+        """リクエストを処理し、ステータスコード・Content-Type・本文を返す"""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["_sim", "state"]:
+            return 200, "application/json", json.dumps(self.state(), ensure_ascii=False)
+        if not parts or parts[0] != self.shop:
+            return 404, "text/html", _page("ページが見つかりません", "<p>ページが見つかりません</p>")
+        route = parts[1:]
+        form = {key: values[-1] for key, values in parse_qs(body.decode("utf-8", "replace")).items()}
+
+        if route == ["calendar"] and method == "GET":
+            week = parse_qs(url.query).get("week", ["0"])[0]
+            return 200, "text/html", self._calendar_page(int(week) if week.isdigit() else 0)
+        if len(route) == 2 and route[0] == "reserve" and method == "GET":
+            return 200, "text/html", self._menu_detail_page(route[1])
+        if len(route) == 5 and route[:3] == ["booking", "lesson", "visitor"]:
+            step, key = route[3], route[4]
+            if method != "POST":
+                return 405, "text/html", _page("エラー", "<p>不正な操作です</p>")
+            if step == "regist":
+                return 200, "text/html", self._visitor_form_page(key)
+            if step == "confirm":
+                return 200, "text/html", self._confirm_page(key, form)
+            if step == "complete":
+                return 200, "text/html", self._complete_page(key)
+        return 404, "text/html", _page("ページが見つかりません", "<p>ページが見つかりません</p>")
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{self.shop}/{path}"
+
+    def _calendar_page(self, week: int) -> str:
+        week = max(0, min(week, self.weeks - 1))
+        now = datetime.now()
+        week_start = self.start_date + timedelta(weeks=week)
+        week_end = week_start + timedelta(days=6)
+        days = []
+        for offset in range(7):
+            day = week_start + timedelta(days=offset)
+            boxes = [
+                f'<div class="dataLinkBox js-dataLinkBox"><a href="{self._url(f"reserve/{slot.slot_id}")}">'
+                f'{html.escape(slot.label(now)).replace(chr(10), "<br>")}</a></div>'
+                for slot in sorted(self.slots.values(), key=lambda slot: slot.start)
+                if slot.day == day
+            ]
+            days.append(
+                f'<div class="calendarDay" data-date="{day.isoformat()}">'
+                f'<div class="dayHeader">{day.month}/{day.day}({WEEKDAYS[day.weekday()]})</div>{"".join(boxes)}</div>'
+            )
+        controls = [
+            f'<li class="ctlListItem listDate">{week_start.strftime("%Y/%m/%d")}({WEEKDAYS[0]}) 〜 '
+            f'{week_end.month:02d}/{week_end.day:02d}({WEEKDAYS[6]})</li>'
+        ]
+        if week < self.weeks - 1:
+            controls.append(f'<li class="ctlListItem listNext"><a href="{self._url(f"calendar?week={week + 1}")}">次週</a></li>')
+        return _page(
+            "予約カレンダー",
+            f'<div id="calendar" class="calendar"><ul class="ctlList">{"".join(controls)}</ul>'
+            f'<div class="calendarWeek">{"".join(days)}</div></div>',
+        )
+
+    def _closed_reason(self, slot: Optional[SimulatedSlot]) -> Optional[str]:
+        """予約できない理由（予約できる場合はNone）"""
+        if slot is None:
+            return "この時間帯はご予約いただけません。"
+        if not slot.is_released(datetime.now()):
+            return "予約受付期間外です。別の時間帯をお探しください。"
+        if slot.remaining <= 0:
+            return "満員のため、ご予約いただけません。"
+        return None
+
+    def _menu_detail_page(self, slot_id: str) -> str:
+        slot = self.slots.get(slot_id)
+        reason = self._closed_reason(slot)
+        if reason:
+            return _page("メニュー詳細", f'<p class="errorMessage">{reason}</p>')
+        return _page(
+            "メニュー詳細",
+            f'<h2>{html.escape(slot.name)}</h2><p>{slot.day.month}/{slot.day.day} {slot.start}</p>'
+            f'<form id="menuDetailForm" method="post" action="{self._url(f"booking/lesson/visitor/regist/{slot_id}")}">'
+            '<label for="lessonEntryPaxCnt">参加人数</label>'
+            '<input type="number" id="lessonEntryPaxCnt" name="lessonEntryPaxCnt" value="0" min="1">'
+            '<button type="submit">次へ</button></form>',
+        )
+
+    def _visitor_form_page(self, slot_id: str, error: str = "") -> str:
+        reason = self._closed_reason(self.slots.get(slot_id))
+        if reason:
+            return _page("予約者情報の入力", f'<p class="errorMessage">{reason}</p>')
+        fields = [
+            ("lastNm", "姓"), ("firstNm", "名"), ("lastNmKn", "セイ"), ("firstNmKn", "メイ"),
+            ("mailAddress1", "メールアドレス"), ("mailAddress1ForCnfrm", "メールアドレス（確認用）"), ("tel1", "電話番号"),
+        ]
+        inputs = "".join(
+            f'<div class="formRow"><span class="formLabel">{label}</span><input type="text" name="{name}"></div>'
+            for name, label in fields
+        )
+        message = f'<p class="formError">{error}</p>' if error else ""
+        return _page(
+            "予約者情報の入力",
+            f'{message}<form id="visitorForm" method="post" action="{self._url(f"booking/lesson/visitor/confirm/{slot_id}")}">'
+            f'{inputs}<button type="submit">確認へ進む</button></form>',
+        )
+
+    def _confirm_page(self, slot_id: str, form: Dict[str, str]) -> str:
+        missing = [name for name in REQUIRED_VISITOR_FIELDS if not form.get(name)]
+        mismatch = form.get("mailAddress1ForCnfrm") and form["mailAddress1ForCnfrm"] != form.get("mailAddress1")
+        if missing or mismatch:
+            return self._visitor_form_page(slot_id, "入力内容に誤りがあります。")
+        reason = self._closed_reason(self.slots.get(slot_id))
+        if reason:
+            return _page("予約内容の確認", f'<p class="errorMessage">{reason}</p>')
+        self._draft_sequence += 1
+        draft_id = f"r{self._draft_sequence:06d}"
+        self._drafts[draft_id] = (slot_id, form)
+        slot = self.slots[slot_id]
+        return _page(
+            "予約内容の確認",
+            f'<p>{slot.day.month}/{slot.day.day} {slot.start} {html.escape(slot.name)}</p>'
+            f'<p>{html.escape(form.get("lastNm", ""))} {html.escape(form.get("firstNm", ""))} 様</p>'
+            f'<form method="post" action="{self._url(f"booking/lesson/visitor/complete/{draft_id}")}">'
+            '<button type="submit">予約する</button></form>',
+        )
+
+    def _complete_page(self, draft_id: str) -> str:
+        draft = self._drafts.pop(draft_id, None)
+        if draft is None:
+            return _page("エラー", '<p class="errorMessage">この時間帯はご予約いただけません。</p>')
+        slot_id, form = draft
+        customer = f'{form.get("lastNm", "")} {form.get("firstNm", "")}'.strip()
+        if not self.book(slot_id, customer):
+            return _page("予約結果", f'<p class="errorMessage">{self._closed_reason(self.slots.get(slot_id))}</p>')
+        return _page("予約結果", "<p>予約が完了しました。ご予約ありがとうございます。</p>")
+
+
+def _page(title: str, body: str) -> str:
+    return (
+        '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">'
+        f'<title>{title} | Airリザーブ シミュレーター</title>'
+        # 次週ボタンは項目全体をクリックできる
+        '<style>.ctlListItem a{display:block}</style></head>'
+        f'<body>{body}</body></html>'
+    )
+
+
+def build_default_slots(
+    start_date: date, weeks: int = 7, release_at: Optional[datetime] = None, capacity: int = 5
+) -> List[SimulatedSlot]:
+    """平日の09:30と13:00に枠を作る（最初の週は公開済み、2週目以降は release_at に公開）"""
+    week_start = start_date - timedelta(days=start_date.weekday())
+    slots = []
+    for offset in range(weeks * 7):
+        day = week_start + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for start in ("09:30", "13:00"):
+            slots.append(SimulatedSlot(
+                f"s{len(slots) + 1:03d}",
+                day,
+                start,
+                capacity=capacity,
+                # 公開済みの週は満員の枠が混ざる
+                remaining=0 if offset < 7 and start == "13:00" else capacity,
+                release_at=release_at if offset >= 7 else None,
+            ))
+    return slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Airリザーブのシミュレーター")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--scenario", help="シナリオファイル（JSON）")
+    parser.add_argument("--weeks", type=int, default=7)
+    parser.add_argument("--release-in", type=float, default=30.0, help="2週目以降の枠を公開するまでの秒数（シナリオ未指定時）")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    options = {'host': args.host, 'port': args.port}
+    if args.latency_ms or args.jitter_ms:
+        options.update(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+    if args.scenario:
+        simulator = AirReserveSimulator.from_scenario(args.scenario, **options)
+    else:
+        release_at = datetime.now() + timedelta(seconds=args.release_in)
+        slots = build_default_slots(date.today(), args.weeks, release_at)
+        simulator = AirReserveSimulator(slots, weeks=args.weeks, **options)
+        logging.getLogger(__name__).info(f"2週目以降の枠を公開します: {release_at.strftime(DATETIME_FORMAT)}")
+
+    async def serve():
+        async with simulator:
+            while True:
+                await asyncio.sleep(3600)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+予約枠情報の共通処理
+
+スクレイパーが返す予約枠（slot_info辞書）から、枠を一意に識別するキーや
+残席数・時刻を取り出す
+"""
+
+import re
+from datetime import date, datetime
+from typing import Dict, Optional
+
+
+# 残席表示（例: "残3 /定員15"）
+REMAINING_PATTERN = re.compile(r'残\s*(\d+)')
+CAPACITY_PATTERN = re.compile(r'/?\s*定員\s*\d+')
+TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+# 枠のテキスト中の日付（例: "6/2", "6月2日"）
+DATE_PATTERN = re.compile(r'(\d{1,2})\s*[/月]\s*(\d{1,2})')
+
+
+def get_slot_key(slot_info: Dict) -> str:
+    """予約枠を一意に識別するキーを取得
+
+    通常のhrefはそのまま使う。疑似href（dataLinkBox:テキスト）の場合は、
+    残席数が変わっても同じ枠として扱えるよう残席・定員表示を除き、検出時点の週番号を付ける。
+    既定以外の監視対象の枠には監視対象のIDを付ける。
+    """
+    href = slot_info.get('href') or ''
+    if href.startswith('dataLinkBox:'):
+        text = href[len('dataLinkBox:'):]
+        text = REMAINING_PATTERN.sub('', text)
+        text = CAPACITY_PATTERN.sub('', text)
+        text = ' '.join(text.split())
+        week = slot_info.get('week_start_date') or slot_info.get('week_number') or ''
+        key = f"dataLinkBox:{week}:{text}"
+    else:
+        key = href
+
+    # 複数の監視対象がある場合は、施設間で同じ表示の枠を区別する
+    target_id = slot_info.get('target_id')
+    if target_id and target_id != 'default':
+        return f"{target_id}|{key}"
+    return key
+
+
+def parse_remaining_seats(text: str) -> Optional[int]:
+    """枠のテキストから残席数を取得（表示がない場合はNone）"""
+    match = REMAINING_PATTERN.search(text or '')
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def parse_slot_minutes(text: str) -> Optional[int]:
+    """枠のテキストから開始時刻（0時からの分）を取得（表示がない場合はNone）"""
+    match = TIME_PATTERN.search(text or '')
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def get_slot_date(slot_info: Dict) -> Optional[date]:
+    """枠の日付を取得（スクレイパーが取得した日付、なければテキスト中の日付、不明な場合はNone）
+
+    テキスト中の日付には年がないため、週の開始日（なければ現在）の年を使い、
+    週の開始日より前の月日になる場合は翌年とする（年末年始の週）。
+    """
+    slot_date = slot_info.get('slot_date')
+    if slot_date:
+        try:
+            return datetime.strptime(str(slot_date), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+
+    match = DATE_PATTERN.search(slot_info.get('text') or '')
+    if not match:
+        return None
+    week_start_date = slot_info.get('week_start_date')
+    try:
+        base = datetime.strptime(str(week_start_date), '%Y-%m-%d').date() if week_start_date else date.today()
+        result = date(base.year, int(match.group(1)), int(match.group(2)))
+    except ValueError:
+        return None
+    if week_start_date and result < base:
+        result = result.replace(year=base.year + 1)
+    return result
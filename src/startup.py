@@ -0,0 +1,135 @@
+"""
+起動時間の計測
+
+main.pyはモードごとに必要なモジュールだけを、モードの実行直前に読み込む
+（Playwrightを読み込むスクレイパー・ブッカーは、ブラウザを使うモードでのみ読み込む）
+このモジュールでは、起動からモードの実行開始までの時間を予算（STARTUP_BUDGET_MS）と比べ、
+新しいPythonプロセスで `-X importtime` を使ってモードごとのモジュール読み込み時間の内訳を計測する
+"""
+
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import get_startup_budget_ms
+
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# main.pyが起動時に読み込むモジュール
+BASE_MODULES = ["dotenv", "src.config", "src.profiles", "src.ledger", "src.targets"]
+
+# モードごとに実行直前に読み込むモジュール
+MODE_MODULES: Dict[str, List[str]] = {
+    "validate": ["src.release_calendar"],
+    "report": ["src.startup"],
+    "bench": ["src.startup", "src.bench"],
+    "monitor": ["src.scraper", "src.booker", "src.multi_target"],
+    "book": ["src.scraper", "src.booker"],
+    "schedule": ["src.scheduler"],
+    "daemon": ["src.daemon", "src.control_api"],
+}
+
+
+class ImportTiming:
+    """1つのモジュールの読み込み時間（-X importtime の1行）"""
+
+    def __init__(self, name: str, self_us: int, cumulative_us: int, depth: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        # 読み込み元からの深さ（0: 直接読み込んだモジュール）
+        self.depth = depth
+
+    def as_dict(self) -> Dict:
+        return {
+            'module': self.name,
+            'self_ms': self.self_us / 1000,
+            'cumulative_ms': self.cumulative_us / 1000,
+        }
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """`-X importtime` の出力（標準エラー）を解析する"""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # 見出しの行
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        # モジュール名の字下げ（2文字ずつ）が読み込み元からの深さ
+        depth = (len(name) - len(stripped) - 1) // 2
+        timings.append(ImportTiming(stripped, self_us, cumulative_us, depth))
+    return timings
+
+
+def measure_imports(modules: List[str], python: Optional[str] = None) -> List[ImportTiming]:
+    """新しいPythonプロセスでモジュールを読み込み、読み込み時間を計測する
+
+    Raises:
+        RuntimeError: モジュールの読み込みに失敗した場合
+    """
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {modules}: {result.stderr.strip().splitlines()[-1:]}")
+    return parse_importtime(result.stderr)
+
+
+def import_report(mode: str, top: int = 10) -> Dict:
+    """モードの起動時に読み込むモジュールの読み込み時間の内訳"""
+    timings = measure_imports(BASE_MODULES + MODE_MODULES[mode])
+    top_level = [timing for timing in timings if timing.depth == 0]
+    total_us = sum(timing.cumulative_us for timing in top_level)
+    return {
+        'mode': mode,
+        'total_ms': total_us / 1000,
+        'modules': len(timings),
+        'top_level': [timing.as_dict() for timing in sorted(top_level, key=lambda t: -t.cumulative_us)[:top]],
+        'slowest_self': [timing.as_dict() for timing in sorted(timings, key=lambda t: -t.self_us)[:top]],
+    }
+
+
+def measure_cold_start(mode: str, runs: int = 5, python: Optional[str] = None) -> Dict:
+    """新しいPythonプロセスの起動からモードのモジュールの読み込み完了までの時間（ミリ秒）を繰り返し計測する"""
+    code = f"import {', '.join(BASE_MODULES + MODE_MODULES[mode])}"
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([python or sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to start mode {mode}: {result.stderr.strip().splitlines()[-1:]}")
+        samples.append(elapsed_ms)
+    return {
+        'mode': mode,
+        'runs': runs,
+        'median_ms': statistics.median(samples),
+        'max_ms': max(samples),
+        'samples_ms': samples,
+    }
+
+
+def check_startup_budget(mode: str, elapsed_ms: float, budget_ms: Optional[float] = None) -> bool:
+    """起動時間を予算と比べてログに出力し、予算内かを返す"""
+    logger = logging.getLogger(__name__)
+    budget_ms = budget_ms if budget_ms is not None else get_startup_budget_ms()
+    if elapsed_ms > budget_ms:
+        logger.warning(f"起動時間が予算を超えました (モード: {mode}): {elapsed_ms:.0f}ms > {budget_ms:.0f}ms")
+        return False
+    logger.info(f"起動時間 (モード: {mode}): {elapsed_ms:.0f}ms (予算 {budget_ms:.0f}ms)")
+    return True
@@ -0,0 +1,167 @@
+"""
+監視対象（施設）
+
+複数のAirリザーブのカレンダーを1つのプロセスで監視するための監視対象の管理
+TARGETS_FILE（JSON）が指定されていない場合は、従来どおり環境変数から1件の監視対象を作成する
+
+監視対象ファイルの形式:
+    [
+        {
+            "id": "production",
+            "url": "https://airrsv.net/kokoroto-azukari/calendar",
+            "release_datetime": "2025-11-01 09:30:00",
+            "monitor_duration_minutes": 10
+        },
+        {
+            "id": "test",
+            "site_mode": "test",
+            "release_datetime": "2025-11-01 13:00:00",
+            "test_site_mode": true,
+            "weight": 0.5
+        }
+    ]
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import (
+    ConfigError,
+    DEFAULT_PRODUCTION_URL,
+    DEFAULT_TEST_URL,
+    get_targets_file,
+    get_target_url,
+    get_test_site_mode,
+    get_next_release_datetime,
+    get_monitor_duration_minutes,
+)
+
+
+class MonitorTarget:
+    """監視対象（カレンダーURLと予約公開日時、サイトごとの挙動）"""
+
+    def __init__(
+        self,
+        target_id: str,
+        url: str,
+        release_datetime: datetime,
+        monitor_duration_minutes: int = 10,
+        test_site_mode: bool = False,
+        weight: float = 1.0,
+    ):
+        self.target_id = target_id
+        self.url = url
+        self.release_datetime = release_datetime
+        self.monitor_duration_minutes = monitor_duration_minutes
+        # テストサイトモード（14日前の13時から受付開始）
+        self.test_site_mode = test_site_mode
+        # ポーリング予算の配分比
+        self.weight = weight
+
+    @classmethod
+    def from_env(cls) -> "MonitorTarget":
+        """環境変数から監視対象を作成"""
+        return cls(
+            target_id="default",
+            url=get_target_url(),
+            release_datetime=get_next_release_datetime(),
+            monitor_duration_minutes=get_monitor_duration_minutes(),
+            test_site_mode=get_test_site_mode(),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MonitorTarget":
+        """辞書から監視対象を作成（未指定の項目は環境変数の値を使う）
+
+        Raises:
+            ConfigError: 項目の値が不正な場合
+        """
+        if not isinstance(data, dict):
+            raise ConfigError(f"Each target in TARGETS_FILE must be a JSON object, got: {data!r}")
+        if not data.get("id"):
+            raise ConfigError("Each target in TARGETS_FILE must have an 'id'")
+
+        url = data.get("url")
+        if not url:
+            site_mode = str(data.get("site_mode", "")).lower()
+            if site_mode == "test":
+                url = DEFAULT_TEST_URL
+            elif site_mode == "production":
+                url = DEFAULT_PRODUCTION_URL
+            else:
+                url = get_target_url()
+
+        if data.get("release_datetime"):
+            try:
+                release_datetime = datetime.strptime(data["release_datetime"], "%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                raise ConfigError(f"Invalid release_datetime for target {data['id']}: {data['release_datetime']}")
+        else:
+            release_datetime = get_next_release_datetime()
+
+        value = data.get("monitor_duration_minutes", get_monitor_duration_minutes())
+        try:
+            duration = int(value)
+        except (TypeError, ValueError):
+            raise ConfigError(f"Invalid monitor_duration_minutes for target {data['id']}: {value}")
+        if duration < 1:
+            raise ConfigError(f"monitor_duration_minutes for target {data['id']} must be at least 1")
+        value = data.get("weight", 1.0)
+        try:
+            weight = float(value)
+        except (TypeError, ValueError):
+            raise ConfigError(f"Invalid weight for target {data['id']}: {value}")
+        if weight <= 0:
+            raise ConfigError(f"weight for target {data['id']} must be greater than 0")
+
+        return cls(
+            target_id=str(data["id"]),
+            url=url,
+            release_datetime=release_datetime,
+            monitor_duration_minutes=duration,
+            test_site_mode=_parse_bool(data, "test_site_mode", get_test_site_mode()),
+            weight=weight,
+        )
+
+
+def _parse_bool(data: Dict, key: str, default: bool) -> bool:
+    """真偽値の項目を取得（JSONの真偽値、または文字列の "true" / "false" のみ受け付ける）"""
+    value = data.get(key, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ConfigError(f"Invalid {key} for target {data['id']}: {value!r} (expected true or false)")
+
+
+def load_targets(path: Optional[str] = None) -> List[MonitorTarget]:
+    """監視対象を読み込む
+
+    Args:
+        path: 監視対象ファイルのパス（未指定の場合はTARGETS_FILE）
+
+    Returns:
+        List[MonitorTarget]: 監視対象のリスト（ファイルがない場合は環境変数から1件）
+
+    Raises:
+        ConfigError: ファイルの形式が不正な場合
+    """
+    path = path or get_targets_file()
+    if not path:
+        return [MonitorTarget.from_env()]
+
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"TARGETS_FILE could not be loaded ({path}): {e}")
+
+    if not isinstance(data, list) or not data:
+        raise ConfigError("TARGETS_FILE must contain a non-empty JSON list of targets")
+
+    targets = [MonitorTarget.from_dict(item) for item in data]
+    ids = [target.target_id for target in targets]
+    if len(ids) != len(set(ids)):
+        raise ConfigError("Target ids in TARGETS_FILE must be unique")
+    return targets
@@ -0,0 +1,49 @@
+"""
+高精度の待機
+
+指定日時の少し手前（粗い待機の余裕）までは通常のasyncio.sleepで待ち、
+最後の区間はモノトニック時計で細かく待機してから戻る
+戻り値は予定日時からの遅延（秒）で、呼び出し側でトリガーの精度をログに出力する
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+
+# 粗い待機の1回あたりの最大秒数（時計の補正やスリープからの復帰に追従するため、壁時計で再計算する）
+MAX_COARSE_SLEEP_SECONDS = 60.0
+
+# この時間を切ったらイベントループに制御を返しながらスピンする
+SPIN_SECONDS = 0.002
+
+
+async def sleep_until(target: datetime, coarse_margin: float = 0.5) -> float:
+    """指定日時まで待機し、遅延（秒）を返す
+
+    Args:
+        target: 待機する日時（ローカル時刻）
+        coarse_margin: 粗い待機を終える、指定日時の手前の秒数
+
+    Returns:
+        float: 指定日時からの遅延（秒、既に過ぎていた場合はその分）
+    """
+    # 粗い待機（壁時計で残り時間を再計算）
+    while True:
+        remaining = (target - datetime.now()).total_seconds()
+        if remaining <= coarse_margin:
+            break
+        await asyncio.sleep(min(remaining - coarse_margin, MAX_COARSE_SLEEP_SECONDS))
+
+    # 細かい待機（最後の区間はモノトニック時計で待つ）
+    deadline = time.monotonic() + (target - datetime.now()).total_seconds()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if remaining > SPIN_SECONDS:
+            await asyncio.sleep(remaining - SPIN_SECONDS)
+        else:
+            await asyncio.sleep(0)
+
+    return (datetime.now() - target).total_seconds()
@@ -0,0 +1,227 @@
+"""
+遅延トレース
+
+スキャン・週の移動・枠の抽出・順位付け・予約の各ステップの所要時間を、モノトニック時計（ナノ秒）で計測する
+スパンは親子関係（同じタスク内で入れ子になったスパン）を持ち、監視の実行ごとに
+OTLPのJSON形式に合わせたスパンのJSON Lines（trace-<実行ID>.jsonl）と、
+ステップごとの所要時間の内訳（trace-<実行ID>-summary.json）を TRACE_DIR に書き出す
+
+使用方法:
+    with get_tracer().span("scan", target_id="default") as span:
+        slots = await ...
+        span.set(slots=len(slots))
+"""
+
+import json
+import logging
+import random
+import statistics
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import get_trace_enabled, get_trace_dir, get_trace_max_spans
+
+
+# 現在のスパン（asyncioのタスクごとに引き継がれる）
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """1つのステップの計測"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set(self, **attributes):
+        """属性を追加"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ns(self) -> int:
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    def as_otlp(self, epoch_offset_ns: int) -> Dict:
+        """OTLPのJSON形式に合わせた辞書（時刻はモノトニック時計を壁時計に換算する）"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'startTimeUnixNano': str(self.start_ns + epoch_offset_ns),
+            'endTimeUnixNano': str((self.end_ns or self.start_ns) + epoch_offset_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """トレース無効時のスパン（何も記録しない）"""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self.token = None
+
+    def __enter__(self) -> Span:
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span = Span(
+            self.name, trace_id, f"{random.getrandbits(64):016x}", parent.span_id if parent else None, self.attributes
+        )
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.span.attributes['error'] = exc_type.__name__
+        _current_span.reset(self.token)
+        self.tracer._finish(self.span)
+        return False
+
+
+class Tracer:
+    """スパンを記録し、実行ごとに書き出す"""
+
+    def __init__(self, enabled: bool = True, max_spans: int = 100000, directory: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.directory = Path(directory) if directory else None
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.run_id = uuid.uuid4().hex[:12]
+        # モノトニック時計を壁時計（Unix時刻）に換算するための差
+        self.epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name: str, **attributes):
+        """スパンを開始するコンテキストマネージャー（無効時は何もしない）"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _SpanContext(self, name, attributes)
+
+    def _finish(self, span: Span):
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        self.spans.append(span)
+
+    def summary(self) -> Dict:
+        """ステップごとの所要時間の内訳（合計時間の長い順）"""
+        durations: Dict[str, List[float]] = {}
+        for span in self.spans:
+            durations.setdefault(span.name, []).append(span.duration_ns / 1e6)
+        # 最上位のスパンの合計を全体として、各ステップの割合を求める
+        root_total = sum(span.duration_ns for span in self.spans if span.parent_id is None) / 1e6
+        steps = {}
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            values.sort()
+            total = sum(values)
+            steps[name] = {
+                'count': len(values),
+                'total_ms': total,
+                'avg_ms': total / len(values),
+                'p50_ms': statistics.median(values),
+                'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max_ms': values[-1],
+                'share': total / root_total if root_total else None,
+            }
+        return {'run_id': self.run_id, 'spans': len(self.spans), 'dropped': self.dropped, 'steps': steps}
+
+    def export(self, directory: Optional[str] = None) -> Optional[Path]:
+        """スパン（JSON Lines）と内訳（JSON）を書き出し、スパンのファイルのパスを返す（スパンがない場合はNone）"""
+        if not self.spans:
+            return None
+        output_dir = Path(directory) if directory else (self.directory or Path(get_trace_dir()))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = output_dir / f"trace-{stamp}-{self.run_id}.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.spans:
+                f.write(json.dumps(span.as_otlp(self.epoch_offset_ns), ensure_ascii=False) + "\n")
+        summary_path = output_dir / f"trace-{stamp}-{self.run_id}-summary.json"
+        summary_path.write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def log_summary(self):
+        """内訳をログに出力"""
+        summary = self.summary()
+        self.logger.info(f"遅延トレース (実行ID: {self.run_id}, スパン: {summary['spans']}件):")
+        for name, step in summary['steps'].items():
+            share = f", {step['share'] * 100:.0f}%" if step['share'] is not None else ""
+            self.logger.info(
+                f"  {name}: {step['count']}回, 合計 {step['total_ms']:.1f}ms{share}, "
+                f"平均 {step['avg_ms']:.1f}ms, p95 {step['p95_ms']:.1f}ms, 最大 {step['max_ms']:.1f}ms"
+            )
+
+    def finish_run(self) -> Optional[Path]:
+        """実行の終わりに内訳をログに出力して書き出し、次の実行のために記録を空にする"""
+        if not self.enabled or not self.spans:
+            return None
+        self.log_summary()
+        try:
+            path = self.export()
+            self.logger.info(f"遅延トレースを保存しました: {path}")
+        except OSError as e:
+            self.logger.error(f"遅延トレースの保存に失敗しました: {e}")
+            path = None
+        self.spans = []
+        self.dropped = 0
+        self.run_id = uuid.uuid4().hex[:12]
+        return path
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """プロセス全体で共有するトレーサー（TRACE_ENABLEDで有効化）"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(enabled=get_trace_enabled(), max_spans=get_trace_max_spans())
+    return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    """共有するトレーサーを差し替える（Noneの場合は次回のget_tracerで設定から作り直す）"""
+    global _tracer
+    _tracer = tracer
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+ベンチマークのテスト
+
+シミュレーターに対する予約公開の再現（公開から検出・予約確定までの時間、スキャンごとの負荷）・
+スキャン時間の計測・ベースラインとの比較と結果の書き出しを、HTTPで操作するスクレイパーで確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import re
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.bench import (
+    ReleaseScenario,
+    check_regressions,
+    compare_to_baseline,
+    load_baseline,
+    run_benchmarks,
+    run_release_scenario,
+    run_throughput,
+    save_baseline,
+    write_results,
+)
+from src.slots import parse_remaining_seats
+
+
+async def request(url: str, form=None) -> str:
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    body = urlencode(form).encode("utf-8") if form is not None else b""
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    writer.write(
+        f"{'POST' if form is not None else 'GET'} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = (await reader.read()).decode("utf-8")
+    writer.close()
+    return response.partition("\r\n\r\n")[2]
+
+
+def form_action(page: str) -> str:
+    return re.search(r'<form[^>]*action="([^"]+)"', page).group(1)
+
+
+class HttpPage:
+    def __init__(self):
+        self.url = None
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+
+
+class HttpScraper:
+    """ブラウザの代わりにHTTPでシミュレーターのカレンダーを読み、予約フローを進めるスクレイパー"""
+
+    def __init__(self, url, booker=None):
+        self.target_url = url
+        self.booker = booker
+        self.page = HttpPage()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def load_calendar_page(self):
+        await self.page.goto(self.target_url)
+        return True
+
+    async def get_available_slots(self, max_weeks=7):
+        slots, url = [], self.page.url
+        for week in range(max_weeks):
+            page = await request(url)
+            for href, text in re.findall(r'<div class="dataLinkBox js-dataLinkBox"><a href="([^"]+)">(.*?)</a></div>', page):
+                text = text.replace("<br>", "\n")
+                if parse_remaining_seats(text):
+                    slots.append({'href': href, 'text': text, 'timestamp': datetime.now(), 'week_number': week + 1})
+            next_link = re.search(r'class="ctlListItem listNext"><a href="([^"]+)"', page)
+            if not next_link:
+                break
+            url = next_link.group(1)
+        return slots
+
+    async def book_slot(self, slot, should_start=None, booker=None):
+        if should_start and not should_start():
+            return False
+        menu = await request(slot['href'])
+        visitor = await request(form_action(menu), {'lessonEntryPaxCnt': "1"})
+        confirm = await request(form_action(visitor), {
+            'lastNm': "山田", 'firstNm': "花子", 'mailAddress1': "hanako@example.com", 'tel1': "09000000000",
+        })
+        done = await request(form_action(confirm), {})
+        return "予約が完了しました" in done
+
+
+class PreferAnyBooker:
+    profile_id = "default"
+    preferred_time_start = "10:00"
+
+    def score_slot(self, slot):
+        return 1.0
+
+
+def test_release_scenario_measures_detection_and_booking():
+    """公開した枠を検出して予約し、公開からの時間とスキャンごとの負荷を返す"""
+    scenario = ReleaseScenario(weeks=3, release_after=0.3, timeout=5, check_interval=0.05)
+    result = asyncio.run(run_release_scenario(scenario, HttpScraper, PreferAnyBooker))
+    assert result['booked'] is True
+    assert 0 <= result['detection_ms'] < 1000
+    assert result['booking_ms'] >= result['detection_ms']
+    assert result['polls'] >= 3
+    assert result['scan_ms'] > 0 and result['cpu_ms_per_poll'] >= 0 and result['rss_mb'] > 0
+
+
+def test_throughput_and_benchmark_metrics():
+    """スキャン時間の計測は週数・枠数ごとにすべての枠を見つけ、結果は比較用の数値にまとめる"""
+    result = asyncio.run(run_throughput(2, 3, scans=2, scraper_factory=HttpScraper))
+    assert result['slots_found'] == 2 * 7 * 3
+    assert result['week_ms'] == result['scan_ms'] / 2
+
+    results = asyncio.run(run_benchmarks(runs=1, suites=("throughput",), scraper_factory=HttpScraper, latency_ms=0))
+    assert set(results['metrics']) == {
+        "throughput.w1_s2.scan_ms", "throughput.w3_s2.scan_ms", "throughput.w7_s2.scan_ms", "throughput.w7_s6.scan_ms",
+    }
+    assert len(results['throughput']) == 4
+
+
+def test_baseline_comparison():
+    """ベースラインより閾値を超えて遅くなった項目を退行とし、結果とベースラインを書き出す"""
+    baseline = {'release.detection_ms': 1000.0, 'release.booking_ms': 5000.0, 'release.failed_runs': 0}
+    metrics = {'release.detection_ms': 1300.0, 'release.booking_ms': 5500.0, 'release.failed_runs': 1, 'new.metric_ms': 1.0}
+    regressions = compare_to_baseline(metrics, baseline, threshold_percent=20)
+    assert [r['metric'] for r in regressions] == ['release.detection_ms', 'release.failed_runs']
+    assert round(regressions[0]['change_percent']) == 30
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_path = str(Path(tmp) / "bench" / "baseline.json")
+        results = {'created_at': "2026-10-19T10:00:00", 'metrics': dict(metrics)}
+        # ベースラインがない場合は比較しない
+        assert check_regressions(results, baseline_path, threshold_percent=20)
+        save_baseline({'created_at': "2026-10-01T10:00:00", 'metrics': baseline}, baseline_path)
+        assert load_baseline(baseline_path) == baseline
+        assert not check_regressions(results, baseline_path, threshold_percent=20)
+        assert check_regressions(results, baseline_path, threshold_percent=50) is False
+        assert check_regressions({'metrics': dict(baseline)}, baseline_path, threshold_percent=0)
+
+        path = write_results(results, str(Path(tmp) / "results"))
+        assert json.loads(path.read_text(encoding="utf-8"))['regressions'][0]['metric'] == 'release.failed_runs'
+
+
+if __name__ == "__main__":
+    test_release_scenario_measures_detection_and_booking()
+    test_throughput_and_benchmark_metrics()
+    test_baseline_comparison()
+    print("すべてのテストが成功しました")
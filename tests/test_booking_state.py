@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+予約フロー状態判定・再開のテスト
+
+URL・DOM情報からの状態判定と、失敗時にカレンダーからやり直さず
+ページの現在の状態から再開することを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.booking_state import BookingState, classify_booking_state
+from src.booker import AirReserveBooker
+from src.flight_recorder import FlightRecorder
+
+
+def test_classify_booking_state():
+    """URL・DOM情報から状態を判定できる"""
+    base = {'url': '', 'hasCalendar': False, 'hasMenuDetail': False, 'hasVisitorForm': False, 'text': ''}
+    assert classify_booking_state({**base, 'url': 'https://airrsv.net/x/calendar', 'hasCalendar': True}) == BookingState.CALENDAR
+    assert classify_booking_state({**base, 'hasMenuDetail': True}) == BookingState.MENU_DETAIL
+    assert classify_booking_state({**base, 'url': 'https://airrsv.net/x/booking/lesson/visitor/regist/', 'hasVisitorForm': True}) == BookingState.FORM
+    assert classify_booking_state({**base, 'url': 'https://airrsv.net/x/booking/confirm'}) == BookingState.CONFIRM
+    assert classify_booking_state({**base, 'text': '予約が完了しました'}) == BookingState.DONE
+    assert classify_booking_state({**base, 'hasMenuDetail': True, 'text': '予約受付期間外です'}) == BookingState.UNAVAILABLE
+    assert classify_booking_state(base) == BookingState.UNKNOWN
+
+
+class FakePage:
+    """状態を文字列で持つダミーページ"""
+
+    url = "https://example.invalid/"
+
+    def __init__(self):
+        self.state = "calendar"
+
+    async def evaluate(self, script):
+        return {
+            'url': self.url + ('confirm' if self.state == 'confirm' else ''),
+            'hasCalendar': self.state == 'calendar',
+            'hasMenuDetail': self.state == 'menu_detail',
+            'hasVisitorForm': self.state == 'form',
+            'text': '',
+        }
+
+
+class FakeBooker(AirReserveBooker):
+    """ページ操作をダミーに置き換えたブッカー"""
+
+    def __init__(self):
+        super().__init__()
+        self.dry_run = False
+        self.recorder = FlightRecorder(mode="off")
+        self.calls = []
+
+    async def _retry_with_backoff(self, func, max_retries=3, base_delay=1.0, operation_name="操作"):
+        return await func()
+
+    async def _click_reservation_link(self, slot_info, page):
+        self.calls.append("click_link")
+        page.state = "menu_detail"
+        return True
+
+    async def _select_menu(self, page):
+        return True
+
+    async def _select_datetime(self, page):
+        return True
+
+    async def _submit_menu_detail_form(self, page):
+        self.calls.append("menu_detail")
+        page.state = "form"
+        return True
+
+    async def _fill_booking_form(self, page):
+        self.calls.append("fill_form")
+        # 確認画面へは遷移したが、フォーム入力としては失敗を返す
+        page.state = "confirm"
+        return len([c for c in self.calls if c == "fill_form"]) > 1
+
+    async def _confirm_booking(self, page):
+        self.calls.append("confirm")
+        page.state = "done"
+        return True
+
+
+def test_resume_from_detected_state():
+    """失敗時はカレンダーからではなく、ページの現在の状態から再開する"""
+    async def run():
+        booker = FakeBooker()
+        page = FakePage()
+        assert await booker.execute_booking({'text': '09:30 一時預かり 残1', 'href': '/x'}, page)
+        assert booker.calls == ["click_link", "menu_detail", "fill_form", "confirm"]
+        assert booker.last_checkpoint['resumes'] == 1
+        assert booker.last_checkpoint['history'][-2:] == [BookingState.CONFIRM, BookingState.DONE]
+
+    asyncio.run(run())
+
+
+def test_resume_starts_from_current_page():
+    """resume=Trueの場合は、ページの現在の状態から予約を開始する"""
+    async def run():
+        booker = FakeBooker()
+        page = FakePage()
+        page.state = "menu_detail"
+        booker._fill_booking_form = FakeBooker._confirm_booking.__get__(booker)
+        assert await booker.execute_booking({'text': '09:30 一時預かり 残1', 'href': '/x'}, page, resume=True)
+        assert "click_link" not in booker.calls
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_classify_booking_state()
+    test_resume_from_detected_state()
+    test_resume_starts_from_current_page()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+予約競争シミュレーションのテスト
+
+遅延の分布と競合の指定の読み込み・パーセンタイル・シミュレーターで競合と席を取り合った勝敗と
+席の確保までの時間・結果の書き出しを、HTTPで予約フローを進めるブッカーで確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import random
+import re
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import ConfigError
+from src.contention import ContentionSimulation, LatencyDistribution, parse_competitors, percentile, write_summary
+
+
+async def request(url: str, form=None) -> str:
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    body = urlencode(form).encode("utf-8") if form is not None else b""
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    writer.write(
+        f"{'POST' if form is not None else 'GET'} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = (await reader.read()).decode("utf-8")
+    writer.close()
+    return response.partition("\r\n\r\n")[2]
+
+
+def form_action(page: str) -> str:
+    return re.search(r'<form[^>]*action="([^"]+)"', page).group(1)
+
+
+class HttpBooker:
+    """ブラウザの代わりにHTTPで予約フローを最後まで進めるブッカー"""
+
+    preferred_time_start = "10:00"
+
+    async def execute_booking(self, slot_info, page, resume=False):
+        menu = await request(slot_info['href'])
+        if "menuDetailForm" not in menu:
+            return False
+        visitor = await request(form_action(menu), {'lessonEntryPaxCnt': "1"})
+        confirm = await request(form_action(visitor), {
+            'lastNm': "山田", 'firstNm': "花子", 'mailAddress1': "hanako@example.com", 'tel1': "09000000000",
+        })
+        if "満員" in confirm:
+            return False
+        done = await request(form_action(confirm), {})
+        return "予約が完了しました" in done
+
+
+@asynccontextmanager
+async def no_page():
+    yield None
+
+
+def run_simulation(competitors: str, detection: str, seats: int = 1, trials: int = 3):
+    simulation = ContentionSimulation(
+        HttpBooker(), parse_competitors(competitors), LatencyDistribution.parse(detection), seats=seats, seed=1
+    )
+    return asyncio.run(simulation.run(trials, no_page))
+
+
+def test_distributions_and_percentiles():
+    """分布の指定を読み込み、不正な指定はConfigErrorにする"""
+    rng = random.Random(0)
+    assert LatencyDistribution.parse("fixed:800").sample(rng) == 800
+    assert all(500 <= LatencyDistribution.parse("uniform:500:1500").sample(rng) <= 1500 for _ in range(100))
+    assert all(LatencyDistribution.parse("normal:10:100").sample(rng) >= 0 for _ in range(100))
+    samples = sorted(LatencyDistribution.parse("lognormal:2000:0.5").sample(rng) for _ in range(1001))
+    assert 1700 < samples[500] < 2300
+
+    competitors = parse_competitors("2*fixed:100, uniform:1:2")
+    assert [str(distribution) for distribution in competitors] == ["fixed:100", "fixed:100", "uniform:1:2"]
+    for spec in ("fixed", "poisson:3", "uniform:1", "fixed:-1", "x*fixed:1"):
+        try:
+            parse_competitors(spec)
+            assert False, f"ConfigErrorが発生しませんでした: {spec}"
+        except ConfigError:
+            pass
+
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 99) == 99
+
+
+def test_faster_competitor_wins_single_seat():
+    """競合が先に予約すると1席の枠は取れず、満席までの時間を記録する"""
+    summary = run_simulation("fixed:0", "fixed:200")
+    assert summary['trials'] == 3 and summary['wins'] == 0 and summary['win_rate'] == 0
+    assert summary['claim_ms']['p50'] is None
+    assert 0 <= summary['sold_out_ms']['p50'] < 200
+
+
+def test_claim_before_competitors_and_with_spare_seats():
+    """競合より先に予約するか、席が残っていれば勝ち、公開から席の確保までの時間を返す"""
+    summary = run_simulation("fixed:400", "fixed:0")
+    assert summary['win_rate'] == 1.0
+    assert all(trial['booked'] for trial in summary['trial_results'])
+    assert 0 <= summary['claim_ms']['p50'] <= summary['claim_ms']['p99'] < 400
+
+    summary = run_simulation("fixed:0", "fixed:100", seats=2)
+    assert summary['win_rate'] == 1.0 and summary['claim_ms']['p50'] >= 100
+    assert summary['competitors'] == ["fixed:0"] and summary['detection'] == "fixed:100"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_summary(summary, tmp)
+        assert path.name.startswith("contention-")
+        assert json.loads(path.read_text(encoding="utf-8"))['wins'] == 3
+
+
+if __name__ == "__main__":
+    test_distributions_and_percentiles()
+    test_faster_competitor_wins_single_seat()
+    test_claim_before_competitors_and_with_spare_seats()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+予約用コンテキストプールのテスト
+
+監視用ページを使わずにプールのページで予約すること、空きがない場合に
+予約が待機することを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.context_pool import BookingContextPool
+from src.scraper import AirReserveScraper
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def clear_cookies(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.url = "about:blank"
+        self.broken = False
+
+    async def goto(self, url, **kwargs):
+        if self.broken:
+            raise RuntimeError("page crashed")
+        self.url = url
+
+
+class FakeBrowser:
+    async def new_context(self, **kwargs):
+        return FakeContext()
+
+
+class FakeBooker:
+    """予約に使われたページと同時実行数を記録する"""
+
+    dry_run = False
+
+    def __init__(self):
+        self.pages = []
+        self.running = 0
+        self.max_running = 0
+
+    async def execute_booking(self, slot, page, resume=False):
+        self.pages.append(page)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return True
+
+
+def test_broken_page_is_recreated():
+    """初期化に失敗したページは作り直して返却する"""
+    async def run():
+        pool = BookingContextPool(FakeBrowser(), 1)
+        await pool.start()
+        page = await pool.checkout()
+        page.broken = True
+        await pool.checkin(page)
+        replacement = await pool.checkout()
+        assert replacement is not page
+        assert page.context.closed
+        await pool.close()
+
+    asyncio.run(run())
+
+
+def test_bookings_queue_on_pool():
+    """予約はプールのページで実行され、空きがなければ待機する"""
+    async def run():
+        booker = FakeBooker()
+        scraper = AirReserveScraper(booker=booker)
+        scraper.page = object()  # 監視用ページ（予約には使われない）
+        scraper.pool = BookingContextPool(FakeBrowser(), 1)
+        await scraper.pool.start()
+
+        slot_a = {'text': '09:30 残1', 'href': '/a'}
+        slot_b = {'text': '13:00 残1', 'href': '/b'}
+        results = await asyncio.gather(scraper.book_slot(slot_a), scraper.book_slot(slot_b))
+        assert results == [True, True]
+
+        assert booker.max_running == 1
+        assert scraper.page not in booker.pages
+        await scraper.pool.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_broken_page_is_recreated()
+    test_bookings_queue_on_pool()
+    print("すべてのテストが成功しました")
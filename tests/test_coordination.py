@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+分散監視のテスト
+
+SQLite・ファイル・RESP（Redis互換サーバーの代用）の各バックエンドで、
+予約試行の確保が1インスタンスだけに成功すること、スキャン結果の共有と週の分担、
+2つのパイプラインが同じ枠を二重に予約しないことを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.coordination import Coordinator, FileCoordination, RedisCoordination, SQLiteCoordination
+from src.pipeline import SlotPipeline
+from src.resp_standin import RespStandIn
+
+
+def check_backend(backend):
+    """確保・期限切れ・解放・スキャン結果の保存を確認"""
+    assert backend.claim("a", "one", 60)
+    assert not backend.claim("a", "two", 60)
+    assert backend.claim("a", "one", None)
+
+    assert backend.claim("b", "one", 0.05)
+    time.sleep(0.1)
+    assert backend.claim("b", "two", 60)
+
+    backend.release("b", "one")
+    assert not backend.claim("b", "one", 60)
+    backend.release("b", "two")
+    assert backend.claim("b", "one", 60)
+
+    backend.put_snapshot("default:one", "x", 60)
+    backend.put_snapshot("default:two", "y", 0.05)
+    backend.put_snapshot("other:one", "z", 60)
+    time.sleep(0.1)
+    assert backend.get_snapshots("default:") == ["x"]
+
+
+def test_sqlite_backend():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteCoordination(str(Path(tmp) / "coordination.db"))
+        check_backend(backend)
+        backend.close()
+
+
+def test_file_backend():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_backend(FileCoordination(tmp))
+
+
+def test_redis_backend_with_standin():
+    async def run():
+        server = RespStandIn(port=0)
+        await server.start()
+        backend = RedisCoordination(f"redis://127.0.0.1:{server.port}/0")
+        try:
+            await asyncio.to_thread(check_backend, backend)
+        finally:
+            backend.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_share_slots_and_week_split():
+    """スキャン結果を合わせ、更新が途絶えたインスタンスの週を引き継ぐ"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "coordination.db")
+            first = Coordinator(SQLiteCoordination(path), "one", 0, 2, snapshot_ttl=60)
+            second = Coordinator(SQLiteCoordination(path), "two", 1, 2, snapshot_ttl=60)
+
+            assert first.assigned_weeks(7) == {0, 2, 4, 6}
+            assert second.assigned_weeks(7) == {1, 3, 5}
+
+            await first.share_slots("default", [{'href': '/a', 'text': 'a'}])
+            merged = await second.share_slots("default", [{'href': '/b', 'text': 'b'}])
+            assert {slot['href'] for slot in merged} == {'/a', '/b'}
+
+            # 他のインスタンスのスキャン結果がない場合は、すべての週を担当する
+            alone = Coordinator(SQLiteCoordination(path), "three", 0, 2, snapshot_ttl=60)
+            await alone.share_slots("other", [])
+            assert alone.assigned_weeks(7) == set(range(7))
+
+    asyncio.run(run())
+
+
+class FakePage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class FakeScraper:
+    target_url = "https://example.invalid/calendar"
+
+    def __init__(self, booked, error=None):
+        self.page = FakePage()
+        self.scans = [[], [{'href': '/a', 'text': '月 10:00 残1'}]]
+        self.booked = booked
+        self.error = error
+        self.scan_weeks = None
+
+    async def get_available_slots(self, max_weeks=7):
+        return self.scans.pop(0) if self.scans else []
+
+    async def book_slot(self, slot, should_start=None, booker=None):
+        self.booked.append(slot['href'])
+        await asyncio.sleep(0.02)
+        if self.error:
+            raise self.error
+        return True
+
+
+class FakeBooker:
+    profile_id = "default"
+
+    def score_slot(self, slot):
+        return 1.0
+
+
+def test_only_one_instance_books_a_slot():
+    """2つのインスタンスが同じ枠を見つけても、予約するのは1つだけ"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "coordination.db")
+            booked = []
+            pipelines = [
+                SlotPipeline(FakeScraper(booked), booker=FakeBooker(), check_interval=0.01, booking_workers=1,
+                             coordinator=Coordinator(SQLiteCoordination(path), f"i{i}", i, 2, poll_period=0.01))
+                for i in range(2)
+            ]
+            until = datetime.now() + timedelta(seconds=0.1)
+            await asyncio.gather(*(pipeline.run(until=until) for pipeline in pipelines))
+
+            assert booked == ['/a']
+
+    asyncio.run(run())
+
+
+def test_claim_released_when_booking_raises():
+    """予約中に例外が発生した場合も確保を解除し、他のインスタンスが予約できる"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "coordination.db")
+            booked = []
+            coordinator = Coordinator(SQLiteCoordination(path), "one", 0, 1, claim_ttl=300, poll_period=0.01)
+            pipeline = SlotPipeline(FakeScraper(booked, error=RuntimeError("ページが閉じられました")),
+                                    booker=FakeBooker(), check_interval=0.01, booking_workers=1,
+                                    coordinator=coordinator)
+            await pipeline.run(until=datetime.now() + timedelta(seconds=0.1))
+            assert booked == ['/a']
+
+            other = Coordinator(SQLiteCoordination(path), "two", 0, 1)
+            assert await other.claim({'href': '/a', 'text': '月 10:00 残1'}, "default")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_sqlite_backend()
+    test_file_backend()
+    test_redis_backend_with_standin()
+    test_share_slots_and_week_split()
+    test_only_one_instance_books_a_slot()
+    test_claim_released_when_booking_raises()
+    print("すべてのテストが成功しました")
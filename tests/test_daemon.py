@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+常駐モードのテスト
+
+制御APIで状態を確認でき、再起動せずにポーリングの一時停止・スキャン間隔の変更・監視期間の追加ができること、
+常駐モードが監視期間のない間も終了せず、追加された監視期間を監視することを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.control_api import ControlServer
+from src.daemon import MonitorDaemon, RuntimeControl
+from src.release_calendar import ReleaseCalendar
+
+
+class RecordingDaemon(MonitorDaemon):
+    """ブラウザを起動せず、待機せずに監視期間を記録する"""
+
+    @asynccontextmanager
+    async def _open_session(self):
+        yield None, []
+
+    async def _trigger(self, name, at):
+        self.trigger_log.append({'name': name, 'scheduled': at, 'lateness_seconds': 0.0})
+        return 0.0
+
+    async def _start_monitoring_job(self):
+        self.ran.append(self.window.release_datetime)
+
+
+async def request(server, method, path, payload=None, socket_path=None):
+    """制御APIにHTTPリクエストを送り、ステータスコードとJSONを返す"""
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content.decode("utf-8"))
+
+
+def test_runtime_control_pauses_polling():
+    """一時停止中はスキャン前のゲートで待機し、再開すると進む"""
+    async def run():
+        control = RuntimeControl(1.0)
+        await asyncio.wait_for(control.gate(), timeout=1)
+
+        control.pause()
+        waiter = asyncio.create_task(control.gate())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        control.resume()
+        await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(run())
+
+
+def test_control_api_changes_daemon_at_runtime():
+    """制御APIで状態を確認し、一時停止・スキャン間隔の変更・監視期間の追加ができる"""
+    release = (datetime.now() + timedelta(days=1)).replace(microsecond=0)
+
+    async def run():
+        daemon = RecordingDaemon(ReleaseCalendar(dates=[], monitor_duration_minutes=1))
+        async with ControlServer(daemon, host="127.0.0.1", port=0, socket_path="") as server:
+            status, body = await request(server, "GET", "/status")
+            assert status == 200
+            assert body['phase'] == "starting" and body['upcoming_windows'] == []
+            assert body['slots'] == [] and body['queued_bookings'] == []
+
+            assert (await request(server, "POST", "/pause"))[0] == 200
+            assert daemon.control.paused
+            assert (await request(server, "POST", "/resume"))[0] == 200
+            assert not daemon.control.paused
+
+            status, body = await request(server, "POST", "/poll-interval", {"seconds": 0.25})
+            assert status == 200 and daemon.control.poll_interval == 0.25
+            assert (await request(server, "POST", "/poll-interval", {"seconds": -1}))[0] == 400
+
+            status, body = await request(
+                server, "POST", "/windows", {"release_datetime": release.strftime("%Y-%m-%d %H:%M:%S")}
+            )
+            assert status == 200 and daemon.calendar.dates == [release]
+            assert body['window']['releases'] == [release.strftime("%Y-%m-%d %H:%M:%S.000")]
+            assert (await request(server, "POST", "/windows", {"release_datetime": "2020-01-01 09:30:00"}))[0] == 400
+            assert (await request(server, "POST", "/windows", {"release_datetime": "tomorrow"}))[0] == 400
+
+            assert (await request(server, "GET", "/missing"))[0] == 404
+            assert (await request(server, "GET", "/pause"))[0] == 405
+
+    asyncio.run(run())
+
+
+def test_control_api_over_unix_socket():
+    """Unixソケットを指定した場合はTCPの代わりに使い、所有者のみ接続できる"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "control.sock")
+            daemon = RecordingDaemon(ReleaseCalendar(dates=[], monitor_duration_minutes=1))
+            async with ControlServer(daemon, socket_path=socket_path) as server:
+                assert os.stat(socket_path).st_mode & 0o777 == 0o600
+                status, body = await request(server, "GET", "/slots", socket_path=socket_path)
+                assert status == 200 and body == {'slots': []}
+            assert not os.path.exists(socket_path)
+
+    asyncio.run(run())
+
+
+def test_daemon_waits_for_added_windows():
+    """監視期間がない間も終了せず、追加された監視期間を監視し、スキャン間隔の変更をパイプラインに反映する"""
+    first = (datetime.now() + timedelta(hours=1)).replace(microsecond=0)
+    second = first + timedelta(hours=1)
+
+    async def run():
+        daemon = RecordingDaemon(ReleaseCalendar(dates=[], monitor_duration_minutes=1))
+        daemon.ran = []
+        task = asyncio.create_task(daemon.start())
+        await asyncio.sleep(0.05)
+        assert daemon.phase == "idle" and not task.done()
+
+        daemon.add_window(first)
+        daemon.add_window(second)
+        for _ in range(100):
+            if len(daemon.ran) == 2 and daemon.phase == "idle":
+                break
+            await asyncio.sleep(0.01)
+        assert daemon.ran == [first, second]
+
+        # 監視中のパイプラインにはスキャン間隔の変更と一時停止のゲートが反映される
+        class FakeScraper:
+            class target:
+                target_id = "default"
+
+        pipeline = daemon._create_pipeline(FakeScraper(), [], None)
+        assert daemon.phase == "monitoring" and pipeline.poll_gate == daemon.control.gate
+        daemon.set_poll_interval(0.5)
+        assert pipeline.check_interval == 0.5
+
+        daemon.stop()
+        await asyncio.wait_for(task, timeout=1)
+        assert daemon.phase == "stopped"
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_runtime_control_pauses_polling()
+    test_control_api_changes_daemon_at_runtime()
+    test_control_api_over_unix_socket()
+    test_daemon_waits_for_added_windows()
+    print("すべてのテストが成功しました")
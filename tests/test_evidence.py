@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+証跡キャプチャのテスト
+
+ブラウザを使わずに、ダミーページで取得・書き込みの非同期処理を確認する
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.evidence import EvidenceCapture
+
+
+class DummyPage:
+    """screenshot/contentのみを持つダミーページ"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def screenshot(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        return b"\xff\xd8dummy"
+
+    async def content(self):
+        self.calls.append({"content": True})
+        return "<html><body>確認画面</body></html>"
+
+
+def test_capture_returns_before_write():
+    """captureは書き込み完了を待たずに戻り、flush後にファイルが存在する"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            evidence = EvidenceCapture(evidence_format="jpeg", jpeg_quality=50, output_dir=tmp)
+            page = DummyPage(delay=0.2)
+
+            filename = await evidence.capture(page, "before_submit")
+            assert filename.endswith(".jpg")
+            assert not Path(filename).exists()
+            assert page.calls == [{"type": "jpeg", "quality": 50}]
+
+            await evidence.close()
+            assert Path(filename).read_bytes() == b"\xff\xd8dummy"
+
+    asyncio.run(run())
+
+
+def test_html_format():
+    """html形式ではページのHTMLを保存する"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            evidence = EvidenceCapture(evidence_format="html", output_dir=tmp)
+            filename = await evidence.capture(DummyPage(), "after_submit")
+            await evidence.close()
+            assert "確認画面" in Path(filename).read_text(encoding="utf-8")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_capture_returns_before_write()
+    test_html_format()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+フライトレコーダーのテスト
+
+リングバッファの保持期間と、失敗時の書き出し内容、コンテキストごとの記録の分離を確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.flight_recorder import FlightRecorder
+
+
+class DummyPage:
+    """content/urlのみを持つダミーページ"""
+
+    url = "https://example.invalid/booking/lesson/visitor/regist/"
+
+    async def content(self):
+        return "<html><body>入力画面</body></html>"
+
+
+def test_window_and_max_events():
+    """保持期間外・上限超過のイベントは破棄される"""
+    recorder = FlightRecorder(mode="events", window_seconds=0.05, max_events=3)
+    for i in range(5):
+        recorder.record("request", url=f"/r{i}")
+    assert [e["url"] for e in recorder.events] == ["/r2", "/r3", "/r4"]
+
+    time.sleep(0.06)
+    recorder.record("response", url="/last")
+    assert [e["url"] for e in recorder.events] == ["/last"]
+
+
+def test_dump_writes_events_and_dom():
+    """失敗時の書き出しでイベントとDOMが保存される"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder = FlightRecorder(mode="events", window_seconds=30, max_events=100, output_dir=tmp)
+            recorder.record("navigated", url=DummyPage.url)
+            record_dir = Path(await recorder.dump(DummyPage(), "fill_form"))
+
+            lines = (record_dir / "events.jsonl").read_text(encoding="utf-8").splitlines()
+            assert json.loads(lines[0])["kind"] == "navigated"
+            assert "入力画面" in (record_dir / "page.html").read_text(encoding="utf-8")
+            assert json.loads((record_dir / "meta.json").read_text(encoding="utf-8"))["reason"] == "fill_form"
+
+    asyncio.run(run())
+
+
+class FakeTracing:
+    def __init__(self):
+        self.calls = []
+
+    async def start(self, **kwargs):
+        self.calls.append("start")
+
+    async def start_chunk(self):
+        self.calls.append("start_chunk")
+
+    async def stop_chunk(self, path=None):
+        self.calls.append("stop_chunk" if path is None else "save_chunk")
+        if path:
+            Path(path).write_bytes(b"")
+
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+
+class FakePage(DummyPage):
+    """リスナーを保持し、イベントを発生させられるページ"""
+
+    def __init__(self, context):
+        self.context = context
+        self.main_frame = object()
+        self.listeners = {}
+
+    def on(self, event, handler):
+        self.listeners[event] = handler
+
+    def emit_request(self, url):
+        self.listeners["request"](type("Request", (), {"method": "GET", "url": url})())
+
+
+def test_recordings_are_kept_per_context():
+    """同じブッカーで同時に予約しているページのイベントとトレースを混ぜない"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder = FlightRecorder(mode="trace", window_seconds=30, max_events=100, output_dir=tmp)
+            first, second = FakePage(FakeContext()), FakePage(FakeContext())
+            for page in (first, second):
+                await recorder.attach(page)
+                await recorder.begin(page)
+            first.emit_request("/first")
+            second.emit_request("/second")
+
+            # 正常終了したページの記録は破棄し、次の予約でトレースチャンクを開始する
+            await recorder.end(first)
+            await recorder.begin(first)
+            assert first.context.tracing.calls == ["start", "stop_chunk", "start_chunk"]
+
+            record_dir = Path(await recorder.dump(second, "confirm"))
+            lines = (record_dir / "events.jsonl").read_text(encoding="utf-8").splitlines()
+            assert [json.loads(line)["url"] for line in lines] == ["/second"]
+            assert second.context.tracing.calls == ["start", "save_chunk"]
+
+            # 二重登録はしない
+            await recorder.attach(first)
+            assert first.context.tracing.calls.count("start") == 1
+
+    asyncio.run(run())
+
+
+def test_off_mode_writes_nothing():
+    """offモードでは書き出さない"""
+    async def run():
+        recorder = FlightRecorder(mode="off", window_seconds=30, max_events=100, output_dir="unused")
+        assert await recorder.dump(DummyPage(), "confirm") is None
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_window_and_max_events()
+    test_dump_writes_events_and_dom()
+    test_recordings_are_kept_per_context()
+    test_off_mode_writes_nothing()
+    print("すべてのテストが成功しました")
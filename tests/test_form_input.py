@@ -198,6 +198,7 @@ async def test_form_input():
             ]
         )
         
+        booker = None
         try:
             page = await browser.new_page()
             
@@ -295,6 +296,8 @@ async def test_form_input():
                 logger.info("非対話的環境のため、10秒後にブラウザを閉じます...")
                 await asyncio.sleep(10)
             
+            if booker:
+                await booker.close()
             await browser.close()
             logger.info("ブラウザを閉じました")
 
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+HARの記録・再生のテスト
+
+コンテキストごとの記録の設定と1つのHARへのまとめ・再生時のルートの横取りの設定・
+記録時のSTOP_BEFORE_SUBMITの確認・記録したHARに対するベンチマークの計測を確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.bench import run_benchmarks, run_replay
+from src.config import ConfigError, get_har_mode
+from src.har import HarSession, merge_har_files, summarize_har
+from src.simulator import AirReserveSimulator, SimulatedSlot
+
+
+def har_entry(url: str, started: str, mime_type: str = "text/html") -> dict:
+    return {
+        'startedDateTime': started,
+        'request': {'method': "GET", 'url': url},
+        'response': {'status': 200, 'content': {'mimeType': mime_type, 'text': ""}},
+    }
+
+
+def write_har(path: Path, entries, pages=()):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'log': {'version': "1.2", 'creator': {'name': "Playwright"},
+                                        'pages': list(pages), 'entries': entries}}), encoding="utf-8")
+
+
+class FakeContext:
+    def __init__(self, options):
+        self.options = options
+        self.routes = []
+        self.closed = False
+
+    async def route_from_har(self, path, not_found="abort"):
+        self.routes.append((path, not_found))
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **options):
+        context = FakeContext(options)
+        self.contexts.append(context)
+        return context
+
+
+def test_merge_and_summarize():
+    """複数のHARのエントリを開始時刻順にまとめ、記録時の情報を残す"""
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor, booking = Path(tmp) / "monitor.har", Path(tmp) / "booking.har"
+        write_har(monitor, [
+            har_entry("https://airrsv.net/shop/calendar", "2026-10-20T13:00:00.100Z"),
+            har_entry("https://cdn.airrsv.net/app.js", "2026-10-20T13:00:00.300Z", "application/javascript"),
+        ], pages=[{'id': "page@1"}])
+        write_har(booking, [har_entry("https://airrsv.net/shop/reserve/1", "2026-10-20T13:00:00.200Z")])
+
+        output = Path(tmp) / "out" / "session.har"
+        merged = merge_har_files([str(monitor), str(booking)], str(output), {'target_url': "https://airrsv.net/shop/calendar"})
+        assert [entry['startedDateTime'][-7:] for entry in merged['log']['entries']] == ["00.100Z", "00.200Z", "00.300Z"]
+        assert merged['log']['creator'] == {'name': "Playwright"} and merged['log']['pages'] == [{'id': "page@1"}]
+        assert [p.name for p in output.parent.iterdir()] == ["session.har"]
+
+        summary = summarize_har(str(output))
+        assert summary['entries'] == 3 and summary['documents'] == 2
+        assert summary['hosts'] == {'airrsv.net': 2, 'cdn.airrsv.net': 1}
+        assert summary['metadata']['target_url'] == "https://airrsv.net/shop/calendar"
+
+        (Path(tmp) / "broken.har").write_text("{}", encoding="utf-8")
+        try:
+            summarize_har(str(Path(tmp) / "broken.har"))
+            assert False, "ConfigErrorが発生しませんでした"
+        except ConfigError:
+            pass
+
+
+def test_record_and_replay_contexts():
+    """記録時はコンテキストごとのHARに記録してまとめ、再生時はすべてのコンテキストでまとめたHARを返す"""
+    async def run(tmp):
+        browser = FakeBrowser()
+        recorder = HarSession("record", tmp)
+        await recorder.new_context(browser, "monitor-default", extra_http_headers={'User-Agent': "test"})
+        await recorder.new_context(browser, "booking-1")
+        options = browser.contexts[0].options
+        assert options['extra_http_headers'] == {'User-Agent': "test"}
+        assert options['record_har_path'].endswith("contexts/monitor-default.har")
+        assert options['record_har_content'] == "embed" and options['record_har_mode'] == "full"
+
+        # Playwrightはコンテキストを閉じたときにHARを書き出す
+        for i, context in enumerate(browser.contexts):
+            write_har(Path(context.options['record_har_path']), [har_entry(f"https://airrsv.net/{i}", f"2026-10-20T13:00:0{i}Z")])
+        path = recorder.finish("https://airrsv.net/shop/calendar")
+        assert summarize_har(str(path))['entries'] == 2
+        assert recorder.finish() is None
+
+        browser = FakeBrowser()
+        player = HarSession("replay", tmp, not_found="fallback")
+        context = await player.new_context(browser, "monitor-default")
+        assert "record_har_path" not in context.options
+        assert context.routes == [(str(path), "fallback")]
+
+        try:
+            await HarSession("replay", str(Path(tmp) / "missing")).new_context(browser, "monitor-default")
+            assert False, "ConfigErrorが発生しませんでした"
+        except ConfigError:
+            assert browser.contexts[-1].closed
+
+        off = FakeBrowser()
+        await HarSession().new_context(off, "monitor-default")
+        assert off.contexts[0].options == {} and off.contexts[0].routes == []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+
+def test_record_requires_stop_before_submit():
+    """記録中に予約を確定しないよう、STOP_BEFORE_SUBMIT=false での記録は設定エラーにする"""
+    previous = {key: os.environ.get(key) for key in ("HAR_MODE", "STOP_BEFORE_SUBMIT")}
+    try:
+        os.environ["HAR_MODE"] = "record"
+        os.environ["STOP_BEFORE_SUBMIT"] = "true"
+        assert get_har_mode() == "record"
+        for mode, stop in (("record", "false"), ("capture", "true")):
+            os.environ["HAR_MODE"], os.environ["STOP_BEFORE_SUBMIT"] = mode, stop
+            try:
+                get_har_mode()
+                assert False, f"ConfigErrorが発生しませんでした: {mode}"
+            except ConfigError:
+                pass
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+async def request(url: str, form=None) -> str:
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    body = urlencode(form).encode("utf-8") if form is not None else b""
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    writer.write(
+        f"{'POST' if form is not None else 'GET'} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = (await reader.read()).decode("utf-8")
+    writer.close()
+    return response.partition("\r\n\r\n")[2]
+
+
+class HttpPage:
+    url = None
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+
+
+class ReplayScraper:
+    """再生の代わりにシミュレーターのカレンダーをHTTPで読むスクレイパー"""
+
+    def __init__(self, url, booker=None):
+        self.target_url = url
+        self.page = HttpPage()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def load_calendar_page(self):
+        await self.page.goto(self.target_url)
+
+    async def get_available_slots(self, max_weeks=7):
+        page = await request(self.page.url)
+        return [{'href': href, 'text': text} for href, text in
+                re.findall(r'<div class="dataLinkBox js-dataLinkBox"><a href="([^"]+)">(.*?)</a></div>', page)]
+
+
+class ConfirmBooker:
+    """確認画面まで進むブッカー"""
+
+    def __init__(self):
+        self.slots = []
+
+    async def execute_booking(self, slot_info, page):
+        self.slots.append(slot_info)
+        menu = await request(slot_info['href'])
+        return "menuDetailForm" in menu
+
+
+def test_replay_benchmark():
+    """記録した監視対象のカレンダーをスキャンし、最初の枠で確認画面までの予約時間を計測する"""
+    async def run(tmp):
+        slot = SimulatedSlot("s001", date.today(), "10:00")
+        async with AirReserveSimulator([slot], weeks=1, port=0) as sim:
+            write_har(Path(tmp) / "session.har", [har_entry(sim.calendar_url, "2026-10-20T13:00:00Z")])
+            merge_har_files([str(Path(tmp) / "session.har")], str(Path(tmp) / "session.har"), {'target_url': sim.calendar_url})
+            booker = ConfirmBooker()
+            result = await run_replay(scans=2, har_dir=tmp, scraper_factory=ReplayScraper, booker_factory=lambda: booker)
+        assert result['entries'] == 1 and result['slots_found'] == 1
+        assert result['booked'] is True and result['booking_ms'] > 0 and result['scan_ms'] > 0
+        assert booker.slots[0]['target_url'] == sim.calendar_url
+
+        # 記録がない場合は省略する
+        results = await run_benchmarks(runs=1, suites=("replay",), har_dir=str(Path(tmp) / "missing"))
+        assert results['metrics'] == {} and 'replay' not in results
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+
+if __name__ == "__main__":
+    test_merge_and_summarize()
+    test_record_and_replay_contexts()
+    test_record_requires_stop_before_submit()
+    test_replay_benchmark()
+    print("すべてのテストが成功しました")
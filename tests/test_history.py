@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+予約枠の履歴のテスト
+
+スキャンごとではなく枠の状態が変化したときだけ記録すること・まとめての書き込み・
+スキャン結果の比較でSQLiteに触れず書き込みはバックグラウンドのスレッドで行うこと・
+日付ごとの表示時刻と満席までの時間の集計・パイプラインのスキャン結果の記録を確認する（ブラウザ不要）
+"""
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.history import SlotHistory, get_history, set_history
+from src.pipeline import SlotPipeline
+
+
+def make_slot(href, text, slot_date="2026-11-05"):
+    return {'href': href, 'text': text, 'slot_date': slot_date}
+
+
+def stored_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT slot_key, seats, status, initial FROM slot_changes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def stored_sessions(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT started_at, ended_at FROM scan_sessions").fetchall()
+    finally:
+        conn.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "書き込まれない"
+        time.sleep(0.01)
+
+
+def test_records_changes_only():
+    """同じ状態が続く間は記録せず、残席数の変化・満席・消えた枠・再表示を1行ずつ記録する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "history.db")
+        history = SlotHistory(path, flush_seconds=3600, batch_size=100)
+        assert history.observe("default", [make_slot("/a", "10:00 残3"), make_slot("/b", "13:00 残1")]) == 2
+        for _ in range(5):
+            assert history.observe("default", [make_slot("/a", "10:00 残3"), make_slot("/b", "13:00 残1")]) == 0
+        assert history.observe("default", [make_slot("/a", "10:00 残2"), make_slot("/b", "13:00 残0")]) == 2
+        assert history.observe("default", [make_slot("/b", "13:00 残0")]) == 1
+        assert history.observe("default", [make_slot("/b", "13:00 残1"), make_slot("/c", "15:00 残5")]) == 2
+        # まとめて書き込むまではファイルに書かない
+        assert stored_rows(path) == []
+        history.close()
+
+        assert stored_rows(path) == [
+            ("/a", 3, "available", 1), ("/b", 1, "available", 1),
+            ("/a", 2, "available", 0), ("/b", 0, "full", 0),
+            ("/a", None, "gone", 0),
+            ("/b", 1, "available", 0), ("/c", 5, "available", 0),
+        ]
+
+        # 行数がたまった場合は書き込む
+        history = SlotHistory(path, flush_seconds=3600, batch_size=2)
+        history.observe("other", [make_slot("/a", "10:00 残3"), make_slot("/b", "13:00 残1")])
+        wait_for(lambda: len(stored_rows(path)) == 9)
+        history.close()
+
+        disabled = SlotHistory()
+        assert disabled.observe("default", [make_slot("/a", "10:00 残3")]) == 0
+        assert disabled.lifecycles() == [] and disabled.dates() == []
+
+
+class RecordingConnection:
+    """SQLiteの接続を使ったスレッドを記録する"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.threads = []
+
+    def __getattr__(self, name):
+        self.threads.append(threading.current_thread())
+        return getattr(self.conn, name)
+
+
+def test_observe_does_not_touch_sqlite():
+    """別のプロセスが書き込み中でもスキャン結果の比較は待たず、書き込みはバックグラウンドのスレッドで行う"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "history.db")
+        history = SlotHistory(path, flush_seconds=3600, batch_size=1)
+        conn = RecordingConnection(history._conn)
+        history._conn = conn
+
+        # 書き込み中（接続のロックを保持している間）も observe は待たない
+        start = datetime(2026, 10, 20, 13, 0, 0)
+        with history._lock:
+            started = time.monotonic()
+            for seats in range(3, 0, -1):
+                observed_at = start + timedelta(seconds=3 - seats)
+                assert history.observe("default", [make_slot("/a", f"10:00 残{seats}")], observed_at) == 1
+            assert time.monotonic() - started < 0.5
+            assert conn.threads == []
+        wait_for(lambda: len(stored_rows(path)) == 3)
+        assert conn.threads and all(thread is not threading.main_thread() for thread in conn.threads)
+
+        # 監視期間の終了も書き込みのスレッドで記録する
+        history.finish("default")
+        wait_for(lambda: stored_sessions(path) == [(start.isoformat(timespec="milliseconds"),
+                                                    (start + timedelta(seconds=2)).isoformat(timespec="milliseconds"))])
+        assert all(thread is not threading.main_thread() for thread in conn.threads)
+        history.close()
+
+
+def test_date_report():
+    """日付ごとに、枠が表示された時刻・満席までの時間・再び予約可能になった回数を集計する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        history = SlotHistory(str(Path(tmp) / "history.db"))
+        start = datetime(2026, 10, 20, 12, 59, 50)
+        at = lambda seconds: start + timedelta(seconds=seconds)
+        history.observe("default", [make_slot("/old", "9:00 残2")], at(0))
+        history.observe("default", [make_slot("/old", "9:00 残2"), make_slot("/a", "10:00 残3"),
+                                    make_slot("/b", "13:00 残1"), make_slot("/x", "10:00 残1", "2026-11-06")], at(10))
+        history.observe("default", [make_slot("/old", "9:00 残2"), make_slot("/a", "10:00 残1"),
+                                    make_slot("/x", "10:00 残1", "2026-11-06")], at(14))
+        history.observe("default", [make_slot("/old", "9:00 残2"), make_slot("/a", "10:00 残0"),
+                                    make_slot("/x", "10:00 残1", "2026-11-06")], at(40))
+        history.observe("default", [make_slot("/old", "9:00 残2"), make_slot("/a", "10:00 残1"),
+                                    make_slot("/x", "10:00 残1", "2026-11-06")], at(600))
+
+        report = history.date_report("2026-11-05")
+        assert report['slots'] == 3 and report['already_listed'] == 1
+        assert report['first_appeared_at'] == at(10) and report['last_appeared_at'] == at(10)
+        assert report['sold_out'] == 2 and report['reopened'] == 1
+        assert report['sell_out_seconds'] == {'median': 17.0, 'max': 30.0}
+        lifecycles = {slot['slot_key']: slot for slot in report['lifecycles']}
+        assert lifecycles['/old']['initial'] and lifecycles['/old']['sold_out_at'] is None
+        assert lifecycles['/a']['slot_time'] == "10:00" and lifecycles['/a']['seats'] == 3
+        assert lifecycles['/a']['sold_out_at'] == at(40) and lifecycles['/a']['reopened'] == [at(600)]
+        assert lifecycles['/b']['sell_out_seconds'] == 4.0
+
+        assert history.dates() == [("2026-11-05", 3), ("2026-11-06", 1)]
+        history.close()
+
+
+class FakePage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class FakeScraper:
+    target_url = "https://example.invalid/calendar"
+
+    def __init__(self, scans):
+        self.page = FakePage()
+        self.scans = list(scans)
+
+    async def get_available_slots(self, max_weeks=7):
+        return self.scans.pop(0) if self.scans else []
+
+
+def test_pipeline_records_scans():
+    """パイプラインのスキャン結果を監視対象ごとに記録する"""
+    async def run():
+        scans = [[make_slot("/a", "10:00 残2")], [make_slot("/a", "10:00 残2")], [make_slot("/a", "10:00 残0")]]
+        pipeline = SlotPipeline(FakeScraper(scans), target_id="shop", check_interval=0.01)
+        await pipeline.run(datetime.now() + timedelta(seconds=0.2))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "history.db")
+        set_history(SlotHistory(path))
+        try:
+            asyncio.run(run())
+            rows = get_history().changes(target_id="shop")
+        finally:
+            get_history().close()
+            set_history(None)
+        assert [(row['status'], row['seats']) for row in rows] == [("available", 2), ("full", 0), ("gone", None)]
+
+
+if __name__ == "__main__":
+    test_records_changes_only()
+    test_observe_does_not_touch_sqlite()
+    test_date_report()
+    test_pipeline_records_scans()
+    print("すべてのテストが成功しました")
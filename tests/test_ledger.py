@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+予約台帳のテスト
+
+予約試行と結果の記録・再起動後の読み込み・枠ごとの試行回数と月ごとの予約数の上限・
+ブッカーが試行前に台帳を確認することを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.booker import AirReserveBooker
+from src.ledger import BookingLedger, get_slot_month
+from src.profiles import BookerProfile
+
+
+def make_slot(href, week_start_date='2025-11-03'):
+    return {'href': href, 'text': f'月 10:00 残1 {href}', 'week_start_date': week_start_date}
+
+
+def test_ledger_persists_attempts_and_outcomes():
+    """記録は再起動後も残り、予約済み・結果不明・試行済みの枠をスキップする"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "ledger.db")
+        ledger = BookingLedger(path)
+        booked, failed, crashed = make_slot('/a'), make_slot('/b'), make_slot('/c')
+
+        assert ledger.check(booked, "p1") is None
+        ledger.record_outcome(ledger.record_attempt(booked, "p1"), booked, "p1", True)
+        ledger.record_outcome(ledger.record_attempt(failed, "p1"), failed, "p1", False)
+        ledger.record_attempt(crashed, "p1")
+        ledger.close()
+
+        ledger = BookingLedger(path, max_attempts_per_slot=2)
+        assert ledger.check(booked, "p1") == "予約済み"
+        assert ledger.check(crashed, "p1") == "結果不明の試行あり"
+        assert ledger.check(failed, "p1") is None
+        assert ledger.check(booked, "p2") is None
+        assert ledger.booked_count("p1", "2025-11") == 1
+
+        ledger.record_outcome(ledger.record_attempt(failed, "p1"), failed, "p1", False)
+        assert ledger.check(failed, "p1").startswith("試行済み")
+        ledger.close()
+
+
+def test_monthly_limit():
+    """プロファイルごとの月の予約数が上限に達すると、同じ月の枠をスキップする"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = BookingLedger(str(Path(tmp) / "ledger.db"), max_bookings_per_month=1)
+        first = make_slot('/a')
+        ledger.record_outcome(ledger.record_attempt(first, "p1"), first, "p1", True)
+
+        assert ledger.check(make_slot('/b'), "p1").startswith("2025-11")
+        assert ledger.check(make_slot('/c', '2025-12-01'), "p1") is None
+        assert ledger.check(make_slot('/b'), "p2") is None
+        ledger.close()
+
+
+def test_monthly_limit_counts_in_flight_attempts():
+    """並行して実行中の試行も月の予約数に数え、失敗すれば枠を戻す"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = BookingLedger(str(Path(tmp) / "ledger.db"), max_bookings_per_month=1)
+        first, second = make_slot('/a'), make_slot('/b')
+        attempt_id = ledger.record_attempt(first, "p1")
+        assert ledger.check(second, "p1").startswith("2025-11")
+
+        ledger.record_outcome(attempt_id, first, "p1", False)
+        assert ledger.check(second, "p1") is None
+        ledger.close()
+
+
+def test_slot_month_uses_slot_date():
+    """月をまたぐ週の枠は、週の開始日ではなく枠の日付の月に数える"""
+    assert get_slot_month({'week_start_date': '2025-05-26', 'slot_date': '2025-06-02'}) == '2025-06'
+    assert get_slot_month({'week_start_date': '2025-05-26', 'text': '6/2(月) 10:00 残1'}) == '2025-06'
+    assert get_slot_month({'week_start_date': '2025-12-29', 'text': '1月2日 10:00'}) == '2026-01'
+    assert get_slot_month({'week_start_date': '2025-05-26', 'text': '10:00 残1'}) == '2025-05'
+
+
+class FakeBooker(AirReserveBooker):
+    """予約フローをダミーに置き換えたブッカー"""
+
+    def __init__(self, ledger, result=True):
+        super().__init__(BookerProfile("p1", preferred_days=["月"]), ledger=ledger)
+        self.dry_run = False
+        self.stop_before_submit = False
+        self.result = result
+        self.executed = []
+
+    async def _execute_booking(self, slot_info, page, resume=False):
+        self.executed.append(slot_info['href'])
+        return self.result
+
+
+def test_booker_consults_ledger_before_attempting():
+    """予約済みの枠は予約フローを実行せず、スコアも0にする"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = BookingLedger(str(Path(tmp) / "ledger.db"))
+            booker = FakeBooker(ledger)
+            slot = make_slot('/a')
+
+            assert booker.score_slot(slot) > 0
+            assert await booker.execute_booking(slot, None)
+            assert not await booker.execute_booking(slot, None)
+            assert booker.executed == ['/a']
+            assert booker.score_slot(slot) == 0
+
+            # STOP_BEFORE_SUBMITの場合は台帳を参照・記録しない
+            booker.stop_before_submit = True
+            assert await booker.execute_booking(slot, None)
+            assert booker.executed == ['/a', '/a']
+            ledger.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_ledger_persists_attempts_and_outcomes()
+    test_monthly_limit()
+    test_monthly_limit_counts_in_flight_attempts()
+    test_slot_month_uses_slot_date()
+    test_booker_consults_ledger_before_attempting()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+ログ出力のテスト
+
+JSON Lines・テキストの書式とフィールド・無効なレベルでのlazyの値の省略・
+ハンドラーをバックグラウンドのスレッドで実行すること・終了時の書き出し・
+スクレイパーの枠の判定を1回だけ行うことを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import threading
+from logging.handlers import QueueHandler
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.logging_setup import TextFormatter, lazy, start_logging, stop_logging
+from src.scraper import AirReserveScraper
+
+
+class RecordingHandler(logging.Handler):
+    """ハンドラーを実行したスレッドを記録する"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def emit(self, record):
+        self.threads.append(threading.current_thread())
+
+
+def read_log(directory: str):
+    [path] = Path(directory).glob("auto-booker-*.log")
+    return path.read_text(encoding="utf-8").splitlines()
+
+
+def test_json_lines_and_lazy():
+    """ファイルには1行1レコードのJSONでフィールドを書き出し、無効なレベルのlazyの値は作らない"""
+    calls = []
+
+    def payload():
+        calls.append(1)
+        return "重い値"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        listener = start_logging(logging.INFO, tmp, "json")
+        logger = logging.getLogger("tests.logging")
+        recorder = RecordingHandler()
+        listener.handlers = listener.handlers + (recorder,)
+        try:
+            logger.info("週を確認中", extra={'week': 2, 'max_weeks': 7})
+            logger.debug("発見した枠", extra={'slots': lazy(payload)})
+            logger.debug("発見した枠: %s", lazy(payload))
+            logger.info("予約枠", extra={'detail': lazy(payload)})
+            try:
+                raise ValueError("失敗")
+            except ValueError:
+                logger.exception("予約エラー")
+        finally:
+            stop_logging()
+
+        lines = [json.loads(line) for line in read_log(tmp)]
+        assert [line['message'] for line in lines] == ["週を確認中", "予約枠", "予約エラー"]
+        assert lines[0]['week'] == 2 and lines[0]['max_weeks'] == 7
+        assert lines[0]['level'] == "INFO" and lines[0]['logger'] == "tests.logging"
+        assert lines[1]['detail'] == "重い値" and len(calls) == 1
+        assert "ValueError: 失敗" in lines[2]['exception']
+        # ハンドラーはリスナーのスレッドで実行する
+        assert recorder.threads and all(thread is not threading.main_thread() for thread in recorder.threads)
+        assert not any(isinstance(h, QueueHandler) for h in logging.getLogger().handlers)
+
+
+def test_text_format_and_args_are_fixed():
+    """テキストの書式ではフィールドを key=value で付け加え、引数の値は記録した時点で確定する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        start_logging(logging.DEBUG, tmp, "text")
+        slot = {'text': "10:00 残1"}
+        try:
+            logging.getLogger("tests.logging").debug("枠: %s", slot, extra={'check': 3})
+            slot['text'] = "10:00 残0"
+        finally:
+            stop_logging()
+        [line] = read_log(tmp)
+        assert line.endswith("- tests.logging - DEBUG - 枠: {'text': '10:00 残1'} check=3")
+
+    record = logging.LogRecord("tests", logging.INFO, __file__, 1, "チェック", None, None)
+    assert TextFormatter().format(record).endswith("INFO - チェック")
+
+
+class FakeElement:
+    def __init__(self, text, href):
+        self.text = text
+        self.href = href
+
+    async def inner_text(self):
+        return self.text
+
+    async def evaluate(self, script):
+        return {'tagName': "DIV", 'date': None, 'column': None}
+
+    async def query_selector(self, selector):
+        return self
+
+    async def get_attribute(self, name):
+        return {'href': self.href, 'class': "dataLinkBox js-dataLinkBox"}.get(name)
+
+
+class FakePage:
+    url = "https://airrsv.net/shop/calendar"
+
+    def __init__(self, elements):
+        self.elements = elements
+
+    async def query_selector_all(self, selector):
+        return self.elements if selector == '.dataLinkBox.js-dataLinkBox' else []
+
+
+def test_scraper_checks_slot_once():
+    """デバッグログを出力する場合も、枠が予約可能かの判定は要素ごとに1回だけ行う"""
+    scraper = AirReserveScraper()
+    scraper.debug = True
+    scraper.test_site_mode = False
+    scraper.page = FakePage([FakeElement("10:00 残1", "/reserve/1"), FakeElement("11:00 満員", "/reserve/2")])
+    calls = []
+    check = scraper._is_available_slot
+
+    def counting(text, href, class_name):
+        calls.append(href)
+        return check(text, href, class_name)
+
+    scraper._is_available_slot = counting
+    slots = asyncio.run(scraper._get_slots_from_current_page())
+    assert [slot['href'] for slot in slots] == ["/reserve/1"]
+    assert calls == ["/reserve/1", "/reserve/2"]
+
+
+if __name__ == "__main__":
+    test_json_lines_and_lazy()
+    test_text_format_and_args_are_fixed()
+    test_scraper_checks_slot_once()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+メトリクスのテスト
+
+Prometheusのテキスト形式（累積のヒストグラムバケットを含む）・GET /metrics への応答・
+ファイルへの書き出し・監視パイプラインと予約フローの集計を確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src import metrics
+from src.booker import AirReserveBooker
+from src.flight_recorder import FlightRecorder
+from src.metrics import MetricsRegistry, MetricsServer, TextfileWriter
+from src.pipeline import SlotPipeline
+
+
+class FakeCalendarPage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class FakeScraper:
+    """1回目は失敗し、以降は用意した枠を返すスクレイパー"""
+
+    target_url = "https://example.invalid/metrics-calendar"
+
+    def __init__(self, scans):
+        self.page = FakeCalendarPage()
+        self.scans = list(scans)
+        self.calls = 0
+
+    async def get_available_slots(self, max_weeks=7):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("ページの読み込みに失敗")
+        return self.scans.pop(0) if self.scans else []
+
+    async def book_slot(self, slot, should_start=None, booker=None):
+        return True
+
+
+class FakeBooker:
+    profile_id = "default"
+
+    def score_slot(self, slot):
+        return 0.0
+
+
+class FakePage:
+    url = "https://example.invalid/"
+
+    async def evaluate(self, script):
+        return {'url': self.url, 'hasCalendar': True, 'hasMenuDetail': False, 'hasVisitorForm': False, 'text': ''}
+
+
+class FailingBooker(AirReserveBooker):
+    """予約リンクのクリックが常に失敗するブッカー"""
+
+    def __init__(self):
+        super().__init__()
+        self.dry_run = False
+        self.max_resumes = 1
+        self.recorder = FlightRecorder(mode="off")
+
+    async def _retry_with_backoff(self, func, max_retries=3, base_delay=1.0, operation_name="操作"):
+        return await func()
+
+    async def _click_reservation_link(self, slot_info, page):
+        raise TimeoutError("リンクが見つかりません")
+
+
+def test_render_prometheus_text_format():
+    """カウンター・ゲージ・ヒストグラム（累積バケット）をラベル付きで出力する"""
+    registry = MetricsRegistry()
+    scans = registry.counter("test_scans_total", "Scans", ["target"])
+    rate = registry.gauge("test_rate", "Rate")
+    latency = registry.histogram("test_latency_seconds", "Latency", ["target"], buckets=(0.1, 1.0))
+    scans.inc(target='https://example.invalid/"a"')
+    scans.inc(2, target='https://example.invalid/"a"')
+    rate.set(2.5)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, target="t")
+    assert registry.counter("test_scans_total", "Scans", ["target"]) is scans
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_scans_total counter" in lines
+    assert 'test_scans_total{target="https://example.invalid/\\"a\\""} 3' in lines
+    assert "test_rate 2.5" in lines
+    assert 'test_latency_seconds_bucket{target="t",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{target="t",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{target="t",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{target="t"} 4.25' in lines
+    assert 'test_latency_seconds_count{target="t"} 4' in lines
+
+    try:
+        scans.inc(profile="x")
+        assert False, "ラベルの違いが検出されませんでした"
+    except ValueError:
+        pass
+
+
+def test_server_and_textfile():
+    """GET /metrics に応答し、ファイルには一時ファイルから置き換えて書き出す"""
+    async def run():
+        registry = MetricsRegistry()
+        registry.counter("test_requests_total", "Requests").inc()
+        server = MetricsServer(registry, port=0)
+        await server.start()
+        try:
+            responses = []
+            for path in ("/metrics", "/other"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+                await writer.drain()
+                responses.append((await reader.read()).decode("utf-8"))
+                writer.close()
+        finally:
+            await server.close()
+        assert responses[0].startswith("HTTP/1.1 200 OK")
+        assert "text/plain; version=0.0.4" in responses[0]
+        assert responses[0].endswith("test_requests_total 1\n")
+        assert responses[1].startswith("HTTP/1.1 404")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "textfile" / "airbooker.prom"
+            writer = TextfileWriter(str(path), interval=60, registry=registry)
+            await writer.start()
+            await asyncio.sleep(0)
+            registry.counter("test_requests_total", "Requests").inc()
+            await writer.close()
+            assert "test_requests_total 2" in path.read_text(encoding="utf-8")
+            assert [p.name for p in path.parent.iterdir()] == ["airbooker.prom"]
+
+    asyncio.run(run())
+
+
+def test_pipeline_records_scan_metrics():
+    """監視パイプラインはスキャン回数・エラー・検出した枠・スキャン頻度を監視対象ごとに集計する"""
+    async def run():
+        target = FakeScraper.target_url
+        before = {
+            'scans': metrics.SCANS.get(target=target),
+            'errors': metrics.SCAN_ERRORS.get(target=target),
+            'seen': metrics.SLOTS_SEEN.get(target=target),
+            'new': metrics.SLOTS_NEW.get(target=target),
+        }
+        slots = [{'href': '/a', 'text': 'a'}, {'href': '/b', 'text': 'b'}]
+        scraper = FakeScraper([slots[:1], slots, slots])
+        pipeline = SlotPipeline(scraper, booker=FakeBooker(), check_interval=0.01, queue_size=4, booking_workers=1)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.1))
+
+        scans = metrics.SCANS.get(target=target) - before['scans']
+        assert metrics.SCAN_ERRORS.get(target=target) - before['errors'] == 1
+        assert scans == scraper.calls - 1 and scans >= 3
+        # 空の結果を含め、スキャンごとの枠の数を合計する
+        assert metrics.SLOTS_SEEN.get(target=target) - before['seen'] == 5
+        assert metrics.SLOTS_NEW.get(target=target) - before['new'] == 2
+        assert metrics.POLLS_PER_SECOND.get(target=target) > 0
+
+    asyncio.run(run())
+
+
+def test_booking_records_attempts_and_step_failures():
+    """予約フローは試行数・結果・失敗したステップと理由を集計する"""
+    async def run():
+        target = "https://example.invalid/metrics-booking"
+        slot = {'text': '09:30 一時預かり', 'href': '/x', 'target_url': target, 'timestamp': datetime.now()}
+        booker = FailingBooker()
+        assert not await booker.execute_booking(slot, FakePage())
+
+        assert metrics.BOOKING_ATTEMPTS.get(target=target, profile=booker.profile_id) == 1
+        assert metrics.BOOKING_RESULTS.get(target=target, result="resume_limit") == 1
+        assert metrics.BOOKING_STEP_FAILURES.get(target=target, step="click_link", reason="TimeoutError") == 2
+        assert metrics.BOOKING_SUCCESS_SECONDS.count(target=target) == 0
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_render_prometheus_text_format()
+    test_server_and_textfile()
+    test_pipeline_records_scan_metrics()
+    test_booking_records_attempts_and_step_failures()
+    print("すべてのテストが成功しました")
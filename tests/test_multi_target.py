@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+複数施設の監視のテスト
+
+監視対象ファイルの読み込み・共有ポーリング予算の配分・
+監視対象ごとの枠の識別を確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import DEFAULT_TEST_URL, ConfigError
+from src.multi_target import PollBudget
+from src.slots import get_slot_key
+from src.targets import load_targets
+
+
+def test_load_targets_from_file():
+    """監視対象ファイルを読み込み、site_modeからURLを決める"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "targets.json"
+        path.write_text(json.dumps([
+            {"id": "prod", "url": "https://airrsv.net/example/calendar",
+             "release_datetime": "2025-11-01 09:30:00", "weight": 2},
+            {"id": "test", "site_mode": "test", "test_site_mode": True,
+             "release_datetime": "2025-11-01 13:00:00", "monitor_duration_minutes": 5},
+        ]), encoding="utf-8")
+
+        prod, test = load_targets(str(path))
+        assert prod.url == "https://airrsv.net/example/calendar"
+        assert prod.weight == 2.0 and not prod.test_site_mode
+        assert test.url == DEFAULT_TEST_URL
+        assert test.test_site_mode and test.monitor_duration_minutes == 5
+        assert test.release_datetime.hour == 13
+
+        path.write_text(json.dumps([{"id": "a", "release_datetime": "2025/11/01"}]), encoding="utf-8")
+        try:
+            load_targets(str(path))
+            assert False, "不正な日時でエラーにならない"
+        except ConfigError:
+            pass
+
+
+def test_load_targets_rejects_bad_types():
+    """型が不正な項目は例外ではなく設定エラーにし、文字列の "false" を真として扱わない"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "targets.json"
+        path.write_text(json.dumps([{"id": "a", "test_site_mode": "false"}, {"id": "b", "test_site_mode": "TRUE"}]),
+                        encoding="utf-8")
+        a, b = load_targets(str(path))
+        assert not a.test_site_mode and b.test_site_mode
+
+        bad_targets = [
+            ["prod"],
+            [{"id": "a", "monitor_duration_minutes": "ten"}],
+            [{"id": "a", "monitor_duration_minutes": None}],
+            [{"id": "a", "weight": None}],
+            [{"id": "a", "weight": [1]}],
+            [{"id": "a", "release_datetime": 20251101}],
+            [{"id": "a", "test_site_mode": "0"}],
+            [{"id": "a", "test_site_mode": 1}],
+        ]
+        for targets in bad_targets:
+            path.write_text(json.dumps(targets), encoding="utf-8")
+            try:
+                load_targets(str(path))
+                assert False, f"不正な値でエラーにならない: {targets}"
+            except ConfigError:
+                pass
+
+
+def test_poll_budget_limits_rate_and_follows_weights():
+    """全体のスキャン間隔を守り、重みに応じてスキャン回数を配分する"""
+    async def run():
+        budget = PollBudget(polls_per_second=100)
+
+        async def poll(target_id, weight, until):
+            while time.monotonic() < until:
+                await budget.acquire(target_id, weight)
+
+        started = time.monotonic()
+        until = started + 0.3
+        await asyncio.gather(poll("a", 2.0, until), poll("b", 1.0, until))
+        elapsed = time.monotonic() - started
+
+        total = budget.granted["a"] + budget.granted["b"]
+        assert total <= elapsed * 100 + 2
+        assert budget.granted["a"] >= budget.granted["b"] * 1.5
+
+    asyncio.run(run())
+
+
+def test_slot_keys_are_separated_by_target():
+    """同じ表示の枠でも監視対象が異なれば別の枠として扱う"""
+    slot = {'href': 'dataLinkBox:10:00 残1', 'week_number': 1}
+    a = dict(slot, target_id='a')
+    b = dict(slot, target_id='b')
+    default = dict(slot, target_id='default')
+    assert get_slot_key(a) != get_slot_key(b)
+    assert get_slot_key(default) == get_slot_key(slot)
+
+
+def test_schedule_mode_rejects_multiple_targets():
+    """定期実行モードは監視対象が2件以上の場合に設定エラーにする（1件の場合はその監視対象を使う）"""
+    from src.scheduler import Scheduler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "targets.json"
+        previous = os.environ.get("TARGETS_FILE")
+        os.environ["TARGETS_FILE"] = str(path)
+        try:
+            path.write_text(json.dumps([{"id": "prod", "site_mode": "production"}]), encoding="utf-8")
+            assert Scheduler().target.target_id == "prod"
+
+            path.write_text(json.dumps([{"id": "prod"}, {"id": "test", "site_mode": "test"}]), encoding="utf-8")
+            try:
+                Scheduler()
+                assert False, "ConfigErrorが発生しませんでした"
+            except ConfigError:
+                pass
+        finally:
+            if previous is None:
+                del os.environ["TARGETS_FILE"]
+            else:
+                os.environ["TARGETS_FILE"] = previous
+
+
+if __name__ == "__main__":
+    test_load_targets_from_file()
+    test_load_targets_rejects_bad_types()
+    test_poll_budget_limits_rate_and_follows_weights()
+    test_slot_keys_are_separated_by_target()
+    test_schedule_mode_rejects_multiple_targets()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+通知のテスト
+
+通知が上限付きのキューを介してバックグラウンドで送信されること、新規枠の検出通知がまとめられること、
+送信先（Webhook・メール・ファイル）ごとのタイムアウトと再試行をローカルの代用サーバーで確認する（ブラウザ・外部サービス不要）
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import ConfigError
+from src.notifier import (
+    FileSink,
+    Notification,
+    NotificationDispatcher,
+    NotificationManager,
+    NotificationSink,
+    SmtpSink,
+    WebhookSink,
+    create_notification_sinks,
+)
+from src.notify_standin import SmtpStandIn, WebhookStandIn
+
+
+class RecordingSink(NotificationSink):
+    """受け取った通知を記録する"""
+
+    name = "recording"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = []
+
+    async def send(self, notification):
+        await asyncio.sleep(self.delay)
+        self.received.append(notification)
+
+
+def test_new_slot_bursts_are_coalesced():
+    """短時間に続く新規枠の検出通知は1通にまとめ、他の種類の通知が届いたらまとめた分を先に送る"""
+    async def run():
+        sink = RecordingSink()
+        dispatcher = NotificationDispatcher([sink], coalesce_seconds=0.2)
+        for i in range(5):
+            dispatcher.submit(Notification("new_slot", f"検出 {i}", {'slot': f"枠{i}"}))
+        dispatcher.submit(Notification("success", "予約成功"))
+        dispatcher.submit(Notification("new_slot", "検出 5", {'slot': "枠5"}))
+        await dispatcher.close(timeout=5)
+
+        assert [n.kind for n in sink.received] == ["new_slot_digest", "success", "new_slot"]
+        assert sink.received[0].fields['slots'] == [f"枠{i}" for i in range(5)]
+        assert "5 件検出" in sink.received[0].message
+        assert dispatcher.sent == {'recording': 3}
+
+    asyncio.run(run())
+
+
+def test_slow_sink_does_not_block_submit():
+    """送信先が遅くても通知は待たずに戻り、キューが満杯の場合は破棄する"""
+    async def run():
+        sink = RecordingSink(delay=0.5)
+        dispatcher = NotificationDispatcher([sink], queue_size=2, coalesce_seconds=0)
+        started = time.perf_counter()
+        results = [dispatcher.submit(Notification("success", f"予約成功 {i}")) for i in range(4)]
+        assert time.perf_counter() - started < 0.05
+        assert results == [True, True, False, False] and dispatcher.dropped == 2
+        await dispatcher.close(timeout=5)
+        assert len(sink.received) == 2
+
+    asyncio.run(run())
+
+
+def test_webhook_sink_retries_and_times_out():
+    """Webhookの送信は失敗時に再試行し、タイムアウトした送信先は失敗として数える"""
+    async def run():
+        flaky = WebhookStandIn(port=0, fail_times=1)
+        slow = WebhookStandIn(port=0, delay=1.0)
+        await flaky.start()
+        await slow.start()
+        try:
+            dispatcher = NotificationDispatcher(
+                [WebhookSink(flaky.url)], retries=1, retry_backoff=0.01, coalesce_seconds=0
+            )
+            dispatcher.submit(Notification("success", "✅ 予約成功: 11/05 10:00", {'slot': "11/05 10:00"}))
+            await dispatcher.close(timeout=5)
+            assert flaky.requests == 2
+            assert flaky.received[0]['text'] == "✅ 予約成功: 11/05 10:00"
+            assert flaky.received[0]['slot'] == "11/05 10:00"
+
+            sink = WebhookSink(slow.url)
+            sink.name = "slow"
+            dispatcher = NotificationDispatcher([sink], timeout=0.2, retries=0, coalesce_seconds=0)
+            dispatcher.submit(Notification("failure", "❌ 予約失敗"))
+            await dispatcher.close(timeout=5)
+            assert dispatcher.failed == {'slow': 1} and dispatcher.sent == {'slow': 0}
+        finally:
+            await flaky.close()
+            await slow.close()
+
+    asyncio.run(run())
+
+
+def test_smtp_and_file_sinks():
+    """メールと（JSON Linesの）ファイルに送信する"""
+    async def run():
+        smtp = SmtpStandIn(port=0)
+        await smtp.start()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "logs" / "notifications.jsonl"
+                dispatcher = NotificationDispatcher(
+                    [SmtpSink("127.0.0.1", smtp.port, "bot@example.com", ["parent@example.com"]), FileSink(str(path))],
+                    coalesce_seconds=0,
+                )
+                dispatcher.submit(Notification("success", "✅ 予約成功: 11/05 10:00", {'profile_id': "hanako"}))
+                await dispatcher.close(timeout=5)
+
+                lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+                assert lines[0]['kind'] == "success" and lines[0]['profile_id'] == "hanako"
+        finally:
+            await smtp.close()
+
+        assert smtp.received[0]['to'] == ["parent@example.com"]
+        assert smtp.received[0]['subject'] == "✅ 予約成功: 11/05 10:00"
+
+    asyncio.run(run())
+
+
+def test_notification_manager_uses_dispatcher():
+    """NotificationManagerはログに出力し、送信先がある場合は送信先にも送る"""
+    async def run():
+        sink = RecordingSink()
+        manager = NotificationManager(NotificationDispatcher([sink], coalesce_seconds=0.1))
+        manager.notify_new_slot_detected({'text': "11/05 10:00"})
+        manager.notify_new_slot_detected({'text': "11/06 10:00"})
+        manager.notify_booking_success({'text': "11/05 10:00", 'profile_id': "hanako"})
+        await manager.close()
+        assert [n.kind for n in sink.received] == ["new_slot_digest", "success"]
+        assert sink.received[1].fields == {'slot': "11/05 10:00", 'profile_id': "hanako"}
+
+    asyncio.run(run())
+
+
+def test_sink_configuration():
+    """NOTIFY_SINKSの送信先を作成し、必要な設定がない場合はConfigErrorにする"""
+    keys = ("NOTIFY_SINKS", "NOTIFY_WEBHOOK_URL")
+    saved = {key: os.environ.get(key) for key in keys}
+    try:
+        os.environ["NOTIFY_SINKS"] = "stdout,webhook"
+        os.environ["NOTIFY_WEBHOOK_URL"] = "http://127.0.0.1:9/webhook"
+        assert [sink.name for sink in create_notification_sinks()] == ["stdout", "webhook"]
+
+        for sinks in ("webhook,sms", "smtp"):
+            os.environ["NOTIFY_SINKS"] = sinks
+            try:
+                create_notification_sinks()
+                assert False, f"ConfigErrorが発生しませんでした: {sinks}"
+            except ConfigError:
+                pass
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    test_new_slot_bursts_are_coalesced()
+    test_slow_sink_does_not_block_submit()
+    test_webhook_sink_retries_and_times_out()
+    test_smtp_and_file_sinks()
+    test_notification_manager_uses_dispatcher()
+    test_sink_configuration()
+    print("すべてのテストが成功しました")
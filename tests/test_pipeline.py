@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+予約枠処理パイプラインのテスト
+
+スキャン結果の差分検出・スコア順の予約・重複予約の防止・
+book_onceでの予約打ち切り・消えた枠の予約取りやめ・ステージごとのメトリクスを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.pipeline import SlotPipeline
+
+
+class FakePage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class FakeScraper:
+    """スキャンごとに用意した枠を返すスクレイパー"""
+
+    target_url = "https://example.invalid/calendar"
+
+    def __init__(self, scans, booking_delay=0.0, results=None):
+        self.page = FakePage()
+        self.scans = list(scans)
+        self.booking_delay = booking_delay
+        self.results = results or {}
+        self.booked = []
+
+    async def get_available_slots(self, max_weeks=7):
+        return self.scans.pop(0) if self.scans else []
+
+    async def book_slot(self, slot, should_start=None, booker=None):
+        if should_start and not should_start():
+            return False
+        self.booked.append(slot['href'])
+        await asyncio.sleep(self.booking_delay)
+        return self.results.get(slot['href'], True)
+
+
+class FakeBooker:
+    profile_id = "default"
+
+    def score_slot(self, slot):
+        return slot['score']
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.events = []
+
+    def notify_new_slot_detected(self, slot):
+        self.events.append(('new_slot', slot['href']))
+
+    def notify_booking_success(self, slot):
+        self.events.append(('success', slot['href']))
+
+    def notify_booking_failure(self, slot, error):
+        self.events.append(('failure', slot['href']))
+
+
+def make_slot(href, score):
+    return {'href': href, 'text': href, 'score': score}
+
+
+def test_books_new_preferred_slots_by_score():
+    """新規枠のうち希望条件に合致する枠をスコア順に予約する"""
+    async def run():
+        scans = [
+            [make_slot('/a', 1.0)],
+            [make_slot('/a', 1.0), make_slot('/b', 0.0), make_slot('/c', 2.0), make_slot('/d', 1.5)],
+        ]
+        scraper = FakeScraper(scans, results={'/d': False})
+        notifier = FakeNotifier()
+        pipeline = SlotPipeline(scraper, booker=FakeBooker(), notifier=notifier,
+                                check_interval=0.01, queue_size=4, booking_workers=1)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.05))
+
+        assert scraper.booked == ['/a', '/c', '/d']
+        assert ('success', '/c') in notifier.events
+        assert ('failure', '/d') in notifier.events
+        metrics = pipeline.get_metrics()
+        assert metrics['booking']['processed'] == 3
+        assert metrics['scanner']['processed'] >= 2
+        assert not pipeline.inflight_keys
+
+    asyncio.run(run())
+
+
+def test_book_once_stops_after_success():
+    """book_onceの場合、最初の予約成功後は予約しない"""
+    async def run():
+        scans = [[make_slot('/a', 3.0), make_slot('/b', 2.0)], [make_slot('/c', 1.0)]]
+        scraper = FakeScraper(scans)
+        pipeline = SlotPipeline(scraper, booker=FakeBooker(), check_interval=0.01,
+                                book_once=True, queue_size=4, booking_workers=1)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.05))
+
+        assert scraper.booked == ['/a']
+        assert pipeline.booking_succeeded
+
+    asyncio.run(run())
+
+
+def test_scanner_keeps_running_during_booking():
+    """予約に時間がかかっても、スキャンは止まらない"""
+    async def run():
+        scans = [[make_slot('/a', 1.0)]] * 50
+        scraper = FakeScraper(scans, booking_delay=0.2)
+        pipeline = SlotPipeline(scraper, booker=FakeBooker(), check_interval=0.01,
+                                queue_size=4, booking_workers=1)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.1))
+
+        assert pipeline.get_metrics()['scanner']['processed'] >= 5
+        assert scraper.booked == ['/a']
+
+    asyncio.run(run())
+
+
+def test_vanished_slots_are_not_booked():
+    """予約キューに残っている枠がカレンダーから消えた場合は予約しない"""
+    async def run():
+        scans = [[make_slot('/a', 2.0), make_slot('/b', 1.0)], [], []]
+        scraper = FakeScraper(scans, booking_delay=0.05)
+        notifier = FakeNotifier()
+        pipeline = SlotPipeline(scraper, booker=FakeBooker(), notifier=notifier, check_interval=0.01,
+                                queue_size=4, booking_workers=1)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.1))
+
+        assert scraper.booked == ['/a']
+        assert ('failure', '/b') not in notifier.events
+        assert pipeline.vanished_keys == {'/a', '/b'}
+        assert not pipeline.inflight_keys and not pipeline.booking_jobs
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_books_new_preferred_slots_by_score()
+    test_book_once_stops_after_success()
+    test_scanner_keeps_running_during_booking()
+    test_vanished_slots_are_not_booked()
+    print("すべてのテストが成功しました")
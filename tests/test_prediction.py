@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+予測ポーリングのテスト
+
+予約枠の履歴からの時刻・曜日・週ごとの頻度の予測・予測した頻度でのポーリング間隔と確認する週の決定・
+確認を省いた週の枠の引き継ぎ・予測した件数と実際の件数の記録を確認する（ブラウザ不要）
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.history import SlotHistory
+from src.pipeline import SlotPipeline
+from src.prediction import PollPlanner, SlotPredictor, week_index
+
+
+# 2026-10-19 は月曜日
+MONDAY = datetime(2026, 10, 19)
+
+
+def busy_afternoons(weeks=4):
+    """月曜日の9時〜17時に監視し、13時台に翌週の枠が出る履歴"""
+    sessions, events = [], []
+    for week in range(weeks):
+        day = MONDAY - timedelta(weeks=week)
+        sessions.append((day.replace(hour=9), day.replace(hour=17)))
+        for minute in range(0, 60, 10):
+            events.append((day.replace(hour=13, minute=minute), day.date() + timedelta(days=8)))
+        events.append((day.replace(hour=10), day.date() + timedelta(days=20)))
+    return events, sessions
+
+
+def test_predictor_from_history():
+    """監視していた時間あたりの件数から時刻・曜日の頻度を、枠の日付から週の割合を求める"""
+    assert week_index(date(2026, 10, 27), date(2026, 10, 21)) == 1
+    assert week_index(date(2026, 10, 25), date(2026, 10, 19)) == 0
+
+    events, sessions = busy_afternoons()
+    predictor = SlotPredictor(events, sessions, max_weeks=4)
+    assert predictor.events == 28 and predictor.exposure_hours == 32
+    assert predictor.base_rate == 28 / 32
+    assert predictor.rate(MONDAY.replace(hour=13, minute=30)) > 5 * predictor.rate(MONDAY.replace(hour=15))
+    # 監視していない時刻は全体の頻度に近づける
+    assert abs(predictor.hour_factors[3] - 1.0) < 1e-9
+    assert predictor.peak_rate() >= predictor.rate(MONDAY.replace(hour=13))
+    assert predictor.week_shares.index(max(predictor.week_shares)) == 1
+    assert abs(sum(predictor.week_shares) - 1.0) < 1e-9
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = SlotHistory(str(Path(tmp) / "history.db"))
+        start = MONDAY.replace(hour=13)
+        slot = lambda href, text: {'href': href, 'text': text, 'slot_date': "2026-10-27"}
+        history.observe("default", [slot("/old", "10:00 残2")], start)
+        history.observe("default", [slot("/old", "10:00 残2"), slot("/new", "11:00 残1")], start + timedelta(minutes=1))
+        history.observe("default", [slot("/old", "10:00 残2")], start + timedelta(minutes=2))
+        history.observe("default", [slot("/old", "10:00 残2"), slot("/new", "11:00 残1")], start + timedelta(minutes=30))
+        history.finish("default")
+        predictor = SlotPredictor.from_history(history, "default")
+        history.close()
+    # 監視開始時に表示されていた枠は数えず、再び予約可能になった枠は数える
+    assert predictor.events == 2 and predictor.exposure_hours == 0.5
+    assert predictor.week_shares[1] == max(predictor.week_shares)
+
+
+def test_planner_intervals_and_weeks():
+    """予約公開の直後は最短の間隔ですべての週を、その後は頻度に応じた間隔で頻度の高い週を確認する"""
+    events, sessions = busy_afternoons()
+    planner = PollPlanner(SlotPredictor(events, sessions, max_weeks=4), max_interval=30.0,
+                          burst_seconds=60, hot_week_share=0.3, full_scan_every=5)
+    assert planner.hot_weeks == {1}
+    planner.start(MONDAY.replace(hour=13))
+    burst = MONDAY.replace(hour=13, second=30)
+    assert planner.next_interval(1.0, burst) == 1.0
+    assert planner.plan_weeks(2, None, burst) is None
+
+    busy, quiet = MONDAY.replace(hour=13, minute=20), MONDAY.replace(hour=15)
+    assert planner.next_interval(1.0, busy) == 1.0
+    assert 20 < planner.next_interval(1.0, quiet) < 30
+    assert planner.plan_weeks(2, None, quiet) == {1}
+    assert planner.plan_weeks(6, None, quiet) is None
+    # 分散監視で割り当てられた週に頻度の高い週がない場合は、割り当てをそのまま使う
+    assert planner.plan_weeks(2, {1, 2}, quiet) == {1}
+    assert planner.plan_weeks(2, {2, 3}, quiet) == {2, 3}
+
+    planner.observe([{'week_number': 2}, {'week_number': 2}, {'week_number': 1}], busy)
+    report = planner.report()
+    assert report['actual'] == 3 and report['polls'] == 3 and report['partial_scans'] == 2
+    assert [hour['hour'] for hour in report['hours']] == ["2026-10-19 13:00", "2026-10-19 15:00"]
+    assert report['predicted'] > 0 and report['hours'][0]['actual'] == 3
+    assert report['weeks'][1]['actual_share'] == 2 / 3 and report['weeks'][1]['hot']
+
+
+def test_planner_requires_history():
+    """無効の場合・履歴の件数が足りない場合は一定間隔で監視する"""
+    previous = {key: os.environ.get(key) for key in ("PREDICTION_ENABLED", "PREDICTION_MIN_EVENTS")}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            history = SlotHistory(str(Path(tmp) / "history.db"))
+            os.environ.pop("PREDICTION_ENABLED", None)
+            assert PollPlanner.from_env(history) is None
+            os.environ["PREDICTION_ENABLED"] = "true"
+            os.environ["PREDICTION_MIN_EVENTS"] = "1"
+            assert PollPlanner.from_env(history) is None
+            history.observe("default", [], MONDAY)
+            history.observe("default", [{'href': "/a", 'text': "10:00 残1"}], MONDAY + timedelta(minutes=5))
+            assert PollPlanner.from_env(history).predictor.events == 1
+            history.close()
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class FakePage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class WeekScraper:
+    """確認する週の枠だけを返すスクレイパー"""
+
+    target_url = "https://example.invalid/calendar"
+
+    def __init__(self, scans):
+        self.page = FakePage()
+        self.scans = list(scans)
+        self.scan_weeks = None
+        self.requested = []
+
+    async def get_available_slots(self, max_weeks=7):
+        self.requested.append(self.scan_weeks)
+        slots = self.scans.pop(0) if len(self.scans) > 1 else self.scans[0]
+        return [slot for slot in slots if self.scan_weeks is None or slot['week_number'] - 1 in self.scan_weeks]
+
+
+def test_pipeline_uses_planner():
+    """パイプラインは予測した週だけを確認し、確認を省いた週の枠を消えた枠として扱わない"""
+    slot = lambda href, week: {'href': href, 'text': href, 'week_number': week}
+    scans = [
+        [slot("/a", 1), slot("/b", 2)],
+        [slot("/a", 1), slot("/b", 2)],
+        [slot("/b", 2), slot("/c", 2)],
+    ]
+    now = datetime.now()
+    events = [(at, at.date() + timedelta(days=7)) for at in (now - timedelta(minutes=minute) for minute in range(10))]
+    predictor = SlotPredictor(events, [(now - timedelta(hours=1), now)], max_weeks=2)
+    planner = PollPlanner(predictor, max_interval=0.01, burst_seconds=0, hot_week_share=0.6, full_scan_every=1000)
+    assert planner.hot_weeks == {1}
+
+    async def run():
+        scraper = WeekScraper(scans)
+        pipeline = SlotPipeline(scraper, max_weeks=2, check_interval=0.01, planner=planner)
+        await pipeline.run(datetime.now() + timedelta(seconds=0.2))
+        return scraper, pipeline
+
+    scraper, pipeline = asyncio.run(run())
+    assert scraper.requested[0] is None and scraper.requested[1] == {1}
+    assert sorted(slot['href'] for slot in pipeline.last_slots) == ["/a", "/b", "/c"]
+    assert not pipeline.vanished_keys
+    report = planner.report()
+    assert report['actual'] == 1 and report['weeks'][1]['actual_share'] == 1.0
+    assert report['partial_scans'] == report['polls'] - 1
+
+
+if __name__ == "__main__":
+    test_predictor_from_history()
+    test_planner_intervals_and_weeks()
+    test_planner_requires_history()
+    test_pipeline_uses_planner()
+    print("すべてのテストが成功しました")
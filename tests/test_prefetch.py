@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+投機的先読みのテスト
+
+最上位候補の選択・ランキング変化時の切り替え・枠が消えた場合の破棄・
+先読みページの引き渡しを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.prefetch import SpeculativePrefetcher
+from src.slots import get_slot_key
+
+
+class FakePage:
+    async def evaluate(self, script):
+        return {'url': 'https://example.invalid/booking/', 'hasVisitorForm': True, 'text': ''}
+
+
+
+class FakePool:
+    """予約用コンテキストプールの代わり"""
+
+    def __init__(self):
+        self.checked_in = []
+
+    async def checkout(self):
+        return FakePage()
+
+    async def checkin(self, page):
+        self.checked_in.append(page)
+
+
+class FakeBooker:
+    """スコアは枠のscoreキー、各ステップは記録のみ"""
+
+    def __init__(self):
+        self.opened = []
+        self.filled = []
+
+    def score_slot(self, slot):
+        return slot['score']
+
+    async def _click_reservation_link(self, slot, page):
+        self.opened.append(slot['href'])
+        await asyncio.sleep(0.01)
+        return True
+
+    async def _select_menu(self, page):
+        return True
+
+    async def _select_datetime(self, page):
+        return True
+
+    async def _submit_menu_detail_form(self, page):
+        return True
+
+    async def _fill_booking_form(self, page):
+        self.filled.append(page)
+        return True
+
+
+def make_slot(href, score):
+    return {'href': href, 'text': href, 'score': score}
+
+
+def test_prefetch_best_and_claim():
+    """最もスコアの高い新規枠を先読みし、予約時にそのページを引き渡す"""
+    async def run():
+        booker = FakeBooker()
+        prefetcher = SpeculativePrefetcher(FakePool(), booker)
+        await prefetcher.start()
+
+        week1 = [make_slot('/a', 1.0), make_slot('/b', 0.0)]
+        week2 = [make_slot('/c', 3.0)]
+        prefetcher.consider(week1)
+        assert get_slot_key(prefetcher.slot) == '/a'
+        prefetcher.consider(week2)
+        assert get_slot_key(prefetcher.slot) == '/c'
+        prefetcher.reconcile(week1 + week2)
+
+        assert await prefetcher.claim(make_slot('/a', 1.0)) is None
+        page = await prefetcher.claim(make_slot('/c', 3.0))
+        assert page is not None
+        assert booker.opened[-1] == '/c'
+        assert booker.filled == [page]
+        assert prefetcher.hits == 1
+        assert prefetcher.discards == 1
+        await prefetcher.close()
+
+    asyncio.run(run())
+
+
+def test_discard_when_slot_disappears():
+    """先読み中の枠がスキャン結果から消えた場合は破棄する"""
+    async def run():
+        prefetcher = SpeculativePrefetcher(FakePool(), FakeBooker())
+        await prefetcher.start()
+        prefetcher.consider([make_slot('/a', 2.0)])
+        prefetcher.reconcile([make_slot('/b', 1.0)])
+        assert prefetcher.slot is None
+
+        # 既知の枠は新規枠として先読みしない
+        prefetcher.consider([make_slot('/b', 1.0)])
+        assert prefetcher.slot is None
+        await prefetcher.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_prefetch_best_and_claim()
+    test_discard_when_slot_disappears()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+予約者プロファイルのテスト
+
+プロファイルファイルの読み込み・残席の公平な割り当て・
+複数プロファイルでのパイプラインの振り分けを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import ConfigError
+from src.pipeline import SlotPipeline
+from src.profiles import FairSeatAllocator, load_profiles
+
+
+class FakePage:
+    async def goto(self, url, **kwargs):
+        pass
+
+
+class FakeScraper:
+    """スキャンごとに用意した枠を返し、予約したプロファイルを記録するスクレイパー"""
+
+    target_url = "https://example.invalid/calendar"
+
+    def __init__(self, scans, failing_profiles=()):
+        self.page = FakePage()
+        self.scans = list(scans)
+        self.failing_profiles = set(failing_profiles)
+        self.booked = []
+
+    async def get_available_slots(self, max_weeks=7):
+        return self.scans.pop(0) if self.scans else []
+
+    async def book_slot(self, slot, should_start=None, booker=None):
+        if should_start and not should_start():
+            return False
+        self.booked.append((booker.profile_id, slot['href']))
+        await asyncio.sleep(0.01)
+        return booker.profile_id not in self.failing_profiles
+
+
+class FakeBooker:
+    """曜日が一致する枠にスコアを付けるブッカー"""
+
+    def __init__(self, profile_id, days, score=1.0):
+        self.profile_id = profile_id
+        self.days = days
+        self.score = score
+
+    def score_slot(self, slot):
+        return self.score if any(day in slot['text'] for day in self.days) else 0
+
+
+def make_slot(href, text):
+    return {'href': href, 'text': text}
+
+
+def test_load_profiles_from_file():
+    """プロファイルファイルを読み込み、重複したidはエラーにする"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "profiles.json"
+        path.write_text(json.dumps([
+            {"id": "a", "booker_name": "山田太郎", "preferred_days": "月,水"},
+            {"id": "b", "booker_name": "佐藤花子", "preferred_days": ["金"]},
+        ], ensure_ascii=False), encoding="utf-8")
+
+        profiles = load_profiles(str(path))
+        assert [p.profile_id for p in profiles] == ["a", "b"]
+        assert profiles[0].preferred_days == ["月", "水"]
+        assert "BOOKER_EMAIL" in profiles[0].missing_fields()
+
+        path.write_text(json.dumps([{"id": "a"}, {"id": "a"}]), encoding="utf-8")
+        try:
+            load_profiles(str(path))
+            assert False, "重複したidでエラーにならない"
+        except ConfigError:
+            pass
+
+
+def test_allocator_respects_seats_and_fairness():
+    """残席数を超えて割り当てず、予約成功数の少ないプロファイルを優先する"""
+    a, b, c = FakeBooker("a", []), FakeBooker("b", []), FakeBooker("c", [])
+    allocator = FairSeatAllocator()
+
+    slot = make_slot('/x', '10:00 残1 /定員15')
+    assert allocator.allocate(slot, [(a, 1.0), (b, 2.0)]) == [b]
+    assert allocator.next_fallback(slot) is a
+    assert allocator.next_fallback(slot) is None
+
+    allocator.record_success("b")
+    slot = make_slot('/y', '11:00 残2 /定員15')
+    assert allocator.allocate(slot, [(a, 1.0), (b, 2.0), (c, 1.0)])[0] is not b
+
+    # 同点の場合は順番に回す
+    allocator = FairSeatAllocator()
+    first = [allocator.allocate(make_slot(f'/{i}', '残1'), [(a, 1.0), (b, 1.0)])[0] for i in range(2)]
+    assert first[0] is not first[1]
+
+
+def test_pipeline_fans_out_without_competing_for_last_seat():
+    """1回のスキャンを各プロファイルに振り分け、最後の1席は1プロファイルだけが予約する"""
+    async def run():
+        scans = [[], [
+            make_slot('/mon', '月 10:00 残1 /定員15'),
+            make_slot('/wed', '水 10:00 残2 /定員15'),
+            make_slot('/fri', '金 10:00 残1 /定員15'),
+        ]]
+        scraper = FakeScraper(scans)
+        bookers = [FakeBooker("a", ["月", "水"]), FakeBooker("b", ["月", "水", "金"])]
+        pipeline = SlotPipeline(scraper, bookers=bookers, check_interval=0.01,
+                                queue_size=8, booking_workers=2)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.05))
+
+        booked = sorted(scraper.booked)
+        assert len([b for b in booked if b[1] == '/mon']) == 1
+        assert ('a', '/wed') in booked and ('b', '/wed') in booked
+        assert ('b', '/fri') in booked
+        assert not pipeline.inflight_keys
+
+    asyncio.run(run())
+
+
+def test_pipeline_moves_seat_to_fallback_on_failure():
+    """割り当て先の予約が失敗した場合は、控えのプロファイルが予約する"""
+    async def run():
+        scans = [[], [make_slot('/mon', '月 10:00 残1 /定員15')]]
+        scraper = FakeScraper(scans, failing_profiles={"a"})
+        bookers = [FakeBooker("a", ["月"], score=2.0), FakeBooker("b", ["月"])]
+        pipeline = SlotPipeline(scraper, bookers=bookers, check_interval=0.01,
+                                queue_size=8, booking_workers=2)
+        await pipeline.run(until=datetime.now() + timedelta(seconds=0.05))
+
+        assert scraper.booked == [('a', '/mon'), ('b', '/mon')]
+        assert pipeline.succeeded_profiles == {"b"}
+
+    asyncio.run(run())
+
+
+def test_book_mode_books_one_slot_per_profile():
+    """予約実行モードは、すべてのプロファイルで既存の枠を1件ずつ予約する"""
+    from main import book_existing_slots
+
+    async def run():
+        slots = [make_slot('/mon', '月 10:00 残1'), make_slot('/wed', '水 10:00 残2'), make_slot('/fri', '金 10:00 残1')]
+        scraper = FakeScraper([], failing_profiles={"c"})
+        bookers = [FakeBooker("a", ["月", "水"], score=2.0), FakeBooker("b", ["月", "水"]), FakeBooker("c", ["金"])]
+        booked_profiles = await book_existing_slots(scraper, bookers, slots)
+
+        assert booked_profiles == {"a", "b"}
+        assert scraper.booked == [('a', '/mon'), ('b', '/wed'), ('c', '/fri')]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_load_profiles_from_file()
+    test_allocator_respects_seats_and_fairness()
+    test_pipeline_fans_out_without_competing_for_last_seat()
+    test_pipeline_moves_seat_to_fallback_on_failure()
+    test_book_mode_books_one_slot_per_profile()
+    print("すべてのテストが成功しました")
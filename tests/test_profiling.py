@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+プロファイリングのテスト
+
+種類の指定の解析・スタックの分類・フェーズ（warmup / burst / steady / booking）ごとのスタックの採取・
+cProfile・イベントループの遅れ・tracemallocの記録と、レポートの書き出しを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import ConfigError, parse_profile_modes
+from src.profiling import Profiler, classify_stack
+
+
+def parse_calendar_text(rounds: int) -> int:
+    """CPUを使う処理（スタックの採取とcProfileで見つかるように、一定時間かかる）"""
+    total = 0
+    for i in range(rounds):
+        total += len(f"{i:05d} 残{i % 5} /定員5".split())
+    return total
+
+
+async def busy(seconds: float):
+    """イベントループを止めない程度に区切ってCPUを使う"""
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        parse_calendar_text(200)
+        await asyncio.sleep(0)
+
+
+def test_parse_modes_and_classify():
+    """種類の指定を解析し、スタックの末端から待機・playwright・logging・asyncio・python に分類する"""
+    assert parse_profile_modes("") == [] and parse_profile_modes("off") == []
+    assert parse_profile_modes("all") == ["cpu", "sample", "loop", "memory"]
+    assert parse_profile_modes(" Loop,sample,loop ") == ["loop", "sample"]
+    try:
+        parse_profile_modes("sample,yappi")
+        assert False, "ConfigErrorが発生しませんでした"
+    except ConfigError:
+        pass
+
+    base = [("/usr/lib/python3.11/asyncio/events.py", "_run"), ("/usr/lib/python3.11/asyncio/base_events.py", "_run_once")]
+    assert classify_stack([("/usr/lib/python3.11/selectors.py", "select")] + base) == "idle"
+    assert classify_stack([("/usr/lib/python3.11/json/encoder.py", "encode"),
+                           ("/venv/site-packages/playwright/_impl/_connection.py", "send")] + base) == "playwright"
+    assert classify_stack([("/usr/lib/python3.11/logging/__init__.py", "emit"), ("/app/src/scraper.py", "scan")] + base) == "logging"
+    assert classify_stack(base) == "asyncio"
+    assert classify_stack([("/app/src/slots.py", "parse_remaining_seats")] + base) == "python"
+
+
+def test_phases_and_report():
+    """フェーズごとにスタック・cProfile・イベントループの遅れ・メモリを記録し、レポートを書き出す"""
+    async def run(tmp):
+        profiler = Profiler(
+            ["cpu", "sample", "loop", "memory"], tmp,
+            sample_interval_ms=1, lag_interval_ms=10, memory_interval=10, burst_seconds=0.3,
+        )
+        await profiler.start()
+        assert profiler.current_phase() == "warmup"
+        await busy(0.15)
+        profiler.begin_window()
+        assert profiler.current_phase() == "burst"
+        await busy(0.1)
+        # イベントループを止める処理はburstの遅れとして記録される
+        time.sleep(0.15)
+        await asyncio.sleep(0.2)
+        await busy(0.15)
+        assert profiler.current_phase() == "steady"
+        with profiler.booking():
+            assert profiler.current_phase() == "booking"
+            payload = [bytearray(1024) for _ in range(2000)]
+            await busy(0.15)
+        assert profiler.current_phase() == "steady"
+        output_dir = await profiler.close()
+        del payload
+        return profiler, output_dir
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler, output_dir = asyncio.run(run(tmp))
+        report = json.loads((output_dir / "report.json").read_text(encoding="utf-8"))
+        phases = report['phases']
+        assert list(phases) == ["warmup", "burst", "steady", "booking"]
+        assert 0.1 < phases['booking']['seconds'] < 1.0
+
+        for phase in ("warmup", "steady", "booking"):
+            sample = phases[phase]['sample']
+            assert sample['samples'] > 10 and "python" in sample['categories']
+            assert any("parse_calendar_text" in item['function'] for item in sample['top_self'])
+            assert any("parse_calendar_text" in item['function'] for item in phases[phase]['cpu'])
+            assert (output_dir / f"{phase}.folded").exists() and (output_dir / f"{phase}.pstats").exists()
+        folded = (output_dir / "booking.folded").read_text(encoding="utf-8")
+        assert folded.startswith("task:") and "parse_calendar_text (tests/test_profiling.py)" in folded
+
+        assert phases['burst']['loop_lag']['max_ms'] >= 100 and phases['burst']['loop_lag']['stalls'] >= 1
+        assert phases['steady']['loop_lag']['count'] > 0
+
+        booking_memory = phases['booking']['memory']
+        assert any(item['location'].startswith("tests/test_profiling.py") and item['size_diff_kb'] > 1000
+                   for window in booking_memory for item in window['top'])
+        assert not profiler.running
+
+
+def test_disabled_profiler_is_noop():
+    """無効の場合は記録せず、予約のフェーズの記録もそのまま使える"""
+    async def run():
+        profiler = Profiler([])
+        await profiler.start()
+        profiler.begin_window()
+        with profiler.booking():
+            pass
+        assert not profiler.running
+        assert await profiler.close() is None
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_parse_modes_and_classify()
+    test_phases_and_report()
+    test_disabled_profiler_is_noop()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+予約公開カレンダーのテスト
+
+繰り返しの規則・単発の公開日時・例外（取りやめ・振替）から監視期間を計算し、
+重なる監視期間がまとめられること、スケジューラーが監視期間を順に実行することを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.config import ConfigError
+from src.release_calendar import ReleaseCalendar, ReleaseRule, load_release_calendar
+from src.scheduler import Scheduler
+
+
+def test_monthly_rule_with_exceptions():
+    """毎月の規則から公開日時を計算し、例外の日は取りやめ・振替する"""
+    calendar = ReleaseCalendar(
+        rules=[ReleaseRule(1, time(9, 30)), ReleaseRule(31, time(13, 0))],
+        dates=[datetime(2026, 2, 20, 10, 0)],
+        exceptions={date(2026, 1, 1): None, date(2026, 3, 1): datetime(2026, 3, 2, 9, 30)},
+    )
+    releases = calendar.releases_between(datetime(2025, 12, 15), datetime(2026, 4, 1))
+    assert releases == [
+        datetime(2025, 12, 31, 13, 0),
+        datetime(2026, 1, 31, 13, 0),
+        datetime(2026, 2, 1, 9, 30),
+        datetime(2026, 2, 20, 10, 0),
+        datetime(2026, 3, 2, 9, 30),
+        datetime(2026, 3, 31, 13, 0),
+    ]
+
+    # 振替先の日が別の例外の日でも、振り替えた公開日時は残す
+    calendar.exceptions[date(2026, 3, 2)] = None
+    assert datetime(2026, 3, 2, 9, 30) in calendar.releases_between(datetime(2026, 3, 1), datetime(2026, 3, 3))
+
+
+def test_overlapping_windows_are_merged():
+    """監視期間が重なる公開日時は1つの監視期間にまとめる"""
+    calendar = ReleaseCalendar(
+        dates=[datetime(2026, 5, 1, 9, 30), datetime(2026, 5, 1, 9, 35), datetime(2026, 5, 1, 13, 0)],
+        monitor_duration_minutes=10,
+    )
+    first, second = calendar.upcoming_windows(datetime(2026, 4, 30))
+    assert first.releases == [datetime(2026, 5, 1, 9, 30), datetime(2026, 5, 1, 9, 35)]
+    assert first.start == datetime(2026, 5, 1, 9, 29, 57)
+    assert first.end == datetime(2026, 5, 1, 9, 45)
+    assert second.release_datetime == datetime(2026, 5, 1, 13, 0)
+
+    # 監視中の公開日時も対象、終わった監視期間は除く
+    assert calendar.upcoming_windows(datetime(2026, 5, 1, 9, 40))[0].start == first.start
+    assert len(calendar.upcoming_windows(datetime(2026, 5, 1, 9, 45))) == 1
+
+
+def test_load_release_calendar_from_file():
+    """カレンダーファイルを読み込み、不正な形式はConfigErrorにする"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "calendar.json"
+        path.write_text(json.dumps({
+            "rules": [{"day": 1, "time": "09:30", "months": [6]}],
+            "exceptions": [{"date": "2026-06-01", "move_to": "2026-06-02 09:30:00"}],
+            "monitor_duration_minutes": 5,
+        }), encoding="utf-8")
+        calendar = load_release_calendar(str(path))
+        assert calendar.recurring and calendar.monitor_duration_minutes == 5
+        window = calendar.next_window(datetime(2026, 5, 1))
+        assert window.release_datetime == datetime(2026, 6, 2, 9, 30)
+
+        for invalid in ({"rules": [{"day": 32}]}, {"dates": ["2026/06/01"]}, {}):
+            path.write_text(json.dumps(invalid), encoding="utf-8")
+            try:
+                load_release_calendar(str(path))
+                assert False, f"ConfigErrorが発生しませんでした: {invalid}"
+            except ConfigError:
+                pass
+
+
+def test_scheduler_runs_each_window_in_order():
+    """スケジューラーは監視期間を順に実行し、今後の監視期間がなくなれば終了する"""
+    now = datetime.now()
+    calendar = ReleaseCalendar(
+        dates=[now - timedelta(minutes=20), now + timedelta(minutes=5), now + timedelta(days=3)],
+        monitor_duration_minutes=1,
+    )
+
+    class RecordingScheduler(Scheduler):
+        """待機せずにトリガーと監視期間を記録する"""
+
+        async def _trigger(self, name, at):
+            self.trigger_log.append({'name': name, 'scheduled': at, 'lateness_seconds': 0.0})
+            return 0.0
+
+        async def _start_monitoring_job(self):
+            self.ran.append(self.window.release_datetime)
+
+    async def run():
+        scheduler = RecordingScheduler(calendar)
+        scheduler.ran = []
+        await asyncio.wait_for(scheduler.start(), timeout=5)
+        assert scheduler.ran == calendar.dates[1:]
+        assert [entry['scheduled'] for entry in scheduler.trigger_log] == [
+            release - timedelta(seconds=3 + scheduler.prepare_seconds) for release in calendar.dates[1:]
+        ]
+
+        # 次の監視期間のみ実行するモード
+        once = RecordingScheduler(calendar, once=True)
+        once.ran = []
+        await asyncio.wait_for(once.start(), timeout=5)
+        assert once.ran == calendar.dates[1:2]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_monthly_rule_with_exceptions()
+    test_overlapping_windows_are_merged()
+    test_load_release_calendar_from_file()
+    test_scheduler_runs_each_window_in_order()
+    print("すべてのテストが成功しました")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Airリザーブのシミュレーターのテスト
+
+カレンダーの構造（週情報・次週ボタン・枠の要素）・公開日時による枠の公開・
+メニュー詳細から予約確定までの流れ・満員・応答の遅延・シナリオファイルの読み込みを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.booking_state import DONE_INDICATORS, UNAVAILABLE_INDICATORS
+from src.config import ConfigError
+from src.simulator import AirReserveSimulator, SimulatedSlot, build_default_slots
+from src.slots import parse_remaining_seats
+
+
+async def request(url: str, form=None):
+    """HTTPリクエストを送り、ステータスコードと本文を返す"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    body = urlencode(form).encode("utf-8") if form is not None else b""
+    method = "POST" if form is not None else "GET"
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        "Content-Type: application/x-www-form-urlencoded\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = (await reader.read()).decode("utf-8")
+    writer.close()
+    head, _, text = response.partition("\r\n\r\n")
+    return int(head.split()[1]), text
+
+
+def form_action(page: str) -> str:
+    return re.search(r'<form[^>]*action="([^"]+)"', page).group(1)
+
+
+def slot_boxes(page: str):
+    return re.findall(r'<div class="dataLinkBox js-dataLinkBox"><a href="([^"]+)">(.*?)</a></div>', page)
+
+
+def test_calendar_markup_and_weeks():
+    """週情報・次週ボタン・枠の要素を再現し、最後の週には次週ボタンがない"""
+    async def run():
+        start = date(2026, 11, 4)
+        slots = build_default_slots(start, weeks=2, release_at=datetime.now() + timedelta(hours=1))
+        async with AirReserveSimulator(slots, start_date=start, weeks=2, port=0) as sim:
+            status, first = await request(sim.calendar_url)
+            assert status == 200
+            assert '<li class="ctlListItem listDate">2026/11/02(月) 〜 11/08(日)</li>' in first
+            assert '<div class="calendarDay" data-date="2026-11-02">' in first
+            boxes = slot_boxes(first)
+            assert len(boxes) == 10
+            assert [parse_remaining_seats(text) for _, text in boxes[:2]] == [5, 0]
+            assert boxes[0][0] == f"{sim.base_url}/simshop/reserve/s001"
+
+            next_url = re.search(r'<li class="ctlListItem listNext"><a href="([^"]+)">次週</a></li>', first).group(1)
+            status, second = await request(next_url)
+            assert "2026/11/09(月) 〜 11/15(日)" in second
+            # 公開前の枠は残0
+            assert {parse_remaining_seats(text) for _, text in slot_boxes(second)} == {0}
+            assert "listNext" not in second
+
+            status, _ = await request(f"{sim.base_url}/othershop/calendar")
+            assert status == 404
+
+    asyncio.run(run())
+
+
+def test_booking_flow_after_release():
+    """公開前は予約受付期間外、公開後はメニュー詳細・入力・確認を経て予約が確定し、残席が減る"""
+    async def run():
+        slot = SimulatedSlot("s001", date(2026, 11, 4), "09:30", capacity=1, release_at=datetime.now() + timedelta(hours=1))
+        async with AirReserveSimulator([slot], start_date=slot.day, port=0) as sim:
+            reserve_url = f"{sim.base_url}/simshop/reserve/s001"
+            _, closed = await request(reserve_url)
+            assert "予約受付期間外です" in closed and "menuDetailForm" not in closed
+            assert any(indicator in closed for indicator in UNAVAILABLE_INDICATORS)
+
+            sim.release()
+            _, menu = await request(reserve_url)
+            assert 'id="menuDetailForm"' in menu and 'id="lessonEntryPaxCnt"' in menu
+            _, visitor = await request(form_action(menu), {'lessonEntryPaxCnt': "1"})
+            for name in ("lastNm", "firstNm", "lastNmKn", "firstNmKn", "mailAddress1", "mailAddress1ForCnfrm", "tel1"):
+                assert f'name="{name}"' in visitor
+            confirm_url = form_action(visitor)
+            assert "/booking/lesson/visitor/confirm/" in confirm_url
+
+            _, invalid = await request(confirm_url, {'lastNm': "山田", 'mailAddress1': "", 'tel1': "0900000000"})
+            assert "入力内容に誤りがあります" in invalid
+
+            visitor_form = {
+                'lastNm': "山田", 'firstNm': "花子", 'mailAddress1': "hanako@example.com",
+                'mailAddress1ForCnfrm': "hanako@example.com", 'tel1': "09000000000",
+            }
+            _, confirm = await request(confirm_url, visitor_form)
+            assert 'name="lastNm"' not in confirm and "予約する" in confirm
+            assert not any(indicator in confirm for indicator in DONE_INDICATORS)
+            _, done = await request(form_action(confirm), {})
+            assert any(indicator in done for indicator in DONE_INDICATORS)
+
+            # 残席がなくなった後の予約は満員
+            assert not sim.book("s001", "他の利用者")
+            _, confirm = await request(confirm_url, visitor_form)
+            assert "満員" in confirm
+            _, calendar = await request(sim.calendar_url)
+            assert parse_remaining_seats(slot_boxes(calendar)[0][1]) == 0
+
+            _, state = await request(f"{sim.base_url}/_sim/state")
+            state = json.loads(state)
+            assert state['slots'][0]['remaining'] == 0
+            assert [booking['customer'] for booking in state['bookings']] == ["山田 花子"]
+
+    asyncio.run(run())
+
+
+def test_latency_and_scenario_file():
+    """シナリオファイルから枠と遅延を読み込み、応答ごとに遅延を加える"""
+    async def run(path):
+        sim = AirReserveSimulator.from_scenario(path, port=0)
+        assert sim.shop == "testshop" and sim.latency == 0.1
+        assert sim.slots["s001"].release_at == datetime(2026, 10, 20, 13, 0)
+        async with sim:
+            started = time.perf_counter()
+            status, page = await request(sim.calendar_url)
+            assert status == 200 and time.perf_counter() - started >= 0.1
+            assert "2026/11/02(月)" in page and len(slot_boxes(page)) == 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scenario.json"
+        path.write_text(json.dumps({
+            'shop': "testshop",
+            'start_date': "2026-11-02",
+            'latency_ms': 100,
+            'slots': [{'date': "2026-11-04", 'time': "10:00", 'capacity': 3, 'release_at': "2026-10-20 13:00:00"}],
+        }), encoding="utf-8")
+        asyncio.run(run(str(path)))
+
+        path.write_text(json.dumps({'slots': [{'time': "10:00"}]}), encoding="utf-8")
+        try:
+            AirReserveSimulator.from_scenario(str(path))
+            assert False, "ConfigErrorが発生しませんでした"
+        except ConfigError:
+            pass
+
+
+if __name__ == "__main__":
+    test_calendar_markup_and_weeks()
+    test_booking_flow_after_release()
+    test_latency_and_scenario_file()
+    print("すべてのテストが成功しました")
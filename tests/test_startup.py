@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+起動時間のテスト
+
+設定の検証モードがPlaywrightを読み込まないこと、-X importtime の出力を解析できること、
+起動時間を予算と比べられることを確認する（ブラウザ不要）
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+from src.startup import check_startup_budget, measure_imports, parse_importtime
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       313 |        313 |   _io
+import time:      1200 |       1200 |     playwright._impl
+import time:       400 |       1600 |   playwright
+import time:       500 |       2100 | src.scraper
+"""
+
+
+def test_parse_importtime():
+    """-X importtime の出力から、モジュールごとの読み込み時間と深さを取り出す"""
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+    assert [(timing.name, timing.depth) for timing in timings] == [
+        ("_io", 1), ("playwright._impl", 2), ("playwright", 1), ("src.scraper", 0),
+    ]
+    assert timings[-1].as_dict() == {'module': 'src.scraper', 'self_ms': 0.5, 'cumulative_ms': 2.1}
+
+
+def test_validate_mode_does_not_import_playwright():
+    """設定の検証モードはブラウザを使うモジュールを読み込まずに終了する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env_path = Path(tmp) / ".env"
+        env_path.write_text(
+            "BOOKER_NAME=山田太郎\nBOOKER_EMAIL=test@example.com\nBOOKER_PHONE=090-0000-0000\n"
+            "CHILD_NAME=山田花子\nCHILD_AGE=2\n",
+            encoding="utf-8",
+        )
+        env = {key: value for key, value in os.environ.items() if key not in ("TARGETS_FILE", "PROFILES_FILE")}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", str(PROJECT_ROOT / "main.py"), "--mode", "validate",
+             "--config", str(env_path)],
+            cwd=tmp, env=env, capture_output=True, text=True, timeout=60,
+        )
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "設定は有効です" in result.stdout
+        modules = {timing.name for timing in parse_importtime(result.stderr)}
+        assert "src.config" in modules
+        assert not any(name.startswith("playwright") for name in modules)
+        assert "src.scraper" not in modules and "src.booker" not in modules
+
+
+def test_measure_imports_and_budget():
+    """新しいプロセスでの読み込み時間を計測し、予算を超えた場合はFalseを返す"""
+    timings = measure_imports(["src.release_calendar"])
+    assert "src.release_calendar" in {timing.name for timing in timings if timing.depth == 0}
+
+    assert check_startup_budget("validate", 100.0, budget_ms=500.0)
+    assert not check_startup_budget("validate", 600.0, budget_ms=500.0)
+
+
+if __name__ == "__main__":
+    test_parse_importtime()
+    test_validate_mode_does_not_import_playwright()
+    test_measure_imports_and_budget()
+    print("すべてのテストが成功しました")
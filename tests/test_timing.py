@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+高精度の待機・スケジューラーのテスト
+
+指定日時までの待機の遅延が小さいこと、待機中もイベントループが止まらないこと、
+スケジューラーがトリガーの遅延を記録することを確認する（ブラウザ不要）
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.scheduler import Scheduler
+from src.timing import sleep_until
+
+
+def test_sleep_until_fires_close_to_target():
+    """指定日時の直後に戻り、遅延を返す"""
+    async def run():
+        target = datetime.now() + timedelta(seconds=0.2)
+        lateness = await sleep_until(target, coarse_margin=0.05)
+        assert datetime.now() >= target
+        assert 0 <= lateness < 0.02
+
+        # 既に過ぎている場合はすぐに戻り、過ぎた分を返す
+        lateness = await sleep_until(datetime.now() - timedelta(seconds=1))
+        assert lateness >= 1
+
+    asyncio.run(run())
+
+
+def test_sleep_until_keeps_event_loop_running():
+    """細かい待機の区間でも他のタスクが実行される"""
+    async def run():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        await sleep_until(datetime.now() + timedelta(seconds=0.1), coarse_margin=0.1)
+        task.cancel()
+        assert len(ticks) > 10
+
+    asyncio.run(run())
+
+
+def test_scheduler_records_trigger_lateness():
+    """スケジューラーはトリガーごとに予定時刻と遅延を記録する"""
+    async def run():
+        scheduler = Scheduler()
+        at = datetime.now() + timedelta(seconds=0.05)
+        lateness = await scheduler._trigger("monitor", at)
+        assert scheduler.trigger_log == [{'name': 'monitor', 'scheduled': at, 'lateness_seconds': lateness}]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_sleep_until_fires_close_to_target()
+    test_sleep_until_keeps_event_loop_running()
+    test_scheduler_records_trigger_lateness()
+    print("すべてのテストが成功しました")
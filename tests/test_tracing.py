@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+遅延トレースのテスト
+
+スパンの親子関係（asyncioのタスクをまたぐ場合も含む）・予約フローの各ステップのスパン・
+OTLP形式のJSON Linesと内訳の書き出しを確認する（ブラウザ不要）
+"""
+import asyncio
+import json
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+from src.booker import AirReserveBooker
+from src.flight_recorder import FlightRecorder
+from src.tracing import Tracer, set_tracer
+
+
+class FakePage:
+    """状態を文字列で持つダミーページ"""
+
+    url = "https://example.invalid/"
+
+    def __init__(self):
+        self.state = "calendar"
+
+    async def evaluate(self, script):
+        return {
+            'url': self.url + ('confirm' if self.state == 'confirm' else ''),
+            'hasCalendar': self.state == 'calendar',
+            'hasMenuDetail': self.state == 'menu_detail',
+            'hasVisitorForm': self.state == 'form',
+            'text': '',
+        }
+
+
+class FakeBooker(AirReserveBooker):
+    """ページ操作をダミーに置き換えたブッカー"""
+
+    def __init__(self):
+        super().__init__()
+        self.dry_run = False
+        self.recorder = FlightRecorder(mode="off")
+
+    async def _retry_with_backoff(self, func, max_retries=3, base_delay=1.0, operation_name="操作"):
+        return await func()
+
+    async def _click_reservation_link(self, slot_info, page):
+        page.state = "menu_detail"
+        return True
+
+    async def _select_menu(self, page):
+        return True
+
+    async def _select_datetime(self, page):
+        return True
+
+    async def _submit_menu_detail_form(self, page):
+        page.state = "form"
+        return True
+
+    async def _fill_booking_form(self, page):
+        page.state = "confirm"
+        return True
+
+    async def _confirm_booking(self, page):
+        await asyncio.sleep(0.01)
+        page.state = "done"
+        return True
+
+
+def test_spans_are_nested_across_tasks():
+    """同じタスク内で入れ子になったスパン・子タスクのスパンは親のスパンに紐付く"""
+    async def run():
+        tracer = Tracer()
+        with tracer.span("scan", target_id="default") as scan:
+            with tracer.span("extract_slots", week=1) as extract:
+                extract.set(slots=3)
+
+            async def child():
+                with tracer.span("navigate_week", week=2):
+                    await asyncio.sleep(0)
+
+            await asyncio.create_task(child())
+        with tracer.span("scan"):
+            pass
+
+        first_scan, extract, navigate, second_scan = sorted(tracer.spans, key=lambda span: span.start_ns)
+        assert extract.parent_id == scan.span_id and navigate.parent_id == scan.span_id
+        assert extract.trace_id == scan.trace_id == navigate.trace_id
+        assert second_scan.parent_id is None and second_scan.trace_id != scan.trace_id
+        assert extract.attributes == {'week': 1, 'slots': 3}
+        assert all(span.end_ns >= span.start_ns for span in tracer.spans)
+
+    asyncio.run(run())
+
+
+def test_booking_steps_are_traced():
+    """予約フローは予約全体と各ステップのスパンを記録し、枠の検出からの時間を属性に持つ"""
+    async def run():
+        tracer = Tracer()
+        set_tracer(tracer)
+        try:
+            slot = {'text': '09:30 一時預かり 残1', 'href': '/x', 'timestamp': datetime.now() - timedelta(seconds=1)}
+            assert await FakeBooker().execute_booking(slot, FakePage())
+        finally:
+            set_tracer(None)
+
+        names = [span.name for span in tracer.spans]
+        assert names == [
+            "booking.click_link", "booking.menu_detail", "booking.fill_form", "booking.confirm", "booking",
+        ]
+        booking = tracer.spans[-1]
+        assert booking.attributes['booked'] is True
+        assert booking.attributes['since_detected_ms'] >= 1000
+        assert booking.attributes['detected_to_booked_ms'] >= booking.attributes['since_detected_ms']
+        assert all(span.parent_id == booking.span_id for span in tracer.spans[:-1])
+        assert tracer.spans[3].attributes['succeeded'] is True
+
+        summary = tracer.summary()
+        assert summary['steps']['booking']['count'] == 1
+        assert summary['steps']['booking']['share'] == 1.0
+        assert summary['steps']['booking.confirm']['max_ms'] >= 10
+
+    asyncio.run(run())
+
+
+def test_export_and_finish_run():
+    """スパンをOTLP形式のJSON Linesと内訳に書き出し、実行ごとに記録を空にする（無効時は記録しない）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = Tracer(directory=tmp)
+        with tracer.span("scan", target_id="default", weeks=7, partial=False):
+            with tracer.span("rank", ratio=0.5):
+                pass
+        run_id = tracer.run_id
+        path = tracer.finish_run()
+
+        lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        rank, scan = lines
+        assert rank['parentSpanId'] == scan['spanId'] and 'parentSpanId' not in scan
+        assert int(scan['endTimeUnixNano']) >= int(rank['endTimeUnixNano']) >= int(rank['startTimeUnixNano'])
+        assert {attr['key']: attr['value'] for attr in scan['attributes']} == {
+            'target_id': {'stringValue': 'default'},
+            'weeks': {'intValue': '7'},
+            'partial': {'boolValue': False},
+        }
+        summary = json.loads(Path(str(path).replace(".jsonl", "-summary.json")).read_text(encoding="utf-8"))
+        assert summary['run_id'] == run_id and set(summary['steps']) == {'scan', 'rank'}
+
+        assert tracer.spans == [] and tracer.run_id != run_id
+        assert tracer.finish_run() is None
+
+        disabled = Tracer(enabled=False)
+        with disabled.span("scan") as span:
+            span.set(slots=1)
+        assert disabled.spans == []
+
+
+if __name__ == "__main__":
+    test_spans_are_nested_across_tasks()
+    test_booking_steps_are_traced()
+    test_export_and_finish_run()
+    print("すべてのテストが成功しました")